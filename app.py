@@ -1,5 +1,6 @@
 import streamlit as st
 from auth import require_login
+from expiry import start as start_expiry_sweeps
 
 # ---------------------------------
 # Page config MUST be first
@@ -9,6 +10,11 @@ st.set_page_config(
     layout="wide"
 )
 
+# ---------------------------------
+# Background expiry sweeps (one thread per server process)
+# ---------------------------------
+start_expiry_sweeps()
+
 # ---------------------------------
 # Login
 # ---------------------------------
@@ -44,6 +50,7 @@ pages = {
         st.Page("pages/8_Registry_Verification.py", title="Verify DWR"),
         st.Page("pages/9_ColdChain_SLA.py", title="Cold Chain SLA"),
         st.Page("pages/10_Audit_Log.py", title="Audit Log"),
+        st.Page("pages/11_Bank_Liens.py", title="Bank Liens"),
     ]
 }
 
@@ -0,0 +1,416 @@
+"""
+Audit log query engine over the event journal.
+
+The journal is already time-partitioned (daily, size-rotated segments under events/).
+Each segment gets an inverted index: a sorted term dictionary plus one sorted posting
+list of row numbers per term, the event timestamps and the byte offset of every row.
+Terms are
+
+    t:<event_type>  o:<object_type>  i:<object_id>  k:<details key>  v:<details value>
+
+Segments are append-only, so a segment's index is built once, saved as .npy files under
+events/.index/ (memory-mapped on load) and afterwards only extended in memory with the
+bytes appended since the last query.
+
+A query intersects posting lists segment by segment, newest first, stops as soon as a
+page is full and reads only those rows from disk. `query` returns the page and a cursor
+for the next (older) one.
+"""
+import io
+import os
+import csv
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from journal import journal_for, EVENT_COLUMNS, LEGACY_COLUMNS
+from utils import csv_path
+
+PAGE_SIZE = 100
+INDEX_DIRNAME = ".index"
+# Longer details values are indexed by their first MAX_VALUE_CHARS characters (prefix search still works)
+MAX_VALUE_CHARS = 64
+# A live segment is re-indexed as one part once it has been extended this many times
+MAX_LIVE_PARTS = 16
+
+_ARRAYS = ["terms", "starts", "postings", "ts", "offsets"]
+
+
+class SegmentIndex:
+    """Inverted index over the rows of one segment that start at `base_row`."""
+
+    def __init__(self, terms, starts, postings, ts, offsets, base_row=0):
+        self.terms = terms          # sorted bytes, one per term
+        self.starts = starts        # postings[starts[i]:starts[i + 1]] are the rows of terms[i]
+        self.postings = postings    # row numbers relative to base_row, ascending per term
+        self.ts = ts                # event_ts as int64 ms (INT64_MIN when unparseable)
+        self.offsets = offsets      # byte offset of each row in the segment file
+        self.base_row = base_row
+        self._span = None
+
+    def __len__(self):
+        return len(self.ts)
+
+    def rows(self, term: str) -> np.ndarray:
+        key = term.encode("utf-8")
+        i = int(np.searchsorted(self.terms, key))
+        if i == len(self.terms) or self.terms[i] != key:
+            return np.empty(0, dtype=np.uint32)
+        return self.postings[self.starts[i]:self.starts[i + 1]]
+
+    def rows_prefix(self, prefixes) -> np.ndarray:
+        """Union of the posting lists of every term starting with one of `prefixes`."""
+        parts = []
+        for prefix in prefixes:
+            lo, hi = self._term_range(prefix)
+            if hi > lo:
+                parts.append(self.postings[self.starts[lo]:self.starts[hi]])
+        if not parts:
+            return np.empty(0, dtype=np.uint32)
+        return np.unique(np.concatenate(parts))
+
+    def overlaps(self, lo, hi) -> bool:
+        """Whether any event_ts can fall in [lo, hi) (None = unbounded)."""
+        if self._span is None:
+            ts = np.asarray(self.ts)
+            self._span = (int(ts.min()), int(ts.max())) if len(ts) else (0, -1)
+        first, last = self._span
+        return (lo is None or last >= lo) and (hi is None or first < hi) and first <= last
+
+    def values(self, prefix: str) -> list:
+        lo, hi = self._term_range(prefix)
+        return [t.decode("utf-8")[len(prefix):] for t in self.terms[lo:hi]]
+
+    def _term_range(self, prefix):
+        key = prefix.encode("utf-8")
+        # 0xFF never occurs in UTF-8, so it sorts after every continuation of the prefix
+        return int(np.searchsorted(self.terms, key)), int(np.searchsorted(self.terms, key + b"\xff"))
+
+    # ----------------------------
+    # Building
+    # ----------------------------
+    @classmethod
+    def build(cls, data: bytes, header, start_offset: int, base_row=0) -> "SegmentIndex":
+        """Index complete CSV records in `data`, which starts at byte `start_offset` of the file."""
+        df = pd.read_csv(io.BytesIO(data), header=None, names=header, dtype=str, keep_default_na=False,
+                         engine="c") if data else pd.DataFrame(columns=header)
+        df = df.rename(columns=LEGACY_COLUMNS).reindex(columns=EVENT_COLUMNS, fill_value="")
+        n = len(df)
+
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+        offsets = start_offset + np.concatenate(([0], newlines[:-1] + 1)).astype(np.int64) if n else np.empty(0, np.int64)
+        if len(offsets) != n:
+            # a quoted field with an embedded newline: rows are fetched by re-reading the segment instead
+            offsets = np.full(n, -1, dtype=np.int64)
+
+        ts = pd.to_datetime(df["event_ts"], errors="coerce", utc=True, format="ISO8601").dt.tz_localize(None)
+        ts = ts.to_numpy(dtype="datetime64[ms]").astype(np.int64)
+
+        term_parts, row_parts = [], []
+        rows = np.arange(n, dtype=np.int64)
+        for prefix, col in (("t:", "event_type"), ("o:", "object_type"), ("i:", "object_id")):
+            values = df[col].to_numpy(dtype=object)
+            keep = values != ""
+            term_parts.append(prefix + df[col][keep].to_numpy(dtype=object))
+            row_parts.append(rows[keep])
+        details_terms, details_rows = _details_terms(df["details_json"])
+        term_parts.append(np.asarray(details_terms, dtype=object))
+        row_parts.append(np.asarray(details_rows, dtype=np.int64))
+
+        all_terms = np.concatenate(term_parts) if n else np.empty(0, dtype=object)
+        all_rows = np.concatenate(row_parts) if n else np.empty(0, dtype=np.int64)
+        codes, uniques = pd.factorize(all_terms, sort=True)
+        # one sort orders by term, then row; repeated (term, row) pairs are dropped
+        keys = np.sort(codes.astype(np.int64) * max(n, 1) + all_rows)
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+        term_codes, postings = np.divmod(keys, max(n, 1))
+        starts = np.searchsorted(term_codes, np.arange(len(uniques) + 1)).astype(np.int64)
+        terms = np.array([t.encode("utf-8") for t in uniques], dtype=bytes) if len(uniques) else np.empty(0, dtype="S1")
+        return cls(terms, starts, postings.astype(np.uint32), ts, offsets, base_row)
+
+    def save(self, directory, meta) -> None:
+        tmp = directory + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+        os.replace(tmp, directory)
+
+    @classmethod
+    def load(cls, directory) -> "SegmentIndex":
+        """Memory-mapped saved index, or None if it is missing or unreadable."""
+        try:
+            arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+        except (OSError, ValueError):
+            return None
+        return cls(**arrays)
+
+
+def _load_meta(directory) -> dict:
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _details_terms(details):
+    """k:<key> and v:<scalar value> terms for the top-level items of each details_json object."""
+    terms, rows = [], []
+    add_term, add_row, loads = terms.append, rows.append, json.loads
+    for row, text in enumerate(details):
+        if len(text) < 3:   # "" or "{}"
+            continue
+        try:
+            obj = loads(text)
+        except ValueError:
+            continue
+        if not isinstance(obj, dict):
+            continue
+        for key, value in obj.items():
+            add_term("k:" + key)
+            add_row(row)
+            if isinstance(value, (str, int, float, bool)) and value != "":
+                add_term("v:" + str(value)[:MAX_VALUE_CHARS])
+                add_row(row)
+    return terms, rows
+
+
+class _Segment:
+    """The index parts of one segment file and how much of the file they cover."""
+
+    def __init__(self, path, header, parts, indexed_bytes):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.header = header
+        self.parts = parts
+        self.indexed_bytes = indexed_bytes
+
+    @property
+    def rows(self) -> int:
+        return sum(len(p) for p in self.parts)
+
+    def fetch(self, rows) -> list:
+        """Events for segment row numbers, in the order given."""
+        offsets = self._offsets(rows)
+        if (offsets < 0).any():
+            df = pd.read_csv(self.path, dtype=str, keep_default_na=False).rename(columns=LEGACY_COLUMNS)
+            df = df.reindex(columns=EVENT_COLUMNS, fill_value="")
+            return df.iloc[list(rows)].to_dict("records")
+        out = []
+        with open(self.path, "rb") as fh:
+            for offset in offsets:
+                fh.seek(int(offset))
+                record = next(csv.reader([fh.readline().decode("utf-8")]))
+                row = {LEGACY_COLUMNS.get(k, k): v for k, v in zip(self.header, record)}
+                out.append({col: row.get(col, "") for col in EVENT_COLUMNS})
+        return out
+
+    def _offsets(self, rows) -> np.ndarray:
+        out = np.empty(len(rows), dtype=np.int64)
+        for part in self.parts:
+            local = np.asarray(rows) - part.base_row
+            hit = (local >= 0) & (local < len(part))
+            out[hit] = np.asarray(part.offsets)[local[hit]]
+        return out
+
+
+class AuditIndex:
+    """Indexes for every segment of one journal, refreshed incrementally before each query."""
+
+    def __init__(self, file_name="events.csv"):
+        self.journal = journal_for(csv_path(file_name))
+        self.index_dir = os.path.join(self.journal.directory, INDEX_DIRNAME)
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def refresh(self) -> list:
+        """Segments oldest-first, each indexed up to its current last complete line."""
+        with self._lock:
+            paths = self.journal._all_paths()
+            out = []
+            for path in paths:
+                try:
+                    size = os.path.getsize(path)
+                except FileNotFoundError:
+                    continue
+                seg = self._segments.get(path)
+                if seg is None or size < seg.indexed_bytes:
+                    seg = self._segments[path] = self._open(path, size)
+                elif size > seg.indexed_bytes:
+                    self._extend(seg)
+                out.append(seg)
+            for path in set(self._segments) - set(paths):
+                del self._segments[path]
+            return out
+
+    def _open(self, path, size) -> _Segment:
+        """
+        Load the saved index of a segment and index whatever was appended after it. Segments
+        are append-only, so an index built over the first N bytes stays valid while size >= N.
+        """
+        with open(path, "rb") as fh:
+            header_line = fh.readline()
+        header = next(csv.reader([header_line.decode("utf-8")]), [])
+        seg = _Segment(path, header, [], len(header_line))
+        meta = _load_meta(self._index_path(path))
+        if meta and meta.get("header") == header and meta.get("bytes", size + 1) <= size:
+            part = SegmentIndex.load(self._index_path(path))
+            if part is not None:
+                seg.parts, seg.indexed_bytes = [part], meta["bytes"]
+        self._extend(seg)
+        return seg
+
+    def _extend(self, seg: _Segment) -> None:
+        with open(seg.path, "rb") as fh:
+            fh.seek(seg.indexed_bytes)
+            data = fh.read()
+        # a concurrent writer may be mid-line: index complete records only
+        data = data[:data.rfind(b"\n") + 1]
+        if not data:
+            return
+        if seg.parts and len(seg.parts) < MAX_LIVE_PARTS:
+            seg.parts.append(SegmentIndex.build(data, seg.header, seg.indexed_bytes, seg.rows))
+            seg.indexed_bytes += len(data)
+            return
+        # first index of this segment, or too many small parts: (re)build it whole and save it
+        with open(seg.path, "rb") as fh:
+            start = len(fh.readline())
+            data = fh.read(seg.indexed_bytes + len(data) - start)
+        seg.parts = [SegmentIndex.build(data, seg.header, start)]
+        seg.indexed_bytes = start + len(data)
+        try:
+            seg.parts[0].save(self._index_path(seg.path), {"bytes": seg.indexed_bytes, "header": seg.header})
+        except OSError:
+            pass
+
+    def _index_path(self, path):
+        return os.path.join(self.index_dir, os.path.basename(path))
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def query(self, event_type=None, object_type=None, object_id=None, key=None, search=None,
+              start=None, end=None, cursor=None, limit=PAGE_SIZE):
+        """
+        Newest-first page of matching events and the cursor of the next page (None at the end).
+
+        event_type/object_type/object_id/key match exactly (key = a top-level details_json key);
+        search is a prefix match on object ids and details values; start/end bound event_ts.
+        """
+        terms, search, lo, hi = _filters(event_type, object_type, object_id, key, search, start, end)
+        after_name, after_row = _parse_cursor(cursor)
+
+        segments = self.refresh()
+        names = [s.name for s in segments]
+        if after_name is not None and after_name in names:
+            segments = segments[:names.index(after_name) + 1]
+
+        picked = []
+        for seg in reversed(segments):
+            for part in reversed(seg.parts):
+                rows = _match(part, terms, search, lo, hi) + part.base_row
+                if seg.name == after_name:
+                    rows = rows[rows < after_row]
+                take = rows[::-1][:limit - len(picked)]
+                picked.extend((seg, int(r)) for r in take)
+                if len(picked) >= limit:
+                    break
+            if len(picked) >= limit:
+                break
+
+        events = []
+        for seg in dict.fromkeys(s for s, _ in picked):
+            events.extend(seg.fetch([r for s, r in picked if s is seg]))
+        df = pd.DataFrame(events, columns=EVENT_COLUMNS)
+        next_cursor = f"{picked[-1][0].name}:{picked[-1][1]}" if len(picked) >= limit else None
+        return df, next_cursor
+
+    def facets(self, prefix) -> list:
+        """Distinct values of one term kind across the journal, e.g. facets("t:") for event types."""
+        values = set()
+        for seg in self.refresh():
+            for part in seg.parts:
+                values.update(part.values(prefix))
+        return sorted(values)
+
+    def count(self, event_type=None, object_type=None, object_id=None, key=None, search=None,
+              start=None, end=None) -> int:
+        """Number of events matching the same filters as `query` (no rows are read)."""
+        terms, search, lo, hi = _filters(event_type, object_type, object_id, key, search, start, end)
+        return sum(len(_match(part, terms, search, lo, hi)) for seg in self.refresh() for part in seg.parts)
+
+
+def _filters(event_type, object_type, object_id, key, search, start, end):
+    terms = [p + str(v) for p, v in (("t:", event_type), ("o:", object_type), ("i:", object_id), ("k:", key))
+             if v not in (None, "", "All")]
+    lo = _ms(start) if start is not None else None
+    hi = _ms(end) if end is not None else None
+    return terms, (search or "").strip(), lo, hi
+
+
+def _match(part: SegmentIndex, terms, search, lo, hi) -> np.ndarray:
+    """Ascending row numbers (relative to the part) matching every filter."""
+    if (lo is not None or hi is not None) and not part.overlaps(lo, hi):
+        return np.empty(0, dtype=np.int64)
+    lists = [part.rows(t) for t in terms]
+    if search:
+        lists.append(part.rows_prefix(["i:" + search, "v:" + search]))
+    if not lists:
+        rows = np.arange(len(part), dtype=np.int64)
+    else:
+        lists.sort(key=len)
+        rows = np.asarray(lists[0], dtype=np.int64)
+        for other in lists[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+    if (lo is not None or hi is not None) and len(rows):
+        ts = np.asarray(part.ts)[rows]
+        keep = np.ones(len(rows), dtype=bool)
+        if lo is not None:
+            keep &= ts >= lo
+        if hi is not None:
+            keep &= ts < hi
+        rows = rows[keep]
+    return rows.astype(np.int64, copy=False)
+
+
+def _ms(value) -> int:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return int(ts.value // 1_000_000)
+
+
+def _parse_cursor(cursor):
+    if not cursor:
+        return None, None
+    name, _, row = str(cursor).rpartition(":")
+    try:
+        return name, int(row)
+    except ValueError:
+        raise ValueError(f"invalid cursor: {cursor!r}")
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def audit_index(file_name="events.csv") -> AuditIndex:
+    with _indexes_lock:
+        index = _indexes.get(file_name)
+        if index is None:
+            index = _indexes[file_name] = AuditIndex(file_name)
+        return index
+
+
+def query_events(cursor=None, limit=PAGE_SIZE, file_name="events.csv", **filters):
+    return audit_index(file_name).query(cursor=cursor, limit=limit, **filters)
@@ -1,26 +1,6 @@
-import os
-import pandas as pd
 import streamlit as st
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-USERS_PATH = os.path.join(BASE_DIR, "users.csv")
-
-def ensure_users_file():
-    if not os.path.exists(USERS_PATH):
-        default_users = pd.DataFrame([
-            {
-                "username": "admin",
-                "password": "Admin123!",
-                "role": "admin",
-                "entity_id": "E-PLAT-001",
-                "name": "Platform Admin"
-            }
-        ])
-        default_users.to_csv(USERS_PATH, index=False)
-
-def load_users():
-    ensure_users_file()
-    return pd.read_csv(USERS_PATH)
+from users import ensure_users_file, authenticate
 
 def require_login():
     if "user" in st.session_state and st.session_state.user is not None:
@@ -38,29 +18,14 @@ def require_login():
 
     if submitted:
         try:
-            users = load_users()
+            user = authenticate(username, password)
         except Exception as e:
             st.error(f"Login system error: {e}")
             st.stop()
 
-        required_cols = {"username", "password", "role", "entity_id"}
-        missing = required_cols - set(users.columns)
-        if missing:
-            st.error(f"Users file is missing required columns: {sorted(missing)}")
-            st.stop()
-
-        users["username"] = users["username"].astype(str).str.strip()
-        users["password"] = users["password"].astype(str).str.strip()
-
-        match = users[
-            (users["username"] == str(username).strip()) &
-            (users["password"] == str(password).strip())
-        ]
-
-        if not match.empty:
-            user = match.iloc[0].to_dict()
+        if user is not None:
             st.session_state.user = user
-            st.success(f"Welcome, {user.get('name', user['username'])}")
+            st.success(f"Welcome, {user.get('name') or user['username']}")
             st.rerun()
         else:
             st.error("Invalid username or password.")
@@ -0,0 +1,96 @@
+"""
+Audit log queries: the previous page's full scan (iter_event_chunks + str.contains) vs.
+audit_query over per-segment inverted indexes, on a synthetic journal of daily segments.
+
+    python benchmarks/bench_audit_query.py [n_events]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from audit_query import AuditIndex
+from journal import journal_for, EVENT_COLUMNS
+
+DAYS = 30
+EVENT_TYPES = ["lot_created", "dwr_issued", "advance_created", "sale_contract_created", "payment_confirmed",
+               "release_confirmed", "dispute_filed", "dispute_resolved", "login", "tank_assigned"]
+OBJECT_TYPES = ["dairy_lot", "dwr_receipt", "advance", "sale_contract", "payment", "release_order", "dispute", "user", "tank"]
+
+
+def write_journal(directory, n, rng):
+    os.makedirs(directory)
+    per_day = n // DAYS
+    for day in range(DAYS):
+        k = per_day if day < DAYS - 1 else n - per_day * (DAYS - 1)
+        base = pd.Timestamp("2026-01-01") + pd.Timedelta(days=day)
+        ts = base + pd.to_timedelta(np.sort(rng.integers(0, 86_400_000, k)), unit="ms")
+        ids = rng.integers(0, n // 4, k)
+        details = [json.dumps({"custodian_id": f"C-{c:03d}", "amount_xof": int(a)})
+                   for c, a in zip(rng.integers(0, 200, k), rng.integers(1, 500, k) * 1000)]
+        df = pd.DataFrame({
+            "event_ts": ts.strftime("%Y-%m-%dT%H:%M:%S.%f"),
+            "username": np.array(["platform_admin", "custodian_mcc", "buyer_demo"])[rng.integers(0, 3, k)],
+            "event_type": np.array(EVENT_TYPES)[rng.integers(0, len(EVENT_TYPES), k)],
+            "object_type": np.array(OBJECT_TYPES)[rng.integers(0, len(OBJECT_TYPES), k)],
+            "object_id": np.char.add("OBJ-", ids.astype(str)),
+            "details_json": details,
+        })[EVENT_COLUMNS]
+        df.to_csv(os.path.join(directory, f"events-{base:%Y%m%d}-0001.csv"), index=False)
+
+
+def timed(fn, repeat=1):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t0) / repeat
+
+
+def scan(journal, et, ot, search, limit=100):
+    kept = []
+    for df in journal.iter_chunks():
+        df = df[(df["event_type"] == et) & (df["object_type"] == ot)]
+        df = df[df["object_id"].str.contains(search, regex=False) | df["details_json"].str.contains(search, regex=False)]
+        kept.append(df.tail(limit))
+    return pd.concat(kept).tail(limit)
+
+
+def main(n=10_000_000):
+    rng = np.random.default_rng(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        events_csv = os.path.join(tmp, "events.csv")
+        _, t_write = timed(lambda: write_journal(os.path.join(tmp, "events"), n, rng))
+        print(f"events: {n:,} in {DAYS} daily segments (written in {t_write:.1f} s)")
+
+        if n <= 2_000_000:
+            _, t_scan = timed(lambda: scan(journal_for(events_csv), "dwr_issued", "dwr_receipt", "C-042"))
+            print(f"full scan (old page)        {t_scan * 1e3:10.1f} ms")
+
+        _, t_build = timed(lambda: AuditIndex(events_csv).refresh())
+        print(f"build + save indexes        {t_build:10.1f} s   (once per segment, then saved)")
+        index = AuditIndex(events_csv)
+        _, t_open = timed(index.refresh)
+        print(f"open saved indexes          {t_open * 1e3:10.1f} ms")
+
+        cases = {
+            "event+object type": dict(event_type="dwr_issued", object_type="dwr_receipt"),
+            "+ details value prefix": dict(event_type="dwr_issued", object_type="dwr_receipt", search="C-042"),
+            "object id": dict(object_id=f"OBJ-{n // 8}"),
+            "time range": dict(event_type="dispute_filed", start="2026-01-10", end="2026-01-11"),
+        }
+        for label, filters in cases.items():
+            (page, cursor), t_q = timed(lambda: index.query(**filters), repeat=20)
+            _, t_next = timed(lambda: index.query(cursor=cursor, **filters), repeat=20) if cursor else (None, 0.0)
+            total, t_count = timed(lambda: index.count(**filters), repeat=5)
+            print(f"{label:<27} {t_q * 1e3:10.2f} ms   next page {t_next * 1e3:7.2f} ms   "
+                  f"count {t_count * 1e3:8.1f} ms ({total:,} matches)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
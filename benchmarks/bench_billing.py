@@ -0,0 +1,104 @@
+"""
+Rent billing: a per-tank, per-day loop vs. billing.close (vectorised accruals and one
+commit of invoices), for n tanks with `DAYS` days each since the last close (CSV
+backend in a temporary directory). The default is 50k tank-days.
+
+    python benchmarks/bench_billing.py [n_tanks]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import storage
+import utils
+import billing
+from capacity import pool_shares
+from storage import CsvBackend
+from table_cache import load_table
+
+DAYS = 10
+THROUGH = pd.Timestamp("2026-10-18", tz="UTC")
+
+
+def seed(directory, n, rng):
+    ids = np.arange(n).astype(str)
+    models = rng.choice(["rental", "rent_to_own", "pay_per_liter"], n, p=[0.4, 0.3, 0.3])
+    assigned = (THROUGH - pd.Timedelta(days=DAYS)).isoformat().replace("+00:00", "Z")
+    pd.DataFrame({"tank_id": np.char.add("T-", ids), "custodian_id": np.char.add("C-", (np.arange(n) % 500).astype(str)),
+                  "capacity_liters": rng.choice([300, 500, 1000], n), "status": "occupied", "ownership_model": models,
+                  "owner_entity_id": np.where(models == "pay_per_liter", "E-PLAT-001",
+                                              np.char.add("E-", rng.integers(0, 2000, n).astype(str))),
+                  "rent_xof_per_day": rng.choice([5000, 8000], n), "rent_to_own_months": 18,
+                  "purchase_price_xof": 4_200_000, "assigned_at": assigned, "contract_until": ""}
+                 ).to_csv(os.path.join(directory, "tanks.csv"), index=False)
+    m = n * 4
+    pd.DataFrame({"lot_id": np.char.add("LOT-", np.arange(m).astype(str)),
+                  "tank_id": np.char.add("T-", rng.integers(0, n, m).astype(str)),
+                  "owner_entity_id": np.char.add("E-", rng.integers(0, 2000, m).astype(str)),
+                  "quantity_liters": rng.integers(5, 60, m).astype(float), "status": "active"}
+                 ).to_csv(os.path.join(directory, "dairy_lots.csv"), index=False)
+    pd.DataFrame(columns=["receipt_id", "lot_id", "status"]).to_csv(os.path.join(directory, "dwr_receipts.csv"), index=False)
+    pd.DataFrame(columns=["payment_id", "ref_type", "ref_id", "payer_id", "payee_id", "amount_xof", "method", "status",
+                          "created_at", "confirmed_at", "provider_ref", "period_start", "period_end"]
+                 ).to_csv(os.path.join(directory, "payments.csv"), index=False)
+
+
+def per_day_loop(tanks, shares):
+    """One Python iteration per tank and day (and per owner in pooled tanks)."""
+    lines = []
+    for _, t in tanks.iterrows():
+        start = t["assigned_at"].floor("D")
+        day = start
+        while day < THROUGH:
+            if t["ownership_model"] == "pay_per_liter":
+                for _, s in shares[shares["tank_id"] == t["tank_id"]].iterrows():
+                    lines.append((t["tank_id"], day, s["owner_entity_id"],
+                                  s["liters"] * t["rent_xof_per_day"] / t["capacity_liters"]))
+            else:
+                lines.append((t["tank_id"], day, t["owner_entity_id"], t["rent_xof_per_day"]))
+            day += pd.Timedelta(days=1)
+    return lines
+
+
+def main(n=5_000):
+    rng = np.random.default_rng(23)
+    with tempfile.TemporaryDirectory() as directory:
+        storage._backend = CsvBackend(base_dir=directory)
+        utils.BASE_DIR = directory                                        # keep the journal out of the repo
+        seed(directory, n, rng)
+        tanks = load_table("tanks.csv")
+        shares = pool_shares()
+
+        sample = tanks.head(200)
+        t0 = time.perf_counter()
+        per_day_loop(sample, shares)
+        t_loop = (time.perf_counter() - t0) / len(sample) * n
+
+        t0 = time.perf_counter()
+        lines = billing.accruals(THROUGH)
+        t_accrue = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        report = billing.close(THROUGH, username="bench")
+        t_close = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        again = billing.close(THROUGH, username="bench")
+        t_again = time.perf_counter() - t0
+
+    print(f"tanks: {n:,}  days since last close: {DAYS}  accrual lines: {len(lines):,}")
+    print(f"per-tank, per-day loop        {t_loop:8.2f} s    (extrapolated from 200 tanks, no writes)")
+    print(f"accruals (np.repeat grid)     {t_accrue * 1e3:8.1f} ms")
+    print(f"close (accrue + invoice + commit + events)  {t_close:6.2f} s    "
+          f"({len(report['invoices']):,} invoices, {report['total_xof']:,.0f} XOF)")
+    print(f"close again (nothing to bill) {t_again * 1e3:8.1f} ms   ({again['tank_days']} tank-days)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
@@ -0,0 +1,61 @@
+"""
+Bulk receipt PDF throughput: sequential rendering vs. the process pool at
+increasing worker counts, plus the single-canvas merged PDF.
+
+    python benchmarks/bench_bulk_issuance.py [n_receipts]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import issuance
+from issuance import render_pdfs, merged_pdf, _render_chunk
+from utils import make_qr_payload
+
+
+def receipts(n):
+    rows, lots = [], {}
+    for i in range(n):
+        rid, lot_id = f"DWR-BENCH-{i:06d}", f"LOT-BENCH-{i:06d}"
+        rows.append({
+            "receipt_id": rid, "issued_at": "2026-01-01T07:00:00Z", "lot_id": lot_id,
+            "owner_entity_id": "E-WG-001", "custodian_id": "C-MCC-001", "status": "active",
+            "expiry_ts": "2026-01-03T07:00:00Z", "lien_active": "no", "lien_holder_id": "",
+            "qr_payload": make_qr_payload(rid, lot_id, "E-WG-001", "C-MCC-001", "2026-01-01T07:00:00Z"),
+        })
+        lots[lot_id] = {"lot_id": lot_id, "product_type": "raw_milk", "quantity_liters": 120, "fat_pct": 3.8,
+                        "snf_pct": 8.5, "acidity": 0.16, "antibiotic_test": "negative", "bacterial_score": 2,
+                        "temp_avg_c": 4.1, "quality_grade": "A", "status": "active"}
+    return rows, lots
+
+
+def main(n=400):
+    rows, lots = receipts(n)
+    items = [(r, lots[r["lot_id"]]) for r in rows]
+
+    t0 = time.perf_counter()
+    _render_chunk(items)
+    base = time.perf_counter() - t0
+    print(f"{'mode':<16} {'seconds':>8} {'receipts/s':>11} {'speedup':>8}")
+    print(f"{'sequential':<16} {base:>8.2f} {n / base:>11.0f} {1.0:>8.2f}")
+
+    cores = os.cpu_count() or 1
+    for workers in sorted(w for w in {2, 4, 8, cores} if 1 < w <= max(cores, 2)):
+        list(render_pdfs(rows[: issuance.PARALLEL_MIN], lots, workers=workers))  # warm the pool
+        t0 = time.perf_counter()
+        out = list(render_pdfs(rows, lots, workers=workers))
+        dt = time.perf_counter() - t0
+        assert len(out) == n
+        print(f"{f'pool x{workers}':<16} {dt:>8.2f} {n / dt:>11.0f} {base / dt:>8.2f}")
+
+    t0 = time.perf_counter()
+    merged_pdf(rows, lots)
+    dt = time.perf_counter() - t0
+    print(f"{'merged pdf':<16} {dt:>8.2f} {n / dt:>11.0f} {base / dt:>8.2f}")
+    print(f"(cpu cores: {cores})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 400)
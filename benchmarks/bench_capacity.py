@@ -0,0 +1,98 @@
+"""
+Tank allocation: filtering tanks and summing their lots per request (what the intake
+page would do) vs. capacity.CapacityBook's sorted free-space pools, for many custodians
+and tanks (CSV backend in a temporary directory).
+
+    python benchmarks/bench_capacity.py [n_tanks]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import storage
+import capacity
+from storage import CsvBackend
+from table_cache import load_table
+
+LOTS_PER_TANK = 20
+OWNERS = 2_000
+SAMPLE = 200
+BATCH = 10_000
+
+
+def seed(directory, n, rng):
+    custodians = max(n // 5, 1)
+    ids = np.arange(n).astype(str)
+    models = rng.choice(["pay_per_liter", "rental", "rent_to_own"], n, p=[0.5, 0.3, 0.2])
+    status = np.where(models == "pay_per_liter", "occupied", rng.choice(["available", "occupied"], n))
+    tanks = pd.DataFrame({"tank_id": np.char.add("T-", ids),
+                          "custodian_id": np.char.add("C-", (np.arange(n) % custodians).astype(str)),
+                          "capacity_liters": rng.choice([300, 500, 1000, 2000], n), "status": status,
+                          "ownership_model": models,
+                          "owner_entity_id": np.char.add("E-", rng.integers(0, OWNERS, n).astype(str))})
+    tanks.to_csv(os.path.join(directory, "tanks.csv"), index=False)
+    m = n * LOTS_PER_TANK
+    tank = rng.integers(0, n, m)
+    pd.DataFrame({"lot_id": np.char.add("LOT-", np.arange(m).astype(str)), "tank_id": tanks["tank_id"].to_numpy()[tank],
+                  "owner_entity_id": np.char.add("E-", rng.integers(0, OWNERS, m).astype(str)),
+                  "quantity_liters": rng.integers(1, 15, m).astype(float),
+                  "status": rng.choice(["active", "quarantined", "sold", "released"], m, p=[0.5, 0.05, 0.25, 0.2])}
+                 ).to_csv(os.path.join(directory, "dairy_lots.csv"), index=False)
+    pd.DataFrame(columns=["receipt_id", "lot_id", "status"]).to_csv(os.path.join(directory, "dwr_receipts.csv"), index=False)
+    return pd.DataFrame({"custodian_id": np.char.add("C-", rng.integers(0, custodians, BATCH).astype(str)),
+                         "owner_entity_id": np.char.add("E-", rng.integers(0, OWNERS, BATCH).astype(str)),
+                         "quantity_liters": rng.integers(20, 400, BATCH).astype(float)})
+
+
+def naive_fit(tanks, lots, custodian_id, quantity, owner):
+    mine = tanks[(tanks["custodian_id"] == custodian_id)
+                 & ((tanks["ownership_model"] == "pay_per_liter") | (tanks["status"] == "available")
+                    | (tanks["owner_entity_id"] == owner))]
+    used = lots[lots["tank_id"].isin(mine["tank_id"]) & lots["status"].isin(["active", "quarantined"])]
+    free = mine.set_index("tank_id")["capacity_liters"] - used.groupby("tank_id")["quantity_liters"].sum()
+    free = free.fillna(mine.set_index("tank_id")["capacity_liters"])
+    free = free[free >= quantity]
+    return None if free.empty else free.sort_values(kind="stable").index[0]
+
+
+def main(n=5_000):
+    rng = np.random.default_rng(22)
+    with tempfile.TemporaryDirectory() as directory:
+        storage._backend = CsvBackend(base_dir=directory)
+        requests = seed(directory, n, rng)
+        tanks, lots = load_table("tanks.csv"), load_table("dairy_lots.csv")
+        sample = requests.head(SAMPLE)
+
+        t0 = time.perf_counter()
+        expected = [naive_fit(tanks, lots, c, q, o) for c, o, q in
+                    zip(sample["custodian_id"], sample["owner_entity_id"], sample["quantity_liters"])]
+        t_naive = (time.perf_counter() - t0) / SAMPLE
+
+        t0 = time.perf_counter()
+        book = capacity.capacity_book()
+        t_build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = [book.best_fit(c, q, o) for c, o, q in
+               zip(sample["custodian_id"], sample["owner_entity_id"], sample["quantity_liters"])]
+        t_fit = (time.perf_counter() - t0) / SAMPLE
+        agree = sum(a == b for a, b in zip(expected, got))
+
+        t0 = time.perf_counter()
+        placed = capacity.allocate(requests)
+        t_batch = time.perf_counter() - t0
+
+    print(f"tanks: {n:,}  custodians: {n // 5:,}  lots: {n * LOTS_PER_TANK:,}")
+    print(f"per-request filter + groupby  {t_naive * 1e3:10.2f} ms / request")
+    print(f"book build (on change)        {t_build * 1e3:10.1f} ms")
+    print(f"best_fit (bisect per pool)    {t_fit * 1e6:10.1f} µs / request   ({agree}/{SAMPLE} same tank)")
+    print(f"allocate {BATCH:,} requests      {t_batch * 1e3:10.1f} ms   ({placed.notna().sum():,} placed)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
@@ -0,0 +1,101 @@
+"""
+Expiry sweeps: masking the whole lot and receipt tables on every sweep vs. the
+expiry.ExpiryScheduler heap, which pops only the due entries. Both read through
+table_cache and commit the same rows (CSV backend in a temporary directory), so on busy
+sweeps the table rewrite dominates both; idle sweeps are where the heap pays off.
+
+    python benchmarks/bench_expiry.py [n_lots]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import storage
+import utils
+import expiry
+from storage import CsvBackend
+from table_cache import load_table
+
+SWEEPS = 20
+DUE_PER_SWEEP = 50
+
+
+def seed(directory, n, start):
+    ids = np.arange(n).astype(str)
+    # one lot expires every minute from `start`; sweeps below step through them
+    expiry_ts = (start + pd.to_timedelta(np.arange(n), unit="min")).strftime("%Y-%m-%dT%H:%M:%SZ")
+    pd.DataFrame({"lot_id": np.char.add("LOT-", ids), "owner_entity_id": "E-WG-001", "custodian_id": "C-MCC-001",
+                  "product_type": "raw_milk", "quantity_liters": 100, "expiry_ts": expiry_ts,
+                  "status": "active"}).to_csv(os.path.join(directory, "dairy_lots.csv"), index=False)
+    pd.DataFrame({"receipt_id": np.char.add("DWR-", ids), "lot_id": np.char.add("LOT-", ids),
+                  "owner_entity_id": "E-WG-001", "custodian_id": "C-MCC-001", "status": "active",
+                  "expiry_ts": expiry_ts}).to_csv(os.path.join(directory, "dwr_receipts.csv"), index=False)
+    pd.DataFrame(columns=["advance_id", "receipt_id", "advance_xof", "fee_xof", "status"]).to_csv(
+        os.path.join(directory, "advances.csv"), index=False)
+
+
+def full_scan(now):
+    """A cron job without the heap: read both tables, mask the due rows and commit them."""
+    updates = {}
+    for file_name, key_col, statuses in (("dairy_lots.csv", "lot_id", expiry.EXPIRING_LOT_STATUSES),
+                                         ("dwr_receipts.csv", "receipt_id", expiry.TRANSITIONS["expired"]["from"])):
+        df = load_table(file_name)
+        due = df[(df["expiry_ts"] <= now) & df["status"].isin(statuses)]
+        if len(due):
+            updates[file_name] = {k: (0, {"status": "expired"}) for k in due[key_col]}
+    if updates:
+        storage.get_backend().commit({}, updates)
+    return len(updates.get("dairy_lots.csv", ()))
+
+
+def main(n=100_000):
+    start = pd.Timestamp("2026-10-01", tz="UTC")
+    with tempfile.TemporaryDirectory() as directory:
+        storage._backend = CsvBackend(base_dir=directory)
+        utils.BASE_DIR = directory                                        # keep the journal out of the repo
+        seed(directory, n, start)
+        nows = [start + pd.Timedelta(minutes=DUE_PER_SWEEP * (i + 1) - 1) for i in range(SWEEPS)]
+
+        t0 = time.perf_counter()
+        for now in nows:
+            full_scan(now)
+        t_scan = (time.perf_counter() - t0) / SWEEPS
+        full_scan(nows[-1])                                               # reload after the last commit
+        t0 = time.perf_counter()
+        for _ in range(SWEEPS):
+            full_scan(nows[-1])                                           # nothing new is due
+        t_scan_idle = (time.perf_counter() - t0) / SWEEPS
+
+        seed(directory, n, start)
+        s = expiry.ExpiryScheduler()
+        t0 = time.perf_counter()
+        s.next_due()
+        t_build = time.perf_counter() - t0
+
+        expired = 0
+        t0 = time.perf_counter()
+        for now in nows:
+            expired += s.sweep(now=now, username="bench")["lots_expired"]
+        t_sweep = (time.perf_counter() - t0) / SWEEPS
+        s.sweep(now=nows[-1], username="bench")
+        t0 = time.perf_counter()
+        for _ in range(SWEEPS):
+            s.sweep(now=nows[-1], username="bench")
+        t_sweep_idle = (time.perf_counter() - t0) / SWEEPS
+
+    print(f"lots: {n:,} (+ {n:,} receipts)   due per sweep: {DUE_PER_SWEEP} lots + {DUE_PER_SWEEP} receipts")
+    print(f"heap build (first sweep only)           {t_build * 1e3:10.1f} ms")
+    print(f"idle sweep   full scan                  {t_scan_idle * 1e3:10.3f} ms")
+    print(f"             heap                       {t_sweep_idle * 1e3:10.3f} ms")
+    print(f"busy sweep   full scan + commit         {t_scan * 1e3:10.1f} ms")
+    print(f"             heap + commit + events     {t_sweep * 1e3:10.1f} ms   ({expired:,} lots expired)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,40 @@
+"""
+Id generation: the old date + 6 hex chars of uuid4 vs. ids.gen_id / ids.gen_ids, with a
+duplicate count for one busy day's worth of ids per prefix.
+
+    python benchmarks/bench_ids.py [n_ids]
+"""
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ids import gen_id, gen_ids
+
+
+def old_gen_id(prefix):
+    return f"{prefix}-{datetime.utcnow().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main(n=200_000):
+    old, t_old = timed(lambda: [old_gen_id("LOT") for _ in range(n)])
+    new, t_new = timed(lambda: [gen_id("LOT") for _ in range(n)])
+    batch, t_batch = timed(lambda: gen_ids("LOT", n))
+
+    print(f"ids: {n:,}")
+    print(f"{'generator':<22} {'µs/id':>7} {'duplicates':>11} {'sorted':>7}")
+    for name, ids, dt in (("uuid4 hex[:6] (old)", old, t_old), ("gen_id", new, t_new), ("gen_ids (batch)", batch, t_batch)):
+        print(f"{name:<22} {dt / n * 1e6:>7.2f} {n - len(set(ids)):>11,} {str(ids == sorted(ids)):>7}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,77 @@
+"""
+Verification lookup latency: boolean-mask scans vs. hash indexes.
+
+Builds synthetic receipts/advances tables of growing size and times the six
+lookups done per verification (receipt, lot, owner, custodian, active advance,
+open dispute) with both approaches.
+
+    python benchmarks/bench_indexes.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from indexes import HashIndex
+
+
+def tables(n):
+    ids = np.char.add("DWR-", np.arange(n).astype(str))
+    receipts = pd.DataFrame({
+        "receipt_id": ids,
+        "lot_id": np.char.add("LOT-", np.arange(n).astype(str)),
+        "owner_entity_id": np.char.add("E-", (np.arange(n) % 1000).astype(str)),
+        "custodian_id": np.char.add("C-", (np.arange(n) % 50).astype(str)),
+        "status": "active",
+    })
+    advances = pd.DataFrame({
+        "advance_id": np.char.add("ADV-", np.arange(n // 2).astype(str)),
+        "receipt_id": ids[: n // 2],
+        "status": np.where(np.arange(n // 2) % 3 == 0, "repaid", "active"),
+    })
+    return receipts, advances
+
+
+def main(sizes=(10_000, 100_000, 1_000_000), probes=200):
+    print(f"{'rows':>10} {'scan_ms':>10} {'index_ms':>10} {'build_s':>9}")
+    for n in sizes:
+        receipts, advances = tables(n)
+        keys = receipts["receipt_id"].sample(probes, random_state=1).tolist()
+
+        t0 = time.perf_counter()
+        for k in keys:
+            r = receipts[receipts["receipt_id"] == k].iloc[0]
+            receipts[receipts["lot_id"] == r["lot_id"]]
+            receipts[receipts["owner_entity_id"] == r["owner_entity_id"]]
+            receipts[receipts["custodian_id"] == r["custodian_id"]]
+            advances[(advances["receipt_id"] == k) & (advances["status"] == "active")].empty
+            advances[(advances["receipt_id"] == k) & (advances["status"] == "open")].empty
+        scan = (time.perf_counter() - t0) / probes
+
+        t0 = time.perf_counter()
+        by_id = HashIndex(receipts, ["receipt_id"], unique=True)
+        by_lot = HashIndex(receipts, ["lot_id"], unique=True)
+        by_owner = HashIndex(receipts, ["owner_entity_id"])
+        by_cust = HashIndex(receipts, ["custodian_id"])
+        adv = HashIndex(advances, ["receipt_id", "status"])
+        build = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for k in keys:
+            r = by_id.get(k)
+            by_lot.positions(r["lot_id"])
+            by_owner.positions(r["owner_entity_id"])
+            by_cust.positions(r["custodian_id"])
+            adv.contains((k, "active"))
+            adv.contains((k, "open"))
+        indexed = (time.perf_counter() - t0) / probes
+
+        print(f"{n:>10} {scan * 1e3:>10.3f} {indexed * 1e3:>10.3f} {build:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Write-latency benchmark for the append-only event journal.
+
+Appends N events (default 1,000,000) to a temporary journal and reports the
+mean / p99 append latency per 100k-event window. Latency should stay flat as
+the journal grows, unlike the old read-concat-rewrite log_event.
+
+    python benchmarks/bench_journal.py [N]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from journal import EventJournal
+
+
+def main(n=1_000_000, window=100_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = EventJournal(os.path.join(tmp, "events"), max_segment_bytes=32 * 1024 * 1024)
+        details = json.dumps({"receipt_id": "DWR-X", "amount": 125000})
+        lat = np.empty(window)
+
+        print(f"{'events':>10} {'mean_us':>10} {'p99_us':>10} {'segments':>9}")
+        for start in range(0, n, window):
+            for i in range(window):
+                t0 = time.perf_counter()
+                journal.append({
+                    "event_ts": "2026-01-01T00:00:00",
+                    "username": "bench",
+                    "event_type": "advance_created",
+                    "object_type": "advance",
+                    "object_id": f"ADV-{start + i}",
+                    "details_json": details,
+                })
+                lat[i] = time.perf_counter() - t0
+            print(f"{start + window:>10} {lat.mean() * 1e6:>10.1f} {np.percentile(lat, 99) * 1e6:>10.1f} {len(journal.segments()):>9}")
+
+        journal.close()
+        t0 = time.perf_counter()
+        total = sum(len(c) for c in journal.iter_chunks())
+        print(f"streamed {total} events back in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,103 @@
+"""
+Bank lien queries: scanning and joining liens, receipts, lots and entities per lender
+query (what a bank page would do without an index) vs. liens.PledgeBook's lender index,
+and the receipt -> lien check the sale/advance pages run (CSV backend in a temporary
+directory).
+
+    python benchmarks/bench_liens.py [n_receipts]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import storage
+import liens
+from storage import CsvBackend
+from table_cache import load_table
+from prices import price_book
+
+LENDERS = 50
+PLEDGED = 0.3
+SAMPLE = 100
+
+
+def seed(directory, n, rng):
+    ids = np.arange(n).astype(str)
+    regions = ["Dakar", "Thies", "Saint-Louis", "Kaolack"]
+    owners = np.char.add("E-", rng.integers(0, max(n // 10, 1), n).astype(str))
+    pd.DataFrame({"entity_id": np.unique(owners), "region": rng.choice(regions, len(np.unique(owners)))}
+                 ).to_csv(os.path.join(directory, "entities.csv"), index=False)
+    pd.DataFrame({"lot_id": np.char.add("LOT-", ids), "product_type": rng.choice(["raw_milk", "pasteurized_milk"], n),
+                  "quantity_liters": rng.integers(50, 500, n).astype(float), "status": "active"}
+                 ).to_csv(os.path.join(directory, "dairy_lots.csv"), index=False)
+    pledged = rng.random(n) < PLEDGED
+    lenders = np.char.add("BANK-", rng.integers(0, LENDERS, n).astype(str))
+    pd.DataFrame({"receipt_id": np.char.add("DWR-", ids), "lot_id": np.char.add("LOT-", ids),
+                  "owner_entity_id": owners, "custodian_id": "C-MCC-001", "status": "active",
+                  "expiry_ts": (pd.Timestamp.utcnow() + pd.Timedelta(days=3)).isoformat(),
+                  "lien_active": np.where(pledged, "yes", "no"), "lien_holder_id": np.where(pledged, lenders, "")}
+                 ).to_csv(os.path.join(directory, "dwr_receipts.csv"), index=False)
+    k = int(pledged.sum())
+    pd.DataFrame({"lien_id": np.char.add("LIEN-", np.arange(k).astype(str)),
+                  "receipt_id": np.char.add("DWR-", ids[pledged]), "lender_type": "bank",
+                  "lender_id": lenders[pledged], "principal_xof": rng.integers(5_000, 100_000, k).astype(float),
+                  "interest_xof": 0.0, "status": rng.choice(["active", "released"], k, p=[0.8, 0.2]),
+                  "created_at": pd.Timestamp.utcnow().isoformat(), "released_at": "", "notes": ""}
+                 ).to_csv(os.path.join(directory, "liens.csv"), index=False)
+    return np.char.add("DWR-", ids)
+
+
+def naive_pledged(lender_id, now, prices):
+    """Load and join everything, then filter to one lender."""
+    l, r, lots, e = (load_table(f) for f in liens.INPUT_FILES)
+    mine = l[(l["lender_id"] == lender_id) & (l["status"] == "active")]
+    return liens.value(liens.join_pledged(mine, r, lots, e), now, prices)
+
+
+def main(n=200_000):
+    rng = np.random.default_rng(24)
+    with tempfile.TemporaryDirectory() as directory:
+        storage._backend = CsvBackend(base_dir=directory)
+        receipt_ids = seed(directory, n, rng)
+        for f in liens.INPUT_FILES:
+            load_table(f)
+        now, prices = pd.Timestamp.utcnow(), price_book()
+        lenders = [f"BANK-{i}" for i in rng.integers(0, LENDERS, SAMPLE)]
+
+        t0 = time.perf_counter()
+        expected = [len(naive_pledged(b, now, prices)) for b in lenders]
+        t_naive = (time.perf_counter() - t0) / SAMPLE
+
+        t0 = time.perf_counter()
+        book = liens.pledge_book()
+        t_build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = [len(book.pledged(b, now, prices)) for b in lenders]
+        t_book = (time.perf_counter() - t0) / SAMPLE
+
+        sample = rng.choice(receipt_ids, SAMPLE)
+        table = load_table(liens.LIENS_FILE)
+        t0 = time.perf_counter()
+        scan = [not table[(table["receipt_id"] == r) & (table["status"] == "active")].empty for r in sample]
+        t_scan = (time.perf_counter() - t0) / SAMPLE
+        liens.active_lien(sample[0])
+        t0 = time.perf_counter()
+        hit = [liens.active_lien(r) is not None for r in sample]
+        t_hit = (time.perf_counter() - t0) / SAMPLE
+
+    print(f"receipts: {n:,}  liens: {len(table):,}  lenders: {LENDERS}")
+    print(f"pledged(): scan + join per query  {t_naive * 1e3:10.2f} ms / query")
+    print(f"pledge book build (on change)     {t_build * 1e3:10.1f} ms")
+    print(f"pledged(): lender index           {t_book * 1e3:10.2f} ms / query   (same rows: {expected == got})")
+    print(f"receipt -> lien: scan             {t_scan * 1e6:10.1f} µs / check")
+    print(f"receipt -> lien: hash index       {t_hit * 1e6:10.1f} µs / check   (same answer: {scan == hit})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,69 @@
+"""
+Login throughput: the old require_login (re-read users.csv, strip every row, plaintext
+mask) vs. users.authenticate (cached dict + scrypt) and users.verify_token, for a
+users file of n rows (CSV backend in a temporary directory).
+
+    python benchmarks/bench_login.py [n_users]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import storage
+import users
+from storage import CsvBackend
+
+SAMPLE = 50
+
+
+def old_login(path, username, password):
+    df = pd.read_csv(path)
+    df["username"] = df["username"].astype(str).str.strip()
+    df["password"] = df["password"].astype(str).str.strip()
+    match = df[(df["username"] == str(username).strip()) & (df["password"] == str(password).strip())]
+    return None if match.empty else match.iloc[0].to_dict()
+
+
+def timed(fn, repeat):
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        out = fn(i)
+    return out, (time.perf_counter() - t0) / repeat
+
+
+def main(n=20_000):
+    with tempfile.TemporaryDirectory() as directory:
+        storage._backend = CsvBackend(base_dir=directory)
+        names = [f"user{i:06d}" for i in range(n)]
+        frame = pd.DataFrame({"username": names, "password": "Admin123!", "role": "owner", "entity_id": "E-WG-001"})
+        plain_path = os.path.join(directory, "users_plain.csv")
+        frame.to_csv(plain_path, index=False)
+        stored = users.hash_password("Admin123!")     # one hash for all rows; the cost per login is the same
+        frame.assign(password=stored).to_csv(os.path.join(directory, "users.csv"), index=False)
+
+        pick = lambda i: names[(i * 7919) % n]
+        _, t_old = timed(lambda i: old_login(plain_path, pick(i), "Admin123!"), SAMPLE)
+        _, t_build = timed(lambda i: users._build(pd.read_csv(os.path.join(directory, "users.csv"))), 3)
+        users.directory()
+        _, t_lookup = timed(lambda i: users.get_user(pick(i)), 10_000)
+        user, t_auth = timed(lambda i: users.authenticate(pick(i), "Admin123!"), SAMPLE)
+        _, t_bad = timed(lambda i: users.authenticate(f"nobody{i}", "Admin123!"), SAMPLE)
+        token = users.issue_token(user)
+        _, t_token = timed(lambda i: users.verify_token(token), 10_000)
+
+    print(f"users: {n:,}")
+    print(f"old login (read + strip + mask)  {t_old * 1e3:8.2f} ms   {1 / t_old:8.0f} /s   plaintext")
+    print(f"directory build (on change)      {t_build * 1e3:8.2f} ms")
+    print(f"directory lookup                 {t_lookup * 1e6:8.2f} µs")
+    print(f"authenticate (lookup + scrypt)   {t_auth * 1e3:8.2f} ms   {1 / t_auth:8.0f} /s   per core, by design")
+    print(f"unknown user (dummy scrypt)      {t_bad * 1e3:8.2f} ms")
+    print(f"verify_token (API, batch jobs)   {t_token * 1e6:8.2f} µs   {1 / t_token:8.0f} /s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,75 @@
+"""
+Reference prices: a year of daily price versions per product x region. Compares the old
+page's per-lot filter of the price table with prices.PriceBook batch as-of lookups
+(one np.searchsorted for every lot) and the cached current matrix.
+
+    python benchmarks/bench_prices.py [n_lots]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from schemas import apply
+from prices import PriceBook
+
+PRODUCTS = ["raw_milk", "yogurt", "butter", "ghee", "cheese"]
+REGIONS = ["Bamako", "Sikasso", "Koulikoro", "Ségou", "Mopti", "Kayes", "Gao", "Tombouctou"]
+DAYS = 365
+SAMPLE = 2_000
+
+
+def curves(rng):
+    days = pd.date_range("2025-01-01", periods=DAYS, freq="D", tz="UTC")
+    grid = pd.MultiIndex.from_product([PRODUCTS, REGIONS, days], names=["product_type", "region", "effective_from"])
+    df = grid.to_frame(index=False)
+    df["xof_per_liter"] = rng.integers(350, 1500, len(df)).astype(float)
+    df["effective_from"] = df["effective_from"].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return apply(df, "reference_prices.csv")
+
+
+def per_lot(prices, products, regions, at, limit):
+    """As-of by filtering the table per lot, the way the page looked up one price."""
+    out = []
+    for p, r, t in zip(products[:limit], regions[:limit], at[:limit]):
+        rows = prices[(prices["product_type"] == p) & (prices["region"] == r) & (prices["effective_from"] <= t)]
+        out.append(float(rows["xof_per_liter"].iloc[-1]) if len(rows) else 500.0)
+    return out
+
+
+def timed(fn, repeat=5):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t0) / repeat
+
+
+def main(n=100_000):
+    rng = np.random.default_rng(17)
+    prices = curves(rng)
+    products = np.array(PRODUCTS)[rng.integers(0, len(PRODUCTS), n)]
+    regions = np.array(REGIONS)[rng.integers(0, len(REGIONS), n)]
+    at = pd.Series(pd.Timestamp("2025-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, DAYS * 86400, n), unit="s"))
+
+    book, t_build = timed(lambda: PriceBook(prices), 3)
+    batch, t_batch = timed(lambda: book.lookup(products, regions, at))
+    loop, t_loop = timed(lambda: per_lot(prices, products, regions, at, SAMPLE), 1)
+    assert np.allclose(loop, batch[:SAMPLE])
+    book.matrix()
+    _, t_matrix = timed(book.matrix, 1000)
+    _, t_one = timed(lambda: book.price("yogurt", "Sikasso"), 1000)
+
+    print(f"price versions: {len(prices):,} ({len(PRODUCTS)} products x {len(REGIONS)} regions x {DAYS} days), lots: {n:,}")
+    print(f"per-lot table filter       {t_loop / SAMPLE * n:10.1f} s    (extrapolated from {SAMPLE:,})")
+    print(f"PriceBook build            {t_build * 1e3:10.1f} ms   (once per file change)")
+    print(f"batch as-of lookup         {t_batch * 1e3:10.1f} ms   ({t_batch / n * 1e9:.0f} ns/lot)")
+    print(f"single price (page)        {t_one * 1e6:10.1f} µs")
+    print(f"current matrix (cached)    {t_matrix * 1e6:10.1f} µs")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
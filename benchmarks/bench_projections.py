@@ -0,0 +1,147 @@
+"""
+Journal projections: a streaming rebuild (projections.Projector, one chunk of events at a
+time) vs. loading the whole journal into one DataFrame and folding it, on a synthetic
+journal of N events (default 1,000,000; ten per receipt lifecycle). Each measurement runs
+in a fresh process so its peak RSS is its own. Then a catch-up of 10,000 new events from
+the saved checkpoint.
+
+    python benchmarks/bench_projections.py [n_events]
+"""
+import os
+import sys
+import time
+import tempfile
+import resource
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from journal import EventJournal, EVENT_COLUMNS
+
+EVENTS_PER_RECEIPT = 10
+BLOCK = 25_000           # receipts per journal segment (~60 MB, like the journal's 64 MB rotation)
+LAG = 20_000             # a receipt's steps are this many receipts apart, so they span chunks
+NAIVE_MAX = 2_000_000    # the whole-log load needs several GB beyond this
+CATCH_UP = 10_000
+
+QR = "DWR1:" + "X" * 120
+STEPS = [
+    ("lot_created", "dairy_lot", "LOT-{i}", '{{"custodian_id": "C-MCC-001", "owner": "E-{o}", "status": "active"}}'),
+    ("receipt_issued", "dwr", "DWR-{i}",
+     '{{"receipt_id": "DWR-{i}", "issued_at": "{ts}Z", "lot_id": "LOT-{i}", "owner_entity_id": "E-{o}", '
+     '"custodian_id": "C-MCC-001", "status": "active", "expiry_ts": "2026-12-01T00:00:00Z", '
+     '"qr_payload": "' + QR + '", "lien_active": "no", "lien_holder_id": ""}}'),
+    ("advance_created", "advance", "ADV-{i}",
+     '{{"advance_id": "ADV-{i}", "receipt_id": "DWR-{i}", "provider_type": "platform", "provider_id": "E-PLAT-001", '
+     '"advance_xof": 14000.0, "fee_xof": 700.0, "tenor_days": 7, "status": "active", "created_at": "{ts}Z", '
+     '"due_at": "2026-12-01T00:00:00Z", "repaid_at": "", "notes": "Pilot in-house advance", '
+     '"amount": 14000.0, "fee": 700.0}}'),
+    ("receipt_status_changed", "dwr", "DWR-{i}",
+     '{{"event": "advance_created", "from": "active", "to": "advance_active", "advance_id": "ADV-{i}"}}'),
+    ("sale_contract_created", "sale_contract", "SC-{i}",
+     '{{"contract_id": "SC-{i}", "receipt_id": "DWR-{i}", "buyer_entity_id": "E-BUY-001", "price_xof": 50000.0, '
+     '"payment_terms": "mobile_money_instant", "status": "pending_payment", "created_at": "{ts}Z", '
+     '"settled_at": "", "notes": "", "price": 50000.0}}'),
+    ("receipt_status_changed", "dwr", "DWR-{i}",
+     '{{"event": "sale_contract_created", "from": "advance_active", "to": "pending_sale", "contract_id": "SC-{i}"}}'),
+    ("advance_repaid", "advance", "ADV-{i}", '{{"receipt_id": "DWR-{i}"}}'),
+    ("sale_settled", "sale_contract", "SC-{i}", '{{"payment_id": "PAY-{i}", "net_to_owner_est": 35300.0}}'),
+    ("receipt_status_changed", "dwr", "DWR-{i}",
+     '{{"event": "sale_settled", "from": "pending_sale", "to": "sold", "contract_id": "SC-{i}"}}'),
+    ("release_order_created", "release_order", "RO-{i}", '{{"receipt_id": "DWR-{i}"}}'),
+]
+
+
+def write_block(directory, seq, first, receipts):
+    ids = np.arange(first, first + receipts)
+    frames = []
+    for s, (event_type, object_type, object_id, details) in enumerate(STEPS):
+        t = (ids - first) + s * LAG
+        ts = np.datetime_as_string(np.datetime64("2026-10-01T00:00:00") + (first * EVENTS_PER_RECEIPT + t)
+                                   .astype("timedelta64[ms]"), unit="us")
+        frames.append(pd.DataFrame({
+            "t": t, "event_ts": ts, "username": "bench", "event_type": event_type, "object_type": object_type,
+            "object_id": [object_id.format(i=i) for i in ids],
+            "details_json": [details.format(i=i, o=i % 1000, ts=x) for i, x in zip(ids, ts)],
+        }))
+    block = pd.concat(frames, ignore_index=True).sort_values("t", kind="stable")
+    block[EVENT_COLUMNS].to_csv(os.path.join(directory, f"events-20261018-{seq:04d}.csv"), index=False)
+
+
+def seed(directory, n):
+    os.makedirs(directory, exist_ok=True)
+    receipts = n // EVENTS_PER_RECEIPT
+    for seq, first in enumerate(range(0, receipts, BLOCK), start=1):
+        write_block(directory, seq, first, min(BLOCK, receipts - first))
+
+
+def _rss_mb():
+    # peak RSS of this process (VmHWM; ru_maxrss would carry the parent's peak across exec)
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def streaming(directory, save_to=None):
+    import projections
+    before = _rss_mb()
+    t0 = time.perf_counter()
+    p = projections.Projector()
+    p.catch_up(EventJournal(directory))
+    elapsed, peak = time.perf_counter() - t0, _rss_mb() - before
+    if save_to:
+        p.save(save_to)
+    statuses = p.frame(projections.RECEIPTS_FILE)["status"].value_counts().to_dict()
+    return elapsed, peak, {f: len(t) for f, t in p.tables.items()}, statuses
+
+
+def whole_log(directory):
+    import projections
+    before = _rss_mb()
+    t0 = time.perf_counter()
+    events = EventJournal(directory).read_all()
+    p = projections.Projector()
+    p.apply(events)
+    elapsed, peak = time.perf_counter() - t0, _rss_mb() - before
+    statuses = p.frame(projections.RECEIPTS_FILE)["status"].value_counts().to_dict()
+    return elapsed, peak, {f: len(t) for f, t in p.tables.items()}, statuses
+
+
+def main(n=1_000_000):
+    import projections
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        directory, checkpoint = os.path.join(tmp, "events"), os.path.join(tmp, "projections")
+        t0 = time.perf_counter()
+        seed(directory, n)
+        size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+        print(f"events: {n:,}  journal: {size / 1e6:,.0f} MB in {len(os.listdir(directory))} segments  "
+              f"(generated in {time.perf_counter() - t0:.0f} s)")
+
+        with ctx.Pool(1) as pool:
+            t_stream, mb_stream, rows, statuses = pool.apply(streaming, (directory, checkpoint))
+        print(f"streaming rebuild        {t_stream:8.1f} s   peak +{mb_stream:7,.0f} MB   {rows}")
+        if n <= NAIVE_MAX:
+            with ctx.Pool(1) as pool:
+                t_all, mb_all, rows_all, statuses_all = pool.apply(whole_log, (directory,))
+            print(f"load whole log + fold    {t_all:8.1f} s   peak +{mb_all:7,.0f} MB   "
+                  f"(same rows: {rows == rows_all and statuses == statuses_all})")
+        else:
+            print(f"load whole log + fold    skipped above {NAIVE_MAX:,} events (holds every event in memory)")
+
+        p = projections.Projector.load(checkpoint)
+        write_block(directory, 9999, n // EVENTS_PER_RECEIPT, CATCH_UP // EVENTS_PER_RECEIPT)
+        t0 = time.perf_counter()
+        read = p.catch_up(EventJournal(directory))
+        t_catch = time.perf_counter() - t0
+        print(f"catch-up from checkpoint {t_catch * 1e3:8.0f} ms  for {read:,} new events")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,60 @@
+"""
+QR payload codec throughput: payloads/sec for encode+sign, single decode+verify,
+and batch decode_many, with payload size vs. the old JSON payload.
+
+    python benchmarks/bench_qr_codec.py [n]
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qr_codec import encode_payload, decode_payload, decode_many
+
+KEY = b"bench-key"
+
+
+def rows(n):
+    return [
+        (f"DWR-{i:08X}", f"LOT-{i:06d}", f"ENT-{i % 1000:04d}", f"CUS-{i % 50:03d}",
+         "2026-01-01T08:30:00Z", "2026-01-15T08:30:00Z")
+        for i in range(n)
+    ]
+
+
+def rate(n, seconds):
+    return f"{n / seconds:>12,.0f} /s"
+
+
+def main(n=50_000):
+    data = rows(n)
+
+    t0 = time.perf_counter()
+    payloads = [encode_payload(*r, key=KEY) for r in data]
+    t_encode = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    decoded = [decode_payload(p, key=KEY) for p in payloads]
+    t_decode = time.perf_counter() - t0
+    assert all(d["signature_valid"] for d in decoded)
+
+    t0 = time.perf_counter()
+    batch = decode_many(payloads, key=KEY)
+    t_batch = time.perf_counter() - t0
+    assert batch["signature_valid"].all()
+
+    legacy = json.dumps({"receipt_id": data[0][0], "lot_id": data[0][1], "owner_entity_id": data[0][2],
+                         "custodian_id": data[0][3], "issued_at": "2026-01-01T08:30:00.123456",
+                         "expiry_ts": data[0][5], "status": "active"})
+
+    print(f"payloads:            {n:,}")
+    print(f"encode + sign:       {rate(n, t_encode)}")
+    print(f"decode + verify:     {rate(n, t_decode)}")
+    print(f"decode_many:         {rate(n, t_batch)}")
+    print(f"payload chars:       {len(payloads[0])} signed/base45 vs {len(legacy)} JSON")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,142 @@
+"""
+Receipt PDF rendering: the previous text-only renderer (kept below, verbatim, as the
+baseline) vs. receipt_pdf's template renderer with a vector QR code, for single
+receipt PDFs and for a merged multi-receipt PDF.
+
+    python benchmarks/bench_receipt_pdf.py [n_receipts]
+"""
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from qr_codec import encode_payload
+from receipt_pdf import generate_receipt_pdf, render_receipts
+
+
+# ----------------------------
+# Baseline: utils.generate_receipt_pdf before the template renderer
+# ----------------------------
+def _wrap_text(text: str, width: int = 90):
+    text = str(text or "")
+    return [text[i:i + width] for i in range(0, len(text), width)] or [""]
+
+
+def legacy_receipt_pdf(receipt_row: dict, lot_row=None) -> bytes:
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    y = height - 50
+
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(50, y, "Mali Dairy Digital Warehouse Receipt (DWR / BDN)")
+    y -= 30
+
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(50, y, f"Issued at: {receipt_row.get('issued_at', '')}")
+    y -= 20
+    pdf.drawString(50, y, f"Receipt ID: {receipt_row.get('receipt_id', '')}")
+    y -= 20
+    pdf.drawString(50, y, f"Lot ID: {receipt_row.get('lot_id', '')}")
+    y -= 20
+    pdf.drawString(50, y, f"Owner Entity: {receipt_row.get('owner_entity_id', '')}")
+    y -= 20
+    pdf.drawString(50, y, f"Custodian: {receipt_row.get('custodian_id', '')}")
+    y -= 20
+    pdf.drawString(50, y, f"Status: {receipt_row.get('status', '')}")
+    y -= 20
+    pdf.drawString(50, y, f"Expiry: {receipt_row.get('expiry_ts', '')}")
+    y -= 30
+
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(50, y, "QR Payload")
+    y -= 18
+
+    pdf.setFont("Helvetica", 9)
+    for line in _wrap_text(receipt_row.get("qr_payload", ""), 90):
+        pdf.drawString(50, y, line)
+        y -= 14
+        if y < 80:
+            pdf.showPage()
+            pdf.setFont("Helvetica", 9)
+            y = height - 50
+
+    if lot_row:
+        y -= 20
+        pdf.setFont("Helvetica-Bold", 12)
+        pdf.drawString(50, y, "Lot Details")
+        y -= 18
+
+        pdf.setFont("Helvetica", 10)
+        fields = [
+            ("Product Type", lot_row.get("product_type", "")),
+            ("Quantity Liters", lot_row.get("quantity_liters", "")),
+            ("Fat %", lot_row.get("fat_pct", "")),
+            ("SNF %", lot_row.get("snf_pct", "")),
+            ("Acidity", lot_row.get("acidity", "")),
+            ("Antibiotic Test", lot_row.get("antibiotic_test", "")),
+            ("Bacterial Score", lot_row.get("bacterial_score", "")),
+            ("Avg Temp C", lot_row.get("temp_avg_c", "")),
+            ("Quality Grade", lot_row.get("quality_grade", "")),
+            ("Lot Status", lot_row.get("status", "")),
+        ]
+
+        for label, value in fields:
+            pdf.drawString(50, y, f"{label}: {value}")
+            y -= 18
+            if y < 80:
+                pdf.showPage()
+                pdf.setFont("Helvetica", 10)
+                y = height - 50
+
+    pdf.showPage()
+    pdf.save()
+
+    buffer.seek(0)
+    return buffer.read()
+
+
+def items(n):
+    out = []
+    for i in range(n):
+        rid, lot_id = f"DWR-BENCH-{i:06d}", f"LOT-BENCH-{i:06d}"
+        receipt = {
+            "receipt_id": rid, "issued_at": "2026-01-01T07:00:00Z", "lot_id": lot_id,
+            "owner_entity_id": "E-WG-001", "custodian_id": "C-MCC-001", "status": "active",
+            "expiry_ts": "2026-01-03T07:00:00Z", "lien_active": "no", "lien_holder_id": "",
+            "qr_payload": encode_payload(rid, lot_id, "E-WG-001", "C-MCC-001", "2026-01-01T07:00:00Z", key=b"bench"),
+        }
+        lot = {"lot_id": lot_id, "product_type": "raw_milk", "quantity_liters": 120, "fat_pct": 3.8,
+               "snf_pct": 8.5, "acidity": 0.16, "antibiotic_test": "negative", "bacterial_score": 2,
+               "temp_avg_c": 4.1, "quality_grade": "A", "status": "active"}
+        owner = {"entity_id": "E-WG-001", "name": "Association Femmes Laitières de Sikasso",
+                 "entity_type": "women_group", "region": "Sikasso", "phone": "+22370000001"}
+        cust = {"custodian_id": "C-MCC-001", "name": "Centre de Collecte Sikasso", "region": "Sikasso",
+                "license_status": "licensed"}
+        out.append((receipt, lot, owner, cust))
+    return out
+
+
+def run(label, n, fn):
+    t0 = time.perf_counter()
+    size = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<28} {n / dt:>11.0f} {size / n:>12,.0f}")
+
+
+def main(n=500):
+    data = items(n)
+    print(f"{'renderer':<28} {'receipts/s':>11} {'bytes/receipt':>12}")
+    run("legacy (text payload)", n, lambda: sum(len(legacy_receipt_pdf(r, lot)) for r, lot, _, _ in data))
+    run("template + QR code", n, lambda: sum(len(generate_receipt_pdf(*item)) for item in data))
+    run("template, merged PDF", n, lambda: len(render_receipts(data)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,120 @@
+"""
+Advance portfolio risk: the page's one-receipt-at-a-time valuation (row lookups plus a
+reference-price filter per advance) vs. risk.join_portfolio over the whole book, and
+the per-refresh cost of risk.flag on the cached join.
+
+    python benchmarks/bench_risk.py [n_advances]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from schemas import apply
+from risk import join_portfolio, flag, exposure, summary
+from prices import PriceBook
+
+PRODUCTS = ["raw_milk", "yogurt", "butter", "ghee", "cheese"]
+REGIONS = ["Bamako", "Sikasso", "Koulikoro", "Ségou", "Mopti"]
+SAMPLE = 2_000
+
+
+def tables(n, rng):
+    now = pd.Timestamp("2026-03-01", tz="UTC")
+    created = now - pd.to_timedelta(rng.integers(0, 30 * 86400, n), unit="s")
+    iso = lambda ts: ts.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    owners = np.char.add("E-", rng.integers(0, 5000, n).astype(str))
+    lots = pd.DataFrame({
+        "lot_id": np.char.add("LOT-", np.arange(n).astype(str)),
+        "created_at": iso(created),
+        "owner_entity_id": owners,
+        "custodian_id": np.char.add("C-", rng.integers(0, 200, n).astype(str)),
+        "product_type": np.array(PRODUCTS)[rng.integers(0, len(PRODUCTS), n)],
+        "quantity_liters": rng.integers(10, 1000, n).astype(float),
+        "temp_avg_c": rng.normal(4.2, 1.0, n).round(1),
+        "temp_breach_count": rng.poisson(0.3, n),
+        "expiry_ts": iso(created + pd.to_timedelta(rng.integers(24, 24 * 60, n), unit="h")),
+        "status": np.where(rng.random(n) < 0.98, "active", "quarantined"),
+    })
+    receipts = pd.DataFrame({
+        "receipt_id": np.char.add("DWR-", np.arange(n).astype(str)),
+        "lot_id": lots["lot_id"],
+        "owner_entity_id": owners,
+        "custodian_id": lots["custodian_id"],
+        "status": "advance_active",
+        "expiry_ts": lots["expiry_ts"],
+    })
+    value = lots["quantity_liters"].to_numpy() * 500
+    advance = (value * rng.uniform(0.3, 0.9, n)).round(-3)
+    advances = pd.DataFrame({
+        "advance_id": np.char.add("ADV-", np.arange(n).astype(str)),
+        "receipt_id": receipts["receipt_id"],
+        "provider_id": "E-PLAT-001",
+        "advance_xof": advance,
+        "fee_xof": (advance * 0.05).round(),
+        "tenor_days": 7,
+        "status": "active",
+        "created_at": iso(created),
+        "due_at": iso(created + pd.Timedelta(days=7)),
+    })
+    entities = pd.DataFrame({
+        "entity_id": np.char.add("E-", np.arange(5000).astype(str)),
+        "region": np.array(REGIONS)[rng.integers(0, len(REGIONS), 5000)],
+    })
+    grid = pd.MultiIndex.from_product([PRODUCTS, REGIONS], names=["product_type", "region"]).to_frame(index=False)
+    prices = grid.assign(xof_per_liter=rng.integers(350, 1500, len(grid)).astype(float))
+    frames = {"advances.csv": advances, "dwr_receipts.csv": receipts, "dairy_lots.csv": lots,
+              "entities.csv": entities, "reference_prices.csv": prices}
+    return {name: apply(df, name) for name, df in frames.items()}, now
+
+
+def per_advance(t, limit):
+    """The page's valuation, one advance at a time (dict lookups stand in for indexes.lookup)."""
+    receipts = t["dwr_receipts.csv"].set_index("receipt_id", drop=False)
+    lots = t["dairy_lots.csv"].set_index("lot_id", drop=False)
+    entities = t["entities.csv"].set_index("entity_id", drop=False)
+    prices = t["reference_prices.csv"]
+    out = []
+    for adv in t["advances.csv"].head(limit).to_dict("records"):
+        r = receipts.loc[adv["receipt_id"]]
+        lot = lots.loc[r["lot_id"]]
+        region = entities.loc[r["owner_entity_id"]]["region"]
+        pr = prices[(prices["product_type"] == lot["product_type"]) & (prices["region"] == region)]
+        price = float(pr.iloc[0]["xof_per_liter"]) if not pr.empty else 500.0
+        out.append((adv["advance_xof"] + adv["fee_xof"]) / (float(lot["quantity_liters"]) * price))
+    return out
+
+
+def timed(fn, repeat=3):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t0) / repeat
+
+
+def main(n=100_000):
+    rng = np.random.default_rng(16)
+    t, now = tables(n, rng)
+    inputs = [t[f] for f in ("advances.csv", "dwr_receipts.csv", "dairy_lots.csv", "entities.csv")]
+    book = PriceBook(t["reference_prices.csv"])
+
+    _, t_loop = timed(lambda: per_advance(t, SAMPLE), 1)
+    joined, t_join = timed(lambda: join_portfolio(*inputs))
+    flagged, t_flag = timed(lambda: flag(joined, now, book), 10)
+    _, t_roll = timed(lambda: [exposure(flagged, by) for by in ("owner", "custodian", "region")], 10)
+
+    s = summary(flagged)
+    print(f"advances: {n:,}  exposure {s['exposure_xof'] / 1e9:.2f} bn XOF  LTV {s['ltv']:.2f}  "
+          f"margin calls {s['margin_calls']:,}  spoilage risk {s['spoilage_risk']:,}")
+    print(f"per-advance loop (page)    {t_loop / SAMPLE * n:10.1f} s    (extrapolated from {SAMPLE:,})")
+    print(f"join_portfolio             {t_join * 1e3:10.1f} ms   (once per table change)")
+    print(f"value + flag (per refresh) {t_flag * 1e3:10.1f} ms")
+    print(f"exposure x3 groupings      {t_roll * 1e3:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,98 @@
+"""
+Typed loads: dairy_lots.csv and dwr_receipts.csv as read_csv infers them (the old load_csv)
+vs. read with schemas.read_dtypes and cast by schemas.apply (what load_table returns now).
+Reports memory footprint, load time and the status filters the pages run.
+
+    python benchmarks/bench_schemas.py [n_lots]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from schemas import apply, read_dtypes
+
+LOTS = "dairy_lots.csv"
+RECEIPTS = "dwr_receipts.csv"
+RECEIPT_STATUSES = ["active", "advance_active", "pending_sale", "sold", "released", "disputed"]
+
+
+def lots(n, rng):
+    created = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, n), unit="s")
+    return pd.DataFrame({
+        "lot_id": np.char.add("LOT-", np.arange(n).astype(str)),
+        "created_at": created.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "owner_entity_id": np.char.add("E-", rng.integers(0, 5000, n).astype(str)),
+        "custodian_id": np.char.add("C-", rng.integers(0, 200, n).astype(str)),
+        "tank_id": np.char.add("T-", rng.integers(0, 2000, n).astype(str)),
+        "product_type": np.array(["raw_milk", "yogurt", "butter", "ghee", "cheese"])[rng.integers(0, 5, n)],
+        "quantity_liters": rng.integers(10, 1000, n).astype(float),
+        "fat_pct": rng.normal(4, 0.4, n).round(1),
+        "antibiotic_test": "pass",
+        "temp_avg_c": rng.normal(4.2, 1.0, n).round(1),
+        "temp_breach_count": rng.poisson(0.3, n),
+        "expiry_ts": (created + pd.Timedelta(hours=48)).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "quality_grade": np.array(["A", "B", "C"])[rng.integers(0, 3, n)],
+        "status": np.where(rng.random(n) < 0.9, "active", "quarantined"),
+    })
+
+
+def receipts(lot_df, rng):
+    n = len(lot_df)
+    return pd.DataFrame({
+        "receipt_id": np.char.add("DWR-", np.arange(n).astype(str)),
+        "issued_at": lot_df["created_at"],
+        "lot_id": lot_df["lot_id"],
+        "owner_entity_id": lot_df["owner_entity_id"],
+        "custodian_id": lot_df["custodian_id"],
+        "status": np.array(RECEIPT_STATUSES)[rng.integers(0, len(RECEIPT_STATUSES), n)],
+        "expiry_ts": lot_df["expiry_ts"],
+        "qr_payload": "",
+        "lien_active": "no",
+        "lien_holder_id": "",
+    })
+
+
+def timed(fn, repeat=5):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t0) / repeat
+
+
+def main(n=1_000_000):
+    rng = np.random.default_rng(15)
+    lot_df = lots(n, rng)
+    frames = {LOTS: lot_df, RECEIPTS: receipts(lot_df, rng)}
+    masks = {
+        LOTS: lambda df: df["status"] == "active",
+        RECEIPTS: lambda df: df["status"].isin(["active", "advance_active"]),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, df in frames.items():
+            path = os.path.join(tmp, name)
+            df.to_csv(path, index=False)
+            old, t_old = timed(lambda: pd.read_csv(path), 1)
+            new, t_new = timed(lambda: apply(pd.read_csv(path, dtype=read_dtypes(name)), name), 1)
+            mb_old = old.memory_usage(deep=True).sum() / 1e6
+            mb_new = new.memory_usage(deep=True).sum() / 1e6
+            _, m_old = timed(lambda: masks[name](old))
+            _, m_new = timed(lambda: masks[name](new))
+            _, f_old = timed(lambda: old[masks[name](old)])
+            _, f_new = timed(lambda: new[masks[name](new)])
+
+            print(f"{name}: {n:,} rows")
+            print(f"  memory           {mb_old:8.0f} MB -> {mb_new:6.0f} MB   ({mb_old / mb_new:.1f}x smaller, "
+                  f"{mb_old * 1e6 / n:.0f} -> {mb_new * 1e6 / n:.0f} bytes/row)")
+            print(f"  load             {t_old * 1e3:8.0f} ms -> {t_new * 1e3:6.0f} ms")
+            print(f"  status compare   {m_old * 1e3:8.1f} ms -> {m_new * 1e3:6.1f} ms   ({m_old / m_new:.0f}x)")
+            print(f"  status filter    {f_old * 1e3:8.1f} ms -> {f_new * 1e3:6.1f} ms   ({f_old / f_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,116 @@
+"""
+Mobile money settlement: the page's one-transaction-per-payment confirmation vs.
+settlement.settle_statement applying a whole provider statement in one unit of work
+(CSV backend in a temporary directory).
+
+    python benchmarks/bench_settlement.py [n_lines]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import storage
+import utils
+from storage import CsvBackend
+from transactions import transaction
+from state_machine import transition
+from table_cache import load_table, invalidate
+from settlement import read_statement, reconcile, settle_statement
+
+CONTRACTS = 20_000
+SAMPLE = 50
+
+
+def seed(directory, n, rng):
+    ids = np.arange(CONTRACTS).astype(str)
+    phones = np.char.add("7", np.char.zfill(ids, 7))
+    pd.DataFrame({"entity_id": np.char.add("E-BUY-", ids), "phone": np.char.add("+223", phones)}).to_csv(
+        os.path.join(directory, "entities.csv"), index=False)
+    pd.DataFrame({"receipt_id": np.char.add("DWR-", ids), "lot_id": np.char.add("LOT-", ids),
+                  "owner_entity_id": "E-WG-001", "custodian_id": "C-MCC-001", "status": "pending_sale",
+                  "expiry_ts": "2030-01-01T00:00:00Z"}).to_csv(os.path.join(directory, "dwr_receipts.csv"), index=False)
+    price = rng.integers(10, 500, CONTRACTS) * 1000
+    pd.DataFrame({"contract_id": np.char.add("SC-", ids), "receipt_id": np.char.add("DWR-", ids),
+                  "buyer_entity_id": np.char.add("E-BUY-", ids), "price_xof": price, "payment_terms": "mobile_money_instant",
+                  "status": "pending_payment", "created_at": "2026-10-01T00:00:00Z"}).to_csv(
+        os.path.join(directory, "sales_contracts.csv"), index=False)
+    half = ids[::2]
+    pd.DataFrame({"advance_id": np.char.add("ADV-", half), "receipt_id": np.char.add("DWR-", half),
+                  "advance_xof": price[::2] // 2, "fee_xof": price[::2] // 40, "status": "active"}).to_csv(
+        os.path.join(directory, "advances.csv"), index=False)
+    pd.DataFrame(columns=["payment_id", "ref_type", "ref_id", "payer_id", "payee_id", "amount_xof", "method",
+                          "status", "created_at", "confirmed_at", "provider_ref"]).to_csv(
+        os.path.join(directory, "payments.csv"), index=False)
+
+    paid = rng.permutation(CONTRACTS)[:n]
+    reference = np.char.add("SC-", paid.astype(str))
+    reference[rng.random(n) < 0.1] = ""                                   # payer + amount only
+    amount = price[paid].astype(float)
+    amount[rng.random(n) < 0.02] -= 1000                                  # short payments
+    return pd.DataFrame({"id": np.char.add("W-", np.arange(n).astype(str)), "client_reference": reference,
+                         "amount": amount, "sender_mobile": phones[paid],
+                         "when_completed": "2026-10-18T08:00:00Z", "status": "succeeded"})
+
+
+def per_payment(lines):
+    """The page's confirmation: one transaction (and four table rewrites) per payment."""
+    for line in lines.to_dict("records"):
+        contract_id = line["reference"]
+        with transaction() as tx:
+            c = tx.get("sales_contracts.csv", contract_id)
+            if c is None or c["status"] != "pending_payment":
+                continue
+            tx.insert("payments.csv", {"payment_id": "PAY-" + line["provider_ref"], "ref_id": contract_id,
+                                       "amount_xof": line["amount_xof"], "provider_ref": line["provider_ref"]})
+            adv = tx.get("advances.csv", "ADV-" + contract_id[3:])
+            if adv is not None and adv["status"] == "active":
+                tx.update("advances.csv", adv["advance_id"], {"status": "repaid"})
+            tx.update("sales_contracts.csv", contract_id, {"status": "settled"})
+            transition(tx, c["receipt_id"], "sale_settled", "bench", {"contract_id": contract_id})
+
+
+def main(n=5_000):
+    rng = np.random.default_rng(18)
+    with tempfile.TemporaryDirectory() as directory:
+        storage._backend = CsvBackend(base_dir=directory)
+        utils.BASE_DIR = directory                                        # keep the journal out of the repo
+        raw = seed(directory, n, rng)
+        path = os.path.join(directory, "wave.csv")
+        raw.to_csv(path, index=False)
+
+        t0 = time.perf_counter()
+        statement = read_statement(path)
+        t_read = time.perf_counter() - t0
+        tables = [load_table(f) for f in ("sales_contracts.csv", "dwr_receipts.csv", "advances.csv",
+                                          "payments.csv", "entities.csv")]
+        t0 = time.perf_counter()
+        matched, unmatched = reconcile(statement, *tables)
+        t_match = time.perf_counter() - t0
+
+        sample = statement[statement["reference"] != ""].tail(SAMPLE)
+        t0 = time.perf_counter()
+        per_payment(sample)
+        t_loop = (time.perf_counter() - t0) / SAMPLE * n
+        invalidate()
+
+        t0 = time.perf_counter()
+        report = settle_statement(statement, username="bench")
+        t_batch = time.perf_counter() - t0
+
+        s = report["summary"]
+        print(f"statement lines: {n:,}  pending contracts: {CONTRACTS:,}  settled {s['settled']:,}  "
+              f"advances repaid {s['advances_repaid']:,}  unmatched {s['unmatched']:,}")
+        print(f"per-payment transactions   {t_loop:10.1f} s    (extrapolated from {SAMPLE})")
+        print(f"read statement             {t_read * 1e3:10.1f} ms")
+        print(f"reconcile (hash joins)     {t_match * 1e3:10.1f} ms   ({len(matched):,} matched)")
+        print(f"settle_statement (atomic)  {t_batch:10.2f} s    ({t_batch / n * 1e6:.0f} µs/line)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
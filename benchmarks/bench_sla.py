@@ -0,0 +1,98 @@
+"""
+Cold-chain SLA scoring: the previous scalar compute_coldchain_score in a Python loop
+vs. sla.score_coldchain over whole columns, then the monthly aggregation job
+(full build vs. incremental refresh after one month changes).
+
+    python benchmarks/bench_sla.py [n_lots]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from sla import score_coldchain, lot_inputs, month_fingerprints, aggregate, DISPUTE_INPUTS
+
+
+def scalar_score(temp_avg_c, temp_breach_count, dispute_count=0, spoiled_count=0):
+    """The previous row-at-a-time implementation, kept as the baseline."""
+    try:
+        temp_avg_c = float(temp_avg_c)
+    except Exception:
+        temp_avg_c = None
+    try:
+        temp_breach_count = int(temp_breach_count)
+    except Exception:
+        temp_breach_count = 0
+    try:
+        dispute_count = int(dispute_count)
+    except Exception:
+        dispute_count = 0
+    try:
+        spoiled_count = int(spoiled_count)
+    except Exception:
+        spoiled_count = 0
+    score = 100
+    if temp_avg_c is not None:
+        if temp_avg_c < 2 or temp_avg_c > 6:
+            score -= 25
+        elif temp_avg_c < 3 or temp_avg_c > 5:
+            score -= 10
+    score -= min(temp_breach_count * 10, 40)
+    score -= min(dispute_count * 8, 24)
+    score -= min(spoiled_count * 20, 40)
+    score = max(0, min(100, score))
+    status = "Green" if score >= 85 else "Amber" if score >= 60 else "Red"
+    return {"score": score, "status": status}
+
+
+def lots(n, rng):
+    days = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+    return pd.DataFrame({
+        "lot_id": np.char.add("LOT-", np.arange(n).astype(str)),
+        "custodian_id": np.char.add("C-", rng.integers(0, 200, n).astype(str)),
+        "created_at": days.strftime("%Y-%m-%dT07:00:00Z"),
+        "temp_avg_c": rng.normal(4.2, 1.2, n).round(1),
+        "temp_breach_count": rng.poisson(0.3, n),
+        "status": np.where(rng.random(n) < 0.01, "quarantined", "active"),
+    })
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main(n=1_000_000):
+    rng = np.random.default_rng(7)
+    df = lots(n, rng)
+
+    loop, t_loop = timed(lambda: [scalar_score(t, b) for t, b in zip(df["temp_avg_c"], df["temp_breach_count"])])
+    vec, t_vec = timed(lambda: score_coldchain(df["temp_avg_c"], df["temp_breach_count"]))
+    assert [r["score"] for r in loop] == vec["score"].tolist()
+    print(f"lots: {n:,}")
+    print(f"row-by-row loop     {t_loop:8.3f} s")
+    print(f"score_coldchain     {t_vec:8.3f} s   ({t_loop / t_vec:,.0f}x)")
+
+    inputs, t_month = timed(lambda: lot_inputs(df))
+    disputes = pd.DataFrame(columns=DISPUTE_INPUTS + ["month"])
+    fps, t_fp = timed(lambda: month_fingerprints(inputs, disputes))
+    _, t_full = timed(lambda: aggregate(inputs, disputes))
+    print(f"full rebuild        {t_month + t_fp + t_full:8.3f} s   ({len(fps)} months)")
+
+    # one new lot arrives in the latest month: only that month is re-aggregated and rewritten
+    latest = max(fps)
+    inputs.loc[len(inputs)] = [f"LOT-{n}", "C-1", f"{latest}-28T07:00:00Z", 4.0, 0, "active", latest]
+    fps2, t_fp2 = timed(lambda: month_fingerprints(inputs, disputes))
+    changed = [m for m in fps2 if fps.get(m) != fps2[m]]
+    _, t_inc = timed(lambda: aggregate(inputs, disputes, changed))
+    print(f"incremental refresh {t_month + t_fp2 + t_inc:8.3f} s   (changed months: {changed})")
+    print("unchanged inputs    refresh_sla returns on the table version tokens without reading any rows")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,75 @@
+"""
+Dashboard reads: parsing dairy_lots.csv with dtype inference vs. reading two typed columns
+of the month-partitioned Parquet snapshot, with and without a pushed-down filter.
+
+    python benchmarks/bench_snapshots.py [n_lots]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import snapshots
+from snapshots import typed, read_table, table_dir, _write
+
+LOTS = "dairy_lots.csv"
+
+
+def lots(n, rng):
+    created = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, n), unit="s")
+    return pd.DataFrame({
+        "lot_id": np.char.add("LOT-", np.arange(n).astype(str)),
+        "created_at": created.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "owner_entity_id": np.char.add("E-", rng.integers(0, 5000, n).astype(str)),
+        "custodian_id": np.char.add("C-", rng.integers(0, 200, n).astype(str)),
+        "tank_id": np.char.add("T-", rng.integers(0, 2000, n).astype(str)),
+        "product_type": np.array(["raw_milk", "yogurt", "butter", "ghee", "cheese"])[rng.integers(0, 5, n)],
+        "quantity_liters": rng.integers(10, 1000, n).astype(float),
+        "fat_pct": rng.normal(4, 0.4, n).round(1),
+        "antibiotic_test": "pass",
+        "temp_avg_c": rng.normal(4.2, 1.0, n).round(1),
+        "temp_breach_count": rng.poisson(0.3, n),
+        "expiry_ts": (created + pd.Timedelta(hours=48)).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "quality_grade": np.array(["A", "B", "C"])[rng.integers(0, 3, n)],
+        "status": np.where(rng.random(n) < 0.9, "active", "quarantined"),
+    })
+
+
+def timed(fn, repeat=3):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return out, (time.perf_counter() - t0) / repeat
+
+
+def main(n=1_000_000):
+    rng = np.random.default_rng(11)
+    df = lots(n, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = os.path.join(tmp, LOTS)
+        df.to_csv(csv, index=False)
+        snapshots.SNAPSHOT_DIR = os.path.join(tmp, "snapshots")
+
+        _, t_snap = timed(lambda: _write(typed(pd.read_csv(csv), LOTS), LOTS, table_dir(LOTS), "part-{i}.parquet"), 1)
+        csv_mb = os.path.getsize(csv) / 1e6
+        pq_mb = sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(table_dir(LOTS)) for f in fs) / 1e6
+
+        full, t_csv = timed(lambda: pd.read_csv(csv))
+        cols = ["status", "quantity_liters"]
+        _, t_cols = timed(lambda: read_table(LOTS, columns=cols, refresh=False))
+        q4 = [("created_at", ">=", "2025-10-01"), ("status", "==", "active")]
+        part, t_filter = timed(lambda: read_table(LOTS, columns=cols, filters=q4, refresh=False))
+
+        print(f"lots: {n:,}  csv {csv_mb:.0f} MB  parquet {pq_mb:.0f} MB  (snapshot written in {t_snap:.1f} s)")
+        print(f"read_csv, all columns          {t_csv * 1e3:8.0f} ms   {full.memory_usage(deep=True).sum() / 1e6:6.0f} MB")
+        print(f"snapshot, 2 columns            {t_cols * 1e3:8.0f} ms   ({t_csv / t_cols:.0f}x)")
+        print(f"snapshot, 2 columns, Q4 active {t_filter * 1e3:8.0f} ms   ({len(part):,} rows, 3 of 12 months read)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,63 @@
+"""
+Tank telemetry ingestion: parse + ring-buffer update + Parquet flush throughput for
+text readings arriving in socket/tail-sized batches, then suffix-stat query latency.
+Target: 10k readings/s on one core.
+
+    python benchmarks/bench_telemetry.py [n_readings]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from telemetry import TelemetryStore, read_readings
+
+TANKS = 200
+BATCH = 4096
+
+
+def readings(n, rng):
+    """Sensor lines for TANKS tanks reporting once a second, with occasional excursions."""
+    t0 = time.time() - n / TANKS
+    ts = t0 + np.arange(n) / TANKS
+    temps = rng.normal(4.0, 0.6, n) + np.where(rng.random(n) < 0.002, 4.0, 0.0)
+    tanks = rng.integers(0, TANKS, n)
+    return [f"{t:.3f},T-BENCH-{k:03d},{c:.2f}" for t, k, c in zip(ts, tanks, temps)], t0
+
+
+def main(n=1_000_000):
+    rng = np.random.default_rng(3)
+    lines, t0 = readings(n, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TelemetryStore(directory=tmp)
+        store._bands = {f"T-BENCH-{k:03d}": (2.0, 6.0) for k in range(TANKS)}
+
+        start = time.perf_counter()
+        for i in range(0, n, BATCH):
+            store.ingest_lines(lines[i:i + BATCH])
+        store.flush()
+        elapsed = time.perf_counter() - start
+
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(tmp) for f in fs)
+        print(f"readings: {n:,} across {TANKS} tanks, batches of {BATCH}")
+        print(f"ingest + flush      {elapsed:8.3f} s   {n / elapsed:,.0f} readings/s")
+        print(f"parquet on disk     {size / 1e6:8.2f} MB   ({size / n:.1f} bytes/reading)")
+
+        start = time.perf_counter()
+        queries = 10_000
+        for k in rng.integers(0, TANKS, queries):
+            store.stats(f"T-BENCH-{k:03d}", since=t0 + rng.random() * n / TANKS)
+        elapsed = time.perf_counter() - start
+        print(f"suffix stats        {elapsed / queries * 1e6:8.1f} us/query")
+
+        start = time.perf_counter()
+        df = read_readings(tank_id="T-BENCH-007", directory=tmp)
+        print(f"read one tank       {time.perf_counter() - start:8.3f} s   ({len(df):,} rows)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,101 @@
+"""
+Load test for the verification API.
+
+Starts `uvicorn verify_api:app` (unless --url is given), then fires GET
+/verify/{id} and POST /verify/batch requests from concurrent client threads
+and reports throughput and p50/p99 latency.
+
+    python benchmarks/load_verify_api.py [--url http://127.0.0.1:8000] [--requests 2000] [--concurrency 16] [--batch 200]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def receipt_ids():
+    from utils import load_csv
+
+    receipts = load_csv("dwr_receipts.csv")
+    ids = receipts["receipt_id"].dropna().astype(str).tolist() if "receipt_id" in receipts.columns else []
+    return ids or ["DWR-UNKNOWN"]
+
+
+def run(url, paths_or_bodies, concurrency):
+    local = threading.local()
+
+    def call(item):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        t0 = time.perf_counter()
+        if isinstance(item, str):
+            resp = session.get(url + item, timeout=30)
+        else:
+            resp = session.post(url + "/verify/batch", json=item, timeout=60)
+        return time.perf_counter() - t0, resp.status_code
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(call, paths_or_bodies))
+    elapsed = time.perf_counter() - t0
+    lat = np.array([r[0] for r in results]) * 1e3
+    errors = sum(1 for r in results if r[1] >= 500)
+    return elapsed, lat, errors
+
+
+def report(name, n, elapsed, lat, errors, per_request=1):
+    print(f"{name:<8} n={n:<6} {n / elapsed:>8.0f} req/s {n * per_request / elapsed:>9.0f} receipts/s "
+          f"p50={np.percentile(lat, 50):.2f}ms p99={np.percentile(lat, 99):.2f}ms errors={errors}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--batch", type=int, default=200)
+    ap.add_argument("--workers", type=int, default=2)
+    args = ap.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        url = "http://127.0.0.1:8765"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "verify_api:app", "--port", "8765", "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=ROOT,
+        )
+        for _ in range(100):
+            try:
+                requests.get(url + "/health", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+
+    try:
+        ids = receipt_ids()
+        rng = np.random.default_rng(0)
+        singles = [f"/verify/{ids[i]}" for i in rng.integers(0, len(ids), args.requests)]
+        report("single", args.requests, *run(url, singles, args.concurrency))
+
+        n_batches = max(1, args.requests // 20)
+        bodies = [{"receipt_ids": [ids[i] for i in rng.integers(0, len(ids), args.batch)]} for _ in range(n_batches)]
+        report("batch", n_batches, *run(url, bodies, args.concurrency), per_request=args.batch)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
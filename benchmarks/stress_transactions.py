@@ -0,0 +1,85 @@
+"""
+Parallel-writer stress test for transactions.UnitOfWork.
+
+Each worker process repeatedly reads a shared advance row, increments its
+amount, sets the receipt status and inserts a payment, all in one transaction
+(retrying on ConcurrentUpdateError). At the end no increment may be lost and
+every payment must be matched by exactly one increment.
+
+    python benchmarks/stress_transactions.py [workers] [txns_per_worker] [csv|sqlite]
+"""
+import os
+import sys
+import time
+import tempfile
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from storage import CsvBackend, SqlBackend
+from transactions import run_in_transaction
+
+
+def make_backend(kind, directory):
+    if kind == "sqlite":
+        return SqlBackend(f"sqlite:///{os.path.join(directory, 'stress.sqlite')}?timeout=30", seed_dir=directory)
+    return CsvBackend(base_dir=directory)
+
+
+def worker(args):
+    kind, directory, worker_id, n = args
+    backend = make_backend(kind, directory)
+    conflicts = 0
+
+    for i in range(n):
+        def step(tx):
+            adv = tx.get("advances.csv", "ADV-1")
+            tx.update("advances.csv", "ADV-1", {"advance_xof": int(float(adv["advance_xof"])) + 1})
+            tx.update("dwr_receipts.csv", "DWR-1", {"status": f"w{worker_id}"})
+            tx.insert("payments.csv", {"payment_id": f"PAY-{worker_id}-{i}", "ref_id": "ADV-1", "amount_xof": 1})
+
+        attempts = [0]
+
+        def counted(tx):
+            attempts[0] += 1
+            step(tx)
+
+        run_in_transaction(counted, retries=200, backend=backend)
+        conflicts += attempts[0] - 1
+    return conflicts
+
+
+def main(workers=8, per_worker=50, kind="csv"):
+    with tempfile.TemporaryDirectory() as tmp:
+        pd.DataFrame([{"advance_id": "ADV-1", "advance_xof": 0, "status": "active"}]).to_csv(os.path.join(tmp, "advances.csv"), index=False)
+        pd.DataFrame([{"receipt_id": "DWR-1", "status": "active"}]).to_csv(os.path.join(tmp, "dwr_receipts.csv"), index=False)
+        pd.DataFrame(columns=["payment_id", "ref_id", "amount_xof"]).to_csv(os.path.join(tmp, "payments.csv"), index=False)
+
+        backend = make_backend(kind, tmp)
+        for file_name in ["advances.csv", "dwr_receipts.csv", "payments.csv"]:
+            backend.exists(file_name)  # seed SQL tables before the workers race
+
+        t0 = time.perf_counter()
+        with Pool(workers) as pool:
+            conflicts = sum(pool.map(worker, [(kind, tmp, w, per_worker) for w in range(workers)]))
+        elapsed = time.perf_counter() - t0
+
+        expected = workers * per_worker
+        total = int(float(backend.get_row("advances.csv", "ADV-1")["advance_xof"]))
+        payments = backend.load("payments.csv")
+
+        print(f"backend={kind} workers={workers} txns={expected} elapsed={elapsed:.2f}s "
+              f"({expected / elapsed:.0f} txn/s) retried_conflicts={conflicts}")
+        print(f"advance total={total} payments={len(payments)} unique_payments={payments['payment_id'].nunique()}")
+        assert total == expected, "lost update"
+        assert len(payments) == expected == payments["payment_id"].nunique(), "payments out of sync"
+        print("OK")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(int(args[0]) if len(args) > 0 else 8,
+         int(args[1]) if len(args) > 1 else 50,
+         args[2] if len(args) > 2 else "csv")
@@ -0,0 +1,342 @@
+"""
+Tank rent billing: daily accruals, rent-to-own equity and invoice runs.
+
+A tank contract starts when the tanks page assigns the tank (`assigned_at`) and, for
+rental and rent-to-own, ends at `contract_until`:
+
+    rental          rent_xof_per_day, billed to the renter
+    rent_to_own     rent_xof_per_day; each paid day (confirmed invoices) earns
+                    purchase_price_xof / (rent_to_own_months x 30) of equity, and the
+                    tank becomes `owned` by the renter once the equity covers the price
+    pay_per_liter   rent_xof_per_day / capacity_liters per liter-day, billed to each owner
+                    for the liters they had in the pooled tank on each day (from the
+                    lots' intake and release, capacity.lot_stays) and paid to the
+                    tank's custodian
+
+`accruals` lays the contracts out as one row per tank, day and payer (np.repeat, no
+per-day loop). `close` bills the days since each tank's last invoice, up to `through`
+(exclusive, midnight UTC), as pending `payments` rows in one commit. The same commit
+moves each billed tank's `billed_through` with its row version checked, so a run that
+is repeated, interrupted or racing another one never bills a day twice (the loser
+recomputes and retries). `confirm_invoice` marks an invoice paid.
+
+    python billing.py                 # close through today (the nightly run)
+    python billing.py 2026-11-01 --dry-run
+    python billing.py equity
+"""
+import sys
+import time
+import random
+
+import numpy as np
+import pandas as pd
+
+from storage import get_backend, ConcurrentUpdateError, VERSION_COL, parse_version
+from table_cache import load_table, invalidate
+from capacity import lot_stays, POOLED_MODEL
+from schemas import iso
+from ids import gen_ids
+from utils import event_rows, event_journal
+from transactions import run_in_transaction
+
+TANKS_FILE = "tanks.csv"
+PAYMENTS_FILE = "payments.csv"
+
+RENTAL, RENT_TO_OWN, OWNED = "rental", "rent_to_own", "owned"
+# ownership model -> payments.ref_type of its invoices
+REF_TYPES = {RENTAL: "tank_rental", RENT_TO_OWN: "tank_rent_to_own", POOLED_MODEL: "tank_storage"}
+DAYS_PER_MONTH = 30
+LESSOR_ID = "E-PLAT-001"
+DAY = pd.Timedelta(days=1)
+
+ACCRUAL_COLUMNS = ["tank_id", "day", "ownership_model", "payer_id", "payee_id", "liters", "amount_xof"]
+
+
+# ----------------------------
+# Contracts and accruals
+# ----------------------------
+def contracts(tanks: pd.DataFrame, payments: pd.DataFrame, stays: pd.DataFrame, through) -> pd.DataFrame:
+    """
+    One row per billable (tank, payer) with its daily amount (per liter-day for pooled
+    tanks) and the days still to bill, [start, end): from the tank's `billed_through` (else
+    the end of its last invoice) or its assignment, whichever is later. Legacy assignments
+    without a date start on the day before `through`.
+    """
+    through = _day(through)
+    tanks = tanks[tanks["ownership_model"].isin(list(REF_TYPES)) & (tanks["status"] == "occupied")]
+    rate = tanks["rent_xof_per_day"].fillna(0).to_numpy(dtype=float)
+    capacity = tanks["capacity_liters"].to_numpy(dtype=float)
+    base = pd.DataFrame({
+        "tank_id": tanks["tank_id"].astype(str).to_numpy(),
+        "ownership_model": tanks["ownership_model"].astype(object).to_numpy(),
+        "custodian_id": tanks["custodian_id"].astype(object).to_numpy(),
+        "assigned_at": tanks["assigned_at"].dt.floor("D").array,
+        "contract_until": tanks["contract_until"].dt.floor("D").array,
+        "rate_xof_per_day": rate,
+        "rate_xof_per_liter_day": rate / np.where(capacity > 0, capacity, np.nan),
+        "payer_id": tanks["owner_entity_id"].astype(object).to_numpy(),
+        "payee_id": LESSOR_ID,
+        "billed_through": _billed_through(tanks, payments),
+    })
+
+    # pooled tanks: one contract per owner who has had lots in the tank, billed per liter-day;
+    # the custodian running the tank is paid (owner_entity_id is whoever last held it dedicated)
+    pooled = base["ownership_model"].to_numpy() == POOLED_MODEL
+    owners = stays[["tank_id", "owner_entity_id"]].drop_duplicates().rename(columns={"owner_entity_id": "payer_id"})
+    per_owner = base[pooled].drop(columns="payer_id").merge(owners, on="tank_id")
+    per_owner["payee_id"] = per_owner["custodian_id"]
+    per_owner["amount_per_day"] = np.nan
+    dedicated = base[~pooled].assign(amount_per_day=base["rate_xof_per_day"][~pooled])
+    df = pd.concat([dedicated, per_owner], ignore_index=True)
+
+    billed = pd.to_datetime(df["billed_through"], utc=True)
+    assigned = pd.to_datetime(df["assigned_at"], utc=True)
+    # a tank reassigned since its last invoice bills the new contract from its assignment
+    start = billed.where(billed.notna() & ~(billed < assigned), assigned)
+    start = start.where(start.notna(), billed)
+    start = start.where(start.notna(), through - DAY)
+    end = df["contract_until"].where(df["contract_until"].notna() & (df["contract_until"] < through), through)
+    df["start"] = pd.to_datetime(start, utc=True)
+    df["end"] = pd.to_datetime(end, utc=True)
+    df["days"] = ((df["end"] - df["start"]) // DAY).clip(lower=0).astype(int)
+    return df
+
+
+def accruals(through=None, tanks=None, payments=None, stays=None, c=None) -> pd.DataFrame:
+    """One row per tank, day and payer not yet billed, up to `through` (default: today)."""
+    stays = lot_stays() if stays is None else stays
+    c = _contracts(through, tanks, payments, stays) if c is None else c
+    pooled = (c["ownership_model"] == POOLED_MODEL).to_numpy()
+    dedicated = c[~pooled]
+    row, day = _expand(dedicated["start"], dedicated["days"])
+    lines = [pd.DataFrame({
+        "tank_id": dedicated["tank_id"].to_numpy()[row],
+        "day": day,
+        "ownership_model": dedicated["ownership_model"].to_numpy()[row],
+        "payer_id": dedicated["payer_id"].to_numpy()[row],
+        "payee_id": dedicated["payee_id"].to_numpy()[row],
+        "liters": np.nan,
+        "amount_xof": dedicated["amount_per_day"].to_numpy()[row],
+    }), _pooled_lines(c[pooled], stays)]
+    lines = [x for x in lines if len(x)]
+    if not lines:
+        return pd.DataFrame(columns=ACCRUAL_COLUMNS)
+    return pd.concat(lines, ignore_index=True)[ACCRUAL_COLUMNS]
+
+
+def _pooled_lines(c: pd.DataFrame, stays: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-liter lines for pooled contracts: each lot counts from its intake day up to the day it
+    left (at least its intake day), within the contract's days to bill.
+    """
+    s = c.merge(stays.rename(columns={"owner_entity_id": "payer_id"}), on=["tank_id", "payer_id"])
+    if s.empty:
+        return s
+    came = s["in_at"].dt.floor("D")
+    left = s["out_at"].dt.floor("D")
+    left = left.where(~(left <= came), came + DAY)
+    first = came.where(came > s["start"], s["start"])
+    stop = left.where(left < s["end"], s["end"])
+    row, day = _expand(first, ((stop - first) // DAY).clip(lower=0))
+    out = pd.DataFrame({"tank_id": s["tank_id"].to_numpy()[row], "day": day, "payer_id": s["payer_id"].to_numpy()[row],
+                        "liters": s["liters"].to_numpy(dtype=float)[row]})
+    out = out.groupby(["tank_id", "day", "payer_id"], sort=False)["liters"].sum().reset_index()
+    terms = c.drop_duplicates("tank_id").set_index("tank_id")
+    out["ownership_model"] = POOLED_MODEL
+    out["payee_id"] = out["tank_id"].map(terms["payee_id"])
+    out["amount_xof"] = out["liters"] * out["tank_id"].map(terms["rate_xof_per_liter_day"]).fillna(0)
+    return out
+
+
+def _expand(start: pd.Series, days: pd.Series):
+    """Row number and day of each of days[i] consecutive days from start[i] (np.repeat, no per-day loop)."""
+    n = days.to_numpy(dtype=int)
+    row = np.repeat(np.arange(len(n)), n)
+    offset = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    first = start.to_numpy(dtype="datetime64[ns]")
+    return row, pd.to_datetime(first[row] + offset.astype("timedelta64[D]"), utc=True)
+
+
+def equity(through=None, tanks=None, payments=None) -> pd.DataFrame:
+    """
+    Rent-to-own progress per tank as of `through`: contract days so far, days paid (confirmed
+    invoices of the current renter since the assignment), the equity they earned and what remains.
+    """
+    through = _day(through)
+    tanks = load_table(TANKS_FILE) if tanks is None else tanks
+    payments = load_table(PAYMENTS_FILE) if payments is None else payments
+    df = tanks[tanks["ownership_model"] == RENT_TO_OWN]
+    price = df["purchase_price_xof"].fillna(0).to_numpy(dtype=float)
+    months = df["rent_to_own_months"].astype("Float64").fillna(0).to_numpy(dtype=float)
+    per_day = price / np.where(months > 0, months * DAYS_PER_MONTH, np.nan)
+    end = df["contract_until"].where(df["contract_until"].notna() & (df["contract_until"] < through), through)
+    days = ((end - df["assigned_at"].dt.floor("D")) // DAY).fillna(0).clip(lower=0).to_numpy(dtype=float)
+    paid = _paid_days(df, payments)
+    value = np.minimum(np.nan_to_num(paid * per_day), price)
+    return pd.DataFrame({
+        "tank_id": df["tank_id"].astype(str).to_numpy(),
+        "owner_entity_id": df["owner_entity_id"].to_numpy(),
+        "contract_days": days.astype(int),
+        "paid_days": paid.astype(int),
+        "equity_xof": value.round(0),
+        "purchase_price_xof": price,
+        "equity_pct": np.round(value / np.where(price > 0, price, np.nan), 3),
+        "remaining_xof": (price - value).round(0),
+    })
+
+
+# ----------------------------
+# Invoice run
+# ----------------------------
+def close(through=None, username="system", dry_run=False, retries=5) -> dict:
+    """
+    Bill every day since each tank's last invoice up to `through` (default: today) as pending
+    payments, one per tank and payer, and hand rent-to-own tanks whose confirmed payments
+    cover the price to their renter. A run that loses a race with another writer of the same
+    tanks starts over from the fresh tables.
+    """
+    through = _day(through)
+    for attempt in range(retries + 1):
+        try:
+            return _close(through, username, dry_run)
+        except ConcurrentUpdateError:
+            if attempt == retries:
+                raise
+            time.sleep(random.uniform(0, 0.01 * (2 ** attempt)))
+
+
+def _close(through, username, dry_run) -> dict:
+    tanks, payments = load_table(TANKS_FILE), load_table(PAYMENTS_FILE)
+    stays = lot_stays()
+    c = contracts(tanks, payments, stays, through)
+    lines = accruals(through, tanks, payments, stays, c)
+    invoices = invoice_rows(lines)
+    stakes = equity(through, tanks, payments)
+    paid_off = stakes[(stakes["remaining_xof"] <= 0) & (stakes["purchase_price_xof"] > 0)]
+
+    if not dry_run and (len(invoices) or len(paid_off)):
+        # every billed tank's row is rewritten with its version checked: a concurrent close
+        # (or tank change) fails the commit instead of billing the same days again
+        changes = {t: {"billed_through": iso(e)} for t, e in zip(c["tank_id"][c["days"] > 0], c["end"][c["days"] > 0])}
+        for t in paid_off["tank_id"]:
+            changes.setdefault(t, {})["ownership_model"] = OWNED
+        versions = dict(zip(tanks["tank_id"].astype(str), tanks[VERSION_COL])) if VERSION_COL in tanks.columns else {}
+        updates = {TANKS_FILE: {t: (parse_version(versions.get(t)), values) for t, values in changes.items()}}
+        events = event_rows(username, "tank_invoiced", "payment", invoices["payment_id"],
+                            [{"tank_id": t, "payer_id": p, "amount_xof": a, "from": s, "to": e} for t, p, a, s, e in
+                             zip(invoices["ref_id"], invoices["payer_id"], invoices["amount_xof"],
+                                 invoices["period_start"], invoices["period_end"])])
+        events += event_rows(username, "tank_ownership_transferred", "tank", paid_off["tank_id"],
+                             [{"owner_entity_id": o, "purchase_price_xof": p}
+                              for o, p in zip(paid_off["owner_entity_id"], paid_off["purchase_price_xof"])])
+        try:
+            get_backend().commit({PAYMENTS_FILE: invoices.to_dict("records")} if len(invoices) else {}, updates,
+                                 events, event_journal())
+        finally:
+            invalidate(PAYMENTS_FILE)
+            invalidate(TANKS_FILE)
+            invalidate("events.csv")
+
+    return {
+        "through": iso(through),
+        "tank_days": len(lines),
+        "invoices": invoices,
+        "equity": stakes,
+        "transferred": list(paid_off["tank_id"]),
+        "total_xof": float(invoices["amount_xof"].sum()) if len(invoices) else 0.0,
+        "dry_run": dry_run,
+    }
+
+
+def confirm_invoice(payment_id, username="system", provider_ref="", method="invoice") -> dict:
+    """Mark a pending rent invoice paid; its days count towards rent-to-own equity from then on."""
+    def stage(tx):
+        row = tx.get(PAYMENTS_FILE, payment_id)
+        if row is None or row.get("ref_type") not in REF_TYPES.values():
+            raise KeyError(f"{payment_id}: no such rent invoice")
+        if row.get("status") != "pending":
+            raise ValueError(f"{payment_id} is already {row.get('status')}")
+        values = {"status": "confirmed", "confirmed_at": iso(pd.Timestamp.utcnow()),
+                  "provider_ref": provider_ref, "method": method}
+        tx.update(PAYMENTS_FILE, payment_id, values)
+        tx.log(username, "tank_invoice_paid", "payment", payment_id,
+               {"tank_id": row.get("ref_id"), "payer_id": row.get("payer_id"), "amount_xof": row.get("amount_xof")})
+        return {**row, **values}
+
+    return run_in_transaction(stage)
+
+
+def invoice_rows(lines: pd.DataFrame) -> pd.DataFrame:
+    """One pending payments row per tank and payer for a block of accrual lines."""
+    if lines.empty:
+        return pd.DataFrame(columns=["payment_id", "ref_type", "ref_id", "payer_id", "payee_id", "amount_xof",
+                                     "method", "status", "created_at", "confirmed_at", "provider_ref",
+                                     "period_start", "period_end"])
+    out = lines.groupby(["tank_id", "payer_id"], sort=False).agg(
+        ownership_model=("ownership_model", "first"), payee_id=("payee_id", "first"),
+        amount_xof=("amount_xof", "sum"), first_day=("day", "min"), last_day=("day", "max")).reset_index()
+    now = iso(pd.Timestamp.utcnow())
+    return pd.DataFrame({
+        "payment_id": gen_ids("INV", len(out)),
+        "ref_type": out["ownership_model"].map(REF_TYPES).to_numpy(),
+        "ref_id": out["tank_id"].to_numpy(),
+        "payer_id": out["payer_id"].to_numpy(),
+        "payee_id": out["payee_id"].to_numpy(),
+        "amount_xof": out["amount_xof"].round(0).to_numpy(),
+        "method": "invoice",
+        "status": "pending",
+        "created_at": now,
+        "confirmed_at": "",
+        "provider_ref": "",
+        "period_start": [iso(t) for t in out["first_day"]],
+        "period_end": [iso(t) for t in out["last_day"] + DAY],
+    })
+
+
+def _contracts(through, tanks, payments, stays) -> pd.DataFrame:
+    return contracts(load_table(TANKS_FILE) if tanks is None else tanks,
+                     load_table(PAYMENTS_FILE) if payments is None else payments,
+                     lot_stays() if stays is None else stays, through)
+
+
+def _billed_through(tanks: pd.DataFrame, payments: pd.DataFrame) -> np.ndarray:
+    """End of each tank's billing so far: its `billed_through`, else (older tanks) the end of its last invoice."""
+    recorded = tanks["billed_through"] if "billed_through" in tanks.columns else pd.Series(pd.NaT, index=tanks.index)
+    recorded = pd.to_datetime(recorded, utc=True)
+    if payments.empty or "period_end" not in payments.columns:
+        return recorded.array
+    mine = payments[payments["ref_type"].isin(list(REF_TYPES.values())) & payments["period_end"].notna()]
+    invoiced = tanks["tank_id"].astype(str).map(mine.groupby(mine["ref_id"].astype(str))["period_end"].max())
+    return recorded.where(recorded.notna(), pd.to_datetime(invoiced, utc=True)).array
+
+
+def _paid_days(tanks: pd.DataFrame, payments: pd.DataFrame) -> np.ndarray:
+    """Days covered by each tank's confirmed rent-to-own invoices from its current renter, since its assignment."""
+    if payments.empty or "period_end" not in payments.columns:
+        return np.zeros(len(tanks))
+    paid = payments[(payments["ref_type"] == REF_TYPES[RENT_TO_OWN]) & (payments["status"] == "confirmed")
+                    & payments["period_start"].notna() & payments["period_end"].notna()]
+    paid = paid.assign(tank_id=paid["ref_id"].astype(str), payer_id=paid["payer_id"].astype(str))
+    mine = pd.DataFrame({"tank_id": tanks["tank_id"].astype(str).to_numpy(),
+                         "payer_id": tanks["owner_entity_id"].astype(str).to_numpy(),
+                         "assigned_at": tanks["assigned_at"].dt.floor("D").array})
+    paid = mine.merge(paid[["tank_id", "payer_id", "period_start", "period_end"]], on=["tank_id", "payer_id"])
+    paid = paid[~(paid["period_start"] < paid["assigned_at"])]
+    days = ((paid["period_end"] - paid["period_start"]) // DAY).groupby(paid["tank_id"]).sum()
+    return mine["tank_id"].map(days).fillna(0).to_numpy(dtype=float)
+
+
+def _day(value) -> pd.Timestamp:
+    ts = pd.Timestamp.utcnow() if value is None else pd.Timestamp(value)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.floor("D")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if args and args[0] == "equity":
+        print(equity().to_string(index=False))
+    else:
+        report = close(args[0] if args else None, dry_run="--dry-run" in sys.argv)
+        print({k: v for k, v in report.items() if k not in ("invoices", "equity")})
+        print(report["invoices"].to_string(index=False))
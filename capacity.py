@@ -0,0 +1,294 @@
+"""
+Tank capacity: liters committed per tank and best-fit allocation of incoming lots.
+
+A tank's committed liters are the lots still in its custody (active or quarantined, and
+not released). Tanks are grouped into pools per custodian:
+
+    pay_per_liter tanks        pooled: lots of any owner, billed by the liter
+    available tanks            open to any owner (as the intake page always allowed)
+    occupied rental / owned    only the lots of the tank's `owner_entity_id`
+
+Each pool is a list of (free liters, tank_id) kept sorted, so `best_fit` is one bisect
+per candidate pool: the tank with the least free space that still takes the lot, which
+keeps large tanks free for large deliveries.
+
+    best_fit("C-MCC-001", 120, "E-WG-001")       # -> "T-500-001" or None
+    occupancy()                                   # one row per tank
+    allocate(requests)                            # a whole intake batch at once
+    lot_stays()                                   # when each lot was in its tank (billing)
+    create_lot(row, username)                     # intake: capacity check and insert in one transaction
+
+The book is rebuilt only when tanks, lots or receipts change.
+
+    python capacity.py                           # occupancy per tank
+    python capacity.py fit <custodian_id> <liters> [owner_entity_id]
+"""
+import sys
+import bisect
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import get_backend
+from table_cache import load_table
+from transactions import run_in_transaction
+
+TANKS_FILE = "tanks.csv"
+LOTS_FILE = "dairy_lots.csv"
+RECEIPTS_FILE = "dwr_receipts.csv"
+RELEASES_FILE = "release_orders.csv"
+INPUT_FILES = [TANKS_FILE, LOTS_FILE, RECEIPTS_FILE]
+
+POOLED_MODEL = "pay_per_liter"
+# Lots still physically in a tank (a released receipt means the milk has left)
+IN_CUSTODY_STATUSES = ["active", "quarantined"]
+OPEN = ""
+
+
+class CapacityError(Exception):
+    """A lot does not fit the tank it was meant for."""
+
+
+class CapacityBook:
+    """Committed and free liters per tank, and sorted free-space pools for best-fit lookups."""
+
+    def __init__(self, tanks: pd.DataFrame, lots: pd.DataFrame, receipts: pd.DataFrame, token=None):
+        self.token = token
+        tanks = tanks.drop_duplicates("tank_id") if "tank_id" in tanks.columns else tanks.iloc[0:0]
+        self.tanks = tanks.set_index(tanks["tank_id"].astype(str))
+        in_tank = _in_custody(lots, receipts)
+        committed = in_tank.groupby("tank_id")["quantity_liters"].sum()
+        self.committed = committed.reindex(self.tanks.index, fill_value=0.0).to_numpy(dtype=float)
+        self.capacity = pd.to_numeric(self.tanks["capacity_liters"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        self.owners = in_tank.groupby("tank_id")["owner_entity_id"].nunique().reindex(
+            self.tanks.index, fill_value=0).to_numpy()
+        self._pos = {t: i for i, t in enumerate(self.tanks.index)}
+        self._pool_of = [(c, o) for c, o in zip(self.tanks["custodian_id"].astype(str), _pool_owner(self.tanks))]
+        self._pools = {}
+        free = self.free_liters()
+        for i in np.argsort(free, kind="stable"):
+            self._pools.setdefault(self._pool_of[i], []).append((float(free[i]), self.tanks.index[i]))
+        self._lock = threading.Lock()
+
+    def free_liters(self) -> np.ndarray:
+        return np.maximum(self.capacity - self.committed, 0.0)
+
+    def free(self, tank_id) -> float:
+        i = self._pos.get(str(tank_id))
+        return 0.0 if i is None else float(max(self.capacity[i] - self.committed[i], 0.0))
+
+    def accepts(self, tank_id, owner_entity_id) -> bool:
+        """Whether `owner_entity_id` may put lots in this tank at all (capacity aside)."""
+        i = self._pos.get(str(tank_id))
+        return i is not None and self._pool_of[i][1] in (OPEN, str(owner_entity_id))
+
+    def candidates(self, custodian_id, owner_entity_id, quantity=0.0) -> list:
+        """(free liters, tank_id) of the custodian's tanks open to this owner with room for `quantity`, tightest first."""
+        out = []
+        for pool in _pool_keys(custodian_id, owner_entity_id):
+            entries = self._pools.get(pool, [])
+            out.extend(entries[bisect.bisect_left(entries, (float(quantity), "")):])
+        return sorted(out)
+
+    def best_fit(self, custodian_id, quantity, owner_entity_id=OPEN):
+        """The custodian's tank with the least free space that still takes `quantity` liters (None if none does)."""
+        best = None
+        for pool in _pool_keys(custodian_id, owner_entity_id):
+            entries = self._pools.get(pool)
+            if not entries:
+                continue
+            j = bisect.bisect_left(entries, (float(quantity), ""))
+            if j < len(entries) and (best is None or entries[j] < best):
+                best = entries[j]
+        return None if best is None else best[1]
+
+    def commit(self, tank_id, liters) -> None:
+        """Book `liters` into a tank (negative to take them out) and re-sort its pool entry."""
+        i = self._pos[str(tank_id)]
+        with self._lock:
+            entries = self._pools[self._pool_of[i]]
+            old = (float(max(self.capacity[i] - self.committed[i], 0.0)), self.tanks.index[i])
+            del entries[bisect.bisect_left(entries, old)]
+            self.committed[i] += float(liters)
+            bisect.insort(entries, (float(max(self.capacity[i] - self.committed[i], 0.0)), self.tanks.index[i]))
+
+    def occupancy(self) -> pd.DataFrame:
+        free = self.free_liters()
+        cols = [c for c in ["custodian_id", "capacity_liters", "ownership_model", "owner_entity_id", "status"]
+                if c in self.tanks.columns]
+        out = self.tanks[cols].copy()
+        out["committed_liters"] = self.committed
+        out["free_liters"] = free
+        out["utilisation"] = np.round(self.committed / np.where(self.capacity > 0, self.capacity, np.nan), 3)
+        out["owners"] = self.owners
+        out["open_to_all"] = [o == OPEN for _, o in self._pool_of]
+        return out.rename_axis("tank_id").reset_index()
+
+    def copy(self) -> "CapacityBook":
+        other = object.__new__(CapacityBook)
+        other.__dict__.update(self.__dict__)
+        other.committed = self.committed.copy()
+        other._pools = {k: list(v) for k, v in self._pools.items()}
+        other._lock = threading.Lock()
+        return other
+
+
+def _in_custody(lots, receipts) -> pd.DataFrame:
+    cols = ["lot_id", "tank_id", "owner_entity_id", "quantity_liters", "status"]
+    if lots.empty or any(c not in lots.columns for c in cols):
+        return pd.DataFrame({"tank_id": pd.Series(dtype=object), "owner_entity_id": pd.Series(dtype=object),
+                             "quantity_liters": pd.Series(dtype=float)})
+    df = lots.loc[lots["status"].isin(IN_CUSTODY_STATUSES), cols]
+    if not receipts.empty and {"lot_id", "status"} <= set(receipts.columns):
+        df = df[~df["lot_id"].isin(receipts.loc[receipts["status"] == "released", "lot_id"])]
+    return df.assign(tank_id=df["tank_id"].astype(str),
+                     quantity_liters=pd.to_numeric(df["quantity_liters"], errors="coerce").fillna(0))
+
+
+def _pool_owner(tanks) -> list:
+    """OPEN for pooled and available tanks, else the entity holding the tank."""
+    model = tanks["ownership_model"].astype(object).to_numpy() if "ownership_model" in tanks.columns else None
+    status = tanks["status"].astype(object).to_numpy() if "status" in tanks.columns else None
+    owner = tanks["owner_entity_id"].astype(object).to_numpy() if "owner_entity_id" in tanks.columns else None
+    out = []
+    for i in range(len(tanks)):
+        dedicated = (model is None or model[i] != POOLED_MODEL) and status is not None and status[i] == "occupied"
+        out.append(str(owner[i]) if dedicated and owner is not None and not pd.isna(owner[i]) else OPEN)
+    return out
+
+
+def _pool_keys(custodian_id, owner_entity_id) -> list:
+    custodian_id, owner = str(custodian_id), str(owner_entity_id or OPEN)
+    return [(custodian_id, OPEN)] + ([(custodian_id, owner)] if owner != OPEN else [])
+
+
+# ----------------------------
+# Module-level book
+# ----------------------------
+_book = None
+_book_lock = threading.Lock()
+
+
+def capacity_book() -> CapacityBook:
+    """The book for the current tanks, lots and receipts, rebuilt only when one of them changes."""
+    global _book
+    backend = get_backend()
+    token = tuple(backend.version_token(f) for f in INPUT_FILES)
+    book = _book
+    if book is not None and book.token == token:
+        return book
+    with _book_lock:
+        if _book is None or _book.token != token:
+            _book = CapacityBook(*(load_table(f) for f in INPUT_FILES), token=token)
+        return _book
+
+
+def best_fit(custodian_id, quantity, owner_entity_id=OPEN):
+    return capacity_book().best_fit(custodian_id, quantity, owner_entity_id)
+
+
+def free(tank_id) -> float:
+    return capacity_book().free(tank_id)
+
+
+def occupancy() -> pd.DataFrame:
+    return capacity_book().occupancy()
+
+
+def allocate(requests: pd.DataFrame) -> pd.Series:
+    """
+    Best-fit tank per row of `requests` (custodian_id, owner_entity_id, quantity_liters),
+    in row order, each row seeing the liters booked by the rows before it. None where no
+    tank has room. The stored tables are not touched.
+    """
+    book = capacity_book().copy()
+    out = []
+    for c, o, q in zip(requests["custodian_id"], requests["owner_entity_id"], requests["quantity_liters"]):
+        tank_id = book.best_fit(c, q, o)
+        if tank_id is not None:
+            book.commit(tank_id, q)
+        out.append(tank_id)
+    return pd.Series(out, index=requests.index, name="tank_id", dtype=object)
+
+
+def create_lot(row: dict, username) -> None:
+    """
+    Insert an intake lot and its `lot_created` event if its tank still takes it.
+
+    The tank's committed liters are re-read inside the transaction, under the writer lock,
+    and the tank row's version is bumped with the insert, so two intakes racing for the
+    last free liters cannot both get them. Raises CapacityError when the lot does not fit.
+    """
+    tank_id, liters = str(row["tank_id"]), float(row["quantity_liters"])
+
+    def stage(tx):
+        if tx.get(TANKS_FILE, tank_id) is None:
+            raise CapacityError(f"Tank {tank_id} does not exist.")
+        book = capacity_book()
+        if not book.accepts(tank_id, row["owner_entity_id"]):
+            raise CapacityError(f"Tank {tank_id} does not take lots of {row['owner_entity_id']}.")
+        if liters > book.free(tank_id):
+            raise CapacityError(f"Tank {tank_id} has only {book.free(tank_id):,.0f} L free.")
+        tx.update(TANKS_FILE, tank_id, {})
+        tx.insert(LOTS_FILE, row)
+        tx.log(username, "lot_created", "dairy_lot", row["lot_id"],
+               {"custodian_id": row["custodian_id"], "owner": row["owner_entity_id"], "status": row["status"],
+                "expiry_ts": row.get("expiry_ts", "")})
+
+    run_in_transaction(stage, exclusive=True)
+
+
+def pool_shares() -> pd.DataFrame:
+    """Liters and share of each owner in the pay-per-liter tanks right now."""
+    book = capacity_book()
+    in_tank = _in_custody(load_table(LOTS_FILE), load_table(RECEIPTS_FILE))
+    pooled = book.tanks.index[book.tanks["ownership_model"].astype(object) == POOLED_MODEL] \
+        if "ownership_model" in book.tanks.columns else []
+    out = in_tank[in_tank["tank_id"].isin(pooled)].groupby(["tank_id", "owner_entity_id"], observed=True)[
+        "quantity_liters"].sum().rename("liters").reset_index()
+    out["share"] = (out["liters"] / out.groupby("tank_id")["liters"].transform("sum")).round(4)
+    return out
+
+
+def lot_stays() -> pd.DataFrame:
+    """
+    When each lot was in its tank: tank_id, owner_entity_id, liters, in_at (intake) and out_at
+    (its receipt's confirmed release, or its expiry once expired; NaT while still in custody).
+    Older lots without an intake time have in_at NaT.
+    """
+    lots, receipts, releases = (load_table(f) for f in (LOTS_FILE, RECEIPTS_FILE, RELEASES_FILE))
+    cols = ["lot_id", "tank_id", "owner_entity_id", "quantity_liters", "status"]
+    if lots.empty or any(c not in lots.columns for c in cols):
+        return pd.DataFrame({"lot_id": pd.Series(dtype=object), "tank_id": pd.Series(dtype=object),
+                             "owner_entity_id": pd.Series(dtype=object), "liters": pd.Series(dtype=float),
+                             "in_at": pd.Series(dtype="datetime64[ns, UTC]"),
+                             "out_at": pd.Series(dtype="datetime64[ns, UTC]")})
+    nat = pd.Series(pd.NaT, index=lots.index, dtype="datetime64[ns, UTC]")
+    in_at = lots["created_at"] if "created_at" in lots.columns else nat
+    out_at = nat.mask(lots["status"] == "expired", lots["expiry_ts"] if "expiry_ts" in lots.columns else nat)
+    if {"lot_id", "receipt_id", "status"} <= set(receipts.columns):
+        gone = receipts.loc[receipts["status"] == "released", ["lot_id", "receipt_id"]]
+        if {"receipt_id", "status", "confirmed_at"} <= set(releases.columns):
+            done = releases[releases["status"] == "released"].groupby("receipt_id")["confirmed_at"].max()
+            left = gone["receipt_id"].map(done).groupby(gone["lot_id"].to_numpy()).max()
+        else:
+            left = pd.Series(dtype="datetime64[ns, UTC]")
+        released = lots["lot_id"].isin(gone["lot_id"])
+        # a released receipt without a confirmed release time: out on its intake day
+        out_at = out_at.mask(released, lots["lot_id"].map(left)).mask(released & lots["lot_id"].map(left).isna(), in_at)
+    return pd.DataFrame({
+        "lot_id": lots["lot_id"].astype(str).to_numpy(),
+        "tank_id": lots["tank_id"].astype(str).to_numpy(),
+        "owner_entity_id": lots["owner_entity_id"].astype(object).to_numpy(),
+        "liters": pd.to_numeric(lots["quantity_liters"], errors="coerce").fillna(0).to_numpy(),
+        "in_at": pd.to_datetime(in_at, utc=True).array,
+        "out_at": pd.to_datetime(out_at, utc=True).array,
+    })
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "fit":
+        print(best_fit(sys.argv[2], float(sys.argv[3]), sys.argv[4] if len(sys.argv) > 4 else OPEN))
+    else:
+        print(occupancy().to_string(index=False))
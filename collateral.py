@@ -0,0 +1,68 @@
+"""
+Receipt collateral, shared by the advance portfolio (risk.py) and bank liens (liens.py).
+
+Both join their exposures (advances or liens) with the receipt, lot and owner region, value
+the milk at the reference prices in force at a given time and roll the result up:
+
+    df = join_collateral(exposures, receipts, lots, entities, receipt_cols, lot_cols)
+    per_liter, collateral, ltv = value(df, now)       # arrays aligned with df
+    totals(flagged)                                    # exposure, collateral, LTV, margin calls
+"""
+import numpy as np
+import pandas as pd
+
+from prices import price_book
+
+# Exposures are written at up to 0.9 of value; above this the owner has to top up or repay
+MARGIN_CALL_LTV = 0.8
+EXPIRED_STATUS = "expired"
+
+
+def join_collateral(df: pd.DataFrame, receipts, lots, entities, receipt_cols, lot_cols) -> pd.DataFrame:
+    """
+    `df` (with a receipt_id column) joined with its receipt, lot and owner region. A `status`
+    among the receipt or lot columns comes back as receipt_status / lot_status.
+    """
+    df = df.merge(first(receipts, "receipt_id", receipt_cols).rename(columns={"status": "receipt_status"}),
+                  on="receipt_id", how="left")
+    df = df.merge(first(lots, "lot_id", lot_cols).rename(columns={"status": "lot_status"}), on="lot_id", how="left")
+    return df.merge(first(entities, "entity_id", ["region"]).rename(columns={"entity_id": "owner_entity_id"}),
+                    on="owner_entity_id", how="left")
+
+
+def value(df: pd.DataFrame, now=None, book=None):
+    """
+    (xof_per_liter, collateral_xof, ltv) arrays at the reference prices in force at `now`.
+    Expired milk (lot or receipt) is worth nothing; collateral that cannot be valued has no LTV.
+    """
+    now = utc(now)
+    book = book if book is not None else price_book()
+    xof_per_liter = book.lookup(df["product_type"], df["region"], now)
+    collateral = df["quantity_liters"].to_numpy(dtype=float) * xof_per_liter
+    expired = (df["lot_status"] == EXPIRED_STATUS).to_numpy()
+    if "receipt_status" in df.columns:
+        expired |= (df["receipt_status"] == EXPIRED_STATUS).to_numpy()
+    collateral[expired] = 0.0
+    ltv = df["exposure_xof"].to_numpy(dtype=float) / np.where(collateral > 0, collateral, np.nan)
+    return xof_per_liter, collateral, ltv
+
+
+def totals(df: pd.DataFrame) -> dict:
+    collateral = float(df["collateral_xof"].sum())
+    exposure = float(df["exposure_xof"].sum())
+    return {
+        "exposure_xof": exposure,
+        "collateral_xof": collateral,
+        "ltv": round(exposure / collateral, 3) if collateral > 0 else None,
+        "margin_calls": int(df["margin_call"].sum()),
+    }
+
+
+def first(df: pd.DataFrame, key, cols) -> pd.DataFrame:
+    # first occurrence wins, like indexes.lookup
+    return df.drop_duplicates(key)[[key] + cols]
+
+
+def utc(value) -> pd.Timestamp:
+    ts = pd.Timestamp.utcnow() if value is None else pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
@@ -0,0 +1,308 @@
+"""
+Expiry sweeps for lots and receipts.
+
+`ExpiryScheduler` keeps a min-heap of (expiry_ts, table, key) for every lot and receipt
+that can still expire. `sweep()` pops the k entries that are due, re-checks each against
+its current row through the primary-key index, and in one commit:
+
+- sets due lots (active / quarantined, receipt not yet released) to `expired`;
+- applies the state machine's `expired` event to due receipts;
+- flags the active advances on those receipts as under-collateralised (events; the
+  advance risk view values expired collateral at zero).
+
+A sweep costs O(k log n) plus the events appended since the last one. The tables are read
+once, when the scheduler starts; after that the heap is fed from the event journal, which
+every lot and receipt write goes through (`lot_created` and `receipt_issued` carry the row,
+`receipt_status_changed` the new status). The scheduler keeps its byte position in the
+journal and reads only what was appended, so it does not depend on where a backend puts new
+rows. A row whose expiry moved is re-queued under its new time when it is popped. A due
+receipt that is only held back (disputed) is parked and re-queued by the status change that
+makes it expirable again.
+
+    python expiry.py            # sweep every SWEEP_INTERVAL seconds
+    python expiry.py once
+"""
+import os
+import sys
+import json
+import heapq
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import get_backend, ConcurrentUpdateError, VERSION_COL, parse_version
+from table_cache import load_table, invalidate
+from indexes import lookup, lookup_rows
+from state_machine import apply_transitions, TRANSITIONS
+from schemas import timestamps
+from utils import event_rows, event_journal
+
+LOTS_FILE = "dairy_lots.csv"
+RECEIPTS_FILE = "dwr_receipts.csv"
+ADVANCES_FILE = "advances.csv"
+EXPIRED = "expired"
+
+SWEEP_INTERVAL = float(os.environ.get("DWR_EXPIRY_SWEEP_S", 60))
+# Lots still physically in custody; a released receipt means the milk has left
+EXPIRING_LOT_STATUSES = ["active", "quarantined"]
+# table -> (primary key, statuses that can expire, statuses that can become expirable again)
+SOURCES = {
+    LOTS_FILE: ("lot_id", EXPIRING_LOT_STATUSES, []),
+    # a resolved dispute restores the receipt's prior status
+    RECEIPTS_FILE: ("receipt_id", TRANSITIONS[EXPIRED]["from"], ["disputed"]),
+}
+# journal event -> table of the row it creates or moves to a new status
+FEEDS = {"lot_created": LOTS_FILE, "receipt_issued": RECEIPTS_FILE, "receipt_status_changed": RECEIPTS_FILE}
+
+
+class ExpiryScheduler:
+    """Min-heap of upcoming lot and receipt expiries, fed from the event journal."""
+
+    def __init__(self):
+        self._heap = []
+        self._position = None   # journal segment name -> bytes already read
+        self._token = None      # journal version token at the last refresh
+        self._held = {}         # file -> {key: expiry ns} popped while held back
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def next_due(self):
+        """Time of the earliest queued expiry (None if nothing is queued)."""
+        with self._lock:
+            self._refresh()
+            return pd.Timestamp(self._heap[0][0], tz="UTC") if self._heap else None
+
+    def sweep(self, now=None, username="system") -> dict:
+        """Expire everything due at `now`; returns counts and the affected ids."""
+        now_ns = _ns(now)
+        with self._lock:
+            self._refresh()
+            due = []
+            while self._heap and self._heap[0][0] <= now_ns:
+                due.append(heapq.heappop(self._heap))
+            if not due:
+                return _result()
+            lots, receipts = self._check(due, now_ns)
+            expired, results = _receipt_transitions(receipts)
+            updates = {}
+            if lots:
+                updates[LOTS_FILE] = {r["lot_id"]: (parse_version(r.get(VERSION_COL)), {"status": EXPIRED}) for r in lots}
+            if expired:
+                updates[RECEIPTS_FILE] = {r["receipt_id"]: (parse_version(r.get(VERSION_COL)), {"status": EXPIRED})
+                                          for r in expired}
+            if not updates:
+                return _result()
+            advances = _open_advances([r["receipt_id"] for r in expired])
+            try:
+                get_backend().commit({}, updates, _events(lots, results, advances, username), event_journal())
+            except ConcurrentUpdateError:
+                # someone changed one of these rows: retry them all on the next sweep
+                for item in due:
+                    heapq.heappush(self._heap, item)
+                return _result(retry=len(due))
+            finally:
+                for file_name in [*updates, "events.csv"]:
+                    invalidate(file_name)
+
+        return _result(lots=[r["lot_id"] for r in lots], receipts=[r["receipt_id"] for r in expired],
+                       advances=list(advances["advance_id"]))
+
+    # ----------------------------
+    # Queue maintenance
+    # ----------------------------
+    def _refresh(self) -> None:
+        """Fold the events appended since the last call into the heap (the tables only on a fresh start)."""
+        journal = event_journal()
+        token = journal.version_token()
+        if self._position is not None and token == self._token:
+            return
+        if self._position is None or _rewound(journal, self._position):
+            self._start(journal)
+        for name, offset, chunk in journal.iter_from(self._position, columns=["event_type", "object_id", "details_json"]):
+            chunk = chunk[chunk["event_type"].isin(list(FEEDS))]
+            for event_type, key, details in chunk.itertuples(index=False):
+                self._feed(FEEDS[event_type], key, event_type, details)
+            self._position[name] = offset
+        self._token = token
+
+    def _start(self, journal) -> None:
+        """Queue every expirable row of the current tables and read the journal from its end."""
+        # position first: an event written meanwhile is read again, and queuing a row twice is harmless
+        self._position = {os.path.basename(p): os.path.getsize(p) for p in journal._all_paths()}
+        self._heap, self._held = [], {}
+        for file_name, (key_col, statuses, held) in SOURCES.items():
+            df = load_table(file_name)
+            if df.empty or "expiry_ts" not in df.columns:
+                continue
+            rows = df[df["status"].isin(statuses + held)]
+            at = _ns_array(rows["expiry_ts"])
+            keep = at != _NAT
+            self._heap.extend(zip(at[keep].tolist(), [file_name] * int(keep.sum()),
+                                  rows[key_col].astype(str).to_numpy()[keep]))
+        heapq.heapify(self._heap)
+
+    def _feed(self, file_name, key, event_type, details) -> None:
+        """
+        Queue a created row that can expire. A status change only matters for a parked
+        key: back to an expirable status re-queues it, any other non-held status drops it.
+        """
+        _, statuses, held = SOURCES[file_name]
+        try:
+            details = json.loads(details) if details else {}
+        except ValueError:
+            details = {}
+        parked = self._held.get(file_name, {})
+        if event_type == "receipt_status_changed":
+            status = details.get("to")
+            if key not in parked or status in held:
+                return
+            at = parked.pop(key)
+            if status in statuses:
+                heapq.heappush(self._heap, (at, file_name, key))
+            return
+        status, expiry_ts = details.get("status"), details.get("expiry_ts")
+        if status is None or expiry_ts is None:
+            # older events carried less: read the row itself
+            row = lookup(file_name, key) or {}
+            status, expiry_ts = row.get("status"), row.get("expiry_ts")
+        at = _ns(expiry_ts, default=None) if status in statuses + held else None
+        if at is not None:
+            heapq.heappush(self._heap, (at, file_name, key))
+
+    def _check(self, due, now_ns):
+        """
+        Current rows for the popped entries that are still due; moved expiries are re-queued
+        and rows held back by their status are parked.
+        """
+        lots, receipts = {}, {}
+        for _, file_name, key in due:
+            key_col, statuses, held = SOURCES[file_name]
+            row = lookup(file_name, key)
+            at = None if row is None else _ns(row.get("expiry_ts"), default=None)
+            if at is None:
+                continue
+            if row.get("status") in held:
+                self._held.setdefault(file_name, {})[key] = at
+                continue
+            if row.get("status") not in statuses:
+                continue
+            if at > now_ns:
+                heapq.heappush(self._heap, (at, file_name, key))
+                continue
+            (lots if file_name == LOTS_FILE else receipts)[key] = row
+        if lots:
+            # milk whose receipt was released has left custody
+            df = load_table(RECEIPTS_FILE)
+            for key in df.loc[df["lot_id"].isin(list(lots)) & (df["status"] == "released"), "lot_id"].astype(str):
+                lots.pop(key, None)
+        return list(lots.values()), list(receipts.values())
+
+
+def _rewound(journal, position) -> bool:
+    """True if a segment we have read from shrank or vanished (the journal was reset)."""
+    sizes = {os.path.basename(p): os.path.getsize(p) for p in journal._all_paths()}
+    return any(sizes.get(name, -1) < offset for name, offset in position.items())
+
+
+def _receipt_transitions(receipts):
+    if not receipts:
+        return [], pd.DataFrame(columns=["receipt_id", "event", "from_status", "to_status", "ok", "reason"])
+    rows = pd.DataFrame(receipts)
+    _, results = apply_transitions(rows, pd.DataFrame({"receipt_id": rows["receipt_id"], "event": EXPIRED}), log=False)
+    ok = results["ok"].to_numpy()
+    return [r for r, allowed in zip(receipts, ok) if allowed], results[ok]
+
+
+def _open_advances(receipt_ids) -> pd.DataFrame:
+    frames = [lookup_rows(ADVANCES_FILE, ("receipt_id", "status"), (rid, "active")) for rid in receipt_ids]
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=["advance_id", "receipt_id", "advance_xof", "fee_xof"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _events(lots, results, advances, username) -> list:
+    """Journal rows written by the sweep's commit."""
+    events = event_rows(username, "lot_expired", "dairy_lot", [r["lot_id"] for r in lots],
+                        [{"expiry_ts": str(r.get("expiry_ts")), "from": r.get("status")} for r in lots])
+    events += event_rows(username, "receipt_status_changed", "dwr", results["receipt_id"],
+                         [{"event": EXPIRED, "from": f, "to": t}
+                          for f, t in zip(results["from_status"], results["to_status"])])
+    if len(advances):
+        exposure = pd.to_numeric(advances["advance_xof"], errors="coerce").fillna(0) \
+            + pd.to_numeric(advances["fee_xof"], errors="coerce").fillna(0)
+        events += event_rows(username, "advance_under_collateralised", "advance", advances["advance_id"],
+                             [{"receipt_id": r, "reason": "collateral expired", "exposure_xof": float(x)}
+                              for r, x in zip(advances["receipt_id"], exposure)])
+    return events
+
+
+def _result(lots=(), receipts=(), advances=(), retry=0) -> dict:
+    return {"lots_expired": len(lots), "receipts_expired": len(receipts), "advances_flagged": len(advances),
+            "retry": retry, "lot_ids": list(lots), "receipt_ids": list(receipts), "advance_ids": list(advances)}
+
+
+_NAT = np.iinfo(np.int64).min
+
+
+def _ns_array(values) -> np.ndarray:
+    ts = values if isinstance(values.dtype, pd.DatetimeTZDtype) else timestamps(values)
+    return ts.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _ns(value=None, default=_NAT):
+    if value is None:
+        return pd.Timestamp.utcnow().value
+    ts = pd.Timestamp(value) if not isinstance(value, str) else timestamps(pd.Series([value])).iloc[0]
+    if pd.isna(ts):
+        return default
+    return (ts.tz_localize("UTC") if ts.tzinfo is None else ts).value
+
+
+# ----------------------------
+# Background sweeps
+# ----------------------------
+_scheduler = None
+_thread = None
+_start_lock = threading.Lock()
+
+
+def scheduler() -> ExpiryScheduler:
+    global _scheduler
+    with _start_lock:
+        if _scheduler is None:
+            _scheduler = ExpiryScheduler()
+        return _scheduler
+
+
+def run(interval=SWEEP_INTERVAL, stop=None) -> None:
+    """Sweep every `interval` seconds until `stop` is set."""
+    stop = stop or threading.Event()
+    s = scheduler()
+    while not stop.is_set():
+        s.sweep()
+        stop.wait(interval)
+
+
+def start(interval=SWEEP_INTERVAL) -> None:
+    """Run sweeps on a daemon thread of this process (once; later calls do nothing)."""
+    global _thread
+    if interval <= 0:
+        return
+    with _start_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=run, args=(interval,), name="expiry-sweeps", daemon=True)
+            _thread.start()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "once":
+        print({k: v for k, v in scheduler().sweep().items() if not k.endswith("_ids")})
+    else:
+        try:
+            run(float(sys.argv[1]) if len(sys.argv) > 1 else SWEEP_INTERVAL)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,161 @@
+"""
+Sortable, collision-resistant ids.
+
+    gen_id("LOT")           -> "LOT-20261018-0AF3K2M8ZQ4T1B7C"
+    gen_ids("DWR", 500)     -> 500 ids in one call, in order
+
+An id is `<prefix>-<UTC date>-<ms of day: 6 chars><sequence: 10 chars>` in Crockford
+base32, so string order is creation order (like a ULID, but the date stays readable and
+the ids sort after the old `<prefix>-<date>-<6 hex>` ones of earlier days). Within one
+millisecond the 50-bit sequence counts up from a random start, so ids from one process
+are strictly increasing and ids from different processes collide with ~2^-50 odds.
+`id_bounds` turns a time range into an id range, so a sorted id column can be
+range-scanned without parsing timestamps.
+
+Double-clicked buttons: `reserve_id(prefix, idempotency_key(form_token(...), ...))` hands
+out the same id while the page shows the same fill of a form, and the page skips an insert
+whose id already exists. `form_done` starts a new token after a successful submit, so an
+identical next delivery is a new record rather than a duplicate.
+"""
+import json
+import time
+import hashlib
+import secrets
+import threading
+
+import numpy as np
+import pandas as pd
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+TIME_CHARS, SEQ_CHARS = 6, 10
+SEQ_BITS = 5 * SEQ_CHARS
+IDEMPOTENCY_TTL_S = 120
+
+_ALPHABET = np.frombuffer(ALPHABET.encode("ascii"), dtype=np.uint8)
+_INDEX = {c: i for i, c in enumerate(ALPHABET)}
+_DAY_MS = 86_400_000
+
+_lock = threading.Lock()
+_last = (0, 0)          # (epoch ms, last sequence handed out)
+_reserved = {}          # idempotency key -> (id, expires at, monotonic s)
+
+
+def gen_id(prefix: str) -> str:
+    return gen_ids(prefix, 1)[0]
+
+
+def gen_ids(prefix: str, n: int) -> list:
+    """`n` consecutive ids (one clock read, one lock), ascending."""
+    if n <= 0:
+        return []
+    ms, seq = _reserve(n)
+    head = f"{_prefix(prefix)}-{_date(ms)}-{_encode(ms % _DAY_MS, TIME_CHARS)}"
+    if n == 1:
+        return [head + _encode(seq, SEQ_CHARS)]
+    values = seq + np.arange(n, dtype=np.int64)
+    shifts = np.arange(5 * (SEQ_CHARS - 1), -1, -5, dtype=np.int64)
+    chars = _ALPHABET[(values[:, None] >> shifts) & 31]
+    tails = chars.view(f"S{SEQ_CHARS}").ravel().astype(str)
+    return np.char.add(head, tails).tolist()
+
+
+def id_time(id_value) -> pd.Timestamp:
+    """Creation time of an id from gen_id (NaT for other formats)."""
+    try:
+        _, day, tail = str(id_value).rsplit("-", 2)
+        if len(tail) != TIME_CHARS + SEQ_CHARS:
+            return pd.NaT
+        ms = _decode(tail[:TIME_CHARS])
+        return pd.Timestamp(day, tz="UTC") + pd.Timedelta(milliseconds=ms)
+    except (ValueError, KeyError):
+        return pd.NaT
+
+
+def id_bounds(prefix: str, start, end) -> tuple:
+    """(lo, hi) such that `lo <= id < hi` selects the ids created in [start, end)."""
+    return _floor(prefix, start), _floor(prefix, end)
+
+
+# ----------------------------
+# Idempotency
+# ----------------------------
+def form_token(state, form: str) -> str:
+    """Token for the current fill of a form, kept in `state` (st.session_state) until `form_done`."""
+    return state.setdefault(f"form_token:{form}", secrets.token_hex(8))
+
+
+def form_done(state, form: str) -> None:
+    """Drop a form's token after a successful submit; the next submission gets a new one."""
+    state.pop(f"form_token:{form}", None)
+
+
+def idempotency_key(*parts) -> str:
+    """Stable key for one submission (form token or natural key, user, action and field values)."""
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def reserve_id(prefix: str, key: str, ttl=IDEMPOTENCY_TTL_S) -> str:
+    """The id already handed out for `key` in the last `ttl` seconds, or a new one."""
+    now = time.monotonic()
+    with _lock:
+        hit = _reserved.get(key)
+        if hit is not None and hit[1] > now:
+            return hit[0]
+        if len(_reserved) > 4096:
+            for k in [k for k, (_, expires) in _reserved.items() if expires <= now]:
+                del _reserved[k]
+    new = gen_id(prefix)
+    with _lock:
+        # another thread may have reserved the key meanwhile; an expired entry is replaced
+        hit = _reserved.get(key)
+        if hit is None or hit[1] <= now:
+            hit = _reserved[key] = (new, now + ttl)
+        return hit[0]
+
+
+def _reserve(n):
+    global _last
+    now = time.time_ns() // 1_000_000
+    with _lock:
+        ms, seq = _last
+        if now > ms:
+            # random start in the lower half leaves 2^49 ids of headroom in this millisecond
+            ms, seq = now, secrets.randbits(SEQ_BITS - 1)
+        else:
+            seq += 1    # same millisecond (or the clock went back): keep counting
+        if seq + n > 1 << SEQ_BITS:
+            ms, seq = ms + 1, secrets.randbits(SEQ_BITS - 1)
+        _last = (ms, seq + n - 1)
+    return ms, seq
+
+
+def _prefix(prefix: str) -> str:
+    # older call sites passed "LOT-"
+    return str(prefix).rstrip("-")
+
+
+def _date(ms: int) -> str:
+    return time.strftime("%Y%m%d", time.gmtime(ms // 1000))
+
+
+def _encode(value: int, width: int) -> str:
+    out = []
+    for _ in range(width):
+        out.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(out))
+
+
+def _decode(text: str) -> int:
+    value = 0
+    for c in text:
+        value = value * 32 + _INDEX[c]
+    return value
+
+
+def _floor(prefix, ts) -> str:
+    ts = pd.Timestamp(ts)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    ms = ts.value // 1_000_000
+    return f"{_prefix(prefix)}-{_date(ms)}-{_encode(ms % _DAY_MS, TIME_CHARS)}"
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import get_backend, primary_key
+from table_cache import load_table
+
+
+class HashIndex:
+    """Hash index from one or more key columns to row positions of a frame."""
+
+    def __init__(self, df: pd.DataFrame, columns, unique=False):
+        self.df = df
+        self.columns = tuple(columns)
+        self.unique = unique
+        if df.empty or any(c not in df.columns for c in self.columns):
+            self._map = {}
+            return
+        keys = [df[c].astype(str) for c in self.columns]
+        if unique:
+            key = keys[0] if len(keys) == 1 else pd.Series(list(zip(*keys)), index=df.index)
+            # first occurrence wins, like receipts[mask].iloc[0]
+            self._map = dict(zip(key.iloc[::-1], range(len(df) - 1, -1, -1)))
+        else:
+            grouped = pd.DataFrame({i: k for i, k in enumerate(keys)}).groupby(list(range(len(keys))), sort=False).indices
+            self._map = grouped
+
+    def _key(self, key):
+        if len(self.columns) == 1:
+            return str(key[0] if isinstance(key, tuple) else key)
+        return tuple(str(k) for k in key)
+
+    def positions(self, key) -> np.ndarray:
+        pos = self._map.get(self._key(key))
+        if pos is None:
+            return np.empty(0, dtype=np.int64)
+        return np.atleast_1d(pos)
+
+    def get(self, key):
+        pos = self.positions(key)
+        return None if len(pos) == 0 else self.df.iloc[int(pos[0])].to_dict()
+
+    def rows(self, key) -> pd.DataFrame:
+        return self.df.iloc[self.positions(key)]
+
+    def contains(self, key) -> bool:
+        return self._key(key) in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+
+class IndexedTable:
+    """A loaded table plus its lazily built indexes, tied to one version token."""
+
+    def __init__(self, df: pd.DataFrame, token):
+        self.df = df
+        self.token = token
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def index(self, columns, unique=False) -> HashIndex:
+        columns = (columns,) if isinstance(columns, str) else tuple(columns)
+        key = (columns, unique)
+        idx = self._indexes.get(key)
+        if idx is None:
+            with self._lock:
+                idx = self._indexes.get(key)
+                if idx is None:
+                    idx = HashIndex(self.df, columns, unique=unique)
+                    self._indexes[key] = idx
+        return idx
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def indexed_table(file_name) -> IndexedTable:
+    """Return the indexed table, reloading (and dropping its indexes) if the table changed."""
+    backend = get_backend()
+    token = backend.version_token(file_name)
+    table = _tables.get(file_name)
+    if table is not None and table.token == token:
+        return table
+    with _tables_lock:
+        table = _tables.get(file_name)
+        if table is None or table.token != token:
+            table = IndexedTable(load_table(file_name), token)
+            _tables[file_name] = table
+        return table
+
+
+def invalidate(file_name=None) -> None:
+    with _tables_lock:
+        if file_name is None:
+            _tables.clear()
+        else:
+            _tables.pop(file_name, None)
+
+
+def lookup(file_name, key, column=None):
+    """O(1) primary-key lookup; returns the row as a dict or None."""
+    column = column or primary_key(file_name)
+    return indexed_table(file_name).index(column, unique=True).get(key)
+
+
+def lookup_rows(file_name, columns, key) -> pd.DataFrame:
+    """Secondary-index lookup, e.g. lookup_rows("advances.csv", ("receipt_id", "status"), (rid, "active"))."""
+    return indexed_table(file_name).index(columns).rows(key)
+
+
+def exists(file_name, columns, key) -> bool:
+    return indexed_table(file_name).index(columns).contains(key)
@@ -0,0 +1,143 @@
+"""
+Bulk DWR issuance: one receipt per eligible lot in a single transaction, PDFs rendered on a process pool.
+"""
+import io
+import os
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils import gen_ids, make_qr_payload, generate_receipt_pdf
+from indexes import indexed_table, lookup
+from table_cache import load_table
+from transactions import run_in_transaction
+from receipt_pdf import render_receipts
+from schemas import iso
+
+RECEIPTS_FILE = "dwr_receipts.csv"
+LOTS_FILE = "dairy_lots.csv"
+
+# Below this many receipts the pool start-up costs more than it saves
+PARALLEL_MIN = 16
+CHUNK_SIZE = 8
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def eligible_lots(lots: pd.DataFrame) -> pd.DataFrame:
+    """Active lots that do not already have a receipt."""
+    active = lots[lots["status"] == "active"]
+    if "receipt_id" in active.columns:
+        active = active[active["receipt_id"].isna() | (active["receipt_id"].astype(str) == "")]
+    issued = indexed_table(RECEIPTS_FILE).index("lot_id")
+    return active[~active["lot_id"].map(lambda lot_id: issued.contains(lot_id))]
+
+
+def build_receipts(lots: pd.DataFrame, issued_at=None, receipt_ids=None) -> list:
+    issued_at = issued_at or iso(pd.Timestamp.utcnow())
+    rows = []
+    for receipt_id, lot in zip(receipt_ids or gen_ids("DWR", len(lots)), lots.to_dict("records")):
+        expiry = iso(lot["expiry_ts"])
+        rows.append({
+            "receipt_id": receipt_id,
+            "issued_at": issued_at,
+            "lot_id": lot["lot_id"],
+            "owner_entity_id": lot["owner_entity_id"],
+            "custodian_id": lot["custodian_id"],
+            "status": "active",
+            "expiry_ts": expiry,
+            "qr_payload": make_qr_payload(receipt_id, lot["lot_id"], lot["owner_entity_id"], lot["custodian_id"],
+                                          issued_at=issued_at, expiry_ts=expiry),
+            "lien_active": "no",
+            "lien_holder_id": "",
+        })
+    return rows
+
+
+def issue_lots(lots: pd.DataFrame, username, receipt_ids=None) -> list:
+    """
+    Issue receipts for the given lots in one transaction (one table write, one journal write).
+
+    Each lot is re-read and re-checked inside the transaction and claimed by writing the
+    receipt id onto the lot row under its row version, so two concurrent runs cannot both
+    issue a receipt for one lot: the loser retries and skips the lots issued meanwhile.
+    `receipt_ids` (one per lot, e.g. reserved from an idempotency key) replaces fresh ids.
+    """
+    wanted = lots["lot_id"].astype(str).tolist()
+    ids = dict(zip(wanted, receipt_ids)) if receipt_ids is not None else None
+
+    def stage(tx):
+        current = load_table(LOTS_FILE)
+        todo = eligible_lots(current[current["lot_id"].astype(str).isin(wanted)])
+        rows = build_receipts(todo, receipt_ids=[ids[str(l)] for l in todo["lot_id"]] if ids else None)
+        tx.track(LOTS_FILE, todo.to_dict("records"))
+        for r in rows:
+            tx.insert(RECEIPTS_FILE, r)
+            tx.update(LOTS_FILE, r["lot_id"], {"receipt_id": r["receipt_id"]})
+            tx.log(username, "receipt_issued", "dwr", r["receipt_id"], r if ids else {**r, "bulk": True})
+        return rows
+
+    return run_in_transaction(stage)
+
+
+# ----------------------------
+# PDF rendering
+# ----------------------------
+def render_pdfs(receipts, lots_by_id=None, workers=None):
+    """
+    Yield (receipt_id, pdf_bytes) in input order. Large batches are rendered in
+    chunks on a shared process pool so throughput scales with cores.
+    """
+    items = _items(receipts, lots_by_id)
+    if len(items) < PARALLEL_MIN or (workers or os.cpu_count() or 1) == 1:
+        yield from _render_chunk(items)
+        return
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    for rendered in _get_pool(workers).map(_render_chunk, chunks):
+        yield from rendered
+
+
+def pdf_zip(receipts, lots_by_id=None, workers=None) -> bytes:
+    """ZIP of one PDF per receipt; entries are written as chunks come back from the pool."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for receipt_id, pdf in render_pdfs(receipts, lots_by_id, workers):
+            zf.writestr(f"{receipt_id}.pdf", pdf)
+    return buffer.getvalue()
+
+
+def merged_pdf(receipts, lots_by_id=None) -> bytes:
+    """
+    One multi-page PDF with a page per receipt. Drawn on a single canvas: reportlab
+    cannot append pages from separately rendered documents, so this path is not parallel.
+    """
+    return render_receipts(_items(receipts, lots_by_id))
+
+
+def _items(receipts, lots_by_id=None):
+    """(receipt, lot, owner, custodian) tuples; lookups happen here so workers get plain dicts."""
+    lots_by_id = lots_by_id or {}
+    return [
+        (r, lots_by_id.get(r["lot_id"]) or lookup("dairy_lots.csv", r["lot_id"]),
+         lookup("entities.csv", r["owner_entity_id"]), lookup("custodians.csv", r["custodian_id"]))
+        for r in receipts
+    ]
+
+
+def _render_chunk(items):
+    return [(item[0]["receipt_id"], generate_receipt_pdf(*item)) for item in items]
+
+
+def _get_pool(workers=None) -> ProcessPoolExecutor:
+    # spawn rather than fork: the Streamlit server is multi-threaded
+    workers = workers or os.cpu_count() or 1
+    with _pool_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pools[workers] = pool
+        return pool
@@ -0,0 +1,300 @@
+import os
+import io
+import csv
+import time
+import atexit
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+EVENT_COLUMNS = ["event_ts", "username", "event_type", "object_type", "object_id", "details_json"]
+
+# Column names used by the original events.csv header
+LEGACY_COLUMNS = {
+    "timestamp": "event_ts",
+    "actor": "username",
+    "entity_type": "object_type",
+    "entity_id": "object_id",
+}
+
+DEFAULT_SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+class EventJournal:
+    """
+    Append-only event journal stored as rotating CSV segments.
+
+    Each append is a single write to the open segment (O(1) regardless of history).
+    Writes are flushed to the OS immediately so readers see them, and fsync'd in
+    batches of `fsync_every` appends or every `fsync_interval` seconds.
+    Segments rotate when they exceed `max_segment_bytes` or the UTC day changes.
+    """
+
+    def __init__(self, directory, legacy_path=None, max_segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 fsync_every=64, fsync_interval=1.0):
+        self.directory = directory
+        self.legacy_path = legacy_path
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._fh = None
+        self._day = None
+        self._size = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    # ----------------------------
+    # Writing
+    # ----------------------------
+    def append(self, row: dict) -> None:
+        self.append_many([row])
+
+    def append_many(self, rows, sync=False) -> None:
+        """Append rows in one write; `sync` fsyncs now instead of with the next batch."""
+        lines = _lines(rows)
+        if not lines:
+            return
+        data = "".join(lines)
+
+        with self._lock:
+            self._ensure_segment(len(data))
+            self._fh.write(data)
+            self._fh.flush()
+            self._size += len(data.encode("utf-8"))
+            self._pending += len(lines)
+            if sync or self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def position(self):
+        """[newest segment name, its size]: every later append lands at or after it (None if empty)."""
+        paths = self.segments()
+        if not paths:
+            return None
+        return [os.path.basename(paths[-1]), os.path.getsize(paths[-1])]
+
+    def append_missing(self, rows, since=None) -> int:
+        """
+        Append the rows not already in the journal after position `since` (whole rows, matched
+        by their exact line), so replaying an interrupted write never duplicates events.
+        """
+        rows = list(rows)
+        lines = _lines(rows)
+        if not lines:
+            return 0
+        self.flush()
+        name, offset = since or (None, 0)
+        written = set()
+        for path in self.segments():
+            if name is not None and os.path.basename(path) < name:
+                continue
+            with open(path, "rb") as fh:
+                if os.path.basename(path) == name:
+                    fh.seek(offset)
+                written.update(fh.read().decode("utf-8", "replace").splitlines(keepends=True))
+        missing = [row for row, line in zip(rows, lines) if line not in written]
+        self.append_many(missing, sync=True)
+        return len(missing)
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+                self._sync()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fh is not None:
+                self._fh.flush()
+                self._sync()
+                self._fh.close()
+                self._fh = None
+
+    def _sync(self):
+        if self._fh is not None and self._pending:
+            os.fsync(self._fh.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _ensure_segment(self, incoming: int):
+        day = datetime.utcnow().strftime("%Y%m%d")
+        if self._fh is not None and day == self._day and self._size + incoming <= self.max_segment_bytes:
+            return
+
+        if self._fh is not None:
+            self._fh.flush()
+            self._sync()
+            self._fh.close()
+            self._fh = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        todays = [p for p in self.segments() if os.path.basename(p).startswith(f"events-{day}-")]
+        seq = 1
+        if todays:
+            last = todays[-1]
+            seq = _segment_seq(last)
+            if os.path.getsize(last) + incoming > self.max_segment_bytes:
+                seq += 1
+
+        path = os.path.join(self.directory, f"events-{day}-{seq:04d}.csv")
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._fh = open(path, "a", encoding="utf-8", newline="")
+        if is_new:
+            self._fh.write(",".join(EVENT_COLUMNS) + "\n")
+        self._day = day
+        self._size = self._fh.tell()
+
+    # ----------------------------
+    # Reading
+    # ----------------------------
+    def segments(self):
+        if not os.path.isdir(self.directory):
+            return []
+        names = [n for n in os.listdir(self.directory) if n.startswith("events-") and n.endswith(".csv")]
+        return [os.path.join(self.directory, n) for n in sorted(names)]
+
+    def iter_events(self):
+        """Yield events oldest-first as dicts, one segment at a time."""
+        for path in self._all_paths():
+            with open(path, encoding="utf-8", newline="") as fh:
+                reader = csv.DictReader(fh)
+                for row in reader:
+                    yield _normalise(row)
+
+    def iter_chunks(self, chunksize=100_000, columns=None):
+        """Yield events oldest-first as DataFrames of at most `chunksize` rows."""
+        cols = columns or EVENT_COLUMNS
+        for path in self._all_paths():
+            try:
+                chunks = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize)
+                for chunk in chunks:
+                    chunk = chunk.rename(columns=LEGACY_COLUMNS)
+                    for col in cols:
+                        if col not in chunk.columns:
+                            chunk[col] = ""
+                    yield chunk[cols]
+            except pd.errors.EmptyDataError:
+                continue
+
+    def iter_from(self, position=None, chunk_bytes=16 * 1024 * 1024, columns=None):
+        """
+        Yield (segment name, byte offset after the chunk, chunk) for the events after
+        `position` ({segment name: byte offset already read}), oldest first. Each chunk is
+        about `chunk_bytes` of whole rows, so the last offset per segment is the position
+        to resume from with a seek. A row still being written is left for the next call.
+        """
+        cols = columns or EVENT_COLUMNS
+        position = position or {}
+        for path in self._all_paths():
+            name = os.path.basename(path)
+            with open(path, "rb") as fh:
+                header = fh.readline()
+                if not header.endswith(b"\n"):
+                    continue
+                names = [LEGACY_COLUMNS.get(c, c) for c in next(csv.reader([header.decode("utf-8")]))]
+                offset = max(int(position.get(name, 0)), len(header))
+                fh.seek(offset)
+                pending = b""
+                while True:
+                    data = fh.read(chunk_bytes)
+                    if not data:
+                        break
+                    pending += data
+                    cut = _row_boundary(pending)
+                    if not cut:
+                        continue
+                    block, pending = pending[:cut], pending[cut:]
+                    offset += len(block)
+                    chunk = pd.read_csv(io.BytesIO(block), dtype=str, keep_default_na=False, header=None, names=names)
+                    for col in cols:
+                        if col not in chunk.columns:
+                            chunk[col] = ""
+                    yield name, offset, chunk[cols]
+
+    def read_all(self, columns=None) -> pd.DataFrame:
+        chunks = list(self.iter_chunks(columns=columns))
+        if not chunks:
+            return pd.DataFrame(columns=columns or EVENT_COLUMNS)
+        return pd.concat(chunks, ignore_index=True)
+
+    def version_token(self):
+        """Changes whenever an event is appended (segment count + size of the newest segment)."""
+        paths = self._all_paths()
+        if not paths:
+            return None
+        try:
+            return (len(paths), os.path.getsize(paths[-1]))
+        except OSError:
+            return None
+
+    def _all_paths(self):
+        paths = []
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            paths.append(self.legacy_path)
+        return paths + self.segments()
+
+
+def _cell(value):
+    return "" if value is None else value
+
+
+def _lines(rows) -> list:
+    """Each event row as one CSV line, as appended to a segment."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    out = []
+    for row in rows:
+        writer.writerow([_cell(row.get(col)) for col in EVENT_COLUMNS])
+        out.append(buf.getvalue())
+        buf.seek(0)
+        buf.truncate()
+    return out
+
+
+def _segment_seq(path):
+    try:
+        return int(os.path.basename(path).rsplit("-", 1)[1].split(".")[0])
+    except (IndexError, ValueError):
+        return 1
+
+
+def _row_boundary(data: bytes) -> int:
+    """Length of the longest prefix of `data` that ends a CSV row (a newline outside quotes)."""
+    cut = data.rfind(b"\n") + 1
+    while cut and data.count(b'"', 0, cut) % 2:
+        cut = data.rfind(b"\n", 0, cut - 1) + 1
+    return cut
+
+
+def _normalise(row):
+    out = {LEGACY_COLUMNS.get(k, k): v for k, v in row.items()}
+    return {col: out.get(col, "") or "" for col in EVENT_COLUMNS}
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def journal_for(csv_file_path: str) -> EventJournal:
+    """
+    Process-wide journal for a legacy events CSV path, e.g. .../events.csv is
+    journalled into segments under .../events/ and the old file is still read.
+    """
+    with _journals_lock:
+        journal = _journals.get(csv_file_path)
+        if journal is None:
+            directory = os.path.splitext(csv_file_path)[0]
+            journal = EventJournal(directory, legacy_path=csv_file_path)
+            _journals[csv_file_path] = journal
+        return journal
+
+
+@atexit.register
+def _close_all():
+    for journal in list(_journals.values()):
+        try:
+            journal.close()
+        except Exception:
+            pass
@@ -0,0 +1,228 @@
+"""
+Bank liens on receipts.
+
+A pledge starts with the owner: `request_lien` records a `requested` lien on one of the
+owner's receipts, which encumbers nothing. The lender then accepts it with `accept_lien`
+(or declines it; the owner can withdraw it with `decline_lien`). Acceptance activates the
+lien and sets `lien_active` / `lien_holder_id` on the receipt in one unit of work, so the
+state machine's `no_active_lien` guard blocks advances, sales and releases until the lender
+calls `release_lien`. A lender cannot encumber a receipt its owner did not offer. A receipt
+can carry one active lien at a time. A receipt under an in-house advance, a sale, a dispute
+or past expiry cannot be pledged.
+
+Lookups go through indexes, never a scan:
+
+    active_lien("DWR-...")              # receipt -> lien (hash index on liens.csv)
+    pledged("BANK-001")                 # every receipt pledged to a lender, valued now
+
+`PledgeBook` joins the active liens with their receipts, lots and owner regions once per
+table version and keeps a lender index over the result. A lender query is one index hit
+plus the price lookup for that lender's rows.
+
+    python liens.py <lender_id>
+"""
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from storage import get_backend
+from table_cache import load_table
+from indexes import lookup_rows, HashIndex
+from transactions import transaction
+from state_machine import InvalidTransition, validate_guards, no_active_lien, not_expired
+from collateral import join_collateral, value as _value, totals, utc, MARGIN_CALL_LTV
+from ids import gen_id
+
+LIENS_FILE = "liens.csv"
+RECEIPTS_FILE = "dwr_receipts.csv"
+INPUT_FILES = [LIENS_FILE, RECEIPTS_FILE, "dairy_lots.csv", "entities.csv"]
+
+ACTIVE, RELEASED = "active", "released"
+REQUESTED, DECLINED = "requested", "declined"
+# Only an unencumbered, undisputed receipt can be pledged
+PLEDGEABLE_STATUSES = ["active"]
+LIEN_FLAG = "yes"
+
+
+# ----------------------------
+# Create / release
+# ----------------------------
+def request_lien(receipt_id, owner_entity_id, lender_id, principal_xof, interest_xof=0.0, lender_type="bank",
+                 username="system", notes="", lien_id=None) -> dict:
+    """
+    The owner's request to pledge their receipt to `lender_id`; the receipt is untouched
+    until the lender accepts. Raises InvalidTransition if the receipt is not the owner's or
+    cannot be pledged.
+    """
+    lien_id = lien_id or gen_id("LIEN")
+    with transaction() as tx:
+        r = _pledgeable(tx, receipt_id)
+        if str(r.get("owner_entity_id")) != str(owner_entity_id):
+            raise InvalidTransition(f"{receipt_id}: not owned by {owner_entity_id}")
+        row = {
+            "lien_id": lien_id,
+            "receipt_id": receipt_id,
+            "lender_type": lender_type,
+            "lender_id": lender_id,
+            "principal_xof": float(principal_xof),
+            "interest_xof": float(interest_xof),
+            "status": REQUESTED,
+            "created_at": datetime.utcnow().isoformat()+"Z",
+            "released_at": "",
+            "notes": notes,
+        }
+        tx.insert(LIENS_FILE, row)
+        tx.log(username, "lien_requested", "lien", lien_id,
+               {"receipt_id": receipt_id, "owner_entity_id": owner_entity_id, "lender_id": lender_id,
+                "principal_xof": float(principal_xof)})
+    return row
+
+
+def accept_lien(lien_id, username="system", lender_id=None) -> dict:
+    """
+    Accept an owner's pledge request (only by its lender when `lender_id` is given): the lien
+    becomes active and the receipt is flagged in one unit of work. Raises InvalidTransition
+    if the request is not open or the receipt can no longer be pledged.
+    """
+    with transaction() as tx:
+        lien = _lien(tx, lien_id, REQUESTED, lender_id)
+        _pledgeable(tx, lien["receipt_id"])
+        tx.update(LIENS_FILE, lien_id, {"status": ACTIVE})
+        tx.update(RECEIPTS_FILE, lien["receipt_id"], {"lien_active": LIEN_FLAG, "lien_holder_id": lien["lender_id"]})
+        tx.log(username, "lien_created", "lien", lien_id,
+               {"receipt_id": lien["receipt_id"], "lender_id": lien["lender_id"],
+                "principal_xof": float(lien["principal_xof"])})
+    return {**lien, "status": ACTIVE}
+
+
+def decline_lien(lien_id, username="system", lender_id=None, owner_entity_id=None) -> dict:
+    """Decline a pledge request (its lender) or withdraw it (the receipt's owner)."""
+    with transaction() as tx:
+        lien = _lien(tx, lien_id, REQUESTED, lender_id)
+        if owner_entity_id is not None:
+            r = tx.get(RECEIPTS_FILE, lien["receipt_id"]) or {}
+            if str(r.get("owner_entity_id")) != str(owner_entity_id):
+                raise InvalidTransition(f"{lien_id}: requested by another owner")
+        tx.update(LIENS_FILE, lien_id, {"status": DECLINED, "released_at": datetime.utcnow().isoformat()+"Z"})
+        tx.log(username, "lien_declined", "lien", lien_id, {"receipt_id": lien["receipt_id"], "lender_id": lien["lender_id"]})
+    return {**lien, "status": DECLINED}
+
+
+def release_lien(lien_id, username="system", lender_id=None) -> dict:
+    """Release an active lien (only by its lender when `lender_id` is given) and clear the receipt flag."""
+    with transaction() as tx:
+        lien = _lien(tx, lien_id, ACTIVE, lender_id)
+        tx.update(LIENS_FILE, lien_id, {"status": RELEASED, "released_at": datetime.utcnow().isoformat()+"Z"})
+        tx.update(RECEIPTS_FILE, lien["receipt_id"], {"lien_active": "no", "lien_holder_id": ""})
+        tx.log(username, "lien_released", "lien", lien_id, {"receipt_id": lien["receipt_id"], "lender_id": lien["lender_id"]})
+    return {**lien, "status": RELEASED}
+
+
+def _pledgeable(tx, receipt_id) -> dict:
+    r = tx.get(RECEIPTS_FILE, receipt_id)
+    if r is None:
+        raise InvalidTransition(f"{receipt_id}: receipt not found")
+    if r.get("status") not in PLEDGEABLE_STATUSES:
+        raise InvalidTransition(f"{receipt_id}: cannot pledge a receipt in status '{r.get('status')}'")
+    reason = validate_guards(r, [no_active_lien, not_expired])
+    if reason:
+        raise InvalidTransition(f"{receipt_id}: {reason}")
+    return r
+
+
+def _lien(tx, lien_id, status, lender_id=None) -> dict:
+    lien = tx.get(LIENS_FILE, lien_id)
+    if lien is None:
+        raise InvalidTransition(f"{lien_id}: lien not found")
+    if lien.get("status") != status:
+        raise InvalidTransition(f"{lien_id}: lien is {lien.get('status')}")
+    if lender_id is not None and lien.get("lender_id") != lender_id:
+        raise InvalidTransition(f"{lien_id}: held by another lender")
+    return lien
+
+
+# ----------------------------
+# Lookups
+# ----------------------------
+def active_lien(receipt_id):
+    """The active lien on a receipt as a dict, or None (receipt -> lien hash index)."""
+    rows = lookup_rows(LIENS_FILE, ("receipt_id", "status"), (receipt_id, ACTIVE))
+    return None if rows.empty else rows.iloc[0].to_dict()
+
+
+def lender_liens(lender_id, status=ACTIVE) -> pd.DataFrame:
+    return lookup_rows(LIENS_FILE, ("lender_id", "status"), (lender_id, status))
+
+
+class PledgeBook:
+    """Active liens joined with their collateral, indexed by lender, for one version of the inputs."""
+
+    def __init__(self, liens, receipts, lots, entities, token=None):
+        self.token = token
+        self.df = join_pledged(liens, receipts, lots, entities)
+        self.by_lender = HashIndex(self.df, ["lender_id"])
+
+    def pledged(self, lender_id, now=None, book=None) -> pd.DataFrame:
+        return value(self.by_lender.rows(lender_id), now, book)
+
+
+def join_pledged(liens, receipts, lots, entities) -> pd.DataFrame:
+    """Active liens with receipt, lot and owner region (the part that only changes with the tables)."""
+    cols = ["lien_id", "receipt_id", "lender_id", "principal_xof", "interest_xof", "created_at"]
+    df = liens.loc[liens["status"] == ACTIVE, cols].reset_index(drop=True) if len(liens) else \
+        pd.DataFrame(columns=cols)
+    df = join_collateral(df, receipts, lots, entities, ["lot_id", "owner_entity_id", "custodian_id", "status", "expiry_ts"],
+                         ["product_type", "quantity_liters", "status"])
+    df["exposure_xof"] = df["principal_xof"].fillna(0) + df["interest_xof"].fillna(0)
+    return df
+
+
+def value(df: pd.DataFrame, now=None, book=None) -> pd.DataFrame:
+    """Collateral value, LTV and margin-call flag at the reference prices in force at `now`."""
+    now = utc(now)
+    xof_per_liter, collateral, ltv = _value(df, now, book)
+    return df.assign(
+        xof_per_liter=xof_per_liter,
+        collateral_xof=np.nan_to_num(collateral),
+        ltv=np.round(ltv, 3),
+        hours_to_expiry=((df["expiry_ts"] - now) / pd.Timedelta(hours=1)).round(1),
+        margin_call=~(ltv < MARGIN_CALL_LTV),
+    )
+
+
+_book = None
+_book_lock = threading.Lock()
+
+
+def pledge_book() -> PledgeBook:
+    """The book for the current liens, receipts, lots and entities, rebuilt only when one changes."""
+    global _book
+    backend = get_backend()
+    token = tuple(backend.version_token(f) for f in INPUT_FILES)
+    book = _book
+    if book is not None and book.token == token:
+        return book
+    with _book_lock:
+        if _book is None or _book.token != token:
+            _book = PledgeBook(*(load_table(f) for f in INPUT_FILES), token=token)
+        return _book
+
+
+def pledged(lender_id, now=None) -> pd.DataFrame:
+    """Every receipt pledged to `lender_id`, with its current collateral value and LTV."""
+    return pledge_book().pledged(lender_id, now)
+
+
+def summary(df: pd.DataFrame) -> dict:
+    return {"liens": len(df), **totals(df)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python liens.py <lender_id>")
+    book = pledged(sys.argv[1])
+    print(summary(book))
+    print(book.to_string(index=False))
@@ -1,6 +1,9 @@
 import streamlit as st
 from auth import require_login
 from utils import load_csv_schema
+from schemas import columns
+from table_cache import cache_stats
+from snapshots import read_table
 import pandas as pd
 
 # ----------------------------
@@ -20,35 +23,8 @@ if st.sidebar.button("Logout"):
     st.rerun()
 
 # ----------------------------
-# Seed schemas + load data
+# Seed data + load (columns and dtypes come from schemas.TABLES)
 # ----------------------------
-entity_schema = [
-    "entity_id", "entity_type", "name", "contact_name",
-    "phone", "region", "legal_status", "mobile_money_id"
-]
-custodian_schema = [
-    "custodian_id", "custodian_type", "name", "region",
-    "license_status", "power_source", "notes"
-]
-tank_schema = [
-    "tank_id", "custodian_id", "capacity_liters", "cooling_type",
-    "temp_min_c", "temp_max_c", "status", "ownership_model",
-    "owner_entity_id", "rent_xof_per_day", "rent_to_own_months",
-    "purchase_price_xof"
-]
-lot_schema = [
-    "lot_id", "created_at", "owner_entity_id", "custodian_id", "tank_id",
-    "product_type", "quantity_liters", "fat_pct", "snf_pct", "acidity",
-    "antibiotic_test", "bacterial_score", "temp_avg_c", "temp_breach_count",
-    "collection_time", "chill_time", "expiry_ts", "quality_grade",
-    "status", "notes"
-]
-receipt_schema = [
-    "receipt_id", "issued_at", "lot_id", "owner_entity_id",
-    "custodian_id", "status", "expiry_ts", "qr_payload",
-    "lien_active", "lien_holder_id"
-]
-
 seed_entities = pd.DataFrame([
     ["E-WG-001", "women_group", "Association Femmes Laitières de Sikasso", "Awa Traoré", "+22370000001", "Sikasso", "informal_registered", "OM-AWA-001"],
     ["E-WI-001", "woman_individual", "Fatoumata Diallo (Transformatrice)", "Fatoumata Diallo", "+22370000002", "Koulikoro", "informal_registered", "OM-FAT-001"],
@@ -56,25 +32,29 @@ seed_entities = pd.DataFrame([
     ["E-COMP-001", "company", "LaitMali SARL", "Moussa Keita", "+22370000004", "Bamako", "formal", "OM-LAIT-001"],
     ["E-BUY-001", "buyer", "Hôpital Régional Sikasso", "Procurement", "+22370000005", "Sikasso", "formal", "OM-HOSP-001"],
     ["E-PLAT-001", "platform", "Mali Dairy DWR Platform", "Admin", "+22370000099", "Bamako", "formal", "PLAT"],
-], columns=entity_schema)
+], columns=columns("entities.csv"))
 
 seed_custodians = pd.DataFrame([
     ["C-MCC-001", "mcc", "Centre de Collecte Sikasso", "Sikasso", "licensed", "solar+grid", "Chilling available"],
     ["C-CHILL-001", "chilling_center", "Chiller Koulikoro", "Koulikoro", "licensed", "grid", "Bulk tank"],
     ["C-PROC-001", "processor", "Mini-Usine Bamako", "Bamako", "licensed", "grid", "Yogurt/butter processing"],
-], columns=custodian_schema)
+], columns=columns("custodians.csv"))
 
 seed_tanks = pd.DataFrame([
-    ["T-500-001", "C-MCC-001", 500, "direct_expansion", 2, 6, "available", "rental", "E-PLAT-001", 5000, 12, 2500000],
-    ["T-1000-001", "C-CHILL-001", 1000, "ice_bank", 2, 6, "available", "rent_to_own", "E-PLAT-001", 8000, 18, 4200000],
-    ["T-300-001", "C-PROC-001", 300, "direct_expansion", 2, 6, "occupied", "owned", "E-COMP-001", 0, 0, 1800000],
-], columns=tank_schema)
+    ["T-500-001", "C-MCC-001", 500, "direct_expansion", 2, 6, "available", "rental", "E-PLAT-001", 5000, 12, 2500000, "", "", ""],
+    ["T-1000-001", "C-CHILL-001", 1000, "ice_bank", 2, 6, "available", "rent_to_own", "E-PLAT-001", 8000, 18, 4200000, "", "", ""],
+    ["T-300-001", "C-PROC-001", 300, "direct_expansion", 2, 6, "occupied", "owned", "E-COMP-001", 0, 0, 1800000, "", "", ""],
+], columns=columns("tanks.csv"))
+
+entities = load_csv_schema("entities.csv", seed_df=seed_entities)
+custodians = load_csv_schema("custodians.csv", seed_df=seed_custodians)
+tanks = load_csv_schema("tanks.csv", seed_df=seed_tanks)
+load_csv_schema("dairy_lots.csv")
+load_csv_schema("dwr_receipts.csv")
 
-entities = load_csv_schema("entities.csv", entity_schema, seed_df=seed_entities)
-custodians = load_csv_schema("custodians.csv", custodian_schema, seed_df=seed_custodians)
-tanks = load_csv_schema("tanks.csv", tank_schema, seed_df=seed_tanks)
-lots = load_csv_schema("dairy_lots.csv", lot_schema, seed_df=pd.DataFrame(columns=lot_schema))
-receipts = load_csv_schema("dwr_receipts.csv", receipt_schema, seed_df=pd.DataFrame(columns=receipt_schema))
+# Dashboard figures come from the typed Parquet snapshots, reading only the columns they use
+lots = read_table("dairy_lots.csv", columns=["created_at", "quantity_liters", "status"])
+receipts = read_table("dwr_receipts.csv", columns=["status"], filters=[("status", "==", "active")])
 
 # ----------------------------
 # Home dashboard
@@ -91,8 +71,13 @@ if not custodians.empty and "license_status" in custodians.columns:
 c2.metric("Licensed custodians", licensed_count)
 
 c3.metric("Tanks", len(tanks))
-c4.metric("Active lots", len(lots[lots["status"].fillna("") == "active"]))
-c5.metric("Active receipts", len(receipts[receipts["status"].fillna("") == "active"]))
+c4.metric("Active lots", int((lots["status"] == "active").sum()))
+c5.metric("Active receipts", len(receipts))
+
+if not lots.empty:
+    intake = lots.dropna(subset=["created_at"]).groupby(lots["created_at"].dt.strftime("%Y-%m"))["quantity_liters"].sum()
+    st.caption("Liters received per month")
+    st.bar_chart(intake)
 
 st.subheader("Pilot flow")
 st.markdown("""1) **Tanks & Storage** (rent / rent-to-own)  
@@ -102,3 +87,7 @@ st.markdown("""1) **Tanks & Storage** (rent / rent-to-own)
 5) **Sale contract + mobile money settlement** (auto-repay advances)  
 6) **Release order** (dispatch)  
 7) **Audit & Cold-chain SLA** (oversight)""")
+
+if user.get("role") in ["platform", "admin"]:
+    with st.expander("Table cache"):
+        st.json(cache_stats())
@@ -1,5 +1,6 @@
 import streamlit as st
-from utils import load_csv
+from audit_query import audit_index, PAGE_SIZE
+from projections import check
 from auth import require_login
 user = require_login()
 
@@ -7,20 +8,57 @@ user = require_login()
 st.set_page_config(page_title="Audit Log", layout="wide")
 st.title("Audit Log (Append-only)")
 
-events = load_csv("events.csv")
-if events.empty:
+index = audit_index()
+event_types = index.facets("t:")
+object_types = index.facets("o:")
+
+if not event_types:
     st.info("No events yet.")
     st.stop()
 
 c1,c2,c3 = st.columns(3)
-et = c1.selectbox("Event type", ["All"] + sorted(events["event_type"].dropna().unique().tolist()))
-ent = c2.selectbox("Entity type", ["All"] + sorted(events["entity_type"].dropna().unique().tolist()))
-search = c3.text_input("Search")
-
-df = events.copy()
-if et != "All": df = df[df["event_type"]==et]
-if ent != "All": df = df[df["entity_type"]==ent]
-if search.strip():
-    s = search.strip()
-    df = df[df["entity_id"].astype(str).str.contains(s, na=False) | df["details_json"].astype(str).str.contains(s, na=False)]
-st.dataframe(df.sort_values("timestamp", ascending=False).head(400), use_container_width=True)
+et = c1.selectbox("Event type", ["All"] + event_types)
+ent = c2.selectbox("Object type", ["All"] + object_types)
+search = c3.text_input("Search (object id or details value, prefix)")
+filters = {"event_type": et, "object_type": ent, "search": search}
+
+# Cursor stack for the pages already visited; any filter change starts again from the newest event
+if st.session_state.get("audit_filters") != filters:
+    st.session_state["audit_filters"] = filters
+    st.session_state["audit_cursors"] = [None]
+cursors = st.session_state["audit_cursors"]
+
+page, next_cursor = index.query(cursor=cursors[-1], limit=PAGE_SIZE, **filters)
+total = index.count(**filters)
+
+if page.empty:
+    st.info("No matching events.")
+    st.stop()
+
+first = (len(cursors) - 1) * PAGE_SIZE
+st.caption(f"Events {first + 1:,}–{first + len(page):,} of {total:,}, newest first")
+st.dataframe(page, use_container_width=True, hide_index=True)
+
+p1,p2,_ = st.columns([1,1,6])
+if p1.button("← Newer", disabled=len(cursors) == 1):
+    cursors.pop()
+    st.rerun()
+if p2.button("Older →", disabled=next_cursor is None):
+    cursors.append(next_cursor)
+    st.rerun()
+
+# ----------------------------
+# Journal vs tables
+# ----------------------------
+if user["role"] in ["platform","admin"]:
+    st.markdown("---")
+    st.subheader("Journal vs tables")
+    st.caption("Receipts, advances and sale contracts replayed from this log and compared with the stored tables.")
+    if st.button("Run consistency check"):
+        issues = check()
+        if issues.empty:
+            st.success("The tables match the journal.")
+        else:
+            st.warning(f"{len(issues):,} disagreement(s) between the tables and the journal.")
+            st.dataframe(issues.groupby(["table","issue"]).size().rename("rows").reset_index(), hide_index=True)
+            st.dataframe(issues, use_container_width=True, hide_index=True)
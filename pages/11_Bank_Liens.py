@@ -0,0 +1,158 @@
+import streamlit as st
+from utils import load_csv
+from ids import reserve_id, idempotency_key, form_token, form_done
+from indexes import lookup
+from transactions import ConcurrentUpdateError
+from state_machine import InvalidTransition, no_active_lien, not_expired
+from liens import (pledged, summary, lender_liens, request_lien, accept_lien, decline_lien, release_lien,
+                   PLEDGEABLE_STATUSES, REQUESTED, MARGIN_CALL_LTV)
+from prices import price
+from auth import require_login
+user = require_login()
+
+
+st.set_page_config(page_title="Bank Liens", layout="wide")
+st.title("Bank Liens — Receipt-backed lending")
+
+if user["role"] not in ["bank","platform","admin","owner"]:
+    st.error("Access denied. Bank or owner role required.")
+    st.stop()
+
+# ----------------------------
+# Owner: offer a receipt as collateral
+# ----------------------------
+if user["role"] == "owner":
+    owner_id = user["entity_id"]
+    st.subheader("Pledge a receipt to a lender")
+    st.caption("The lender sees your request and accepts or declines it; the receipt is only encumbered once accepted.")
+    receipts = load_csv("dwr_receipts.csv")
+    mine = receipts[receipts["owner_entity_id"] == owner_id]
+    eligible = mine[mine["status"].isin(PLEDGEABLE_STATUSES) & no_active_lien(mine) & not_expired(mine)]
+    if eligible.empty:
+        st.info("No unencumbered active receipts to pledge.")
+    else:
+        receipt_id = st.selectbox("Receipt", eligible["receipt_id"].tolist())
+        r = lookup("dwr_receipts.csv", receipt_id)
+        lot = lookup("dairy_lots.csv", r["lot_id"]) or {}
+        owner = lookup("entities.csv", owner_id) or {}
+        est_value = float(lot.get("quantity_liters") or 0) * price(lot.get("product_type"), owner.get("region"))
+        st.caption(f"{lot.get('product_type', '')} {lot.get('quantity_liters', '')} L • estimated value {est_value:,.0f} XOF")
+        lender_id = st.text_input("Lender entity ID", value="BANK-001")
+        principal = st.number_input("Principal (XOF)", min_value=0.0, value=float(int(est_value*0.6)), step=5000.0)
+        interest = st.number_input("Interest (XOF)", min_value=0.0, value=float(int(principal*0.03)), step=1000.0)
+        notes = st.text_input("Loan reference / notes")
+
+        if st.button("Request lien", type="primary"):
+            lien_id = reserve_id("LIEN", idempotency_key(form_token(st.session_state, "lien_requested"),
+                                                         user["username"], "lien_requested", receipt_id, lender_id, principal, interest))
+            if lookup("liens.csv", lien_id) is not None:
+                st.info(f"Request {lien_id} was already sent.")
+                st.stop()
+            try:
+                request_lien(receipt_id, owner_id, lender_id, principal, interest, username=user["username"],
+                             notes=notes, lien_id=lien_id)
+            except InvalidTransition as e:
+                st.error(f"Pledge not allowed: {e}")
+                st.stop()
+            form_done(st.session_state, "lien_requested")
+            st.success(f"Pledge request {lien_id} sent to {lender_id}.")
+
+    st.markdown("---")
+    st.subheader("Your open pledge requests")
+    liens = load_csv("liens.csv")
+    requests = liens[(liens["status"] == REQUESTED) & liens["receipt_id"].isin(mine["receipt_id"])]
+    if requests.empty:
+        st.info("No open requests.")
+        st.stop()
+    st.dataframe(requests[["lien_id","receipt_id","lender_id","principal_xof","interest_xof","created_at"]],
+                 use_container_width=True, hide_index=True)
+    lien_id = st.selectbox("Request", requests["lien_id"].tolist())
+    if st.button("Withdraw request"):
+        try:
+            decline_lien(lien_id, username=user["username"], owner_entity_id=owner_id)
+        except InvalidTransition as e:
+            st.error(f"Withdrawal not allowed: {e}")
+            st.stop()
+        except ConcurrentUpdateError:
+            st.error("Request was updated by another user. Please retry.")
+            st.stop()
+        st.success(f"Request {lien_id} withdrawn.")
+    st.stop()
+
+lender_id = user["entity_id"] if user["role"]=="bank" else st.text_input("Lender entity ID", value="BANK-001")
+
+# ----------------------------
+# Pledged portfolio
+# ----------------------------
+st.subheader(f"Receipts pledged to {lender_id}")
+book = pledged(lender_id)
+totals = summary(book)
+m1,m2,m3,m4,m5 = st.columns(5)
+m1.metric("Active liens", totals["liens"])
+m2.metric("Exposure (XOF)", f"{totals['exposure_xof']:,.0f}")
+m3.metric("Collateral (XOF)", f"{totals['collateral_xof']:,.0f}")
+m4.metric("LTV", "-" if totals["ltv"] is None else f"{totals['ltv']:.0%}")
+m5.metric(f"Margin calls (LTV ≥ {MARGIN_CALL_LTV:.0%})", totals["margin_calls"])
+if not book.empty:
+    st.dataframe(book[["lien_id","receipt_id","owner_entity_id","custodian_id","receipt_status","product_type",
+                       "quantity_liters","exposure_xof","collateral_xof","ltv","hours_to_expiry","margin_call"]],
+                 use_container_width=True, hide_index=True)
+
+# ----------------------------
+# Owner requests
+# ----------------------------
+st.markdown("---")
+st.subheader("Pledge requests from owners")
+requests = lender_liens(lender_id, REQUESTED)
+if requests.empty:
+    st.info("No pending pledge requests. Owners offer their receipts from this page.")
+else:
+    st.dataframe(requests[["lien_id","receipt_id","principal_xof","interest_xof","created_at","notes"]],
+                 use_container_width=True, hide_index=True)
+    request_id = st.selectbox("Request", requests["lien_id"].tolist())
+    r = lookup("dwr_receipts.csv", requests.loc[requests["lien_id"]==request_id, "receipt_id"].iloc[0]) or {}
+    lot = lookup("dairy_lots.csv", r.get("lot_id")) or {}
+    owner = lookup("entities.csv", r.get("owner_entity_id")) or {}
+    est_value = float(lot.get("quantity_liters") or 0) * price(lot.get("product_type"), owner.get("region"))
+    st.caption(f"Owner {r.get('owner_entity_id', '')} • {lot.get('product_type', '')} {lot.get('quantity_liters', '')} L "
+               f"• estimated value {est_value:,.0f} XOF")
+    a1, a2 = st.columns(2)
+    accept, decline = a1.button("Accept and register lien", type="primary"), a2.button("Decline")
+    if accept or decline:
+        try:
+            if accept:
+                accept_lien(request_id, username=user["username"], lender_id=lender_id)
+            else:
+                decline_lien(request_id, username=user["username"], lender_id=lender_id)
+        except InvalidTransition as e:
+            st.error(f"Not allowed: {e}")
+            st.stop()
+        except ConcurrentUpdateError:
+            st.error("Receipt or request was updated by another user. Please retry.")
+            st.stop()
+        if accept:
+            st.success(f"Lien registered: {request_id}. The receipt cannot be sold or released until the lien is released.")
+        else:
+            st.success(f"Request {request_id} declined.")
+
+# ----------------------------
+# Release a lien
+# ----------------------------
+st.markdown("---")
+st.subheader("Release a lien (loan repaid)")
+active = lender_liens(lender_id)
+if active.empty:
+    st.info("No active liens.")
+    st.stop()
+
+lien_id = st.selectbox("Active lien", active["lien_id"].tolist())
+if st.button("Release lien"):
+    try:
+        release_lien(lien_id, username=user["username"], lender_id=lender_id if user["role"]=="bank" else None)
+    except InvalidTransition as e:
+        st.error(f"Release not allowed: {e}")
+        st.stop()
+    except ConcurrentUpdateError:
+        st.error("Lien or receipt was updated by another user. Please retry.")
+        st.stop()
+    st.success(f"Lien {lien_id} released.")
@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
-from utils import load_csv, save_csv, log_event
+from datetime import datetime, timedelta
+from utils import load_csv, update_row, log_event
 from auth import require_login
+from capacity import occupancy, POOLED_MODEL
+from billing import close, confirm_invoice, equity, REF_TYPES, DAYS_PER_MONTH
+from transactions import ConcurrentUpdateError
 
 # ----------------------------
 # Page config MUST be first
@@ -47,12 +51,55 @@ if not custodians.empty and "custodian_id" in tanks.columns and "custodian_id" i
 else:
     view = tanks.copy()
 
+# Liters committed by the lots in each tank; pay-per-liter tanks are shared by many owners
+usage = occupancy()[["tank_id", "committed_liters", "free_liters", "utilisation", "owners"]]
+view = view.merge(usage, on="tank_id", how="left")
+
 sort_cols = [c for c in ["status", "capacity_liters"] if c in view.columns]
 if sort_cols:
     view = view.sort_values(sort_cols)
 
 st.dataframe(view, use_container_width=True)
 
+# ----------------------------
+# Rent & rent-to-own
+# ----------------------------
+st.markdown("---")
+st.subheader("Rent & rent-to-own")
+
+stakes = equity()
+payments = load_csv("payments.csv")
+open_invoices = payments[payments["ref_type"].isin(list(REF_TYPES.values())) & (payments["status"] == "pending")]
+if user.get("role") == "owner":
+    stakes = stakes[stakes["owner_entity_id"] == user.get("entity_id")]
+    open_invoices = open_invoices[open_invoices["payer_id"] == user.get("entity_id")]
+
+st.caption("Rent-to-own equity (earned by paid days)")
+st.dataframe(stakes, use_container_width=True)
+st.caption(f"Open rent invoices: {len(open_invoices)} ({open_invoices['amount_xof'].sum():,.0f} XOF)")
+st.dataframe(open_invoices[["payment_id", "ref_type", "ref_id", "payer_id", "amount_xof", "period_start", "period_end"]],
+             use_container_width=True)
+
+if user.get("role") in ["platform", "admin"] and st.button("Close billing through today"):
+    report = close(username=user.get("username", "unknown"))
+    st.success(f"{len(report['invoices'])} invoices, {report['total_xof']:,.0f} XOF for {report['tank_days']} tank-days."
+               + (f" Ownership transferred: {', '.join(report['transferred'])}." if report["transferred"] else ""))
+
+if user.get("role") in ["platform", "admin"] and not open_invoices.empty:
+    c1, c2 = st.columns(2)
+    invoice_id = c1.selectbox("Invoice paid", open_invoices["payment_id"].tolist())
+    provider_ref = c2.text_input("Payment reference")
+    if st.button("Confirm payment"):
+        try:
+            confirm_invoice(invoice_id, username=user.get("username", "unknown"), provider_ref=provider_ref)
+        except (KeyError, ValueError) as e:
+            st.error(str(e))
+            st.stop()
+        except ConcurrentUpdateError:
+            st.error("Invoice was updated by another user. Please retry.")
+            st.stop()
+        st.success(f"Invoice {invoice_id} confirmed. Rent-to-own equity counts it from the next billing close.")
+
 # ----------------------------
 # Tank request
 # ----------------------------
@@ -83,19 +130,28 @@ if st.button("Submit request", type="primary"):
     idx = match_idx[0]
 
     current_status = str(tanks.loc[idx, "status"]) if "status" in tanks.columns else ""
-    if current_status != "available":
+    current_model = str(tanks.loc[idx, "ownership_model"]) if "ownership_model" in tanks.columns else ""
+    # a pooled tank keeps taking owners; the custodian checks liters at intake
+    joins_pool = model == POOLED_MODEL and current_model == POOLED_MODEL
+    if current_status != "available" and not joins_pool:
         st.error("Tank not available.")
     else:
-        # ensure required columns exist
-        for col in ["status", "ownership_model", "owner_entity_id"]:
-            if col not in tanks.columns:
-                tanks[col] = None
-
-        tanks.loc[idx, "status"] = "occupied"
-        tanks.loc[idx, "ownership_model"] = model
-        tanks.loc[idx, "owner_entity_id"] = user.get("entity_id", "")
-
-        save_csv(tanks, "tanks.csv")
+        # billing accrues from assigned_at; rental and rent-to-own stop at contract_until
+        now = datetime.utcnow()
+        term = timedelta(days=int(days) * (DAYS_PER_MONTH if model == "rent_to_own" else 1))
+        if joins_pool:
+            update_row("tanks.csv", tank_id, {"status": "occupied"})
+        elif model == POOLED_MODEL:
+            update_row("tanks.csv", tank_id, {"status": "occupied", "ownership_model": model,
+                                              "assigned_at": now.isoformat()+"Z", "contract_until": ""})
+        else:
+            update_row("tanks.csv", tank_id, {
+                "status": "occupied",
+                "ownership_model": model,
+                "owner_entity_id": user.get("entity_id", ""),
+                "assigned_at": now.isoformat()+"Z",
+                "contract_until": (now + term).isoformat()+"Z",
+            })
 
         log_event(
             user.get("username", "unknown"),
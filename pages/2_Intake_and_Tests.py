@@ -1,7 +1,13 @@
 import streamlit as st
 import pandas as pd
+import time
 from datetime import datetime, timedelta
-from utils import load_csv, save_csv, log_event, gen_id
+from utils import load_csv
+from ids import reserve_id, idempotency_key, form_token, form_done
+from indexes import lookup
+from telemetry import read_readings, summarize, DEFAULT_WINDOW
+from capacity import capacity_book, create_lot, CapacityError
+from transactions import ConcurrentUpdateError
 from auth import require_login
 user = require_login()
 
@@ -28,13 +34,30 @@ if avail_tanks.empty:
     st.warning("No tanks registered for this custodian.")
     st.stop()
 
-tank_id = st.selectbox("Tank ID", avail_tanks["tank_id"].tolist())
 owner_entity_id = st.selectbox("Owner entity", entities["entity_id"].tolist())
 product_type = st.selectbox("Product", ["raw_milk","yogurt","butter","ghee","cheese"])
 quantity = st.number_input("Quantity (liters)", min_value=1.0, value=50.0, step=1.0)
+
+# Tanks this owner may use (pooled, available or their own), tightest fit first
+book = capacity_book()
+open_tanks = [t for _, t in book.candidates(custodian_id, owner_entity_id)]
+if not open_tanks:
+    st.warning("No tank of this custodian is open to this owner (rented tanks only take their renter's milk).")
+    st.stop()
+fit = book.best_fit(custodian_id, quantity, owner_entity_id)
+tank_id = st.selectbox("Tank ID", open_tanks, index=open_tanks.index(fit) if fit in open_tanks else 0,
+                       format_func=lambda t: f"{t} — {book.free(t):,.0f} L free")
+if fit is None:
+    st.warning(f"No tank has {quantity:,.0f} L free for this owner.")
+tank = avail_tanks[avail_tanks["tank_id"]==tank_id].iloc[0]
+recent = read_readings(tank_id, start=time.time() - DEFAULT_WINDOW)
+live = summarize(recent, tank["temp_min_c"], tank["temp_max_c"]) if not recent.empty else None
+if live:
+    st.caption(f"Tank telemetry, last hour: {live['readings']} readings, avg {live['temp_avg_c']} °C, "
+               f"{live['temp_breach_count']} breaches. The sensor feed keeps these figures up to date on the lot.")
 fat_pct = st.number_input("Fat %", min_value=0.0, value=4.0, step=0.1)
 antibiotic = st.selectbox("Antibiotic rapid test", ["pass","fail","not_tested"])
-temp_avg = st.number_input("Avg temp (°C)", value=4.0, step=0.1)
+temp_avg = st.number_input("Avg temp (°C)", value=float(live["temp_avg_c"]) if live else 4.0, step=0.1)
 breaches = st.number_input("Temp breaches (count)", min_value=0, value=0, step=1)
 quality = st.selectbox("Quality grade", ["A","B","C"])
 notes = st.text_input("Notes")
@@ -44,7 +67,14 @@ expiry = datetime.utcnow() + timedelta(hours=hours[product_type])
 
 if st.button("Create Dairy Lot", type="primary"):
     status = "quarantined" if antibiotic=="fail" else "active"
-    lot_id = gen_id("LOT-", 8)
+    # the same fill of the form submitted twice (double click) maps to the same lot id;
+    # the token is renewed once the lot is created, so an identical next delivery is a new lot
+    lot_id = reserve_id("LOT", idempotency_key(form_token(st.session_state, "lot_created"), user["username"], "lot_created",
+                                               owner_entity_id, custodian_id, tank_id, product_type, quantity, fat_pct,
+                                               antibiotic, temp_avg, breaches, quality, notes))
+    if lookup("dairy_lots.csv", lot_id) is not None:
+        st.info(f"Lot {lot_id} was already created.")
+        st.stop()
     row = {
         "lot_id": lot_id,
         "created_at": datetime.utcnow().isoformat()+"Z",
@@ -67,9 +97,15 @@ if st.button("Create Dairy Lot", type="primary"):
         "status": status,
         "notes": notes,
     }
-    lots = pd.concat([lots, pd.DataFrame([row])], ignore_index=True)
-    save_csv(lots, "dairy_lots.csv")
-    log_event(user["username"], "lot_created", "dairy_lot", lot_id, {"custodian_id": custodian_id, "owner": owner_entity_id, "status": status})
+    try:
+        create_lot(row, user["username"])
+    except CapacityError as e:
+        st.error(str(e))
+        st.stop()
+    except ConcurrentUpdateError:
+        st.error("Tank was updated by another user. Please retry.")
+        st.stop()
+    form_done(st.session_state, "lot_created")
     if status=="quarantined":
         st.warning("Lot created but QUARANTINED (antibiotic fail).")
     else:
@@ -1,6 +1,11 @@
 import streamlit as st
 import pandas as pd
-from utils import load_csv, save_csv, log_event, gen_id, make_qr_payload, generate_receipt_pdf
+from utils import load_csv, generate_receipt_pdf
+from ids import reserve_id, idempotency_key
+from indexes import lookup
+from transactions import ConcurrentUpdateError
+from schemas import iso
+from issuance import eligible_lots, issue_lots, pdf_zip, merged_pdf
 from auth import require_login
 user = require_login()
 
@@ -14,44 +19,66 @@ if user["role"] not in ["platform","government"]:
     st.stop()
 
 lots = load_csv("dairy_lots.csv")
-receipts = load_csv("dwr_receipts.csv")
-entities = load_csv("entities.csv")
-custodians = load_csv("custodians.csv")
 
-eligible = lots[lots["status"]=="active"].copy()
+eligible = eligible_lots(lots)   # active lots without a receipt
 if eligible.empty:
     st.info("No eligible lots.")
     st.stop()
 
+mode = st.radio("Mode", ["Single lot", "Bulk (all active lots without a receipt)"], horizontal=True)
+
+if mode.startswith("Bulk"):
+    pending = eligible
+    st.write(f"{len(pending)} lot(s) ready for issuance, {pending['quantity_liters'].astype(float).sum():,.0f} L in total.")
+    st.dataframe(pending[["lot_id","owner_entity_id","custodian_id","product_type","quantity_liters","expiry_ts"]],
+                 use_container_width=True, hide_index=True)
+    output = st.radio("PDF output", ["ZIP (one PDF per receipt)", "Merged PDF"], horizontal=True)
+    if pending.empty:
+        st.stop()
+    if st.button(f"Issue {len(pending)} DWR/BDN", type="primary"):
+        try:
+            rows = issue_lots(pending, user["username"])
+        except ConcurrentUpdateError:
+            st.error("Lots were updated by another user. Please retry.")
+            st.stop()
+        st.success(f"{len(rows)} DWR issued.")
+        lots_by_id = {l["lot_id"]: l for l in pending.to_dict("records")}
+        stamp = pd.Timestamp.utcnow().strftime("%Y%m%d-%H%M%S")
+        with st.spinner("Rendering PDF receipts..."):
+            if output.startswith("ZIP"):
+                st.download_button("Download receipts (ZIP)", data=pdf_zip(rows, lots_by_id),
+                                   file_name=f"DWR-bulk-{stamp}.zip", mime="application/zip")
+            else:
+                st.download_button("Download receipts (PDF)", data=merged_pdf(rows, lots_by_id),
+                                   file_name=f"DWR-bulk-{stamp}.pdf", mime="application/pdf")
+    st.stop()
+
 lot_id = st.selectbox("Select active lot", eligible["lot_id"].tolist())
 lot = eligible[eligible["lot_id"]==lot_id].iloc[0].to_dict()
-owner = entities[entities["entity_id"]==lot["owner_entity_id"]].iloc[0].to_dict()
-cust = custodians[custodians["custodian_id"]==lot["custodian_id"]].iloc[0].to_dict()
+owner = lookup("entities.csv", lot["owner_entity_id"])
+cust = lookup("custodians.csv", lot["custodian_id"])
+expiry = iso(lot["expiry_ts"])
 
 c1,c2,c3,c4 = st.columns(4)
 c1.metric("Product", lot["product_type"])
 c2.metric("Qty (L)", float(lot["quantity_liters"]))
 c3.metric("Temp avg", f"{lot['temp_avg_c']} °C")
-c4.metric("Expiry", lot["expiry_ts"])
+c4.metric("Expiry", expiry)
 
 if st.button("Issue DWR/BDN", type="primary"):
-    receipt_id = gen_id("DWR-", 8)
-    qr = make_qr_payload(receipt_id, lot_id, lot["owner_entity_id"], lot["custodian_id"])
-    row = {
-        "receipt_id": receipt_id,
-        "issued_at": pd.Timestamp.utcnow().isoformat()+"Z",
-        "lot_id": lot_id,
-        "owner_entity_id": lot["owner_entity_id"],
-        "custodian_id": lot["custodian_id"],
-        "status": "active",
-        "expiry_ts": lot["expiry_ts"],
-        "qr_payload": qr,
-        "lien_active": "no",
-        "lien_holder_id": "",
-    }
-    receipts = pd.concat([receipts, pd.DataFrame([row])], ignore_index=True)
-    save_csv(receipts, "dwr_receipts.csv")
-    log_event(user["username"], "receipt_issued", "dwr", receipt_id, {"lot_id": lot_id})
+    receipt_id = reserve_id("DWR", idempotency_key("receipt_issued", lot_id))
+    if lookup("dwr_receipts.csv", receipt_id) is not None:
+        st.info(f"Receipt {receipt_id} was already created.")
+        st.stop()
+    try:
+        rows = issue_lots(eligible[eligible["lot_id"]==lot_id], user["username"], receipt_ids=[receipt_id])
+    except ConcurrentUpdateError:
+        st.error("Lot was updated by another user. Please retry.")
+        st.stop()
+    if not rows:
+        st.info(f"Lot {lot_id} already has a receipt.")
+        st.stop()
+    row = rows[0]
     st.success(f"DWR issued: {receipt_id}")
 
     pdf = generate_receipt_pdf(row, lot, owner, cust)
@@ -1,7 +1,14 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from utils import load_csv, save_csv, log_event, gen_id
+from utils import load_csv
+from ids import reserve_id, idempotency_key, form_token, form_done
+from indexes import lookup, lookup_rows
+from transactions import transaction, ConcurrentUpdateError
+from state_machine import transition, InvalidTransition
+from risk import portfolio, exposure, summary, MARGIN_CALL_LTV
+from prices import price
+from liens import active_lien
 from auth import require_login
 user = require_login()
 
@@ -13,18 +20,39 @@ if user["role"] not in ["platform","owner"]:
     st.error("Access denied.")
     st.stop()
 
+# ----------------------------
+# Portfolio risk (platform)
+# ----------------------------
+if user["role"] == "platform":
+    book = portfolio()
+    if not book.empty:
+        totals = summary(book)
+        m1,m2,m3,m4,m5 = st.columns(5)
+        m1.metric("Active advances", totals["advances"])
+        m2.metric("Exposure (XOF)", f"{totals['exposure_xof']:,.0f}")
+        m3.metric("Portfolio LTV", "-" if totals["ltv"] is None else f"{totals['ltv']:.0%}")
+        m4.metric(f"Margin calls (LTV ≥ {MARGIN_CALL_LTV:.0%})", totals["margin_calls"])
+        m5.metric("Spoilage risk", totals["spoilage_risk"])
+
+        by = st.radio("Exposure by", ["owner", "custodian", "region"], horizontal=True)
+        st.dataframe(exposure(book, by), use_container_width=True, hide_index=True)
+
+        flagged = book[book["margin_call"] | book["spoilage_risk"] | book["overdue"]]
+        if not flagged.empty:
+            st.caption(f"{len(flagged)} flagged advance(s)")
+            st.dataframe(flagged[["advance_id","receipt_id","owner_entity_id","custodian_id","exposure_xof","collateral_xof",
+                                  "ltv","hours_to_expiry","hours_to_due","margin_call","spoilage_risk","overdue"]],
+                         use_container_width=True, hide_index=True)
+    st.markdown("---")
+
 receipts = load_csv("dwr_receipts.csv")
-lots = load_csv("dairy_lots.csv")
-advances = load_csv("advances.csv")
-entities = load_csv("entities.csv")
-prices = load_csv("reference_prices.csv")
 
 if receipts.empty:
     st.info("No receipts.")
     st.stop()
 
 if user["role"] == "owner":
-    mine = receipts[receipts["owner_entity_id"]==user["entity_id"]]
+    mine = lookup_rows("dwr_receipts.csv", "owner_entity_id", user["entity_id"])
     if mine.empty:
         st.info("You have no receipts.")
         st.stop()
@@ -32,12 +60,14 @@ if user["role"] == "owner":
 else:
     receipt_id = st.selectbox("Receipt", receipts["receipt_id"].tolist())
 
-r = receipts[receipts["receipt_id"]==receipt_id].iloc[0].to_dict()
-lot = lots[lots["lot_id"]==r["lot_id"]].iloc[0].to_dict()
+r = lookup("dwr_receipts.csv", receipt_id)
+lot = lookup("dairy_lots.csv", r["lot_id"])
+lien = active_lien(receipt_id)
+if lien is not None:
+    st.warning(f"Receipt is already pledged to {lien['lender_id']} (lien {lien['lien_id']}).")
 
-owner_region = entities[entities["entity_id"]==r["owner_entity_id"]].iloc[0]["region"]
-pr = prices[(prices["product_type"]==lot["product_type"]) & (prices["region"]==owner_region)]
-xof_per_liter = float(pr.iloc[0]["xof_per_liter"]) if not pr.empty else 500.0
+owner_region = lookup("entities.csv", r["owner_entity_id"])["region"]
+xof_per_liter = price(lot["product_type"], owner_region)
 est_value = float(lot["quantity_liters"]) * xof_per_liter
 
 c1,c2,c3 = st.columns(3)
@@ -51,10 +81,11 @@ fee_pct = st.slider("Fee %", 0.0, 0.15, 0.05, 0.01)
 tenor = st.number_input("Tenor (days)", min_value=1, value=7, step=1)
 
 if st.button("Create advance (pilot)", type="primary"):
-    if r["status"] not in ["active"]:
-        st.error(f"Receipt must be ACTIVE. Current: {r['status']}")
+    adv_id = reserve_id("ADV", idempotency_key(form_token(st.session_state, "advance_created"),
+                                               user["username"], "advance_created", receipt_id, advance_xof, fee_pct, tenor))
+    if lookup("advances.csv", adv_id) is not None:
+        st.info(f"Advance {adv_id} was already created.")
         st.stop()
-    adv_id = gen_id("ADV-", 8)
     fee = advance_xof*fee_pct
     created = datetime.utcnow()
     due = created + timedelta(days=int(tenor))
@@ -72,10 +103,16 @@ if st.button("Create advance (pilot)", type="primary"):
         "repaid_at": "",
         "notes": "Pilot in-house advance"
     }
-    advances = pd.concat([advances, pd.DataFrame([row])], ignore_index=True)
-    save_csv(advances, "advances.csv")
-
-    receipts.loc[receipts["receipt_id"]==receipt_id, "status"] = "advance_active"
-    save_csv(receipts, "dwr_receipts.csv")
-    log_event(user["username"], "advance_created", "advance", adv_id, {"receipt_id": receipt_id, "amount": advance_xof, "fee": fee})
+    try:
+        with transaction() as tx:
+            tx.insert("advances.csv", row)
+            transition(tx, receipt_id, "advance_created", user["username"], {"advance_id": adv_id})
+            tx.log(user["username"], "advance_created", "advance", adv_id, {**row, "amount": advance_xof, "fee": fee})
+    except InvalidTransition as e:
+        st.error(f"Advance not allowed: {e}")
+        st.stop()
+    except ConcurrentUpdateError:
+        st.error("Receipt was updated by another user. Please retry.")
+        st.stop()
+    form_done(st.session_state, "advance_created")
     st.success(f"Advance created: {adv_id}. Receipt status set to advance_active.")
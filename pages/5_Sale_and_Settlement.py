@@ -1,7 +1,13 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from utils import load_csv, save_csv, log_event, gen_id
+from utils import load_csv, gen_id
+from ids import reserve_id, idempotency_key, form_token, form_done
+from indexes import lookup, lookup_rows
+from transactions import transaction, ConcurrentUpdateError
+from state_machine import transition, InvalidTransition
+from settlement import read_statement, settle_statement, report_csv, PROVIDERS
+from liens import active_lien
 from auth import require_login
 user = require_login()
 
@@ -10,45 +16,87 @@ st.set_page_config(page_title="Sale & Settlement", layout="wide")
 st.title("Sale Contract + Mobile Money Settlement (Demo)")
 
 receipts = load_csv("dwr_receipts.csv")
-lots = load_csv("dairy_lots.csv")
 contracts = load_csv("sales_contracts.csv")
-payments = load_csv("payments.csv")
-advances = load_csv("advances.csv")
 
 eligible = receipts[receipts["status"].isin(["active","advance_active"])].copy()
 if eligible.empty:
     st.info("No receipts available for sale.")
-    st.stop()
-
-receipt_id = st.selectbox("Select receipt", eligible["receipt_id"].tolist())
-r = receipts[receipts["receipt_id"]==receipt_id].iloc[0].to_dict()
-lot = lots[lots["lot_id"]==r["lot_id"]].iloc[0].to_dict()
+else:
+    receipt_id = st.selectbox("Select receipt", eligible["receipt_id"].tolist())
+    r = lookup("dwr_receipts.csv", receipt_id)
+    lot = lookup("dairy_lots.csv", r["lot_id"])
+    lien = active_lien(receipt_id)
+    if lien is not None:
+        st.warning(f"Receipt is pledged to {lien['lender_id']} (lien {lien['lien_id']}). "
+                   "The lender must release the lien before it can be sold.")
 
-buyer_id = st.text_input("Buyer entity ID", value="E-BUY-001")
-price = st.number_input("Total price (XOF)", min_value=0.0, value=50000.0, step=5000.0)
-terms = st.selectbox("Terms", ["mobile_money_instant","mobile_money_T+1","cash_on_delivery"])
+    buyer_id = st.text_input("Buyer entity ID", value="E-BUY-001")
+    price = st.number_input("Total price (XOF)", min_value=0.0, value=50000.0, step=5000.0)
+    terms = st.selectbox("Terms", ["mobile_money_instant","mobile_money_T+1","cash_on_delivery"])
 
-if st.button("Create sale contract", type="primary"):
-    cid = gen_id("SC-", 8)
-    row = {
-        "contract_id": cid,
-        "receipt_id": receipt_id,
-        "buyer_entity_id": buyer_id,
-        "price_xof": float(price),
-        "payment_terms": terms,
-        "status": "pending_payment",
-        "created_at": datetime.utcnow().isoformat()+"Z",
-        "settled_at": "",
-        "notes": ""
-    }
-    contracts = pd.concat([contracts, pd.DataFrame([row])], ignore_index=True)
-    save_csv(contracts, "sales_contracts.csv")
-    receipts.loc[receipts["receipt_id"]==receipt_id, "status"] = "pending_sale"
-    save_csv(receipts, "dwr_receipts.csv")
-    log_event(user["username"], "sale_contract_created", "sale_contract", cid, {"receipt_id": receipt_id, "price": price})
-    st.success(f"Contract created: {cid}. Now settle payment below.")
+    if st.button("Create sale contract", type="primary"):
+        cid = reserve_id("SC", idempotency_key(form_token(st.session_state, "sale_contract_created"),
+                                               user["username"], "sale_contract_created", receipt_id, buyer_id, price, terms))
+        if lookup("sales_contracts.csv", cid) is not None:
+            st.info(f"Contract {cid} was already created.")
+            st.stop()
+        row = {
+            "contract_id": cid,
+            "receipt_id": receipt_id,
+            "buyer_entity_id": buyer_id,
+            "price_xof": float(price),
+            "payment_terms": terms,
+            "status": "pending_payment",
+            "created_at": datetime.utcnow().isoformat()+"Z",
+            "settled_at": "",
+            "notes": ""
+        }
+        try:
+            with transaction() as tx:
+                tx.insert("sales_contracts.csv", row)
+                transition(tx, receipt_id, "sale_contract_created", user["username"], {"contract_id": cid})
+                tx.log(user["username"], "sale_contract_created", "sale_contract", cid, {**row, "price": price})
+        except InvalidTransition as e:
+            st.error(f"Sale not allowed: {e}")
+            st.stop()
+        except ConcurrentUpdateError:
+            st.error("Receipt was updated by another user. Please retry.")
+            st.stop()
+        contracts = pd.concat([contracts, pd.DataFrame([row])], ignore_index=True)
+        form_done(st.session_state, "sale_contract_created")
+        st.success(f"Contract created: {cid}. Now settle payment below.")
 
 st.markdown("---")
+if user["role"] == "platform":
+    st.subheader("Settle a mobile money statement")
+    st.caption("Orange Money / Moov / Wave reconciliation file (CSV or JSON). Lines are matched to pending "
+               "contracts by reference, then by payer phone number and amount, and applied in one batch.")
+    upload = st.file_uploader("Provider statement", type=["csv", "json"])
+    provider = st.selectbox("Provider", ["detect"] + list(PROVIDERS))
+    if upload is not None:
+        statement = read_statement(upload.getvalue(), None if provider == "detect" else provider)
+        preview = settle_statement(statement, dry_run=True)["summary"]
+        st.write(f"{preview['lines']} lines: {preview['settled']} match pending contracts "
+                 f"({int(preview['settled_xof']):,} XOF), {preview['unmatched']} do not.")
+        if st.button("Apply statement", type="primary"):
+            try:
+                report = settle_statement(statement, username=user["username"])
+            except ConcurrentUpdateError:
+                st.error("Contracts were updated by another user. Please retry.")
+                st.stop()
+            s = report["summary"]
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Settled", s["settled"])
+            c2.metric("Settled (XOF)", f"{int(s['settled_xof']):,}")
+            c3.metric("Advances repaid", s["advances_repaid"])
+            c4.metric("Unmatched", s["unmatched"])
+            if not report["unmatched"].empty:
+                st.dataframe(report["unmatched"], use_container_width=True, hide_index=True)
+                st.download_button("Download reconciliation report", report_csv(report),
+                                   file_name="unmatched_lines.csv", mime="text/csv")
+            contracts = load_csv("sales_contracts.csv")
+    st.markdown("---")
+
 st.subheader("Settle payment (demo)")
 pending = contracts[contracts["status"]=="pending_payment"]
 if pending.empty:
@@ -60,7 +108,10 @@ c = pending[pending["contract_id"]==contract_id].iloc[0].to_dict()
 method = st.selectbox("Payment method", ["orange_money","moov_money","wave","bank_transfer"])
 
 if st.button("Confirm payment", type="primary"):
-    pid = gen_id("PAY-", 8)
+    pid = reserve_id("PAY", idempotency_key(user["username"], "sale_settled", contract_id, method))
+    if lookup("payments.csv", pid) is not None:
+        st.info(f"Payment {pid} was already created.")
+        st.stop()
     pay = {
         "payment_id": pid,
         "ref_type": "sale_contract",
@@ -72,28 +123,32 @@ if st.button("Confirm payment", type="primary"):
         "status": "confirmed",
         "created_at": datetime.utcnow().isoformat()+"Z",
         "confirmed_at": datetime.utcnow().isoformat()+"Z",
-        "provider_ref": gen_id("MM-", 10)
+        "provider_ref": gen_id("MM")
     }
-    payments = pd.concat([payments, pd.DataFrame([pay])], ignore_index=True)
-    save_csv(payments, "payments.csv")
-
     receipt_id = c["receipt_id"]
-    adv = advances[(advances["receipt_id"]==receipt_id) & (advances["status"]=="active")]
+    adv = lookup_rows("advances.csv", ("receipt_id","status"), (receipt_id,"active"))
     net_to_owner = float(c["price_xof"])
-    if not adv.empty:
-        adv0 = adv.iloc[0]
-        net_to_owner -= float(adv0["advance_xof"]) + float(adv0["fee_xof"])
-        advances.loc[advances["advance_id"]==adv0["advance_id"], "status"] = "repaid"
-        advances.loc[advances["advance_id"]==adv0["advance_id"], "repaid_at"] = datetime.utcnow().isoformat()+"Z"
-        save_csv(advances, "advances.csv")
-        log_event("system", "advance_repaid", "advance", adv0["advance_id"], {"receipt_id": receipt_id})
-
-    contracts.loc[contracts["contract_id"]==contract_id, "status"] = "settled"
-    contracts.loc[contracts["contract_id"]==contract_id, "settled_at"] = datetime.utcnow().isoformat()+"Z"
-    save_csv(contracts, "sales_contracts.csv")
 
-    receipts = load_csv("dwr_receipts.csv")
-    receipts.loc[receipts["receipt_id"]==receipt_id, "status"] = "sold"
-    save_csv(receipts, "dwr_receipts.csv")
-    log_event(user["username"], "sale_settled", "sale_contract", contract_id, {"payment_id": pid, "net_to_owner_est": net_to_owner})
+    # Payment, advance repayment, contract settlement and receipt sale commit together
+    try:
+        with transaction() as tx:
+            current = tx.get("sales_contracts.csv", contract_id)
+            if current["status"] != "pending_payment":
+                st.error(f"Contract is no longer pending. Current: {current['status']}")
+                st.stop()
+            tx.insert("payments.csv", pay)
+            if not adv.empty and tx.get("advances.csv", adv.iloc[0]["advance_id"])["status"] == "active":
+                adv0 = adv.iloc[0]
+                net_to_owner -= float(adv0["advance_xof"]) + float(adv0["fee_xof"])
+                tx.update("advances.csv", adv0["advance_id"], {"status": "repaid", "repaid_at": datetime.utcnow().isoformat()+"Z"})
+                tx.log("system", "advance_repaid", "advance", adv0["advance_id"], {"receipt_id": receipt_id})
+            tx.update("sales_contracts.csv", contract_id, {"status": "settled", "settled_at": datetime.utcnow().isoformat()+"Z"})
+            transition(tx, receipt_id, "sale_settled", user["username"], {"contract_id": contract_id})
+            tx.log(user["username"], "sale_settled", "sale_contract", contract_id, {"payment_id": pid, "net_to_owner_est": net_to_owner})
+    except InvalidTransition as e:
+        st.error(f"Settlement not allowed: {e}")
+        st.stop()
+    except ConcurrentUpdateError:
+        st.error("Contract, advance or receipt was updated by another user. Please retry.")
+        st.stop()
     st.success(f"Payment confirmed: {pid}. Receipt marked SOLD. Net to owner estimate: {int(net_to_owner)} XOF.")
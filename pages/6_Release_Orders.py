@@ -1,7 +1,12 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from utils import load_csv, save_csv, log_event, gen_id
+from utils import load_csv
+from ids import reserve_id, idempotency_key, form_token, form_done
+from indexes import lookup
+from transactions import transaction, ConcurrentUpdateError
+from state_machine import transition, InvalidTransition
+from liens import active_lien
 from auth import require_login
 user = require_login()
 
@@ -19,12 +24,20 @@ if sold.empty:
 
 receipt_id = st.selectbox("Sold receipt", sold["receipt_id"].tolist())
 r = sold[sold["receipt_id"]==receipt_id].iloc[0].to_dict()
+lien = active_lien(receipt_id)
+if lien is not None:
+    st.warning(f"Receipt is pledged to {lien['lender_id']} (lien {lien['lien_id']}). "
+               "The milk cannot be released until the lender releases the lien.")
 
 buyer_id = st.text_input("Buyer entity ID", value="E-BUY-001")
 notes = st.text_input("Dispatch notes", value="Pickup with insulated transport. Verify ID at gate.")
 
 if st.button("Create release order", type="primary"):
-    ro_id = gen_id("RO-", 8)
+    ro_id = reserve_id("RO", idempotency_key(form_token(st.session_state, "release_order_created"),
+                                             user["username"], "release_order_created", receipt_id, buyer_id, notes))
+    if lookup("release_orders.csv", ro_id) is not None:
+        st.info(f"Release order {ro_id} was already created.")
+        st.stop()
     row = {
         "release_order_id": ro_id,
         "receipt_id": receipt_id,
@@ -35,9 +48,12 @@ if st.button("Create release order", type="primary"):
         "confirmed_at": "",
         "notes": notes
     }
+    # The order and its event commit together
+    with transaction() as tx:
+        tx.insert("release_orders.csv", row)
+        tx.log(user["username"], "release_order_created", "release_order", ro_id, {"receipt_id": receipt_id})
     ro = pd.concat([ro, pd.DataFrame([row])], ignore_index=True)
-    save_csv(ro, "release_orders.csv")
-    log_event(user["username"], "release_order_created", "release_order", ro_id, {"receipt_id": receipt_id})
+    form_done(st.session_state, "release_order_created")
     st.success(f"Release order created: {ro_id}")
 
 st.markdown("---")
@@ -53,14 +69,20 @@ if pending.empty:
 
 ro_id = st.selectbox("Pending RO", pending["release_order_id"].tolist())
 if st.button("Confirm released", type="primary"):
-    ro.loc[ro["release_order_id"]==ro_id, "status"] = "released"
-    ro.loc[ro["release_order_id"]==ro_id, "confirmed_at"] = datetime.utcnow().isoformat()+"Z"
-    save_csv(ro, "release_orders.csv")
-
     receipt_id = ro[ro["release_order_id"]==ro_id].iloc[0]["receipt_id"]
-    receipts = load_csv("dwr_receipts.csv")
-    receipts.loc[receipts["receipt_id"]==receipt_id, "status"] = "released"
-    save_csv(receipts, "dwr_receipts.csv")
-
-    log_event(user["username"], "released", "dwr", receipt_id, {"release_order_id": ro_id})
+    try:
+        with transaction() as tx:
+            current = tx.get("release_orders.csv", ro_id)
+            if current["status"] != "pending":
+                st.error(f"Release order is no longer pending. Current: {current['status']}")
+                st.stop()
+            tx.update("release_orders.csv", ro_id, {"status": "released", "confirmed_at": datetime.utcnow().isoformat()+"Z"})
+            transition(tx, receipt_id, "released", user["username"], {"release_order_id": ro_id})
+            tx.log(user["username"], "released", "dwr", receipt_id, {"release_order_id": ro_id})
+    except InvalidTransition as e:
+        st.error(f"Release not allowed: {e}")
+        st.stop()
+    except ConcurrentUpdateError:
+        st.error("Release order or receipt was updated by another user. Please retry.")
+        st.stop()
     st.success("Release confirmed. Receipt closed as RELEASED.")
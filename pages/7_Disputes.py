@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from utils import load_csv, save_csv, log_event, gen_id
+from utils import load_csv
+from ids import reserve_id, idempotency_key, form_token, form_done
+from indexes import lookup
+from transactions import transaction, ConcurrentUpdateError
+from state_machine import transition, InvalidTransition
 from auth import require_login
 user = require_login()
 
@@ -21,7 +25,11 @@ dtype = st.selectbox("Dispute type", ["quality","spoilage","payment_delay","grad
 desc = st.text_area("Description")
 
 if st.button("File dispute", type="primary"):
-    did = gen_id("DSP-", 8)
+    did = reserve_id("DSP", idempotency_key(form_token(st.session_state, "dispute_filed"),
+                                            user["username"], "dispute_filed", receipt_id, dtype, desc))
+    if lookup("disputes.csv", did) is not None:
+        st.info(f"Dispute {did} was already created.")
+        st.stop()
     row = {
         "dispute_id": did,
         "receipt_id": receipt_id,
@@ -31,13 +39,24 @@ if st.button("File dispute", type="primary"):
         "status": "open",
         "created_at": datetime.utcnow().isoformat()+"Z",
         "resolved_at": "",
-        "resolution": ""
+        "resolution": "",
+        "prior_status": ""
     }
+    try:
+        with transaction() as tx:
+            current = tx.get("dwr_receipts.csv", receipt_id)
+            row["prior_status"] = current["status"] if current else ""
+            tx.insert("disputes.csv", row)
+            transition(tx, receipt_id, "dispute_filed", user["username"], {"dispute_id": did})
+            tx.log(user["username"], "dispute_filed", "dispute", did, {"receipt_id": receipt_id, "type": dtype})
+    except InvalidTransition as e:
+        st.error(f"Dispute not allowed: {e}")
+        st.stop()
+    except ConcurrentUpdateError:
+        st.error("Receipt was updated by another user. Please retry.")
+        st.stop()
     disputes = pd.concat([disputes, pd.DataFrame([row])], ignore_index=True)
-    save_csv(disputes, "disputes.csv")
-    receipts.loc[receipts["receipt_id"]==receipt_id, "status"] = "disputed"
-    save_csv(receipts, "dwr_receipts.csv")
-    log_event(user["username"], "dispute_filed", "dispute", did, {"receipt_id": receipt_id, "type": dtype})
+    form_done(st.session_state, "dispute_filed")
     st.success(f"Dispute filed: {did}")
 
 st.markdown("---")
@@ -54,15 +73,19 @@ if open_df.empty:
 did = st.selectbox("Open dispute", open_df["dispute_id"].tolist())
 resolution = st.text_area("Resolution")
 if st.button("Resolve", type="primary"):
-    disputes.loc[disputes["dispute_id"]==did, "status"] = "resolved"
-    disputes.loc[disputes["dispute_id"]==did, "resolved_at"] = datetime.utcnow().isoformat()+"Z"
-    disputes.loc[disputes["dispute_id"]==did, "resolution"] = resolution
-    save_csv(disputes, "disputes.csv")
-
     receipt_id = disputes[disputes["dispute_id"]==did].iloc[0]["receipt_id"]
-    receipts = load_csv("dwr_receipts.csv")
-    if receipts.loc[receipts["receipt_id"]==receipt_id, "status"].iloc[0] == "disputed":
-        receipts.loc[receipts["receipt_id"]==receipt_id, "status"] = "active"
-        save_csv(receipts, "dwr_receipts.csv")
-    log_event(user["username"], "dispute_resolved", "dispute", did, {"receipt_id": receipt_id})
+    try:
+        with transaction() as tx:
+            current = tx.get("disputes.csv", did)
+            if current["status"] != "open":
+                st.error(f"Dispute is no longer open. Current: {current['status']}")
+                st.stop()
+            tx.update("disputes.csv", did, {"status": "resolved", "resolved_at": datetime.utcnow().isoformat()+"Z", "resolution": resolution})
+            if tx.get("dwr_receipts.csv", receipt_id)["status"] == "disputed":
+                transition(tx, receipt_id, "dispute_resolved", user["username"], {"dispute_id": did},
+                           to=current.get("prior_status"))
+            tx.log(user["username"], "dispute_resolved", "dispute", did, {"receipt_id": receipt_id})
+    except ConcurrentUpdateError:
+        st.error("Dispute or receipt was updated by another user. Please retry.")
+        st.stop()
     st.success("Dispute resolved.")
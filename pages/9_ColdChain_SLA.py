@@ -1,59 +1,45 @@
-def compute_coldchain_score(temp_avg_c, temp_breach_count, dispute_count=0, spoiled_count=0):
-    """
-    Returns a dict with score and status.
-
-    Inputs:
-    - temp_avg_c: average temperature in Celsius
-    - temp_breach_count: number of temperature breaches
-    - dispute_count: number of related disputes
-    - spoiled_count: number of spoiled lots
-    """
-    try:
-        temp_avg_c = float(temp_avg_c)
-    except Exception:
-        temp_avg_c = None
-
-    try:
-        temp_breach_count = int(temp_breach_count)
-    except Exception:
-        temp_breach_count = 0
-
-    try:
-        dispute_count = int(dispute_count)
-    except Exception:
-        dispute_count = 0
-
-    try:
-        spoiled_count = int(spoiled_count)
-    except Exception:
-        spoiled_count = 0
-
-    score = 100
-
-    # Temperature penalty
-    if temp_avg_c is not None:
-        if temp_avg_c < 2 or temp_avg_c > 6:
-            score -= 25
-        elif temp_avg_c < 3 or temp_avg_c > 5:
-            score -= 10
-
-    # Breach penalty
-    score -= min(temp_breach_count * 10, 40)
-
-    # Dispute penalty
-    score -= min(dispute_count * 8, 24)
-
-    # Spoilage penalty
-    score -= min(spoiled_count * 20, 40)
-
-    score = max(0, min(100, score))
-
-    if score >= 85:
-        status = "Green"
-    elif score >= 60:
-        status = "Amber"
-    else:
-        status = "Red"
-
-    return {"score": score, "status": status}
-
+import streamlit as st
+import pandas as pd
+from utils import load_csv
+from sla import refresh_sla, SLA_FILE
+from auth import require_login
+user = require_login()
+
+
+st.set_page_config(page_title="Cold Chain SLA", layout="wide")
+st.title("Cold Chain SLA (custodian x month)")
+
+if user["role"] not in ["platform","government","custodian"]:
+    st.error("Access denied. Platform/Government/Custodian role required.")
+    st.stop()
+
+c1,c2 = st.columns([1,4])
+force = c1.button("Rebuild all months")
+result = refresh_sla(force=force)
+if result["changed_months"]:
+    c2.caption(f"Recomputed: {', '.join(result['changed_months'])}")
+
+sla = load_csv(SLA_FILE)
+if user["role"] == "custodian":
+    sla = sla[sla["custodian_id"]==user["entity_id"]]
+
+if sla.empty:
+    st.info("No lots received yet.")
+    st.stop()
+
+months = sorted(sla["month"].astype(str).unique().tolist(), reverse=True)
+month = st.selectbox("Month", months)
+cur = sla[sla["month"].astype(str)==month]
+
+m1,m2,m3,m4 = st.columns(4)
+m1.metric("Lots received", int(pd.to_numeric(cur["lots_received"]).sum()))
+m2.metric("Temp breaches", int(pd.to_numeric(cur["temp_breaches"]).sum()))
+m3.metric("Spoiled lots", int(pd.to_numeric(cur["spoiled_lots"]).sum()))
+m4.metric("Red custodians", int((cur["penalty_status"]=="Red").sum()))
+
+st.subheader(f"SLA scores — {month}")
+st.dataframe(cur, use_container_width=True, hide_index=True)
+st.bar_chart(cur.set_index("custodian_id")["sla_score"])
+
+with st.expander("History"):
+    st.dataframe(sla, use_container_width=True, hide_index=True)
@@ -0,0 +1,184 @@
+"""
+Reference prices (XOF per liter) as time-versioned curves.
+
+Each row of reference_prices.csv is one version of the price of a product in a region,
+valid from `effective_from` (blank: since the beginning) until the next version. A blank
+region is the national price, used for regions without their own. Lookups are as-of:
+
+    price("yogurt", "Sikasso")                          # today
+    lookup(lots["product_type"], regions, at=lots["created_at"])   # thousands at once
+
+`PriceBook` keeps every version sorted by (product, region, effective_from) in one int64
+key array, so a batch lookup is a single np.searchsorted. The book is rebuilt only when
+the file changes, and the product x region matrix is kept per price epoch.
+
+    python prices.py                                    # current matrix
+    python prices.py set yogurt Sikasso 950 [2026-11-01]
+"""
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import get_backend
+from table_cache import load_table
+from schemas import timestamps, iso
+from utils import insert_rows, log_event
+
+PRICES_FILE = "reference_prices.csv"
+DEFAULT_XOF_PER_LITER = 500.0
+NATIONAL = ""
+
+
+class PriceBook:
+    """All price versions of one reference_prices.csv version, indexed for as-of lookups."""
+
+    def __init__(self, df: pd.DataFrame, token=None):
+        self.token = token
+        df = df[df["xof_per_liter"].notna()] if "xof_per_liter" in df.columns else df.iloc[0:0]
+        product = _labels(df["product_type"].astype(object)) if len(df) else np.empty(0, dtype=object)
+        region = _labels(df["region"].astype(object)) if len(df) else np.empty(0, dtype=object)
+        self.products = pd.Index(pd.unique(product))
+        self.regions = pd.Index(pd.unique(np.append(region, NATIONAL)))
+        self.national = self.regions.get_loc(NATIONAL)
+
+        eff = _ns(df["effective_from"]) if len(df) else np.empty(0, dtype=np.int64)
+        dated = eff != _NAT
+        self.times = np.unique(eff[dated])
+        # rank 0 = undated (always valid), rank i = the i-th distinct effective time
+        rank = np.where(dated, np.searchsorted(self.times, eff) + 1, 0)
+        key = self.products.get_indexer(product) * len(self.regions) + self.regions.get_indexer(region)
+
+        order = np.lexsort((rank, key))       # stable: of two versions with the same date, the later row wins
+        self.keys = key[order]
+        self.composite = self.keys * (len(self.times) + 1) + rank[order]
+        self.values = df["xof_per_liter"].to_numpy(dtype=float)[order]
+        self._matrices = {}
+
+    def lookup(self, product_types, regions, at=None) -> np.ndarray:
+        """XOF/L per (product_type, region) as of `at` (scalar, per-row array or None for now)."""
+        product = _codes(self.products, product_types)
+        region = _codes(self.regions, regions)
+        rank = np.searchsorted(self.times, _at(at, len(product)), side="right")
+        out = self._asof(product, region, rank)
+        missing = np.isnan(out)
+        if missing.any():
+            out[missing] = self._asof(product[missing], np.full(missing.sum(), self.national), rank[missing])
+        return np.where(np.isnan(out), DEFAULT_XOF_PER_LITER, out)
+
+    def matrix(self, at=None) -> pd.DataFrame:
+        """Product x region prices as of `at`; one cached matrix per price epoch."""
+        epoch = int(np.searchsorted(self.times, _at(at, 1)[0], side="right"))
+        m = self._matrices.get(epoch)
+        if m is None:
+            grid = pd.MultiIndex.from_product([self.products, self.regions])
+            values = self.lookup(grid.get_level_values(0), grid.get_level_values(1), at)
+            m = pd.DataFrame(values.reshape(len(self.products), len(self.regions)),
+                             index=self.products, columns=[r or "national" for r in self.regions])
+            self._matrices[epoch] = m
+        return m
+
+    def price(self, product_type, region, at=None) -> float:
+        """One price, read from the cached matrix of its epoch."""
+        m = self.matrix(at)
+        if pd.isna(product_type) or product_type not in m.index:
+            return DEFAULT_XOF_PER_LITER
+        column = region if not pd.isna(region) and region and region in m.columns else "national"
+        return float(m.at[product_type, column])
+
+    def _asof(self, product, region, rank) -> np.ndarray:
+        out = np.full(len(product), np.nan)
+        known = (product >= 0) & (region >= 0)
+        key = product * len(self.regions) + region
+        pos = np.searchsorted(self.composite, key * (len(self.times) + 1) + rank, side="right") - 1
+        hit = known & (pos >= 0)
+        hit[hit] = self.keys[pos[hit]] == key[hit]
+        out[hit] = self.values[pos[hit]]
+        return out
+
+
+_NAT = np.iinfo(np.int64).min
+_book = None
+_book_lock = threading.Lock()
+
+
+def price_book() -> PriceBook:
+    """The book for the current reference_prices.csv, rebuilt only when the file changes."""
+    global _book
+    token = get_backend().version_token(PRICES_FILE)
+    book = _book
+    if book is not None and book.token == token:
+        return book
+    with _book_lock:
+        if _book is None or _book.token != token:
+            _book = PriceBook(load_table(PRICES_FILE), token)
+        return _book
+
+
+def lookup(product_types, regions, at=None) -> np.ndarray:
+    return price_book().lookup(product_types, regions, at)
+
+
+def price(product_type, region, at=None) -> float:
+    return price_book().price(product_type, region, at)
+
+
+def current_matrix() -> pd.DataFrame:
+    return price_book().matrix()
+
+
+def set_price(product_type, region, xof_per_liter, effective_from=None, username="system", source="") -> dict:
+    """Record a new price version (it does not overwrite history). Blank region = national price."""
+    row = {
+        "product_type": product_type,
+        "region": region or NATIONAL,
+        "xof_per_liter": float(xof_per_liter),
+        "effective_from": iso(pd.Timestamp(effective_from or pd.Timestamp.utcnow())),
+        "source": source,
+    }
+    insert_rows(PRICES_FILE, [row])
+    log_event(username, "reference_price_set", "reference_price", f"{product_type}/{region or 'national'}", row)
+    return row
+
+
+def _labels(values) -> np.ndarray:
+    arr = np.asarray(values, dtype=object)
+    return np.where(pd.isna(arr), NATIONAL, arr)
+
+
+def _codes(index: pd.Index, values) -> np.ndarray:
+    """Positions of `values` in `index` (-1 if absent), resolved once per distinct value."""
+    if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+        codes, uniques = np.asarray(values.cat.codes), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    per_value = np.append(index.get_indexer(_labels(uniques)), index.get_indexer([NATIONAL]))
+    return per_value[codes]   # code -1 (null) picks the last slot
+
+
+def _ns(values) -> np.ndarray:
+    values = pd.Series(values).reset_index(drop=True)
+    ts = values if isinstance(values.dtype, pd.DatetimeTZDtype) else timestamps(values)
+    return ts.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def _at(at, n) -> np.ndarray:
+    """Query times as int64 ns; None or NaT means now."""
+    now = pd.Timestamp.utcnow().value
+    if at is None:
+        return np.full(n, now, dtype=np.int64)
+    if np.ndim(at) == 0:
+        ts = pd.Timestamp(at)
+        if pd.isna(ts):
+            return np.full(n, now, dtype=np.int64)
+        return np.full(n, (ts.tz_localize("UTC") if ts.tzinfo is None else ts).value, dtype=np.int64)
+    out = _ns(at)
+    return np.where(out == _NAT, now, out)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 5 and sys.argv[1] == "set":
+        print(set_price(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5] if len(sys.argv) > 5 else None))
+    else:
+        print(current_matrix().to_string())
@@ -0,0 +1,371 @@
+"""
+Event-sourced projections: receipts, advances and sale contracts rebuilt from the journal.
+
+The pages still write the tables directly; the events journal is the independent record
+of what they did. `Projector` replays the journal oldest first, one chunk of events at a
+time, and folds each event into the row it touches:
+
+    receipt_issued                  creates the receipt (the event carries the row)
+    receipt_status_changed          status = details "to"
+    lien_created / lien_released    lien_active, lien_holder_id
+    advance_created                 creates the advance
+    advance_repaid                  status = repaid, repaid_at = event time
+    sale_contract_created           creates the contract
+    sale_settled                    status = settled, settled_at = event time
+
+Memory is one chunk of events plus the projected rows, however long the log is. The rows
+and the journal position (bytes read per segment) are saved under projections/, so a
+catch-up seeks past everything it has already folded and reads only what was appended.
+Replaying an event twice is harmless: creates skip known keys and updates set values.
+
+`check` compares the projection with the stored tables: rows only one side has, and
+columns that disagree. Columns an event did not record (older events carried less) are
+not compared.
+
+    python projections.py              # catch up from the checkpoint and save it
+    python projections.py rebuild      # replay the whole journal
+    python projections.py check        # catch up, then list disagreements
+"""
+import os
+import sys
+import json
+import shutil
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import schemas
+from schemas import FLOAT, INT, TIMESTAMP, iso
+from storage import BASE_DIR
+from table_cache import load_table
+from journal import journal_for
+from utils import csv_path
+
+EVENTS_FILE = "events.csv"
+RECEIPTS_FILE = "dwr_receipts.csv"
+ADVANCES_FILE = "advances.csv"
+CONTRACTS_FILE = "sales_contracts.csv"
+KEYS = {RECEIPTS_FILE: "receipt_id", ADVANCES_FILE: "advance_id", CONTRACTS_FILE: "contract_id"}
+
+PROJECTIONS_DIR = os.path.join(BASE_DIR, "projections")
+CHECKPOINT = "_checkpoint.json"
+CHUNK_BYTES = 16 * 1024 * 1024
+# Pages stamp settled_at / repaid_at just before their commit and the event just after it
+TS_TOLERANCE = pd.Timedelta(minutes=1)
+
+CREATE, UPDATE = "create", "update"
+OBJECT_ID, TS = "@object_id", "@event_ts"
+
+# event type -> (table, row key, create/update, {column: source}). A source is a details key,
+# TS for the event time or "=value" for a constant. A create takes every table column found
+# in the details and falls back to the sources for the ones it lacks.
+EVENTS = {
+    "receipt_issued": (RECEIPTS_FILE, OBJECT_ID, CREATE,
+                       {"issued_at": TS, "status": "=active", "lien_active": "=no"}),
+    "receipt_status_changed": (RECEIPTS_FILE, OBJECT_ID, UPDATE, {"status": "to"}),
+    "lien_created": (RECEIPTS_FILE, "receipt_id", UPDATE, {"lien_active": "=yes", "lien_holder_id": "lender_id"}),
+    "lien_released": (RECEIPTS_FILE, "receipt_id", UPDATE, {"lien_active": "=no", "lien_holder_id": "="}),
+    "advance_created": (ADVANCES_FILE, OBJECT_ID, CREATE,
+                        {"advance_xof": "amount", "fee_xof": "fee", "status": "=active", "created_at": TS}),
+    "advance_repaid": (ADVANCES_FILE, OBJECT_ID, UPDATE, {"status": "=repaid", "repaid_at": TS}),
+    "sale_contract_created": (CONTRACTS_FILE, OBJECT_ID, CREATE,
+                              {"price_xof": "price", "status": "=pending_payment", "created_at": TS}),
+    "sale_settled": (CONTRACTS_FILE, OBJECT_ID, UPDATE, {"status": "=settled", "settled_at": TS}),
+}
+
+
+class Table:
+    """
+    One projected table: a growable array per column, typed from schemas.TABLES (datetime64
+    timestamps, float amounts, objects for text with repeated values shared), and a
+    key -> row map.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.key = KEYS[file_name]
+        self.kinds = dict(schemas.TABLES[file_name])
+        self.columns = list(self.kinds)
+        self.rows = {}
+        self.data = {c: _empty(k, 0) for c, k in self.kinds.items()}
+        self.orphans = 0    # updates to rows the journal never created
+        self._strings = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def create(self, frame: pd.DataFrame) -> None:
+        """Append rows for keys not seen yet (a repeated create is ignored, like indexes.lookup)."""
+        keys = _text(frame[self.key]).to_numpy()
+        fresh = ~pd.Series(keys).duplicated().to_numpy() & np.fromiter(
+            (k not in self.rows for k in keys), dtype=bool, count=len(keys))
+        frame, keys = frame[fresh], keys[fresh]
+        n, m = len(self.rows), len(keys)
+        self._reserve(n + m)
+        for col in self.columns:
+            if col in frame.columns:
+                self.data[col][n:n + m] = self._values(col, frame[col])
+        self.rows.update(zip(keys, range(n, n + m)))
+
+    def update(self, frame: pd.DataFrame) -> None:
+        """Apply updates in row order: per key and column the last value written wins."""
+        last = frame.groupby(self.key, sort=False).last()
+        pos = np.fromiter((self.rows.get(k, -1) for k in last.index), dtype=np.int64, count=len(last))
+        self.orphans += int((pos < 0).sum())
+        for col in last.columns:
+            values = self._values(col, last[col])
+            ok = (pos >= 0) & pd.notna(values)
+            self.data[col][pos[ok]] = values[ok]
+
+    def raw(self) -> pd.DataFrame:
+        n = len(self.rows)
+        return pd.DataFrame({c: pd.Series(self.data[c][:n]).dt.tz_localize("UTC") if k == TIMESTAMP
+                             else self.data[c][:n] for c, k in self.kinds.items()})
+
+    def frame(self) -> pd.DataFrame:
+        return schemas.apply(self.raw(), self.file_name)
+
+    def _values(self, col, values: pd.Series) -> np.ndarray:
+        kind = self.kinds[col]
+        if kind == TIMESTAMP:
+            ts = schemas.timestamps(values if pd.api.types.is_datetime64_any_dtype(values) else _text(values))
+            return ts.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+        if kind in (FLOAT, INT):
+            return pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+        out = _text(values).to_numpy()
+        codes, uniques = pd.factorize(out)
+        if len(out) >= 64 and len(uniques) * 4 <= len(out):
+            # statuses, custodians, owners...: one string object per distinct value
+            shared = np.array([self._strings.setdefault(u, u) for u in uniques] + [None], dtype=object)
+            out = shared[codes]
+        return out
+
+    def _reserve(self, size):
+        capacity = len(self.data[self.columns[0]])
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 1024)
+        for col, kind in self.kinds.items():
+            grown = _empty(kind, capacity)
+            grown[:len(self.rows)] = self.data[col][:len(self.rows)]
+            self.data[col] = grown
+
+
+def _empty(kind, n) -> np.ndarray:
+    if kind == TIMESTAMP:
+        return np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    if kind in (FLOAT, INT):
+        return np.full(n, np.nan)
+    return np.full(n, None, dtype=object)
+
+
+class Projector:
+    """The projected tables and how far into the journal they are."""
+
+    def __init__(self, position=None, events=0):
+        self.tables = {f: Table(f) for f in KEYS}
+        self.position = dict(position or {})
+        self.events = events
+        self.token = None
+
+    def catch_up(self, journal=None, chunk_bytes=CHUNK_BYTES) -> int:
+        """Fold every event after the current position; returns how many were read."""
+        journal = journal or _journal()
+        read = 0
+        for name, offset, chunk in journal.iter_from(self.position, chunk_bytes):
+            self.apply(chunk)
+            self.position[name] = offset
+            read += len(chunk)
+        self.events += read
+        return read
+
+    def apply(self, events: pd.DataFrame) -> None:
+        """Fold one chunk of events, oldest first, into the tables."""
+        events = events[events["event_type"].isin(list(EVENTS))]
+        staged = {}
+        for event_type, rows in events.groupby("event_type", sort=False):
+            file_name, key, kind, sources = EVENTS[event_type]
+            columns = self.tables[file_name].columns if kind == CREATE else []
+            wanted = set(columns) | {s for s in sources.values() if not s.startswith(("=", "@"))}
+            if key != OBJECT_ID:
+                wanted.add(key)
+            # one decode for the whole group instead of a json.loads per event
+            docs = json.loads("[" + ",".join(rows["details_json"].where(rows["details_json"] != "", "{}")) + "]")
+            details = pd.DataFrame(docs, columns=sorted(wanted), index=rows.index)
+
+            out = pd.DataFrame({KEYS[file_name]: rows["object_id"] if key == OBJECT_ID else details[key]})
+            for col in columns:
+                if col != KEYS[file_name]:
+                    out[col] = details[col]
+            for col, source in sources.items():
+                value = _source(source, rows, details)
+                out[col] = value if col not in out else out[col].where(out[col].notna(), value)
+            staged.setdefault((file_name, kind), []).append(out)
+
+        # creates first: an update in the same chunk always comes after its row's create
+        for kind in (CREATE, UPDATE):
+            for (file_name, k), frames in staged.items():
+                if k == kind:
+                    frame = pd.concat(frames).sort_index(kind="stable")
+                    getattr(self.tables[file_name], kind)(frame[frame[KEYS[file_name]].notna()])
+
+    def frame(self, file_name) -> pd.DataFrame:
+        return self.tables[file_name].frame()
+
+    # ----------------------------
+    # Checkpoints
+    # ----------------------------
+    def save(self, directory=PROJECTIONS_DIR) -> None:
+        """Write the rows and the journal position, swapping the directory in whole."""
+        tmp = f"{directory}.tmp-{uuid.uuid4().hex[:8]}"
+        os.makedirs(tmp)
+        for file_name, table in self.tables.items():
+            table.raw().to_parquet(os.path.join(tmp, _parquet_name(file_name)), index=False)
+        with open(os.path.join(tmp, CHECKPOINT), "w", encoding="utf-8") as fh:
+            json.dump({"position": self.position, "events": self.events, "saved_at": iso(pd.Timestamp.utcnow()),
+                       "orphans": {f: t.orphans for f, t in self.tables.items()}}, fh)
+        old = f"{directory}.old-{uuid.uuid4().hex[:8]}"
+        if os.path.isdir(directory):
+            os.replace(directory, old)
+        os.replace(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory=PROJECTIONS_DIR):
+        """The saved projection, or None if there is no checkpoint."""
+        try:
+            with open(os.path.join(directory, CHECKPOINT), encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        projector = cls(meta.get("position"), meta.get("events", 0))
+        for file_name, table in projector.tables.items():
+            path = os.path.join(directory, _parquet_name(file_name))
+            if os.path.exists(path):
+                table.create(pd.read_parquet(path))
+            table.orphans = meta.get("orphans", {}).get(file_name, 0)
+        return projector
+
+
+def _source(source, rows, details) -> pd.Series:
+    if source == TS:
+        return rows["event_ts"]
+    if source.startswith("="):
+        return pd.Series(source[1:], index=rows.index, dtype=object)
+    return details[source]
+
+
+def _text(values: pd.Series) -> pd.Series:
+    return values.astype(str).where(values.notna(), None).astype(object)
+
+
+def _parquet_name(file_name):
+    return os.path.splitext(file_name)[0] + ".parquet"
+
+
+# ----------------------------
+# Consistency check
+# ----------------------------
+def compare(stored: pd.DataFrame, projected: pd.DataFrame, file_name) -> pd.DataFrame:
+    """One row per disagreement: not_in_journal, not_in_table, or a column mismatch."""
+    key = KEYS[file_name]
+    stored = stored.drop_duplicates(key)
+    stored = stored.set_index(stored[key].astype(str))
+    projected = projected.set_index(projected[key].astype(str))
+    issues = [
+        pd.DataFrame({"key": stored.index.difference(projected.index), "issue": "not_in_journal"}),
+        pd.DataFrame({"key": projected.index.difference(stored.index), "issue": "not_in_table"}),
+    ]
+    both = stored.index.intersection(projected.index)
+    for col, kind in schemas.TABLES[file_name]:
+        if col == key or col not in stored.columns:
+            continue
+        a, b = stored.loc[both, col], projected.loc[both, col]
+        known = b.notna().to_numpy()
+        if kind == TIMESTAMP:
+            differ = ~((a - b).abs() <= TS_TOLERANCE).to_numpy()
+        elif kind in (FLOAT, INT):
+            differ = ~np.isclose(a.to_numpy(dtype=float, na_value=np.nan), b.to_numpy(dtype=float, na_value=np.nan),
+                                 equal_nan=True)
+        else:
+            differ = (a.astype(object).fillna("").astype(str) != b.astype(object).fillna("").astype(str)).to_numpy()
+        bad = differ & known
+        if bad.any():
+            issues.append(pd.DataFrame({"key": both[bad], "column": col, "stored": a[bad].astype(str).to_numpy(),
+                                        "projected": b[bad].astype(str).to_numpy(), "issue": "mismatch"}))
+    out = pd.concat(issues, ignore_index=True).reindex(columns=["key", "column", "stored", "projected", "issue"])
+    out.insert(0, "table", file_name)
+    return out.fillna({"column": "", "stored": "", "projected": ""})
+
+
+# ----------------------------
+# Module-level projector
+# ----------------------------
+_projector = None
+_lock = threading.Lock()
+
+
+def _journal():
+    return journal_for(csv_path(EVENTS_FILE))
+
+
+def projector() -> Projector:
+    """The process-wide projection: loaded from the checkpoint once, caught up whenever the journal grows."""
+    global _projector
+    journal = _journal()
+    token = journal.version_token()
+    with _lock:
+        if _projector is None:
+            _projector = Projector.load() or Projector()
+        if _projector.token is None or _projector.token != token:
+            _projector.catch_up(journal)
+            _projector.token = token
+        return _projector
+
+
+def project(file_name) -> pd.DataFrame:
+    """A table as the journal says it should be."""
+    p = projector()
+    with _lock:
+        return p.frame(file_name)
+
+
+def check(file_names=None) -> pd.DataFrame:
+    """Disagreements between the stored tables and the projection, for every projected table by default."""
+    p = projector()
+    with _lock:
+        frames = {f: p.frame(f) for f in (file_names or KEYS)}
+    return pd.concat([compare(load_table(f), df, f) for f, df in frames.items()], ignore_index=True)
+
+
+def catch_up() -> Projector:
+    """Catch the process-wide projection up and save it as the new checkpoint."""
+    p = projector()
+    with _lock:
+        p.save()
+    return p
+
+
+def rebuild() -> Projector:
+    """Replay the whole journal from scratch and save the result as the checkpoint."""
+    global _projector
+    with _lock:
+        p = Projector()
+        p.token = _journal().version_token()
+        p.catch_up()
+        p.save()
+        _projector = p
+    return p
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "catch_up"
+    p = rebuild() if cmd == "rebuild" else catch_up()
+    print({"events": p.events, **{f: len(t) for f, t in p.tables.items()},
+           "orphan_updates": {f: t.orphans for f, t in p.tables.items()}})
+    if cmd == "check":
+        issues = check()
+        print(issues.groupby(["table", "issue"]).size().to_string() if len(issues) else "consistent")
+        print(issues.head(50).to_string(index=False))
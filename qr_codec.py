@@ -0,0 +1,238 @@
+"""
+DWR QR payload codec.
+
+Issued receipts carry a compact signed payload:
+
+    DWR1:<base45(binary record + 16-byte HMAC tag)>
+
+The binary record packs timestamps as epoch seconds and the status as a one-byte
+code, and base45 keeps the whole string in the QR alphanumeric mode, so a receipt
+QR stays small (~100 chars vs ~250 for the old JSON). The HMAC can be checked
+offline by any holder of the platform key without a registry lookup.
+
+`decode_payload` also accepts the legacy JSON payloads, bare `DWR-...` ids and
+`receipt_id=...` query strings, so older printed receipts still scan.
+"""
+import json
+import struct
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+import numpy as np
+import pandas as pd
+
+from signing import sign, check
+
+PREFIX = "DWR1:"
+VERSION = 1
+TAG_BYTES = 16
+PURPOSE = b"dwr-qr-v1"
+
+STATUS_CODES = ["active", "advance_active", "pending_sale", "sold", "released", "disputed", "expired"]
+STRING_FIELDS = ["receipt_id", "lot_id", "owner_entity_id", "custodian_id"]
+FIELDS = STRING_FIELDS + ["issued_at", "expiry_ts", "status"]
+
+_HEADER = struct.Struct(">BIIB")  # version, issued_at, expiry_ts, status code
+
+# ----------------------------
+# Base45 (RFC 9285)
+# ----------------------------
+B45_CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+_B45_INDEX = {c: i for i, c in enumerate(B45_CHARSET)}
+_B45_ENC = np.frombuffer(B45_CHARSET.encode("ascii"), dtype=np.uint8)
+_B45_DEC = np.full(256, 255, dtype=np.int64)
+_B45_DEC[_B45_ENC] = np.arange(45)
+
+
+def b45encode(data: bytes) -> str:
+    out = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        out += (B45_CHARSET[n % 45], B45_CHARSET[n // 45 % 45], B45_CHARSET[n // 2025])
+    if len(data) % 2:
+        out += (B45_CHARSET[data[-1] % 45], B45_CHARSET[data[-1] // 45])
+    return "".join(out)
+
+
+def b45decode(text: str) -> bytes:
+    """Scalar decode; pure Python is faster than numpy for a single ~100 char payload."""
+    try:
+        vals = [_B45_INDEX[c] for c in text]
+    except KeyError:
+        raise ValueError("invalid base45 character")
+    if len(vals) % 3 == 1:
+        raise ValueError("invalid base45 length")
+    out = bytearray()
+    for i in range(0, len(vals) - 2, 3):
+        n = vals[i] + vals[i + 1] * 45 + vals[i + 2] * 2025
+        if n > 0xFFFF:
+            raise ValueError("invalid base45 triple")
+        out += bytes((n >> 8, n & 0xFF))
+    if len(vals) % 3 == 2:
+        n = vals[-2] + vals[-1] * 45
+        if n > 0xFF:
+            raise ValueError("invalid base45 pair")
+        out.append(n)
+    return bytes(out)
+
+
+def _b45decode_rows(chars: np.ndarray):
+    """Decode a (rows, length) uint8 array of equal-length base45 strings in one pass."""
+    vals = _B45_DEC[chars]
+    if (vals == 255).any():
+        raise ValueError("invalid base45 character")
+    rows, length = vals.shape
+    triples, rest = divmod(length, 3)
+    if rest == 1:
+        raise ValueError("invalid base45 length")
+    t = vals[:, : triples * 3].reshape(rows, triples, 3)
+    n = t[:, :, 0] + t[:, :, 1] * 45 + t[:, :, 2] * 2025
+    if (n > 0xFFFF).any():
+        raise ValueError("invalid base45 triple")
+    out = np.stack([n // 256, n % 256], axis=2).reshape(rows, triples * 2)
+    if rest == 2:
+        tail = vals[:, -2] + vals[:, -1] * 45
+        if (tail > 0xFF).any():
+            raise ValueError("invalid base45 pair")
+        out = np.concatenate([out, tail[:, None]], axis=1)
+    return [row.tobytes() for row in out.astype(np.uint8)]
+
+
+# ----------------------------
+# Encode / decode
+# ----------------------------
+def encode_payload(receipt_id, lot_id, owner_entity_id, custodian_id, issued_at=None, expiry_ts=None,
+                   status="active", key=None) -> str:
+    record = _pack({
+        "receipt_id": receipt_id,
+        "lot_id": lot_id,
+        "owner_entity_id": owner_entity_id,
+        "custodian_id": custodian_id,
+        "issued_at": issued_at or datetime.utcnow().isoformat() + "Z",
+        "expiry_ts": expiry_ts,
+        "status": status,
+    })
+    return PREFIX + b45encode(record + sign(record, PURPOSE, TAG_BYTES, key))
+
+
+def decode_payload(payload, key=None) -> dict:
+    """
+    Decode any supported payload. Returns the fields plus `format` and `signature_valid`
+    (True/False for signed payloads, None for unsigned legacy formats).
+    Raises ValueError if the payload is not recognised.
+    """
+    text = str(payload or "").strip()
+    if text.startswith(PREFIX):
+        raw = b45decode(text[len(PREFIX):])
+        return _unpack_signed(raw, key)
+    if text.startswith("{"):
+        data = json.loads(text)
+        if not isinstance(data, dict) or not data.get("receipt_id"):
+            raise ValueError("JSON payload has no receipt_id")
+        return {**{f: data.get(f) for f in FIELDS}, "format": "json", "signature_valid": None}
+    if text.startswith("DWR-"):
+        return {**dict.fromkeys(FIELDS), "receipt_id": text, "format": "id", "signature_valid": None}
+    if "receipt_id=" in text:
+        receipt_id = parse_qs(text, keep_blank_values=True).get("receipt_id", [None])[0]
+        if receipt_id:
+            return {**dict.fromkeys(FIELDS), "receipt_id": receipt_id, "format": "query", "signature_valid": None}
+    raise ValueError("unrecognised QR payload")
+
+
+def decode_many(payloads, key=None) -> pd.DataFrame:
+    """
+    Batch decode for handheld scanner dumps. Signed payloads are grouped by length and
+    base45-decoded as 2-D arrays; invalid payloads get an `error` instead of raising.
+    """
+    payloads = [str(p or "").strip() for p in payloads]
+    results = [None] * len(payloads)
+
+    signed = {}
+    for i, p in enumerate(payloads):
+        if p.startswith(PREFIX):
+            signed.setdefault(len(p), []).append(i)
+
+    for length, idx in signed.items():
+        chars = np.frombuffer("".join(payloads[i][len(PREFIX):] for i in idx).encode("ascii", "replace"), dtype=np.uint8)
+        chars = chars.reshape(len(idx), length - len(PREFIX))
+        try:
+            raws = _b45decode_rows(chars)
+        except ValueError:
+            raws = [None] * len(idx)
+        for i, raw in zip(idx, raws):
+            try:
+                results[i] = _unpack_signed(raw if raw is not None else b45decode(payloads[i][len(PREFIX):]), key)
+            except ValueError as e:
+                results[i] = {"error": str(e)}
+
+    for i, p in enumerate(payloads):
+        if results[i] is None:
+            try:
+                results[i] = decode_payload(p, key)
+            except ValueError as e:
+                results[i] = {"error": str(e)}
+
+    columns = FIELDS + ["format", "signature_valid", "error"]
+    df = pd.DataFrame([{**dict.fromkeys(columns), **r} for r in results], columns=columns, dtype=object)
+    df.insert(0, "payload", payloads)
+    return df
+
+
+def _pack(fields: dict) -> bytes:
+    status = fields.get("status") or "active"
+    code = STATUS_CODES.index(status) if status in STATUS_CODES else 255
+    out = [_HEADER.pack(VERSION, _epoch(fields.get("issued_at")), _epoch(fields.get("expiry_ts")), code)]
+    for name in STRING_FIELDS:
+        value = str(fields.get(name) or "").encode("utf-8")
+        if len(value) > 255:
+            raise ValueError(f"{name} too long for QR payload")
+        out.append(bytes([len(value)]) + value)
+    return b"".join(out)
+
+
+def _unpack_signed(raw: bytes, key=None) -> dict:
+    if len(raw) < _HEADER.size + TAG_BYTES:
+        raise ValueError("truncated QR payload")
+    record, tag = raw[:-TAG_BYTES], raw[-TAG_BYTES:]
+    version, issued, expiry, code = _HEADER.unpack_from(record)
+    if version != VERSION:
+        raise ValueError(f"unsupported QR payload version {version}")
+    out, pos = {}, _HEADER.size
+    for name in STRING_FIELDS:
+        if pos >= len(record):
+            raise ValueError("truncated QR payload")
+        n = record[pos]
+        out[name] = record[pos + 1 : pos + 1 + n].decode("utf-8")
+        pos += 1 + n
+    out["issued_at"] = _iso(issued)
+    out["expiry_ts"] = _iso(expiry)
+    out["status"] = STATUS_CODES[code] if code < len(STATUS_CODES) else None
+    out["format"] = "signed"
+    out["signature_valid"] = check(record, tag, PURPOSE, key)
+    return out
+
+
+def _epoch(value) -> int:
+    if value is None or value == "":
+        return 0
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        text = str(value).strip()
+        if text.endswith("Z"):
+            text = text[:-1]
+        try:
+            ts = datetime.fromisoformat(text)
+        except ValueError:
+            ts = pd.to_datetime(value, errors="coerce", utc=True)
+            if pd.isna(ts):
+                return 0
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return max(0, min(int(ts.timestamp()), 0xFFFFFFFF))
+
+
+def _iso(epoch: int):
+    if not epoch:
+        return None
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
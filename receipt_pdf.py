@@ -0,0 +1,186 @@
+"""
+Receipt PDF renderer.
+
+The static page (header band, section boxes, field labels, footer) is drawn once per
+document into a form XObject and every receipt page only draws its values, the QR
+code (one filled path of module runs) and a `Do` of the template. A merged bulk PDF
+therefore carries the template once, however many receipts it holds.
+"""
+import itertools
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.lib.colors import HexColor, black, white
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+TEMPLATE = "dwr_receipt_template"
+WIDTH, HEIGHT = A4
+
+BRAND = HexColor("#1F4E79")
+RULE = HexColor("#B7C4D1")
+MUTED = HexColor("#5A6570")
+
+VALUE_X = 150
+QR_X, QR_Y, QR_SIZE = 400, 560, 150
+QR_BORDER = 4
+
+# (section title, box top y, [(label, source, field)])
+SECTIONS = [
+    ("Receipt", 760, [
+        ("Receipt ID", "receipt", "receipt_id"),
+        ("Issued at", "receipt", "issued_at"),
+        ("Status", "receipt", "status"),
+        ("Expiry", "receipt", "expiry_ts"),
+        ("Lot ID", "receipt", "lot_id"),
+        ("Lien", "receipt", "lien_active"),
+    ]),
+    ("Owner", 610, [
+        ("Entity ID", "owner", "entity_id"),
+        ("Name", "owner", "name"),
+        ("Type", "owner", "entity_type"),
+        ("Region", "owner", "region"),
+        ("Phone", "owner", "phone"),
+    ]),
+    ("Custodian", 480, [
+        ("Custodian ID", "custodian", "custodian_id"),
+        ("Name", "custodian", "name"),
+        ("Region", "custodian", "region"),
+        ("License", "custodian", "license_status"),
+    ]),
+    ("Lot Details", 370, [
+        ("Product Type", "lot", "product_type"),
+        ("Quantity Liters", "lot", "quantity_liters"),
+        ("Fat %", "lot", "fat_pct"),
+        ("SNF %", "lot", "snf_pct"),
+        ("Acidity", "lot", "acidity"),
+        ("Antibiotic Test", "lot", "antibiotic_test"),
+        ("Bacterial Score", "lot", "bacterial_score"),
+        ("Avg Temp C", "lot", "temp_avg_c"),
+        ("Quality Grade", "lot", "quality_grade"),
+        ("Lot Status", "lot", "status"),
+    ]),
+]
+LINE = 16
+
+# Pre-computed value positions: (x, y, source, field); built once at import
+_VALUE_SLOTS = [
+    (VALUE_X, top - 32 - i * LINE, source, field)
+    for _, top, fields in SECTIONS
+    for i, (_, source, field) in enumerate(fields)
+]
+
+
+def generate_receipt_pdf(receipt_row: dict, lot_row=None, owner_row=None, custodian_row=None) -> bytes:
+    return render_receipts([(receipt_row, lot_row, owner_row, custodian_row)])
+
+
+def render_receipts(items) -> bytes:
+    """One PDF with a page per (receipt, lot, owner, custodian) item, sharing one template."""
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    pdf.setTitle("Digital Warehouse Receipt")
+    _define_template(pdf)
+    for receipt_row, lot_row, owner_row, custodian_row in items:
+        _draw_page(pdf, receipt_row, lot_row, owner_row, custodian_row)
+    pdf.save()
+    return buffer.getvalue()
+
+
+def qr_modules(payload: str) -> tuple:
+    """Module matrix (True = dark) for a payload, error correction level M, as rows of booleans."""
+    return _qr_modules(str(payload or ""))
+
+
+# ----------------------------
+# QR encoding
+# ----------------------------
+@lru_cache(maxsize=4096)
+def _qr_modules(payload: str) -> tuple:
+    # reportlab's encoder, with its mask scoring; a receipt re-rendered for a ZIP and a
+    # merged PDF (or downloaded again) reuses the matrix
+    qr = QrCodeWidget(payload, barLevel="M").qr
+    qr.make()
+    n = qr.getModuleCount()
+    return tuple(tuple(bool(qr.isDark(r, c)) for c in range(n)) for r in range(n))
+
+
+@lru_cache(maxsize=4096)
+def _qr_runs(payload: str) -> tuple:
+    """(row, first column, length) of each horizontal run of dark modules."""
+    runs = []
+    for r, row in enumerate(_qr_modules(payload)):
+        c = 0
+        for dark, group in itertools.groupby(row):
+            count = len(list(group))
+            if dark:
+                runs.append((r, c, count))
+            c += count
+    return tuple(runs)
+
+
+def _draw_qr(pdf, payload):
+    n = len(_qr_modules(payload)) + 2 * QR_BORDER
+    box = QR_SIZE / n
+    path = pdf.beginPath()
+    for r, c, count in _qr_runs(payload):
+        path.rect(QR_X + (c + QR_BORDER) * box, QR_Y + QR_SIZE - (r + QR_BORDER + 1) * box, count * box, box)
+    pdf.setFillColor(black)
+    pdf.drawPath(path, stroke=0, fill=1)
+
+
+def _define_template(pdf):
+    pdf.beginForm(TEMPLATE)
+    _draw_template(pdf)
+    pdf.endForm()
+
+
+def _draw_template(pdf):
+    pdf.setFillColor(BRAND)
+    pdf.rect(0, HEIGHT - 60, WIDTH, 60, stroke=0, fill=1)
+    pdf.setFillColor(white)
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(40, HEIGHT - 35, "Mali Dairy Digital Warehouse Receipt (DWR / BDN)")
+    pdf.setFont("Helvetica", 9)
+    pdf.drawString(40, HEIGHT - 50, "Récépissé d'entrepôt numérique — pilot registry")
+
+    pdf.setStrokeColor(RULE)
+    for title, top, fields in SECTIONS:
+        width = (QR_X - 55) if top > QR_Y else (WIDTH - 80)
+        pdf.roundRect(40, top - 20 - len(fields) * LINE, width, len(fields) * LINE + 20, 4, stroke=1, fill=0)
+        pdf.setFillColor(BRAND)
+        pdf.setFont("Helvetica-Bold", 11)
+        pdf.drawString(50, top - 14, title)
+        pdf.setFillColor(MUTED)
+        labels = pdf.beginText()
+        labels.setFont("Helvetica", 9)
+        for i, (label, _, _) in enumerate(fields):
+            labels.setTextOrigin(50, top - 32 - i * LINE)
+            labels.textOut(label)
+        pdf.drawText(labels)
+
+    pdf.roundRect(QR_X - 5, QR_Y - 20, QR_SIZE + 10, QR_SIZE + 25, 4, stroke=1, fill=0)
+    pdf.drawCentredString(QR_X + QR_SIZE / 2, QR_Y - 13, "Scan to verify (signed QR)")
+
+    pdf.setFont("Helvetica", 8)
+    pdf.drawString(40, 50, "This receipt is valid only while its registry status is active. Verify by scanning the QR code")
+    pdf.drawString(40, 40, "or entering the Receipt ID on the registry verification page.")
+
+
+def _draw_page(pdf, receipt_row, lot_row, owner_row, custodian_row):
+    rows = {"receipt": receipt_row or {}, "lot": lot_row or {}, "owner": owner_row or {}, "custodian": custodian_row or {}}
+    pdf.doForm(TEMPLATE)
+
+    text = pdf.beginText()
+    text.setFont("Helvetica", 10)
+    for x, y, source, field in _VALUE_SLOTS:
+        value = rows[source].get(field)
+        text.setTextOrigin(x, y)
+        text.textOut("" if value is None or value != value else str(value)[:70])
+    pdf.drawText(text)
+
+    payload = rows["receipt"].get("qr_payload")
+    if payload:
+        _draw_qr(pdf, payload)
+    pdf.showPage()
@@ -0,0 +1,100 @@
+"""
+Portfolio risk for in-house advances.
+
+`portfolio` joins every active advance with its receipt, lot and owner region in one
+vectorised pass, then values the collateral at today's reference price (prices.lookup) and
+adds current LTV, hours to expiry vs. due date and the margin-call / spoilage-risk flags.
+`exposure` rolls the result up by owner, custodian or region. The join is cached per table
+version, so a dashboard refresh only recomputes the price- and time-dependent columns.
+"""
+import pandas as pd
+
+from storage import get_backend
+from table_cache import load_table, cached
+from sla import SPOILED_STATUSES
+from collateral import join_collateral, value, totals, utc, MARGIN_CALL_LTV
+
+ADVANCES_FILE = "advances.csv"
+INPUT_FILES = [ADVANCES_FILE, "dwr_receipts.csv", "dairy_lots.csv", "entities.csv"]
+
+# Collateral expiring within this many hours (or before the advance is due) is at risk
+SPOILAGE_HOURS = 24
+BREACH_LIMIT = 3
+TEMP_MIN_C, TEMP_MAX_C = 2.0, 6.0
+
+GROUPS = {"owner": "owner_entity_id", "custodian": "custodian_id", "region": "region"}
+
+
+# ----------------------------
+# Portfolio
+# ----------------------------
+def join_portfolio(advances, receipts, lots, entities) -> pd.DataFrame:
+    """Active advances with their collateral (the part that only changes with the tables)."""
+    df = advances.loc[advances["status"] == "active",
+                      ["advance_id", "receipt_id", "provider_id", "advance_xof", "fee_xof", "created_at", "due_at"]]
+    df = join_collateral(df, receipts, lots, entities, ["lot_id", "owner_entity_id", "custodian_id", "expiry_ts"],
+                         ["product_type", "quantity_liters", "temp_avg_c", "temp_breach_count", "status"])
+
+    df["exposure_xof"] = df["advance_xof"].fillna(0) + df["fee_xof"].fillna(0)
+    breaches = pd.to_numeric(df["temp_breach_count"], errors="coerce").fillna(0).to_numpy()
+    temp = df["temp_avg_c"].to_numpy(dtype=float)
+    df["cold_chain_risk"] = ((breaches >= BREACH_LIMIT) | (temp < TEMP_MIN_C) | (temp > TEMP_MAX_C)
+                             | df["lot_status"].isin(SPOILED_STATUSES).to_numpy())
+    return df
+
+
+def flag(df: pd.DataFrame, now=None, book=None) -> pd.DataFrame:
+    """
+    Collateral value and LTV at the reference prices in force at `now`, time to expiry/due
+    and the flags. An advance whose collateral cannot be valued (missing lot or quantity)
+    has no LTV and is flagged for a margin call.
+    """
+    now = utc(now)
+    xof_per_liter, collateral, ltv = value(df, now, book)
+    hour = pd.Timedelta(hours=1)
+    to_expiry = (df["expiry_ts"] - now) / hour
+    to_due = (df["due_at"] - now) / hour
+    expires_before_due = (df["expiry_ts"] < df["due_at"]).to_numpy()
+    return df.assign(
+        xof_per_liter=xof_per_liter,
+        collateral_xof=collateral,
+        ltv=ltv,
+        hours_to_expiry=to_expiry.round(1),
+        hours_to_due=to_due.round(1),
+        expires_before_due=expires_before_due,
+        overdue=(to_due < 0).to_numpy(),
+        margin_call=~(ltv < MARGIN_CALL_LTV),
+        spoilage_risk=df["cold_chain_risk"].to_numpy() | expires_before_due | (to_expiry < SPOILAGE_HOURS).to_numpy(),
+    )
+
+
+def portfolio(now=None) -> pd.DataFrame:
+    """One row per active advance with LTV, time to expiry/due and risk flags."""
+    backend = get_backend()
+    token = tuple(backend.version_token(f) for f in INPUT_FILES)
+    joined = cached("risk:portfolio", token, lambda: join_portfolio(*(load_table(f) for f in INPUT_FILES)))
+    return flag(joined, now)
+
+
+def exposure(df: pd.DataFrame, by="owner") -> pd.DataFrame:
+    """Exposure, collateral, aggregate LTV and flag counts per owner / custodian / region."""
+    col = GROUPS.get(by, by)
+    out = df.groupby(col, observed=True, dropna=False).agg(
+        advances=("advance_id", "size"),
+        exposure_xof=("exposure_xof", "sum"),
+        collateral_xof=("collateral_xof", "sum"),
+        margin_calls=("margin_call", "sum"),
+        spoilage_risk=("spoilage_risk", "sum"),
+    )
+    out["ltv"] = (out["exposure_xof"] / out["collateral_xof"].where(out["collateral_xof"] > 0)).round(3)
+    return out.sort_values("exposure_xof", ascending=False).reset_index()
+
+
+def summary(df: pd.DataFrame) -> dict:
+    return {
+        "advances": len(df),
+        **totals(df),
+        "spoilage_risk": int(df["spoilage_risk"].sum()),
+        "overdue": int(df["overdue"].sum()),
+    }
+
@@ -0,0 +1,192 @@
+"""
+Table schema registry: the columns of every ledger and the dtype each is held in.
+
+Loads go through `apply` (table_cache.load_table does it for every table), so pages
+get compact, comparable columns instead of whatever read_csv infers:
+
+    category     statuses and other small vocabularies (status, product_type, region, ...)
+    timestamp    datetime64[ns, UTC]; naive, "Z" and "+00:00Z" ISO strings all parse
+    float64      measurements and XOF amounts (NaN when blank)
+    Int64        counts (nullable, so blanks stay blank)
+    string       ids and free text, kept as Python str objects
+
+Storage stays text: `iso` turns a timestamp back into the "...Z" form the pages write.
+"""
+import numpy as np
+import pandas as pd
+
+STRING, CATEGORY, FLOAT, INT, TIMESTAMP = "string", "category", "float64", "Int64", "timestamp"
+_DTYPES = {STRING: object, CATEGORY: "category", FLOAT: "float64", INT: "Int64", TIMESTAMP: "datetime64[ns, UTC]"}
+
+TABLES = {
+    "entities.csv": [
+        ("entity_id", STRING), ("entity_type", CATEGORY), ("name", STRING), ("contact_name", STRING),
+        ("phone", STRING), ("region", CATEGORY), ("legal_status", CATEGORY), ("mobile_money_id", STRING),
+    ],
+    "custodians.csv": [
+        ("custodian_id", STRING), ("custodian_type", CATEGORY), ("name", STRING), ("region", CATEGORY),
+        ("license_status", CATEGORY), ("power_source", CATEGORY), ("notes", STRING),
+    ],
+    "tanks.csv": [
+        ("tank_id", STRING), ("custodian_id", STRING), ("capacity_liters", FLOAT), ("cooling_type", CATEGORY),
+        ("temp_min_c", FLOAT), ("temp_max_c", FLOAT), ("status", CATEGORY), ("ownership_model", CATEGORY),
+        ("owner_entity_id", STRING), ("rent_xof_per_day", FLOAT), ("rent_to_own_months", INT),
+        ("purchase_price_xof", FLOAT), ("assigned_at", TIMESTAMP), ("contract_until", TIMESTAMP),
+        ("billed_through", TIMESTAMP),
+    ],
+    "dairy_lots.csv": [
+        ("lot_id", STRING), ("created_at", TIMESTAMP), ("owner_entity_id", STRING), ("custodian_id", STRING),
+        ("tank_id", STRING), ("product_type", CATEGORY), ("quantity_liters", FLOAT), ("fat_pct", FLOAT),
+        ("snf_pct", FLOAT), ("acidity", FLOAT), ("antibiotic_test", CATEGORY), ("bacterial_score", FLOAT),
+        ("temp_avg_c", FLOAT), ("temp_breach_count", INT), ("collection_time", TIMESTAMP),
+        ("chill_time", TIMESTAMP), ("expiry_ts", TIMESTAMP), ("quality_grade", CATEGORY), ("status", CATEGORY),
+        ("notes", STRING), ("receipt_id", STRING),
+    ],
+    "dwr_receipts.csv": [
+        ("receipt_id", STRING), ("issued_at", TIMESTAMP), ("lot_id", STRING), ("owner_entity_id", STRING),
+        ("custodian_id", STRING), ("status", CATEGORY), ("expiry_ts", TIMESTAMP), ("qr_payload", STRING),
+        ("lien_active", CATEGORY), ("lien_holder_id", STRING),
+    ],
+    "advances.csv": [
+        ("advance_id", STRING), ("receipt_id", STRING), ("provider_type", CATEGORY), ("provider_id", STRING),
+        ("advance_xof", FLOAT), ("fee_xof", FLOAT), ("tenor_days", INT), ("status", CATEGORY),
+        ("created_at", TIMESTAMP), ("due_at", TIMESTAMP), ("repaid_at", TIMESTAMP), ("notes", STRING),
+    ],
+    "sales_contracts.csv": [
+        ("contract_id", STRING), ("receipt_id", STRING), ("buyer_entity_id", STRING), ("price_xof", FLOAT),
+        ("payment_terms", CATEGORY), ("status", CATEGORY), ("created_at", TIMESTAMP), ("settled_at", TIMESTAMP),
+        ("notes", STRING),
+    ],
+    "payments.csv": [
+        ("payment_id", STRING), ("ref_type", CATEGORY), ("ref_id", STRING), ("payer_id", STRING),
+        ("payee_id", STRING), ("amount_xof", FLOAT), ("method", CATEGORY), ("status", CATEGORY),
+        ("created_at", TIMESTAMP), ("confirmed_at", TIMESTAMP), ("provider_ref", STRING),
+        ("period_start", TIMESTAMP), ("period_end", TIMESTAMP),
+    ],
+    "release_orders.csv": [
+        ("release_order_id", STRING), ("receipt_id", STRING), ("custodian_id", STRING),
+        ("buyer_entity_id", STRING), ("status", CATEGORY), ("created_at", TIMESTAMP),
+        ("confirmed_at", TIMESTAMP), ("notes", STRING),
+    ],
+    "disputes.csv": [
+        ("dispute_id", STRING), ("receipt_id", STRING), ("raised_by_entity_id", STRING),
+        ("dispute_type", CATEGORY), ("description", STRING), ("status", CATEGORY), ("created_at", TIMESTAMP),
+        ("resolved_at", TIMESTAMP), ("resolution", STRING), ("prior_status", CATEGORY),
+    ],
+    "liens.csv": [
+        ("lien_id", STRING), ("receipt_id", STRING), ("lender_type", CATEGORY), ("lender_id", STRING),
+        ("principal_xof", FLOAT), ("interest_xof", FLOAT), ("status", CATEGORY), ("created_at", TIMESTAMP),
+        ("released_at", TIMESTAMP), ("notes", STRING),
+    ],
+    "reference_prices.csv": [
+        ("product_type", CATEGORY), ("region", CATEGORY), ("xof_per_liter", FLOAT), ("effective_from", TIMESTAMP),
+        ("source", STRING),
+    ],
+    "sla_coldchain.csv": [
+        ("month", STRING), ("custodian_id", STRING), ("lots_received", INT), ("avg_temp_c", FLOAT),
+        ("temp_breaches", INT), ("spoiled_lots", INT), ("dispute_rate", FLOAT), ("sla_score", INT),
+        ("penalty_status", CATEGORY),
+    ],
+    "users.csv": [
+        ("username", STRING), ("password", STRING), ("role", CATEGORY), ("entity_id", STRING), ("name", STRING),
+    ],
+    "events.csv": [
+        ("event_ts", TIMESTAMP), ("username", CATEGORY), ("event_type", CATEGORY), ("object_type", CATEGORY),
+        ("object_id", STRING), ("details_json", STRING),
+    ],
+}
+
+
+def columns(file_name) -> list:
+    return [col for col, _ in TABLES[file_name]]
+
+
+def kinds(file_name) -> dict:
+    return dict(TABLES.get(file_name, []))
+
+
+def empty(file_name) -> pd.DataFrame:
+    return apply(pd.DataFrame(columns=columns(file_name)), file_name)
+
+
+def read_dtypes(file_name) -> dict:
+    """dtype= for read_csv: text columns are read as str (no inference), vocabularies straight to category."""
+    return {col: ("category" if kind == CATEGORY else str)
+            for col, kind in TABLES.get(file_name, []) if kind in (STRING, CATEGORY)}
+
+
+def apply(df: pd.DataFrame, file_name) -> pd.DataFrame:
+    """
+    Cast a loaded table to its declared dtypes. Declared columns come first (missing ones
+    are added as nulls); undeclared columns such as row_version are kept as read.
+    Unparseable values become nulls. Tables without a declaration are returned unchanged.
+    """
+    declared = TABLES.get(file_name)
+    if declared is None:
+        return df
+    out = {}
+    for col, kind in declared:
+        if col in df.columns:
+            out[col] = cast(df[col], kind)
+        else:
+            out[col] = pd.Series(None, index=df.index, dtype=_DTYPES[kind])
+    for col in df.columns:
+        if col not in out:
+            out[col] = df[col]
+    return pd.DataFrame(out, index=df.index)
+
+
+def cast(values: pd.Series, kind) -> pd.Series:
+    if kind == TIMESTAMP:
+        return timestamps(values)
+    if kind == FLOAT:
+        return pd.to_numeric(values, errors="coerce").astype("float64")
+    if kind == INT:
+        if values.dtype == "Int64":
+            return values
+        return pd.to_numeric(values, errors="coerce").round().astype("Int64")
+    if kind == CATEGORY:
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return values
+        return _text(values).astype("category")
+    return _text(values)
+
+
+def _text(values: pd.Series) -> pd.Series:
+    if values.dtype == object:
+        return values
+    return values.astype(str).where(values.notna(), None).astype(object)
+
+
+def timestamps(values: pd.Series) -> pd.Series:
+    """UTC datetime64 from ISO strings as stored by the pages (naive, "Z" or "+00:00Z")."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.tz_localize("UTC") if values.dt.tz is None else values.dt.tz_convert("UTC")
+    try:
+        # Arrow's cast parses a clean "...Z" column ~40x faster than to_datetime, but all-or-nothing
+        import pyarrow as pa
+
+        parsed = pa.array(values, type=pa.string(), from_pandas=True).cast(pa.timestamp("us", tz="UTC"))
+        return pd.Series(parsed.to_pandas(), index=values.index).astype("datetime64[ns, UTC]")
+    except (ImportError, ValueError, TypeError):
+        pass
+    ts = pd.to_datetime(values, errors="coerce", utc=True, format="ISO8601")
+    # pd.Timestamp.utcnow().isoformat() + "Z" gives "...+00:00Z", which to_datetime rejects
+    retry = ts.isna() & values.notna()
+    if retry.any():
+        text = values[retry].astype(str).str.strip().str.replace(r"(?<=[+-]\d\d:\d\d)Z$", "", regex=True)
+        ts[retry] = pd.to_datetime(text, errors="coerce", utc=True, format="ISO8601")
+    return ts
+
+
+def iso(value):
+    """A timestamp cell back to the stored "YYYY-MM-DDTHH:MM:SS.ffffffZ" text; blanks and strings pass through."""
+    if value is pd.NaT:
+        return ""
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        ts = pd.Timestamp(value)
+        if pd.isna(ts):
+            return ""
+        ts = ts.tz_convert("UTC") if ts.tzinfo else ts
+        return ts.tz_localize(None).isoformat() + "Z"
+    return value
@@ -0,0 +1,307 @@
+"""
+Batch settlement of mobile money statements.
+
+Orange Money, Moov and Wave hand back reconciliation files (CSV or JSON) with one line per
+payment. `settle_statement` reads one, matches every line to a pending sale contract and
+applies payments, advance repayments, contract settlement and the receipts' `sold`
+transition in a single unit of work:
+
+    report = settle_statement("wave_2026-10-18.csv", username="platform_admin")
+    report["unmatched"]        # lines that were not applied, with a reason
+
+Lines are matched by contract reference first, then lines without a usable reference by
+(payer phone number, amount) when that pair is unique on both sides. Both matches are
+hash joins over the whole statement, so a file of thousands of lines costs a few table
+scans instead of one page round-trip and four file rewrites per payment.
+
+    python settlement.py statement.csv [orange_money|moov_money|wave]
+"""
+import io
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+from utils import gen_ids
+from table_cache import load_table
+from transactions import run_in_transaction
+from state_machine import apply_transitions, transition
+from schemas import iso, timestamps
+
+CONTRACTS_FILE = "sales_contracts.csv"
+PAYMENTS_FILE = "payments.csv"
+ADVANCES_FILE = "advances.csv"
+RECEIPTS_FILE = "dwr_receipts.csv"
+ENTITIES_FILE = "entities.csv"
+# Entity column holding the MSISDN that payments come from
+PHONE_COLUMN = "phone"
+
+PLATFORM_ENTITY_ID = "E-PLAT-001"
+# Provider amounts are whole XOF; allow for rounding in the file
+AMOUNT_TOLERANCE_XOF = 1.0
+
+# Statement column -> normalised column, per provider
+PROVIDERS = {
+    "orange_money": {"Transaction ID": "provider_ref", "Reference": "reference", "Amount": "amount_xof",
+                     "Sender": "payer_msisdn", "Date": "paid_at", "Status": "status"},
+    "moov_money": {"txn_id": "provider_ref", "merchant_ref": "reference", "amount": "amount_xof",
+                   "msisdn": "payer_msisdn", "txn_date": "paid_at", "txn_status": "status"},
+    "wave": {"id": "provider_ref", "client_reference": "reference", "amount": "amount_xof",
+             "sender_mobile": "payer_msisdn", "when_completed": "paid_at", "status": "status"},
+}
+STATEMENT_COLUMNS = ["provider_ref", "reference", "amount_xof", "payer_msisdn", "paid_at", "status"]
+SUCCESS_STATUSES = {"success", "successful", "succeeded", "completed", "complete", "confirmed", "ok", ""}
+
+
+# ----------------------------
+# Statements
+# ----------------------------
+def read_statement(source, provider=None) -> pd.DataFrame:
+    """
+    A provider statement (path, file object or bytes; CSV or JSON) as one row per line
+    with STATEMENT_COLUMNS plus `line` (1-based position in the file) and `method`.
+    The provider is detected from the column names when not given.
+    """
+    raw = _read_raw(source)
+    provider = provider or detect_provider(raw.columns)
+    df = raw.rename(columns=PROVIDERS.get(provider, {}))
+    for col in STATEMENT_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+    df = df[STATEMENT_COLUMNS].copy()
+    for col in ("provider_ref", "reference", "payer_msisdn", "status"):
+        df[col] = df[col].fillna("").astype(str).str.strip()
+    df["reference"] = df["reference"].str.upper()
+    df["status"] = df["status"].str.lower()
+    df["payer_msisdn"] = _msisdn(df["payer_msisdn"])
+    df["amount_xof"] = pd.to_numeric(df["amount_xof"].astype(str).str.replace(r"[\s,]", "", regex=True), errors="coerce")
+    df["paid_at"] = timestamps(df["paid_at"].fillna("").astype(str))
+    df.insert(0, "line", np.arange(1, len(df) + 1))
+    df["method"] = provider or ""
+    return df
+
+
+def detect_provider(columns) -> str:
+    """The provider whose statement columns best match `columns` ("" if none do)."""
+    columns = set(columns)
+    best, hits = "", 0
+    for provider, mapping in PROVIDERS.items():
+        n = len(columns & set(mapping))
+        if n > hits:
+            best, hits = provider, n
+    return best
+
+
+# ----------------------------
+# Matching
+# ----------------------------
+def reconcile(statement, contracts, receipts, advances, payments=None, entities=None):
+    """
+    Match statement lines to pending contracts without writing anything.
+
+    Returns (matched, unmatched): matched has one row per settled contract with the line,
+    contract, receipt and the advance it repays (if any); unmatched is every other line
+    with a `reason`.
+    """
+    lines = statement.copy()
+    lines["contract_id"] = ""
+    lines["match"] = ""
+    lines["reason"] = ""
+    lines["from_status"] = None
+
+    def reject(mask, reason):
+        lines.loc[mask & (lines["reason"] == ""), "reason"] = reason
+
+    reject(~lines["status"].isin(SUCCESS_STATUSES), "payment not successful")
+    reject(lines["amount_xof"].isna(), "missing amount")
+    reject(lines["provider_ref"].duplicated() & (lines["provider_ref"] != ""), "duplicate line")
+    if payments is not None and len(payments) and "provider_ref" in payments.columns:
+        known = set(payments["provider_ref"].dropna().astype(str))
+        reject(lines["provider_ref"].isin(known) & (lines["provider_ref"] != ""), "already settled")
+
+    pending = contracts.loc[contracts["status"] == "pending_payment",
+                            ["contract_id", "receipt_id", "buyer_entity_id", "price_xof"]]
+    pending = pending.drop_duplicates("contract_id").assign(key=lambda d: d["contract_id"].astype(str).str.upper())
+
+    # 1) by contract reference: one hash join over every line
+    by_ref = pd.Series(pending["contract_id"].to_numpy(), index=pending["key"].to_numpy())
+    open_lines = lines["reason"] == ""
+    ref_hit = open_lines & lines["reference"].isin(by_ref.index)
+    lines.loc[ref_hit, "contract_id"] = by_ref.reindex(lines.loc[ref_hit, "reference"]).to_numpy()
+    lines.loc[ref_hit, "match"] = "reference"
+
+    # 2) the rest by (payer phone number, amount), only where the pair is unique on both sides.
+    #    Statements identify the payer by MSISDN, so match the buyer's registered phone (the
+    #    mobile_money_id column holds account labels such as OM-AWA-001, not numbers).
+    if entities is not None and len(entities) and PHONE_COLUMN in entities.columns:
+        phones = entities.drop_duplicates("entity_id").set_index("entity_id")[PHONE_COLUMN]
+        rest = pending[~pending["contract_id"].isin(lines.loc[ref_hit, "contract_id"])]
+        rest = rest.assign(payer_msisdn=_msisdn(rest["buyer_entity_id"].map(phones)),
+                           amount=rest["price_xof"].round())
+        rest = rest[(rest["payer_msisdn"] != "") & ~rest.duplicated(["payer_msisdn", "amount"], keep=False)]
+        candidates = lines[open_lines & ~ref_hit & (lines["payer_msisdn"] != "")]
+        candidates = candidates.assign(amount=candidates["amount_xof"].round())
+        candidates = candidates[~candidates.duplicated(["payer_msisdn", "amount"], keep=False)]
+        pairs = candidates[["payer_msisdn", "amount"]].reset_index().merge(rest[["payer_msisdn", "amount", "contract_id"]],
+                                               on=["payer_msisdn", "amount"]).set_index("index")
+        lines.loc[pairs.index, "contract_id"] = pairs["contract_id"]
+        lines.loc[pairs.index, "match"] = "payer_amount"
+
+    matched_line = lines["contract_id"] != ""
+    reject(~matched_line & (lines["reference"] != ""), "unknown or settled contract reference")
+    reject(~matched_line, "no reference and no unique payer/amount match")
+    reject(matched_line & lines["contract_id"].duplicated(), "contract already paid in this statement")
+
+    lines = lines.merge(pending.drop(columns="key"), on="contract_id", how="left")
+    short = (lines["reason"] == "") & ((lines["amount_xof"] - lines["price_xof"]).abs() > AMOUNT_TOLERANCE_XOF)
+    lines.loc[short, "reason"] = [f"amount {paid:,.0f} does not match contract price {price:,.0f}"
+                                  for paid, price in lines.loc[short, ["amount_xof", "price_xof"]].to_numpy()]
+
+    # The receipt must still accept the sale (pending_sale -> sold)
+    candidates = lines[lines["reason"] == ""]
+    _, results = apply_transitions(receipts, pd.DataFrame({"receipt_id": candidates["receipt_id"].astype(str),
+                                                           "event": "sale_settled"}), log=False)
+    blocked = ~results["ok"].to_numpy()
+    lines.loc[candidates.index[blocked], "reason"] = "receipt: " + results.loc[blocked, "reason"].astype(str).to_numpy()
+    lines.loc[candidates.index, "from_status"] = results["from_status"].to_numpy()
+
+    matched = lines[lines["reason"] == ""].drop(columns="reason")
+    active = advances.loc[advances["status"] == "active", ["advance_id", "receipt_id", "advance_xof", "fee_xof"]]
+    matched = matched.merge(active.drop_duplicates("receipt_id"), on="receipt_id", how="left")   # first, like the page
+    matched["repaid_xof"] = matched["advance_xof"].fillna(0) + matched["fee_xof"].fillna(0)
+    matched["net_to_owner_xof"] = matched["price_xof"] - matched["repaid_xof"]
+
+    unmatched = lines.loc[lines["reason"] != "", ["line", *STATEMENT_COLUMNS, "method", "contract_id", "reason"]]
+    return matched, unmatched.reset_index(drop=True)
+
+
+# ----------------------------
+# Settlement
+# ----------------------------
+def settle_statement(source, provider=None, username="system", dry_run=False) -> dict:
+    """
+    Reconcile a statement and apply every matched line in one atomic unit of work.
+
+    Returns {"settled": matched lines with their payment_id, "unmatched": rejected lines
+    with a reason, "unpaid": contracts still pending after the run, "summary": totals}.
+    """
+    statement = source if isinstance(source, pd.DataFrame) else read_statement(source, provider)
+    now = iso(pd.Timestamp.utcnow())
+    state = {}
+
+    def stage(tx):
+        # reloaded on every retry, so a concurrent settlement is matched against fresh tables
+        tables = {f: load_table(f) for f in (CONTRACTS_FILE, RECEIPTS_FILE, ADVANCES_FILE, PAYMENTS_FILE, ENTITIES_FILE)}
+        matched, unmatched = reconcile(statement, tables[CONTRACTS_FILE], tables[RECEIPTS_FILE],
+                                       tables[ADVANCES_FILE], tables[PAYMENTS_FILE], tables[ENTITIES_FILE])
+        matched["payment_id"] = gen_ids("PAY", len(matched))
+        state.update(matched=matched, unmatched=unmatched, contracts=tables[CONTRACTS_FILE])
+        if dry_run or matched.empty:
+            return
+
+        _track(tx, CONTRACTS_FILE, tables[CONTRACTS_FILE], matched["contract_id"])
+        _track(tx, RECEIPTS_FILE, tables[RECEIPTS_FILE], matched["receipt_id"])
+        repaid = matched[matched["advance_id"].notna()]
+        _track(tx, ADVANCES_FILE, tables[ADVANCES_FILE], repaid["advance_id"])
+
+        for m in matched.to_dict("records"):
+            tx.insert(PAYMENTS_FILE, {
+                "payment_id": m["payment_id"],
+                "ref_type": "sale_contract",
+                "ref_id": m["contract_id"],
+                "payer_id": m["buyer_entity_id"],
+                "payee_id": PLATFORM_ENTITY_ID,
+                "amount_xof": float(m["amount_xof"]),
+                "method": m["method"],
+                "status": "confirmed",
+                "created_at": now,
+                "confirmed_at": iso(m["paid_at"]) or now,
+                "provider_ref": m["provider_ref"],
+            })
+            tx.update(CONTRACTS_FILE, m["contract_id"], {"status": "settled", "settled_at": now})
+        for advance_id in repaid["advance_id"]:
+            tx.update(ADVANCES_FILE, advance_id, {"status": "repaid", "repaid_at": now})
+        _stage_events(tx, matched, username)
+
+    run_in_transaction(stage)
+    matched, unmatched = state["matched"], state["unmatched"]
+
+    contracts = state["contracts"]
+    unpaid = contracts[(contracts["status"] == "pending_payment")
+                       & ~contracts["contract_id"].isin(matched["contract_id"])]
+    return {
+        "settled": matched,
+        "unmatched": unmatched,
+        "unpaid": unpaid.reset_index(drop=True),
+        "summary": {
+            "lines": len(statement),
+            "settled": len(matched),
+            "unmatched": len(unmatched),
+            "settled_xof": float(matched["amount_xof"].sum()),
+            "advances_repaid": int(matched["advance_id"].notna().sum()),
+            "repaid_xof": float(matched["repaid_xof"].sum()),
+            "unmatched_xof": float(unmatched["amount_xof"].sum()),
+            "unpaid_contracts": len(unpaid),
+            "dry_run": dry_run,
+        },
+    }
+
+
+def report_csv(report: dict) -> bytes:
+    """The unmatched lines of a settlement report as CSV, for the provider or finance team."""
+    return report["unmatched"].to_csv(index=False).encode("utf-8")
+
+
+def _track(tx, file_name, table, keys):
+    key_col = {CONTRACTS_FILE: "contract_id", RECEIPTS_FILE: "receipt_id", ADVANCES_FILE: "advance_id"}[file_name]
+    rows = table[table[key_col].isin(set(keys))].drop_duplicates(key_col)
+    tx.track(file_name, rows.to_dict("records"))
+
+
+def _stage_events(tx, matched: pd.DataFrame, username):
+    # Same transitions and events as a one-by-one settlement on the page, staged in `tx`
+    repaid = matched[matched["advance_id"].notna()]
+    tx.log_many("system", "advance_repaid", "advance", repaid["advance_id"],
+                [{"receipt_id": r} for r in repaid["receipt_id"]])
+    for receipt_id, contract_id in zip(matched["receipt_id"], matched["contract_id"]):
+        transition(tx, receipt_id, "sale_settled", username, {"contract_id": contract_id})
+    tx.log_many(username, "sale_settled", "sale_contract", matched["contract_id"],
+                [{"payment_id": p, "provider_ref": ref, "net_to_owner_est": float(n), "statement_line": int(line)}
+                 for p, ref, n, line in zip(matched["payment_id"], matched["provider_ref"],
+                                            matched["net_to_owner_xof"], matched["line"])])
+
+
+def _read_raw(source) -> pd.DataFrame:
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    name = source if isinstance(source, str) else getattr(source, "name", "")
+    if hasattr(source, "read"):
+        data = source.read()
+        text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+    else:
+        with open(source, encoding="utf-8-sig") as fh:
+            text = fh.read()
+    if str(name).lower().endswith(".json") or text.lstrip()[:1] in ("[", "{"):
+        payload = json.loads(text)
+        if isinstance(payload, dict):
+            # {"transactions": [...]} / {"data": [...]} envelopes
+            payload = next((v for v in payload.values() if isinstance(v, list)), [payload])
+        return pd.DataFrame(payload).astype(object)
+    return pd.read_csv(io.StringIO(text), dtype=str, keep_default_na=False)
+
+
+def _msisdn(values: pd.Series) -> pd.Series:
+    """Digits only, without the Mali country code, so +223 70 00 00 00 and 70000000 match."""
+    digits = values.fillna("").astype(str).str.replace(r"\D", "", regex=True)
+    return digits.str.replace(r"^(00)?223(?=\d{8}$)", "", regex=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or not os.path.exists(sys.argv[1]):
+        sys.exit("usage: python settlement.py statement.csv|statement.json [orange_money|moov_money|wave]")
+    report = settle_statement(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(json.dumps(report["summary"], indent=2))
+    if len(report["unmatched"]):
+        print(report["unmatched"].to_string(index=False))
@@ -0,0 +1,58 @@
+import os
+import hmac
+import hashlib
+import secrets
+import threading
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SECRET_PATH = os.path.join(BASE_DIR, ".dwr_secret")
+
+_key = None
+_lock = threading.Lock()
+
+
+def secret_key() -> bytes:
+    """Platform signing key: DWR_SECRET_KEY if set, else a random key persisted in .dwr_secret."""
+    global _key
+    if _key is None:
+        with _lock:
+            if _key is None:
+                env = os.environ.get("DWR_SECRET_KEY", "")
+                if env:
+                    _key = env.encode("utf-8")
+                else:
+                    if not os.path.exists(SECRET_PATH):
+                        _create_secret()
+                    with open(SECRET_PATH) as fh:
+                        key = fh.read().strip()
+                    if not key:
+                        raise RuntimeError(f"{SECRET_PATH} is empty; delete it or set DWR_SECRET_KEY")
+                    _key = key.encode("utf-8")
+    return _key
+
+
+def _create_secret() -> None:
+    # Written in full to a private temp file, then linked into place: os.link fails if another
+    # process got there first, and nobody can ever read a created-but-unwritten key.
+    tmp = f"{SECRET_PATH}.{os.getpid()}.{secrets.token_hex(4)}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, "w") as fh:
+            fh.write(secrets.token_hex(32))
+            fh.flush()
+            os.fsync(fh.fileno())
+        try:
+            os.link(tmp, SECRET_PATH)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp)
+
+
+def sign(data: bytes, purpose: bytes, length=32, key=None) -> bytes:
+    """HMAC-SHA256 tag over data, domain-separated by purpose and truncated to `length` bytes."""
+    return hmac.new(key or secret_key(), purpose + b"\x00" + data, hashlib.sha256).digest()[:length]
+
+
+def check(data: bytes, tag: bytes, purpose: bytes, key=None) -> bool:
+    return hmac.compare_digest(sign(data, purpose, len(tag), key), tag)
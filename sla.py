@@ -0,0 +1,195 @@
+"""
+Cold-chain SLA engine.
+
+`score_coldchain` scores whole columns at once. `refresh_sla` materialises
+sla_coldchain.csv (one row per custodian x month) from dairy_lots and disputes,
+recomputing only the months whose input rows changed since the last run.
+"""
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+from storage import BASE_DIR, get_backend
+from table_cache import load_table, invalidate
+
+SLA_FILE = "sla_coldchain.csv"
+SLA_COLUMNS = ["month", "custodian_id", "lots_received", "avg_temp_c", "temp_breaches",
+               "spoiled_lots", "dispute_rate", "sla_score", "penalty_status"]
+INPUT_FILES = ["dairy_lots.csv", "disputes.csv", "dwr_receipts.csv"]
+STATE_PATH = os.path.join(BASE_DIR, ".sla_state.json")
+
+# Lot statuses counted as spoiled for the custodian's SLA
+SPOILED_STATUSES = ["spoiled", "quarantined"]
+
+LOT_INPUTS = ["lot_id", "custodian_id", "created_at", "temp_avg_c", "temp_breach_count", "status"]
+DISPUTE_INPUTS = ["dispute_id", "custodian_id", "created_at"]
+# Columns that can change a month's SLA rows (hashing lot_id would double the cost for nothing)
+LOT_FINGERPRINT = ["custodian_id", "created_at", "temp_avg_c", "temp_breach_count", "status"]
+
+
+def score_coldchain(temp_avg_c, temp_breach_count, dispute_count=0, spoiled_count=0) -> pd.DataFrame:
+    """
+    Vectorised cold-chain score. Takes scalars or equal-length columns and returns a
+    frame with `score` (0-100) and `status` (Green/Amber/Red), same rules as before:
+    -25 outside 2-6 °C, -10 outside 3-5 °C, -10 per breach (max 40),
+    -8 per dispute (max 24), -20 per spoiled lot (max 40).
+    """
+    temp = _numeric(temp_avg_c)
+    n = len(temp)
+    breaches = _count(temp_breach_count, n)
+    disputes = _count(dispute_count, n)
+    spoiled = _count(spoiled_count, n)
+
+    score = np.full(n, 100, dtype=np.int64)
+    score -= np.where((temp < 2) | (temp > 6), 25, np.where((temp < 3) | (temp > 5), 10, 0))
+    score -= np.minimum(breaches * 10, 40)
+    score -= np.minimum(disputes * 8, 24)
+    score -= np.minimum(spoiled * 20, 40)
+    score = np.clip(score, 0, 100)
+
+    status = np.where(score >= 85, "Green", np.where(score >= 60, "Amber", "Red"))
+    return pd.DataFrame({"score": score, "status": status})
+
+
+def _numeric(values) -> np.ndarray:
+    values = np.atleast_1d(np.asarray(values))
+    if values.dtype.kind in "iufb":
+        return values.astype(float)
+    return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+
+
+def _count(values, n) -> np.ndarray:
+    """Counts as int64; blanks and junk count as 0, like int() failing in the scalar version."""
+    arr = _numeric(values)
+    arr = np.trunc(np.nan_to_num(arr, nan=0.0)).astype(np.int64)
+    return np.broadcast_to(arr, (n,)) if len(arr) == 1 else arr
+
+
+# ----------------------------
+# Aggregation job
+# ----------------------------
+def lot_inputs(lots: pd.DataFrame) -> pd.DataFrame:
+    df = lots.reindex(columns=LOT_INPUTS)
+    df = df[df["created_at"].notna()]
+    df["month"] = _month(df["created_at"])
+    return df
+
+
+def dispute_inputs(disputes: pd.DataFrame, receipts: pd.DataFrame) -> pd.DataFrame:
+    """Disputes attributed to the custodian holding the disputed receipt."""
+    custodian = receipts.reindex(columns=["receipt_id", "custodian_id"]).drop_duplicates("receipt_id")
+    df = disputes.reindex(columns=["dispute_id", "receipt_id", "created_at"]).merge(custodian, on="receipt_id", how="left")
+    df = df.loc[df["created_at"].notna(), DISPUTE_INPUTS]
+    df["month"] = _month(df["created_at"])
+    return df
+
+
+def _month(ts: pd.Series) -> np.ndarray:
+    """"YYYY-MM" for ISO timestamp strings (or datetime columns)."""
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        return ts.dt.strftime("%Y-%m").to_numpy()
+    return ts.to_numpy().astype("U7").astype(object)
+
+
+def month_fingerprints(lots: pd.DataFrame, disputes: pd.DataFrame) -> dict:
+    """Order-independent hash of each month's input rows: month -> "<lots hash/count>|<disputes hash/count>"."""
+    lot_fp = _fingerprint(lots, LOT_FINGERPRINT)
+    dispute_fp = _fingerprint(disputes, DISPUTE_INPUTS)
+    return {m: f"{lot_fp.get(m, '')}|{dispute_fp.get(m, '')}" for m in sorted(set(lot_fp) | set(dispute_fp))}
+
+
+def _fingerprint(df: pd.DataFrame, cols) -> dict:
+    hashes = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+    g = pd.Series(hashes, index=df["month"].to_numpy()).groupby(level=0)
+    sums, sizes = g.sum(), g.size()
+    return {m: f"{h}:{n}" for m, h, n in zip(sums.index, sums.to_numpy(), sizes.to_numpy())}
+
+
+def aggregate(lots: pd.DataFrame, disputes: pd.DataFrame, months=None) -> pd.DataFrame:
+    """SLA rows per custodian x month from lot_inputs/dispute_inputs frames, optionally only for `months`."""
+    if months is not None:
+        lots = lots[lots["month"].isin(months)]
+        disputes = disputes[disputes["month"].isin(months)]
+
+    lots = lots.assign(
+        temp=pd.to_numeric(lots["temp_avg_c"], errors="coerce"),
+        breaches=pd.to_numeric(lots["temp_breach_count"], errors="coerce").fillna(0),
+        spoiled=lots["status"].isin(SPOILED_STATUSES),
+    )
+    keys = ["month", "custodian_id"]
+    per_lot = lots.groupby(keys).agg(
+        lots_received=("lot_id", "size"),
+        avg_temp_c=("temp", "mean"),
+        temp_breaches=("breaches", "sum"),
+        spoiled_lots=("spoiled", "sum"),
+    )
+    per_dispute = disputes.dropna(subset=["custodian_id"]).groupby(keys).size().rename("disputes")
+    out = per_lot.join(per_dispute, how="outer").reset_index()
+
+    out["lots_received"] = out["lots_received"].fillna(0).astype(np.int64)
+    out["temp_breaches"] = out["temp_breaches"].fillna(0).astype(np.int64)
+    out["spoiled_lots"] = out["spoiled_lots"].fillna(0).astype(np.int64)
+    out["disputes"] = out["disputes"].fillna(0).astype(np.int64)
+    out["dispute_rate"] = (out["disputes"] / out["lots_received"].where(out["lots_received"] > 0)).round(4)
+    out["avg_temp_c"] = out["avg_temp_c"].round(2)
+
+    scored = score_coldchain(out["avg_temp_c"], out["temp_breaches"], out["disputes"], out["spoiled_lots"])
+    out["sla_score"] = scored["score"].to_numpy()
+    out["penalty_status"] = scored["status"].to_numpy()
+    return out[SLA_COLUMNS].sort_values(keys, ignore_index=True)
+
+
+def refresh_sla(force=False) -> dict:
+    """
+    Bring sla_coldchain.csv up to date. Returns {"changed_months": [...], "rows": n}.
+    Skips all work if none of the input tables changed since the last run.
+    """
+    backend = get_backend()
+    tokens = {f: repr(backend.version_token(f)) for f in INPUT_FILES}
+    rebuild = force or not backend.exists(SLA_FILE)
+    state = {} if rebuild else _load_state()
+    if state.get("tokens") == tokens:
+        return {"changed_months": [], "rows": None}
+
+    lots = lot_inputs(load_table("dairy_lots.csv"))
+    disputes = dispute_inputs(load_table("disputes.csv"), load_table("dwr_receipts.csv"))
+    fingerprints = month_fingerprints(lots, disputes)
+
+    previous = state.get("months", {})
+    changed = sorted(m for m, fp in fingerprints.items() if previous.get(m) != fp)
+    removed = set(previous) - set(fingerprints)
+
+    current = pd.DataFrame(columns=SLA_COLUMNS) if rebuild else load_table(SLA_FILE)
+    if changed or removed or rebuild:
+        keep = current[~current["month"].astype(str).isin(set(changed) | removed)]
+        fresh = aggregate(lots, disputes, changed)
+        parts = [df for df in (keep, fresh) if not df.empty]
+        table = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=SLA_COLUMNS)
+        current = table.reindex(columns=SLA_COLUMNS).sort_values(["month", "custodian_id"], ignore_index=True)
+        backend.save(current, SLA_FILE)
+        invalidate(SLA_FILE)
+
+    _save_state({"tokens": tokens, "months": fingerprints})
+    return {"changed_months": changed, "rows": len(current)}
+
+
+def _load_state() -> dict:
+    try:
+        with open(STATE_PATH, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state: dict) -> None:
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, STATE_PATH)
+
+
+if __name__ == "__main__":
+    print(refresh_sla(force="--force" in sys.argv))
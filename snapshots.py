@@ -0,0 +1,245 @@
+"""
+Columnar Parquet snapshots of the ledgers.
+
+`snapshot_table` writes a typed copy of a table to snapshots/<table>/month=YYYY-MM/,
+partitioned by the month of its main timestamp. `read_table` refreshes a stale snapshot
+and then reads it with column projection and predicate pushdown: only the requested
+columns are decoded, and month partitions and row groups that cannot match a filter
+are skipped. The events journal is snapshotted one segment per file, and only
+segments that grew since the last run are rewritten.
+
+    python snapshots.py            # refresh every snapshot
+"""
+import os
+import sys
+import json
+import shutil
+import uuid
+import threading
+
+import numpy as np
+import pandas as pd
+
+import schemas
+from schemas import STRING, CATEGORY, FLOAT, INT, TIMESTAMP
+from storage import BASE_DIR, get_backend
+from table_cache import load_table
+from journal import journal_for, LEGACY_COLUMNS
+
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "snapshots")
+EVENTS_FILE = "events.csv"
+PARTITION_COL = "month"
+
+_lock = threading.Lock()
+
+# table -> timestamp column whose month partitions the snapshot; column types come from schemas.TABLES
+PARTITIONS = {
+    "entities.csv": None,
+    "custodians.csv": None,
+    "tanks.csv": None,
+    "dairy_lots.csv": "created_at",
+    "dwr_receipts.csv": "issued_at",
+    "advances.csv": "created_at",
+    "sales_contracts.csv": "created_at",
+    "payments.csv": "created_at",
+    "release_orders.csv": "created_at",
+    "disputes.csv": "created_at",
+    "liens.csv": "created_at",
+    EVENTS_FILE: "event_ts",
+}
+
+
+def arrow_schema(file_name):
+    import pyarrow as pa
+
+    types = {STRING: pa.string(), CATEGORY: pa.dictionary(pa.int32(), pa.string()), FLOAT: pa.float64(),
+             INT: pa.int64(), TIMESTAMP: pa.timestamp("us", tz="UTC")}
+    fields = [pa.field(col, types[kind]) for col, kind in schemas.TABLES[file_name]]
+    if PARTITIONS[file_name]:
+        fields.append(pa.field(PARTITION_COL, pa.string()))
+    return pa.schema(fields)
+
+
+def typed(df: pd.DataFrame, file_name) -> pd.DataFrame:
+    """The declared columns of a table cast by schemas.apply, plus the month partition column."""
+    partition_col = PARTITIONS[file_name]
+    out = schemas.apply(df, file_name)[schemas.columns(file_name)]
+    if partition_col:
+        months = out[partition_col].dt.tz_convert(None).to_numpy(dtype="datetime64[M]").astype(str)
+        out[PARTITION_COL] = np.where(months == "NaT", "none", months)
+    return out
+
+
+# ----------------------------
+# Writing
+# ----------------------------
+def table_dir(file_name) -> str:
+    return os.path.join(SNAPSHOT_DIR, os.path.splitext(file_name)[0])
+
+
+def snapshot_table(file_name, force=False) -> bool:
+    """Rewrite a table's snapshot if the table changed since it was taken. Returns True if written."""
+    with _lock:
+        if file_name == EVENTS_FILE:
+            return _snapshot_events(force)
+        return _snapshot_table(file_name, force)
+
+
+def _snapshot_table(file_name, force) -> bool:
+    token = repr(get_backend().version_token(file_name))
+    directory = table_dir(file_name)
+    if not force and _load_meta(directory).get("token") == token:
+        return False
+
+    df = typed(load_table(file_name), file_name)
+    tmp = directory + f".tmp-{uuid.uuid4().hex[:8]}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    _write(df, file_name, tmp, "part-{i}.parquet")
+    _save_meta(tmp, {"token": token})
+    _swap(tmp, directory)
+    return True
+
+
+def _snapshot_events(force) -> bool:
+    """Snapshot the event journal: one Parquet file per segment, rewriting only segments that changed."""
+    journal = journal_for(os.path.join(BASE_DIR, EVENTS_FILE))
+    directory = table_dir(EVENTS_FILE)
+    meta = {} if force else _load_meta(directory)
+    done = meta.get("segments", {})
+    if force:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    current = {}
+    changed = False
+    for path in journal._all_paths():
+        name = os.path.basename(path)
+        size = os.path.getsize(path)
+        current[name] = size
+        if done.get(name) == size:
+            continue
+        _remove_segment(directory, name)
+        chunks = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=500_000)
+        try:
+            for i, chunk in enumerate(chunks):
+                df = typed(chunk.rename(columns=LEGACY_COLUMNS), EVENTS_FILE)
+                _write(df, EVENTS_FILE, directory, f"{os.path.splitext(name)[0]}-{i}-{{i}}.parquet")
+        except pd.errors.EmptyDataError:
+            pass
+        changed = True
+    for name in set(done) - set(current):
+        _remove_segment(directory, name)
+        changed = True
+    if changed or not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+        _save_meta(directory, {"segments": current})
+    return changed
+
+
+def _write(df, file_name, directory, basename_template):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(directory, exist_ok=True)
+    table = pa.Table.from_pandas(df, schema=arrow_schema(file_name), preserve_index=False)
+    if PARTITIONS[file_name] and len(df):
+        pq.write_to_dataset(table, directory, partition_cols=[PARTITION_COL], basename_template=basename_template,
+                            existing_data_behavior="overwrite_or_ignore", compression="zstd")
+    else:
+        pq.write_table(table, os.path.join(directory, basename_template.format(i=0)), compression="zstd")
+
+
+def _remove_segment(directory, segment_name):
+    stem = os.path.splitext(segment_name)[0] + "-"
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.startswith(stem):
+                os.remove(os.path.join(root, name))
+
+
+def _swap(tmp, directory):
+    old = directory + f".old-{uuid.uuid4().hex[:8]}"
+    if os.path.isdir(directory):
+        os.replace(directory, old)
+    os.replace(tmp, directory)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _load_meta(directory) -> dict:
+    try:
+        with open(os.path.join(directory, "_meta.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_meta(directory, meta) -> None:
+    tmp = os.path.join(directory, "_meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, os.path.join(directory, "_meta.json"))
+
+
+def snapshot_all(force=False) -> dict:
+    return {file_name: snapshot_table(file_name, force=force) for file_name in PARTITIONS}
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def read_table(file_name, columns=None, filters=None, refresh=True) -> pd.DataFrame:
+    """
+    Typed rows of a table from its snapshot, reading only `columns`.
+
+    filters: [(column, op, value), ...] ANDed together, op in == != < <= > >= in not in.
+    Filters on the partition timestamp also prune whole months.
+    """
+    import pyarrow.dataset as ds
+
+    if refresh:
+        snapshot_table(file_name)
+    schema = arrow_schema(file_name)
+    columns = list(columns) if columns is not None else [c for c in schema.names if c != PARTITION_COL]
+    directory = table_dir(file_name)
+    files = [os.path.join(root, f) for root, _, names in os.walk(directory) for f in names if f.endswith(".parquet")]
+    if not files:
+        return schema.empty_table().select(columns).to_pandas()
+
+    dataset = ds.dataset(files, schema=schema, format="parquet", partitioning="hive", partition_base_dir=directory)
+    table = dataset.to_table(columns=columns, filter=_expression(file_name, filters or []))
+    return table.to_pandas()
+
+
+_OPS = {
+    "==": lambda f, v: f == v, "!=": lambda f, v: f != v, "<": lambda f, v: f < v, "<=": lambda f, v: f <= v,
+    ">": lambda f, v: f > v, ">=": lambda f, v: f >= v, "in": lambda f, v: f.isin(v), "not in": lambda f, v: ~f.isin(v),
+}
+
+
+def _expression(file_name, filters):
+    import pyarrow.dataset as ds
+
+    partition_col = PARTITIONS[file_name]
+    types = schemas.kinds(file_name)
+    expr = None
+    for col, op, value in filters:
+        if types.get(col) == TIMESTAMP:
+            value = [_utc(v) for v in value] if op in ("in", "not in") else _utc(value)
+        parts = [_OPS[op](ds.field(col), value)]
+        if col == partition_col and op in ("<", "<=", ">", ">=", "=="):
+            # the month directory of the bound can hold matching rows, so compare inclusively
+            month = value.strftime("%Y-%m")
+            bound = {"<": "<=", "<=": "<=", ">": ">=", ">=": ">=", "==": "=="}[op]
+            parts.append(_OPS[bound](ds.field(PARTITION_COL), month))
+        for part in parts:
+            expr = part if expr is None else expr & part
+    return expr
+
+
+def _utc(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+if __name__ == "__main__":
+    for name, written in snapshot_all(force="--force" in sys.argv).items():
+        print(f"{name:<22} {'written' if written else 'up to date'}")
@@ -0,0 +1,158 @@
+import pandas as pd
+
+from utils import log_events
+from schemas import timestamps
+
+RECEIPTS_FILE = "dwr_receipts.csv"
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+# ----------------------------
+# Guards: vectorised checks over receipt rows, True where the transition is allowed
+# ----------------------------
+def no_active_lien(df: pd.DataFrame) -> pd.Series:
+    if "lien_active" not in df.columns:
+        return pd.Series(True, index=df.index)
+    lien = df["lien_active"].astype(str).str.strip().str.lower()
+    return ~lien.isin(["yes", "true", "1", "active"])
+
+
+def not_expired(df: pd.DataFrame) -> pd.Series:
+    if "expiry_ts" not in df.columns:
+        return pd.Series(True, index=df.index)
+    exp = timestamps(df["expiry_ts"])
+    return ~(exp < pd.Timestamp.utcnow())
+
+
+GUARD_MESSAGES = {
+    no_active_lien: "receipt has an active lien",
+    not_expired: "receipt has expired",
+}
+
+# event -> allowed source statuses, target status (or the statuses it may restore), guards
+TRANSITIONS = {
+    "advance_created": {"from": ["active"], "to": "advance_active", "guards": [no_active_lien, not_expired]},
+    "sale_contract_created": {"from": ["active", "advance_active"], "to": "pending_sale", "guards": [no_active_lien, not_expired]},
+    "sale_settled": {"from": ["pending_sale"], "to": "sold", "guards": []},
+    "released": {"from": ["sold"], "to": "released", "guards": [no_active_lien]},
+    "dispute_filed": {"from": ["active", "advance_active", "pending_sale"], "to": "disputed", "guards": []},
+    # back to the status the receipt had when the dispute was filed (disputes.prior_status)
+    "dispute_resolved": {"from": ["disputed"], "to": ["active", "advance_active", "pending_sale"], "guards": []},
+    "expired": {"from": ["active", "advance_active", "pending_sale"], "to": "expired", "guards": []},
+}
+
+
+def validate(df: pd.DataFrame, event: str) -> pd.Series:
+    """Return a Series of rejection reasons ("" where allowed) for applying `event` to every row of df."""
+    spec = TRANSITIONS.get(event)
+    if spec is None:
+        return pd.Series(f"unknown event '{event}'", index=df.index)
+
+    status = df["status"].astype(str)
+    reason = pd.Series("", index=df.index, dtype=object)
+    bad_state = ~status.isin(spec["from"])
+    reason[bad_state] = "cannot " + event + " from status '" + status[bad_state] + "'"
+
+    for guard in spec["guards"]:
+        blocked = (reason == "") & ~guard(df)
+        reason[blocked] = GUARD_MESSAGES.get(guard, guard.__name__)
+    return reason
+
+
+def validate_guards(row: dict, guards) -> str:
+    """Message of the first guard one receipt row fails ("" if it passes them all)."""
+    df = pd.DataFrame([row])
+    for guard in guards:
+        if not guard(df).iloc[0]:
+            return GUARD_MESSAGES.get(guard, guard.__name__)
+    return ""
+
+
+def target_status(event: str, to=None) -> str:
+    """
+    Status `event` moves a receipt to. Events with several possible targets (a resolved
+    dispute restores the prior status) take it from `to`, defaulting to the first one.
+    """
+    target = TRANSITIONS[event]["to"]
+    if isinstance(target, str):
+        return target
+    if to is None or pd.isna(to) or str(to) == "":
+        return target[0]
+    if str(to) not in target:
+        raise InvalidTransition(f"{event} cannot move a receipt to '{to}'")
+    return str(to)
+
+
+def next_status(row: dict, event: str, to=None) -> str:
+    reason = validate(pd.DataFrame([row]), event).iloc[0]
+    if reason:
+        raise InvalidTransition(f"{row.get('receipt_id', '')}: {reason}")
+    return target_status(event, to)
+
+
+def transition(tx, receipt_id, event, username="system", details=None, to=None) -> str:
+    """Validate and stage one receipt transition inside a transactions.UnitOfWork."""
+    row = tx.get(RECEIPTS_FILE, receipt_id)
+    if row is None:
+        raise InvalidTransition(f"{receipt_id}: receipt not found")
+    new_status = next_status(row, event, to)
+    tx.update(RECEIPTS_FILE, receipt_id, {"status": new_status})
+    tx.log(username, "receipt_status_changed", "dwr", receipt_id,
+           {"event": event, "from": row["status"], "to": new_status, **(details or {})})
+    return new_status
+
+
+def apply_transitions(df: pd.DataFrame, events: pd.DataFrame, username="system", log=True):
+    """
+    Validate and apply many transitions in one pass.
+
+    events: DataFrame with `receipt_id` and `event` columns, in the order they happened,
+    and optionally `to` for events with several possible targets (see target_status).
+    Several events for the same receipt are applied in order (one vectorised round per
+    position), so a replay of active -> pending_sale -> sold works in one call.
+
+    Returns (updated copy of df, events with from_status/to_status/ok/reason columns).
+    """
+    out = df.copy()
+    out["status"] = out["status"].astype(object)   # typed loads hold it as a category; targets may be new values
+    results = events.reset_index(drop=True).copy()
+    results["from_status"] = None
+    results["to_status"] = None
+    results["ok"] = False
+    results["reason"] = ""
+
+    positions = pd.Index(out["receipt_id"].astype(str)).get_indexer(results["receipt_id"].astype(str))
+    missing = positions < 0
+    results.loc[missing, "reason"] = "receipt not found"
+
+    rounds = results.groupby("receipt_id", sort=False).cumcount()
+    for rnd in range(int(rounds.max()) + 1 if len(results) else 0):
+        in_round = (rounds == rnd) & ~missing
+        for event, idx in results.index[in_round].groupby(results.loc[in_round, "event"]).items():
+            pos = positions[idx]
+            rows = out.iloc[pos]
+            reason = validate(rows, event).to_numpy()
+            ok = reason == ""
+            results.loc[idx, "from_status"] = rows["status"].to_numpy()
+            results.loc[idx, "reason"] = reason
+            results.loc[idx, "ok"] = ok
+            if ok.any():
+                if isinstance(TRANSITIONS[event]["to"], str):
+                    target = TRANSITIONS[event]["to"]
+                else:
+                    wanted = results.loc[idx[ok], "to"] if "to" in results.columns else [None] * int(ok.sum())
+                    target = [target_status(event, t) for t in wanted]
+                results.loc[idx[ok], "to_status"] = target
+                out.iloc[pos[ok], out.columns.get_loc("status")] = target
+
+    if log:
+        applied = results[results["ok"]]
+        log_events(
+            username, "receipt_status_changed", "dwr", applied["receipt_id"],
+            [{"event": e, "from": f, "to": t} for e, f, t in zip(applied["event"], applied["from_status"], applied["to_status"])],
+        )
+    return out, results
+
@@ -0,0 +1,707 @@
+import os
+import csv
+import json
+import uuid
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+import pandas as pd
+
+from schemas import read_dtypes, iso
+from journal import journal_for
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# csv (pilot default) | sqlite | postgres
+STORAGE_BACKEND = os.environ.get("DWR_STORAGE_BACKEND", "csv").strip().lower()
+DATABASE_URL = os.environ.get("DWR_DATABASE_URL", "").strip()
+SQLITE_PATH = os.path.join(BASE_DIR, "dwr.sqlite")
+
+PRIMARY_KEYS = {
+    "entities": "entity_id",
+    "custodians": "custodian_id",
+    "tanks": "tank_id",
+    "dairy_lots": "lot_id",
+    "dwr_receipts": "receipt_id",
+    "advances": "advance_id",
+    "sales_contracts": "contract_id",
+    "payments": "payment_id",
+    "release_orders": "release_order_id",
+    "disputes": "dispute_id",
+    "liens": "lien_id",
+    "users": "username",
+}
+
+
+# Optimistic concurrency: bumped on every transactional update of a row
+VERSION_COL = "row_version"
+
+# CSV commits spanning several files or carrying events: the staged files and events,
+# written before the first file is swapped in and replayed by the next lock holder
+REDO_FILE = ".dwr.redo"
+# SQL commits carrying events: the events, stored in the same database transaction
+OUTBOX_TABLE = "_event_outbox"
+# SQL write counter per table, bumped by every write's own transaction (cache version tokens)
+CHANGES_TABLE = "_table_changes"
+
+
+class ConcurrentUpdateError(Exception):
+    """A row changed between being read and being written in a transaction."""
+
+
+def table_name(file_name: str) -> str:
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+def primary_key(file_name: str) -> str:
+    pk = PRIMARY_KEYS.get(table_name(file_name))
+    if pk is None:
+        raise KeyError(f"No primary key registered for table '{table_name(file_name)}'")
+    return pk
+
+
+class CsvBackend:
+    """
+    One CSV file per table. Inserts append lines; updates rewrite the file atomically.
+    A commit touching several files (or logging events) goes through a redo log, so a
+    crash part-way is finished by the next writer instead of leaving mixed state.
+    """
+
+    name = "csv"
+
+    def __init__(self, base_dir=BASE_DIR):
+        self.base_dir = base_dir
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock across threads and processes sharing this data directory."""
+        with self._thread_lock:
+            self._lock_depth += 1
+            fh = None
+            try:
+                if self._lock_depth == 1 and fcntl is not None:
+                    fh = open(os.path.join(self.base_dir, ".dwr.lock"), "a")
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                if self._lock_depth == 1:
+                    self._recover()
+                yield
+            finally:
+                if fh is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+                    fh.close()
+                self._lock_depth -= 1
+
+    def path(self, file_name):
+        return os.path.join(self.base_dir, file_name)
+
+    def exists(self, file_name) -> bool:
+        return os.path.exists(self.path(file_name))
+
+    def version_token(self, file_name):
+        """Cheap change marker for caches: (mtime_ns, size) of the CSV file."""
+        try:
+            st = os.stat(self.path(file_name))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self, file_name) -> pd.DataFrame:
+        path = self.path(file_name)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        try:
+            return pd.read_csv(path, dtype=read_dtypes(file_name))
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        except (pd.errors.ParserError, UnicodeDecodeError, ValueError) as e:
+            log.warning("%s could not be parsed, loading it as empty: %s", path, e)
+            return pd.DataFrame()
+
+    def save(self, df: pd.DataFrame, file_name) -> None:
+        with self.lock():
+            _atomic_write_csv(df, self.path(file_name))
+
+    def get_row(self, file_name, key, key_col=None):
+        key_col = key_col or primary_key(file_name)
+        df = self._load_text(self.path(file_name))
+        if df.empty or key_col not in df.columns:
+            return None
+        match = df[df[key_col] == str(key)]
+        return None if match.empty else match.iloc[0].to_dict()
+
+    def insert(self, file_name, rows) -> None:
+        rows = list(rows)
+        if not rows:
+            return
+        with self.lock():
+            self._insert(file_name, rows)
+
+    def update(self, file_name, key, values: dict, key_col=None) -> int:
+        with self.lock():
+            return self._update(file_name, key, values, key_col)
+
+    def commit(self, inserts, updates, events=(), journal=None) -> None:
+        """
+        Apply a unit of work atomically with respect to other writers and crashes.
+
+        inserts: {file_name: [row, ...]}
+        updates: {file_name: {key: (expected_version, values)}}
+        events:  journal rows (utils.event_row) appended to `journal` as part of the commit
+        """
+        if events and journal is None:
+            raise ValueError("events need a journal to be committed to")
+        with self.lock():
+            frames = {}
+            for file_name, changes in updates.items():
+                key_col = primary_key(file_name)
+                df = self._load_text(self.path(file_name))
+                if VERSION_COL not in df.columns:
+                    df[VERSION_COL] = ""
+                if key_col in df.columns and df[key_col].is_unique:
+                    frames[file_name] = _apply_updates(df, file_name, key_col, changes)
+                    continue
+                for key, (expected, values) in changes.items():
+                    mask = df[key_col] == str(key) if key_col in df.columns else pd.Series(False, index=df.index)
+                    if not mask.any():
+                        raise ConcurrentUpdateError(f"{table_name(file_name)} {key} no longer exists")
+                    current = parse_version(df.loc[mask, VERSION_COL].iloc[0])
+                    if current != expected:
+                        raise ConcurrentUpdateError(
+                            f"{table_name(file_name)} {key} was modified concurrently (version {current}, expected {expected})"
+                        )
+                    for col, value in values.items():
+                        df.loc[mask, col] = _cell(value)
+                    df.loc[mask, VERSION_COL] = str(current + 1)
+                frames[file_name] = df
+
+            for file_name, rows in inserts.items():
+                if not rows:
+                    continue
+                base = frames[file_name] if file_name in frames else self._load_text(self.path(file_name))
+                frames[file_name] = _concat_rows(base, rows)
+
+            # Stage every table first, then swap them in together
+            staged = []
+            try:
+                for file_name, df in frames.items():
+                    staged.append((os.path.basename(_stage_csv(df, self.path(file_name))), file_name))
+            except Exception:
+                for tmp, _ in staged:
+                    os.remove(self.path(tmp))
+                raise
+            events = list(events)
+            redo = {"files": staged, "events": events,
+                    "journal": journal.directory if journal is not None else None,
+                    "since": journal.position() if journal is not None and events else None}
+            if len(staged) < 2 and not events:
+                self._apply(redo)          # one rename is atomic on its own
+                return
+            _write_json(redo, self.path(REDO_FILE))
+            self._apply(redo)
+            os.remove(self.path(REDO_FILE))
+
+    def _apply(self, redo, replay=False) -> None:
+        for tmp, file_name in redo["files"]:
+            if os.path.exists(self.path(tmp)):
+                os.replace(self.path(tmp), self.path(file_name))
+        if redo["events"]:
+            journal = journal_for(redo["journal"] + ".csv")
+            if replay:
+                journal.append_missing(redo["events"], redo["since"])
+            else:
+                journal.append_many(redo["events"], sync=True)
+
+    def _recover(self) -> None:
+        """Finish a commit that was interrupted after its redo log was written."""
+        path = self.path(REDO_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as fh:
+            redo = json.load(fh)
+        self._apply(redo, replay=True)
+        os.remove(path)
+
+    def _insert(self, file_name, rows) -> None:
+        path = self.path(file_name)
+        header = _read_header(path)
+        new_cols = [c for r in rows for c in r if c not in (header or [])]
+        if not header or new_cols:
+            # New file or new columns: fall back to a full rewrite once
+            _atomic_write_csv(_concat_rows(self._load_text(path), rows), path)
+            return
+
+        with open(path, "a", encoding="utf-8", newline="") as fh:
+            if not _ends_with_newline(path):
+                fh.write("\n")
+            writer = csv.writer(fh)
+            for row in rows:
+                writer.writerow([_cell(row.get(col)) for col in header])
+
+    def _update(self, file_name, key, values: dict, key_col=None) -> int:
+        key_col = key_col or primary_key(file_name)
+        path = self.path(file_name)
+        df = self._load_text(path)
+        if df.empty or key_col not in df.columns:
+            return 0
+        mask = df[key_col] == str(key)
+        count = int(mask.sum())
+        if count:
+            for col, value in values.items():
+                df.loc[mask, col] = _cell(value)
+            if VERSION_COL in df.columns:
+                df.loc[mask, VERSION_COL] = df.loc[mask, VERSION_COL].map(lambda v: str(parse_version(v) + 1))
+            _atomic_write_csv(df, path)
+        return count
+
+    def _load_text(self, path) -> pd.DataFrame:
+        # Read as text so untouched cells are written back byte-for-byte
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        try:
+            return pd.read_csv(path, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+
+class SqlBackend:
+    """
+    SQLAlchemy-backed tables (SQLite out of the box, Postgres by URL).
+    A table that does not exist yet is seeded from its CSV file on first use.
+    """
+
+    def __init__(self, url, seed_dir=BASE_DIR):
+        from sqlalchemy import create_engine
+
+        self.url = url
+        self.name = "postgres" if url.startswith("postgres") else "sqlite"
+        self.engine = create_engine(url, future=True)
+        self.seed_dir = seed_dir
+        self._seeded = set()
+        self._lock = threading.Lock()
+        self._changes_ready = False
+        self._indexed = set()
+        self._recovered = False
+
+    def version_token(self, file_name):
+        """
+        Write counter of the table, kept in the database, so a write by any process (or any
+        server sharing the database) changes every process's token.
+        """
+        from sqlalchemy import text
+
+        self._ensure_changes()
+        with self.engine.connect() as conn:
+            version = conn.execute(text(f'SELECT version FROM "{CHANGES_TABLE}" WHERE name = :name'),
+                                   {"name": table_name(file_name)}).scalar()
+        return version or 0
+
+    def _touch(self, conn, *file_names):
+        """Bump the write counters of the tables, in the writing transaction (see _ensure_changes)."""
+        from sqlalchemy import text
+
+        for table in dict.fromkeys(table_name(f) for f in file_names):
+            conn.execute(text(f'INSERT INTO "{CHANGES_TABLE}" (name, version) VALUES (:name, 1) '
+                              f'ON CONFLICT (name) DO UPDATE SET version = "{CHANGES_TABLE}".version + 1'),
+                         {"name": table})
+
+    def _ensure_changes(self):
+        # Called before a write opens its transaction: creating the table from inside one
+        # would wait on the writer's own lock under SQLite
+        if self._changes_ready:
+            return
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{CHANGES_TABLE}" (name TEXT PRIMARY KEY, version INTEGER)'))
+        self._changes_ready = True
+
+    def exists(self, file_name) -> bool:
+        from sqlalchemy import inspect
+
+        self._seed(file_name)
+        return inspect(self.engine).has_table(table_name(file_name))
+
+    def load(self, file_name) -> pd.DataFrame:
+        if not self.exists(file_name):
+            return pd.DataFrame()
+        with self.engine.connect() as conn:
+            return pd.read_sql_table(table_name(file_name), conn)
+
+    def save(self, df: pd.DataFrame, file_name) -> None:
+        self._ensure_changes()
+        with self.engine.begin() as conn:
+            df.to_sql(table_name(file_name), conn, if_exists="replace", index=False)
+            self._indexed.discard(table_name(file_name))   # replace dropped the index
+            self._index_key(conn, file_name)
+            self._touch(conn, file_name)
+        self._seeded.add(table_name(file_name))
+
+    def insert(self, file_name, rows) -> None:
+        rows = list(rows)
+        if not rows:
+            return
+        self._seed(file_name)
+        self._ensure_changes()
+        df = _row_frame(rows)
+        with self.engine.begin() as conn:
+            self._ensure_columns(conn, file_name, df.columns)
+            df.to_sql(table_name(file_name), conn, if_exists="append", index=False)
+            self._index_key(conn, file_name)
+            self._touch(conn, file_name)
+
+    def get_row(self, file_name, key, key_col=None):
+        from sqlalchemy import text
+
+        if not self.exists(file_name):
+            return None
+        key_col = key_col or primary_key(file_name)
+        sql = f'SELECT * FROM "{table_name(file_name)}" WHERE "{key_col}" = :key'
+        with self.engine.connect() as conn:
+            row = conn.execute(text(sql), {"key": str(key)}).mappings().first()
+        return None if row is None else dict(row)
+
+    def update(self, file_name, key, values: dict, key_col=None) -> int:
+        if not values:
+            return 0
+        self._seed(file_name)
+        self._ensure_changes()
+        with self.engine.begin() as conn:
+            self._ensure_columns(conn, file_name, list(values) + [VERSION_COL])
+            count = self._update(conn, file_name, key, values, key_col)
+            self._touch(conn, file_name)
+        return count
+
+    def commit(self, inserts, updates, events=(), journal=None) -> None:
+        """
+        Apply a unit of work in one database transaction (see CsvBackend.commit). Events are
+        stored in the outbox table by the same transaction, then moved to the journal.
+        """
+        if events and journal is None:
+            raise ValueError("events need a journal to be committed to")
+        for file_name in list(inserts) + list(updates):
+            self._seed(file_name)
+        self._ensure_changes()
+        events = list(events)
+        outbox = None
+        if events:
+            self._recover()
+            outbox = {"id": uuid.uuid4().hex, "journal": journal.directory,
+                      "since": json.dumps(journal.position()), "events": json.dumps(events)}
+        with self.engine.begin() as conn:
+            if outbox is not None:
+                self._outbox(conn, outbox)
+            for file_name, changes in updates.items():
+                columns = dict.fromkeys(col for _, values in changes.values() for col in values)
+                self._ensure_columns(conn, file_name, [VERSION_COL, *columns])
+                for key, (expected, values) in changes.items():
+                    if not self._update(conn, file_name, key, values, expected=expected):
+                        raise ConcurrentUpdateError(
+                            f"{table_name(file_name)} {key} was modified concurrently (expected version {expected})"
+                        )
+            for file_name, rows in inserts.items():
+                if rows:
+                    df = _row_frame(rows)
+                    self._ensure_columns(conn, file_name, df.columns)
+                    df.to_sql(table_name(file_name), conn, if_exists="append", index=False)
+                    self._index_key(conn, file_name)
+            self._touch(conn, *inserts, *updates)
+        if outbox is not None:
+            journal.append_many(events, sync=True)
+            self._drop_outbox(outbox["id"])
+
+    def _outbox(self, conn, row) -> None:
+        from sqlalchemy import text
+
+        conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{OUTBOX_TABLE}" '
+                          '(id TEXT PRIMARY KEY, journal TEXT, since TEXT, events TEXT)'))
+        conn.execute(text(f'INSERT INTO "{OUTBOX_TABLE}" (id, journal, since, events) '
+                          'VALUES (:id, :journal, :since, :events)'), row)
+
+    def _drop_outbox(self, outbox_id) -> None:
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            conn.execute(text(f'DELETE FROM "{OUTBOX_TABLE}" WHERE id = :id'), {"id": outbox_id})
+
+    def _recover(self) -> None:
+        """Move events left in the outbox by a process that stopped after its commit to the journal (once per process)."""
+        if self._recovered:
+            return
+        from sqlalchemy import inspect, text
+
+        self._recovered = True
+        if not inspect(self.engine).has_table(OUTBOX_TABLE):
+            return
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(f'SELECT id, journal, since, events FROM "{OUTBOX_TABLE}"')).mappings().all()
+        for row in rows:
+            journal_for(row["journal"] + ".csv").append_missing(json.loads(row["events"]), json.loads(row["since"]))
+            self._drop_outbox(row["id"])
+
+    def _update(self, conn, file_name, key, values, key_col=None, expected=None) -> int:
+        from sqlalchemy import text
+
+        key_col = key_col or primary_key(file_name)
+        params = {f"v{i}": _sql_cell(v) for i, v in enumerate(values.values())}
+        params["key"] = str(key)   # key columns are text (seeded as str, see _seed)
+        assignments = [f'"{col}" = :v{i}' for i, col in enumerate(values)]
+        where = f'"{key_col}" = :key'
+        assignments.append(f'"{VERSION_COL}" = COALESCE("{VERSION_COL}", 0) + 1')
+        if expected is not None:
+            where += f' AND COALESCE("{VERSION_COL}", 0) = :expected'
+            params["expected"] = expected
+        sql = f'UPDATE "{table_name(file_name)}" SET {", ".join(assignments)} WHERE {where}'
+        return conn.execute(text(sql), params).rowcount
+
+    def _ensure_columns(self, conn, file_name, columns):
+        from sqlalchemy import inspect, text
+        from sqlalchemy.exc import DBAPIError
+
+        table = table_name(file_name)
+        insp = inspect(conn)
+        if not insp.has_table(table):
+            return
+        existing = {c["name"] for c in insp.get_columns(table)}
+        for col in columns:
+            if col not in existing:
+                col_type = "INTEGER" if col == VERSION_COL else "TEXT"
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{col}" {col_type}'))
+                except DBAPIError:
+                    pass  # added concurrently by another writer
+
+    def _index_key(self, conn, file_name):
+        """Unique index on the table's key (a plain one if old data holds duplicate keys)."""
+        from sqlalchemy import inspect, text
+        from sqlalchemy.exc import DBAPIError
+
+        table = table_name(file_name)
+        key_col = PRIMARY_KEYS.get(table)
+        if key_col is None or table in self._indexed:
+            return
+        insp = inspect(conn)
+        if not insp.has_table(table):
+            return
+        if not any(ix["column_names"] == [key_col] for ix in insp.get_indexes(table)):
+            for unique in ("UNIQUE ", ""):
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text(f'CREATE {unique}INDEX IF NOT EXISTS "ix_{table}_{key_col}" '
+                                          f'ON "{table}" ("{key_col}")'))
+                    break
+                except DBAPIError:
+                    continue
+        self._indexed.add(table)
+
+    def _seed(self, file_name):
+        table = table_name(file_name)
+        if table in self._seeded:
+            return
+        from sqlalchemy import inspect
+
+        with self._lock:
+            if table in self._seeded:
+                return
+            if not inspect(self.engine).has_table(table):
+                path = os.path.join(self.seed_dir, file_name)
+                if os.path.exists(path):
+                    key_col = PRIMARY_KEYS.get(table)
+                    try:
+                        seed = pd.read_csv(path, dtype={key_col: str} if key_col else None)
+                    except pd.errors.EmptyDataError:
+                        seed = None
+                    if seed is not None:
+                        if key_col and VERSION_COL not in seed.columns:
+                            seed[VERSION_COL] = 0
+                        try:
+                            with self.engine.begin() as conn:
+                                seed.to_sql(table, conn, if_exists="fail", index=False)
+                        except ValueError:
+                            pass  # seeded concurrently by another process
+            with self.engine.begin() as conn:
+                self._index_key(conn, file_name)
+            self._seeded.add(table)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(STORAGE_BACKEND, DATABASE_URL)
+    return _backend
+
+
+def create_backend(kind="csv", url=""):
+    if kind == "csv":
+        return CsvBackend()
+    if kind == "sqlite":
+        return SqlBackend(url or f"sqlite:///{SQLITE_PATH}")
+    if kind == "postgres":
+        if not url:
+            raise ValueError("DWR_DATABASE_URL must be set for the postgres backend")
+        return SqlBackend(url)
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+class Table:
+    """Per-table adapter bound to the configured backend."""
+
+    def __init__(self, file_name, backend=None):
+        self.file_name = file_name
+        self.backend = backend or get_backend()
+
+    @property
+    def key(self):
+        return primary_key(self.file_name)
+
+    def load(self) -> pd.DataFrame:
+        return self.backend.load(self.file_name)
+
+    def save(self, df: pd.DataFrame) -> None:
+        self.backend.save(df, self.file_name)
+
+    def insert(self, row: dict) -> None:
+        self.backend.insert(self.file_name, [row])
+
+    def insert_many(self, rows) -> None:
+        self.backend.insert(self.file_name, rows)
+
+    def get(self, key):
+        return self.backend.get_row(self.file_name, key)
+
+    def update(self, key, values: dict) -> int:
+        return self.backend.update(self.file_name, key, values)
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    try:
+        if pd.isna(value):
+            return ""
+    except (TypeError, ValueError):
+        pass
+    return iso(value)
+
+
+def _sql_cell(value):
+    """A value bound into SQL: missing values are NULL, timestamps ISO text."""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return iso(value)
+
+
+def parse_version(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _apply_updates(df: pd.DataFrame, file_name, key_col, changes) -> pd.DataFrame:
+    """Batch form of CsvBackend.commit's per-key loop for tables with unique keys: one hash lookup, one write per column."""
+    keys = [str(k) for k in changes]
+    pos = pd.Index(df[key_col]).get_indexer(keys)
+    if (pos < 0).any():
+        raise ConcurrentUpdateError(f"{table_name(file_name)} {keys[int((pos < 0).argmax())]} no longer exists")
+    current = [parse_version(v) for v in df[VERSION_COL].to_numpy()[pos]]
+    cells = {}
+    for p, key, cur, (expected, values) in zip(pos, keys, current, changes.values()):
+        if cur != expected:
+            raise ConcurrentUpdateError(
+                f"{table_name(file_name)} {key} was modified concurrently (version {cur}, expected {expected})"
+            )
+        for col, value in values.items():
+            cells.setdefault(col, ([], []))
+            cells[col][0].append(p)
+            cells[col][1].append(_cell(value))
+    for col, (rows, values) in cells.items():
+        if col not in df.columns:
+            df[col] = ""
+        df.iloc[rows, df.columns.get_loc(col)] = values
+    df.iloc[pos, df.columns.get_loc(VERSION_COL)] = [str(c + 1) for c in current]
+    return df
+
+
+def _row_frame(rows) -> pd.DataFrame:
+    # timestamps from typed frames are stored as ISO text, like the pages write them
+    return pd.DataFrame([{k: iso(v) for k, v in row.items()} for row in rows])
+
+
+def _concat_rows(df: pd.DataFrame, rows) -> pd.DataFrame:
+    new = _row_frame(rows)
+    if df.empty:
+        cols = list(df.columns) + [c for c in new.columns if c not in df.columns]
+        return new.reindex(columns=cols)
+    return pd.concat([df, new], ignore_index=True)
+
+
+def _read_header(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, encoding="utf-8", newline="") as fh:
+        return next(csv.reader(fh), None)
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as fh:
+        fh.seek(-1, os.SEEK_END)
+        return fh.read(1) in (b"\n", b"\r")
+
+
+def _stage_csv(df: pd.DataFrame, path: str) -> str:
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".csv", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as fh:
+            df.to_csv(fh, index=False)
+            fh.flush()
+            os.fsync(fh.fileno())
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return tmp
+
+
+def _write_json(obj, path: str) -> None:
+    """Durably replace `path` with `obj` as JSON (temp file, fsync, rename, fsync the directory)."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        json.dump(obj, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+    if hasattr(os, "O_DIRECTORY"):
+        dfd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+
+
+def _atomic_write_csv(df: pd.DataFrame, path: str) -> None:
+    os.replace(_stage_csv(df, path), path)
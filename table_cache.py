@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from storage import get_backend
+from schemas import apply
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("DWR_TABLE_CACHE_MB", "256")) * 1024 * 1024)
+
+
+class TableCache:
+    """
+    Process-wide LRU cache of loaded tables, shared by every Streamlit session and rerun.
+
+    Entries are keyed by table name and validated against a version token (file
+    mtime/size, DB write counter, journal size), so a change made by any writer is
+    picked up on the next read. Total size is bounded by `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, token, loader) -> pd.DataFrame:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == token:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        df = loader()
+        size = int(df.memory_usage(deep=True).sum())
+
+        with self._lock:
+            self.misses += 1
+            self._drop(key)
+            if size <= self.max_bytes:
+                self._entries[key] = (token, df, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._drop(oldest)
+                    self.evictions += 1
+        return df
+
+    def invalidate(self, key=None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                self._drop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+_cache = TableCache()
+
+
+def load_table(file_name) -> pd.DataFrame:
+    """
+    A table typed per the schemas registry, as a shallow copy of the shared cached frame:
+    adding or replacing columns is safe, writing values in place is not (use utils.load_csv,
+    which hands out a deep copy, for frames that get edited).
+    """
+    backend = get_backend()
+    df = _cache.get(file_name, backend.version_token(file_name), lambda: apply(backend.load(file_name), file_name))
+    return df.copy(deep=False)
+
+
+def cached(key, token, loader) -> pd.DataFrame:
+    return _cache.get(key, token, loader)
+
+
+def invalidate(file_name=None) -> None:
+    _cache.invalidate(file_name)
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,465 @@
+"""
+Tank temperature telemetry.
+
+Sensors send "<ts>,<tank_id>,<temp_c>" lines (ts as epoch seconds or ISO 8601), either
+appended to a file that `tail_file` follows or as UDP datagrams to `serve_udp`.
+Readings go into a fixed-size ring buffer per tank and are flushed to Parquet under
+telemetry/date=YYYY-MM-DD/. Each ring slot also stores the running sum and breach
+count *before* that reading, so the mean and breach count over any suffix of the
+buffer (the last hour, or since a lot was received) is two lookups, not a scan.
+
+A breach is an excursion outside the tank's temp_min_c..temp_max_c band: consecutive
+out-of-band readings count once. `attach_to_lots` writes the per-lot figures onto
+dairy_lots.temp_avg_c / temp_breach_count.
+
+    python telemetry.py tail sensors.log
+    python telemetry.py udp [port]
+"""
+import os
+import sys
+import glob
+import time
+import socket
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from storage import BASE_DIR, get_backend, ConcurrentUpdateError, VERSION_COL, parse_version
+from table_cache import load_table, invalidate
+from indexes import indexed_table
+
+TELEMETRY_DIR = os.path.join(BASE_DIR, "telemetry")
+LOTS_FILE = "dairy_lots.csv"
+
+RING_SIZE = int(os.environ.get("DWR_TELEMETRY_RING", 1 << 16))   # ~18 h per tank at 1 Hz
+DEFAULT_WINDOW = 3600.0                                           # rolling stats, seconds
+FLUSH_ROWS = 100_000
+FLUSH_INTERVAL = 60.0
+ATTACH_INTERVAL = 30.0
+WARM_SECONDS = 48 * 3600                                          # raw milk shelf life
+UDP_PORT = 8125
+
+# Lots still physically in their tank (a released receipt means the milk has left)
+LIVE_LOT_STATUSES = ["active", "quarantined"]
+
+
+class TankSeries:
+    """Ring buffer of one tank's readings with prefix sums for O(log n) suffix statistics."""
+
+    def __init__(self, temp_min=np.nan, temp_max=np.nan, size=RING_SIZE):
+        self.temp_min = temp_min
+        self.temp_max = temp_max
+        self.size = size
+        self.ts = np.zeros(size, dtype=np.float64)
+        self.temp = np.zeros(size, dtype=np.float32)
+        self.sum_before = np.zeros(size, dtype=np.float64)
+        self.breaches_before = np.zeros(size, dtype=np.int64)
+        self.end = 0               # readings seen so far (logical index of the next slot)
+        self.total_sum = 0.0
+        self.total_breaches = 0
+        self.out_of_band = False   # state of the last reading, so excursions span batches
+
+    def extend(self, ts: np.ndarray, temp: np.ndarray) -> None:
+        n = len(ts)
+        if not n:
+            return
+        temp64 = temp.astype(np.float64)
+        out = (temp64 < self.temp_min) | (temp64 > self.temp_max)
+        entering = out & ~np.concatenate(([self.out_of_band], out[:-1]))
+
+        sums = np.cumsum(temp64)
+        counts = np.cumsum(entering)
+        sum_before = self.total_sum + sums - temp64
+        breaches_before = self.total_breaches + counts - entering
+
+        keep = slice(max(0, n - self.size), n)
+        pos = (self.end + np.arange(keep.start, n)) % self.size
+        self.ts[pos] = ts[keep]
+        self.temp[pos] = temp[keep]
+        self.sum_before[pos] = sum_before[keep]
+        self.breaches_before[pos] = breaches_before[keep]
+
+        self.end += n
+        self.total_sum += float(sums[-1])
+        self.total_breaches += int(counts[-1])
+        self.out_of_band = bool(out[-1])
+
+    @property
+    def oldest(self) -> int:
+        return max(0, self.end - self.size)
+
+    def first_at(self, t: float) -> int:
+        """Logical index of the first retained reading with ts >= t (readings arrive in time order)."""
+        if self.end <= self.size:
+            return int(np.searchsorted(self.ts[:self.end], t))
+        split = self.end % self.size
+        head, tail = self.ts[split:], self.ts[:split]
+        if t <= head[-1]:
+            return self.oldest + int(np.searchsorted(head, t))
+        return self.oldest + len(head) + int(np.searchsorted(tail, t))
+
+    def stats(self, since=None) -> dict:
+        """Mean temperature and breaches over readings at or after `since` (epoch s; None = all retained)."""
+        if not self.end:
+            return {"readings": 0, "temp_avg_c": None, "temp_breach_count": 0, "last_ts": None, "last_temp_c": None}
+        start = self.oldest if since is None else self.first_at(since)
+        last = (self.end - 1) % self.size
+        n = self.end - start
+        if n <= 0:
+            avg, breaches = None, 0
+        else:
+            i = start % self.size
+            avg = round(float(self.total_sum - self.sum_before[i]) / n, 2)
+            breaches = int(self.total_breaches - self.breaches_before[i])
+        return {
+            "readings": n,
+            "temp_avg_c": avg,
+            "temp_breach_count": breaches,
+            "last_ts": float(self.ts[last]),
+            "last_temp_c": round(float(self.temp[last]), 2),
+        }
+
+
+class TelemetryStore:
+    """
+    Per-tank ring buffers plus the pending Parquet batch. `ingest` is safe to call from
+    several reader threads; flushing happens inline once FLUSH_ROWS readings are pending
+    or FLUSH_INTERVAL seconds have passed.
+    """
+
+    def __init__(self, directory=TELEMETRY_DIR, ring_size=RING_SIZE,
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.ring_size = ring_size
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.series = {}
+        self.rejected = 0
+
+        self._lock = threading.Lock()
+        self._bands = None
+        self._pending = []
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+
+    # ----------------------------
+    # Ingestion
+    # ----------------------------
+    def ingest_lines(self, lines) -> int:
+        """Parse and ingest "<ts>,<tank_id>,<temp_c>" lines; malformed lines are counted in `rejected`."""
+        ts, tank_ids, temps, bad = parse_lines(lines)
+        self.rejected += bad
+        self.ingest(ts, tank_ids, temps)
+        return len(ts)
+
+    def ingest(self, ts, tank_ids, temps) -> None:
+        ts = np.asarray(ts, dtype=np.float64)
+        temps = np.asarray(temps, dtype=np.float32)
+        tank_ids = np.asarray(tank_ids, dtype=object)
+        if not len(ts):
+            return
+        codes, tanks = pd.factorize(tank_ids)
+        order = np.lexsort((ts, codes))
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+
+        with self._lock:
+            for group in np.split(order, bounds):
+                self._series(tanks[codes[group[0]]]).extend(ts[group], temps[group])
+            self._pending.append((ts, tank_ids, temps))
+            self._pending_rows += len(ts)
+            if self._pending_rows >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def _series(self, tank_id) -> TankSeries:
+        series = self.series.get(tank_id)
+        if series is None:
+            lo, hi = self.bands().get(tank_id, (np.nan, np.nan))
+            series = self.series[tank_id] = TankSeries(lo, hi, self.ring_size)
+        return series
+
+    def bands(self) -> dict:
+        """tank_id -> (temp_min_c, temp_max_c) from tanks.csv; tanks without a band never breach."""
+        if self._bands is None:
+            tanks = load_table("tanks.csv").reindex(columns=["tank_id", "temp_min_c", "temp_max_c"])
+            lo = pd.to_numeric(tanks["temp_min_c"], errors="coerce").to_numpy()
+            hi = pd.to_numeric(tanks["temp_max_c"], errors="coerce").to_numpy()
+            self._bands = dict(zip(tanks["tank_id"].astype(str), zip(lo, hi)))
+        return self._bands
+
+    def warm(self, since: float) -> int:
+        """Replay persisted readings from `since` (epoch s) into the buffers after a restart."""
+        df = read_readings(start=since, directory=self.directory)
+        if df.empty:
+            return 0
+        ts = _epoch(df["ts"])
+        with self._lock:
+            for tank_id, idx in df.groupby("tank_id", observed=True, sort=False).indices.items():
+                self._series(str(tank_id)).extend(ts[idx], df["temp_c"].to_numpy()[idx])
+        return len(df)
+
+    # ----------------------------
+    # Statistics
+    # ----------------------------
+    def stats(self, tank_id, since=None, window=None) -> dict:
+        """Suffix statistics for a tank: readings since `since` (epoch s) or in the last `window` seconds."""
+        with self._lock:
+            series = self.series.get(tank_id)
+            if series is None:
+                return TankSeries(size=1).stats()
+            if window is not None and series.end:
+                since = series.ts[(series.end - 1) % series.size] - window
+            return series.stats(since)
+
+    def rolling(self, window=DEFAULT_WINDOW) -> pd.DataFrame:
+        rows = [{"tank_id": tank_id, **self.stats(tank_id, window=window)} for tank_id in list(self.series)]
+        return pd.DataFrame(rows)
+
+    def lot_stats(self, lots: pd.DataFrame) -> pd.DataFrame:
+        """temp_avg_c / temp_breach_count per lot over the readings since the lot was received."""
+        since = _epoch(pd.to_datetime(lots["created_at"], errors="coerce", utc=True))
+        rows = []
+        for lot_id, tank_id, t0 in zip(lots["lot_id"], lots["tank_id"].astype(str), since):
+            if tank_id not in self.series or t0 != t0:
+                continue
+            s = self.stats(tank_id, since=t0)
+            if s["readings"]:
+                rows.append({"lot_id": lot_id, "temp_avg_c": s["temp_avg_c"], "temp_breach_count": s["temp_breach_count"]})
+        return pd.DataFrame(rows, columns=["lot_id", "temp_avg_c", "temp_breach_count"])
+
+    def attach_to_lots(self) -> int:
+        """
+        Write current figures onto live lots in one commit, touching only lots whose values
+        changed. A concurrent edit makes this round a no-op; the next one picks it up.
+        """
+        lots = live_lots()
+        if lots.empty:
+            return 0
+        fresh = self.lot_stats(lots)
+        if fresh.empty:
+            return 0
+        current = lots.set_index(lots["lot_id"].astype(str))
+        updates = {}
+        for lot_id, avg, breaches in fresh.itertuples(index=False):
+            row = current.loc[str(lot_id)]
+            old_avg = pd.to_numeric(row.get("temp_avg_c"), errors="coerce")
+            old_breaches = pd.to_numeric(row.get("temp_breach_count"), errors="coerce")
+            if old_avg == avg and old_breaches == breaches:
+                continue
+            values = {"temp_avg_c": avg, "temp_breach_count": breaches}
+            updates[str(lot_id)] = (parse_version(row.get(VERSION_COL)), values)
+        if not updates:
+            return 0
+        try:
+            get_backend().commit({}, {LOTS_FILE: updates})
+        except ConcurrentUpdateError:
+            return 0
+        finally:
+            invalidate(LOTS_FILE)
+        return len(updates)
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        ts = np.concatenate([p[0] for p in self._pending])
+        tank_ids = np.concatenate([p[1] for p in self._pending])
+        temps = np.concatenate([p[2] for p in self._pending])
+        self._pending, self._pending_rows = [], 0
+        write_readings(ts, tank_ids, temps, self.directory)
+
+
+def live_lots() -> pd.DataFrame:
+    """Lots in LIVE_LOT_STATUSES whose receipt (if any) has not been released."""
+    lots = load_table(LOTS_FILE)
+    if lots.empty or "tank_id" not in lots.columns:
+        return lots
+    lots = lots[lots["status"].isin(LIVE_LOT_STATUSES)]
+    released = indexed_table("dwr_receipts.csv").index(("lot_id", "status"))
+    return lots[[not released.contains((lot_id, "released")) for lot_id in lots["lot_id"]]]
+
+
+def parse_lines(lines):
+    """Columns (ts, tank_ids, temps, n_rejected) from "<ts>,<tank_id>,<temp_c>" lines."""
+    fields = [line.strip().split(",") for line in lines]
+    fields = [f for f in fields if len(f) == 3]
+    bad = len(lines) - len(fields)
+    if not fields:
+        return np.empty(0), np.empty(0, dtype=object), np.empty(0, dtype=np.float32), bad
+    raw_ts, tank_ids, raw_temps = zip(*fields)
+    raw_ts = pd.Series(raw_ts)
+    ts = pd.to_numeric(raw_ts, errors="coerce").to_numpy(dtype=np.float64, copy=True)
+    iso = np.isnan(ts)
+    if iso.any():
+        ts[iso] = _epoch(pd.to_datetime(raw_ts[iso], errors="coerce", utc=True, format="ISO8601"))
+    temps = pd.to_numeric(pd.Series(raw_temps), errors="coerce").to_numpy(dtype=np.float32)
+    tank_ids = np.array([t.strip() for t in tank_ids], dtype=object)
+    ok = ~(np.isnan(ts) | np.isnan(temps)) & (tank_ids != "")
+    return ts[ok], tank_ids[ok], temps[ok], bad + int((~ok).sum())
+
+
+# ----------------------------
+# Parquet
+# ----------------------------
+def write_readings(ts, tank_ids, temps, directory=TELEMETRY_DIR) -> list:
+    """Write readings as one Parquet file per UTC day: ts (ms, UTC), tank_id (dictionary), temp_c (float32)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    ms = np.round(np.asarray(ts) * 1e3).astype(np.int64)
+    days = ms // 86_400_000
+    written = []
+    for day in np.unique(days):
+        sel = days == day
+        table = pa.table({
+            "ts": pa.array(ms[sel], type=pa.timestamp("ms", tz="UTC")),
+            "tank_id": pa.array(tank_ids[sel], type=pa.string()).dictionary_encode(),
+            "temp_c": pa.array(np.asarray(temps)[sel], type=pa.float32()),
+        })
+        date = datetime.fromtimestamp(int(day) * 86400, tz=timezone.utc).strftime("%Y-%m-%d")
+        path = os.path.join(directory, f"date={date}", f"part-{int(ms[sel][0])}-{os.getpid()}.parquet")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table, path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+        written.append(path)
+    return written
+
+
+def read_readings(tank_id=None, start=None, end=None, directory=TELEMETRY_DIR) -> pd.DataFrame:
+    """Persisted readings, optionally for one tank and an epoch-second [start, end) range, sorted by ts."""
+    import pyarrow.dataset as ds
+
+    files = []
+    for path in sorted(glob.glob(os.path.join(directory, "date=*", "*.parquet"))):
+        day = os.path.basename(os.path.dirname(path))[5:]
+        if start is not None and day < _day(start):
+            continue
+        if end is not None and day > _day(end):
+            continue
+        files.append(path)
+    if not files:
+        return pd.DataFrame({"ts": pd.Series(dtype="datetime64[ms, UTC]"), "tank_id": pd.Series(dtype=object),
+                             "temp_c": pd.Series(dtype=np.float32)})
+
+    dataset = ds.dataset(files, format="parquet")
+    cond = None
+    for expr in (
+        ds.field("tank_id") == tank_id if tank_id is not None else None,
+        ds.field("ts") >= pd.Timestamp(start, unit="s", tz="UTC") if start is not None else None,
+        ds.field("ts") < pd.Timestamp(end, unit="s", tz="UTC") if end is not None else None,
+    ):
+        if expr is not None:
+            cond = expr if cond is None else cond & expr
+    df = dataset.to_table(filter=cond).to_pandas()
+    return df.sort_values("ts", kind="stable", ignore_index=True)
+
+
+def _epoch(ts: pd.Series) -> np.ndarray:
+    return (ts - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy(dtype=np.float64)
+
+
+def _day(epoch_s) -> str:
+    return datetime.fromtimestamp(float(epoch_s), tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def summarize(readings: pd.DataFrame, temp_min, temp_max) -> dict:
+    """Mean and breach count of one tank's persisted readings (same breach rule as TankSeries)."""
+    series = TankSeries(float(temp_min), float(temp_max), size=max(1, len(readings)))
+    series.extend(_epoch(readings["ts"]), readings["temp_c"].to_numpy(dtype=np.float32))
+    return series.stats()
+
+
+# ----------------------------
+# Sources
+# ----------------------------
+def tail_file(path, store: TelemetryStore, poll=0.2, batch_lines=8192, stop=None, from_start=False) -> None:
+    """Follow a sensor log like `tail -F`, ingesting complete lines in batches."""
+    stop = stop or threading.Event()
+    fh, inode, partial = None, None, ""
+    last_attach = time.monotonic()
+    while not stop.is_set():
+        if fh is None:
+            try:
+                fh = open(path, encoding="utf-8", errors="replace")
+                inode = os.fstat(fh.fileno()).st_ino
+                if not from_start:
+                    fh.seek(0, os.SEEK_END)
+                from_start = True   # files that appear after a rotation are read from the top
+            except FileNotFoundError:
+                stop.wait(poll)
+                continue
+        lines = fh.readlines(batch_lines * 32)
+        if lines:
+            lines[0] = partial + lines[0]
+            partial = "" if lines[-1].endswith("\n") else lines.pop()
+            store.ingest_lines(lines)
+        else:
+            try:
+                rotated = os.stat(path).st_ino != inode
+            except FileNotFoundError:
+                rotated = True
+            if rotated:
+                fh.close()
+                fh = None
+            else:
+                stop.wait(poll)
+        if time.monotonic() - last_attach >= ATTACH_INTERVAL:
+            store.attach_to_lots()
+            last_attach = time.monotonic()
+    if fh is not None:
+        fh.close()
+    store.flush()
+
+
+def serve_udp(store: TelemetryStore, host="127.0.0.1", port=UDP_PORT, batch_lines=4096, max_delay=0.05, stop=None) -> None:
+    """Receive newline-separated readings as UDP datagrams; ingests every `batch_lines` or `max_delay` s."""
+    stop = stop or threading.Event()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind((host, port))
+    sock.settimeout(max_delay)
+    lines, first = [], time.monotonic()
+    last_attach = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                data = sock.recv(65536)
+                lines.extend(data.decode("utf-8", errors="replace").splitlines())
+            except socket.timeout:
+                pass
+            if lines and (len(lines) >= batch_lines or time.monotonic() - first >= max_delay):
+                store.ingest_lines(lines)
+                lines, first = [], time.monotonic()
+            elif not lines:
+                first = time.monotonic()
+            if time.monotonic() - last_attach >= ATTACH_INTERVAL:
+                store.attach_to_lots()
+                last_attach = time.monotonic()
+    finally:
+        sock.close()
+        if lines:
+            store.ingest_lines(lines)
+        store.flush()
+
+
+if __name__ == "__main__":
+    store = TelemetryStore()
+    store.warm(time.time() - WARM_SECONDS)
+    try:
+        if len(sys.argv) > 2 and sys.argv[1] == "tail":
+            tail_file(sys.argv[2], store)
+        elif len(sys.argv) > 1 and sys.argv[1] == "udp":
+            serve_udp(store, port=int(sys.argv[2]) if len(sys.argv) > 2 else UDP_PORT)
+        else:
+            print(__doc__)
+    except KeyboardInterrupt:
+        store.flush()
+        store.attach_to_lots()
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# a fixed signing key, so issuing receipts never writes .dwr_secret into the checkout
+os.environ.setdefault("DWR_SECRET_KEY", "test-signing-key")
+
+import storage  # noqa: E402
+import utils  # noqa: E402
+from table_cache import invalidate  # noqa: E402
+
+PAST = "2020-01-01T00:00:00Z"
+FUTURE = "2099-01-01T00:00:00Z"
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Tables and the event journal in a temporary directory (CSV backend)."""
+    d = str(tmp_path)
+    monkeypatch.setattr(storage, "_backend", storage.CsvBackend(base_dir=d))
+    monkeypatch.setattr(utils, "BASE_DIR", d)
+    invalidate()
+    yield d
+    invalidate()
+
+
+@pytest.fixture
+def seed(data_dir):
+    """seed(file_name, rows, columns=None) writes a table as the pages would find it."""
+    def write(file_name, rows, columns=None):
+        pd.DataFrame(rows, columns=columns).to_csv(os.path.join(data_dir, file_name), index=False)
+        invalidate(file_name)
+    return write
+
+
+@pytest.fixture
+def events(data_dir):
+    """events() reads the journal back as a DataFrame."""
+    def read():
+        return utils.event_journal().read_all()
+    return read
+
+
+@pytest.fixture
+def stored(data_dir):
+    """stored(file_name) reads a table back from disk, every cell as a string."""
+    def read(file_name):
+        return pd.read_csv(os.path.join(data_dir, file_name), dtype=str, keep_default_na=False)
+    return read
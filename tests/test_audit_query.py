@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+import audit_query
+import utils
+from audit_query import AuditIndex, query_events
+
+
+@pytest.fixture
+def journal(data_dir, monkeypatch):
+    """append(*events) writes (event_type, object_type, object_id, details, ts) rows to the journal."""
+    monkeypatch.setattr(audit_query, "_indexes", {})
+    journal = utils.event_journal()
+
+    def append(*rows):
+        journal.append_many([utils.event_row("alice", t, o, i, d, ts) for t, o, i, d, ts in rows])
+    return append
+
+
+def history(n=25):
+    """Receipts R0..R{n-1} issued a minute apart; every fifth one also gets a lien event."""
+    rows = []
+    for i in range(n):
+        ts = f"2026-10-18T08:{i:02d}:00"
+        rows.append(("receipt_issued", "dwr", f"R{i}", {"lot_id": f"LOT-{i}", "owner": "E-WG-001"}, ts))
+        if i % 5 == 0:
+            rows.append(("lien_requested", "lien", f"LIEN-{i}", {"receipt_id": f"R{i}"}, ts))
+    return rows
+
+
+def test_filters_match_exactly(journal):
+    journal(*history())
+    index = AuditIndex()
+    page, cursor = index.query(event_type="lien_requested")
+    assert page["object_id"].tolist() == ["LIEN-20", "LIEN-15", "LIEN-10", "LIEN-5", "LIEN-0"]
+    assert cursor is None
+    assert index.query(object_id="R7")[0]["event_type"].tolist() == ["receipt_issued"]
+    assert index.count(object_type="dwr", key="lot_id") == 25
+    assert index.count(key="receipt_id") == 5
+    assert index.count(event_type="receipt_issued", object_type="lien") == 0
+    # "All" from the page's select boxes means no filter
+    assert index.count(event_type="All") == 30
+
+
+def test_search_is_a_prefix_match_on_ids_and_values(journal):
+    journal(*history())
+    index = AuditIndex()
+    assert sorted(index.query(search="LOT-2")[0]["object_id"]) == ["R2", "R20", "R21", "R22", "R23", "R24"]
+    # R1 itself, R10..R19 and the lien on R10 and R15 point back at an R1* receipt
+    assert index.count(search="R1") == 13
+    assert index.count(search="E-WG") == 25
+
+
+def test_pages_walk_newest_first_without_gaps(journal):
+    journal(*history())
+    seen, cursor = [], None
+    while True:
+        page, cursor = query_events(cursor=cursor, limit=7, event_type="receipt_issued")
+        assert len(page) <= 7
+        seen.extend(page["object_id"])
+        if cursor is None:
+            break
+    assert seen == [f"R{i}" for i in reversed(range(25))]
+    with pytest.raises(ValueError):
+        query_events(cursor="events:notanumber")
+
+
+def test_time_range_is_half_open(journal):
+    journal(*history())
+    index = AuditIndex()
+    page, _ = index.query(event_type="receipt_issued", start="2026-10-18T08:10:00", end="2026-10-18T08:13:00")
+    assert page["object_id"].tolist() == ["R12", "R11", "R10"]
+    assert index.count(start="2026-10-19") == 0
+
+
+def test_appends_are_indexed_on_the_next_query(journal):
+    journal(*history(5))
+    index = AuditIndex()
+    assert index.count() == 6
+    journal(("receipt_sold", "dwr", "R3", {"contract_id": "SC-1"}, "2026-10-18T09:00:00"))
+    page, _ = index.query(limit=1)
+    assert page.iloc[0]["event_type"] == "receipt_sold"
+    assert index.count(key="contract_id") == 1
+    assert index.facets("t:") == ["lien_requested", "receipt_issued", "receipt_sold"]
+
+
+def test_saved_index_is_reused_and_extended(journal):
+    journal(*history(10))
+    first = AuditIndex()
+    first.count()
+    assert os.listdir(first.index_dir)
+    journal(("receipt_sold", "dwr", "R3", {"contract_id": "SC-1"}, "2026-10-18T09:00:00"))
+    fresh = AuditIndex()
+    assert fresh.count() == 13
+    assert fresh.query(object_id="R3")[0]["event_type"].tolist() == ["receipt_sold", "receipt_issued"]
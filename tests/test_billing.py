@@ -0,0 +1,91 @@
+import multiprocessing
+import time
+
+import pandas as pd
+import pytest
+
+import billing
+import storage
+from storage import CsvBackend
+
+T = pd.Timestamp("2026-10-18", tz="UTC")
+PAYMENT_COLUMNS = ["payment_id", "ref_type", "ref_id", "payer_id", "payee_id", "amount_xof", "method", "status",
+                   "created_at", "confirmed_at", "provider_ref", "period_start", "period_end"]
+
+
+@pytest.fixture
+def tanks(seed):
+    seed("tanks.csv", {
+        "tank_id": ["T1", "T2"], "custodian_id": ["C1", "C1"], "capacity_liters": [500, 1000],
+        "status": ["occupied", "occupied"], "ownership_model": ["rent_to_own", "pay_per_liter"],
+        "owner_entity_id": ["E1", "E-OLD"], "rent_xof_per_day": [1000, 1000], "rent_to_own_months": [1, 12],
+        "purchase_price_xof": [3000, 0], "assigned_at": ["2026-10-08T00:00:00Z"] * 2, "contract_until": ["", ""]})
+    seed("dairy_lots.csv", {
+        "lot_id": ["L1", "L2"], "created_at": ["2026-10-10T08:00:00Z", "2026-10-15T08:00:00Z"],
+        "owner_entity_id": ["A", "B"], "tank_id": ["T2", "T2"], "quantity_liters": [100.0, 300.0],
+        "status": ["active", "active"], "expiry_ts": ["2026-12-01T00:00:00Z"] * 2})
+    seed("dwr_receipts.csv", [], columns=["receipt_id", "lot_id", "status"])
+    seed("release_orders.csv", [], columns=["release_order_id", "receipt_id", "status", "confirmed_at"])
+    seed("payments.csv", [], columns=PAYMENT_COLUMNS)
+
+
+def periods(invoices):
+    return sorted(zip(invoices["ref_id"], invoices["payer_id"], invoices["period_start"].str[:10],
+                      invoices["period_end"].str[:10]))
+
+
+def test_close_bills_each_day_once(tanks, stored):
+    first = billing.close(T - pd.Timedelta(days=5))
+    assert periods(first["invoices"]) == [("T1", "E1", "2026-10-08", "2026-10-13"),
+                                          ("T2", "A", "2026-10-10", "2026-10-13")]
+    second = billing.close(T)
+    assert periods(second["invoices"]) == [("T1", "E1", "2026-10-13", "2026-10-18"),
+                                           ("T2", "A", "2026-10-13", "2026-10-18"),
+                                           ("T2", "B", "2026-10-15", "2026-10-18")]
+    again = billing.close(T)
+    assert again["invoices"].empty and again["total_xof"] == 0.0
+    assert len(stored("payments.csv")) == 5
+
+
+def test_dry_run_writes_nothing(tanks, stored):
+    assert len(billing.close(T, dry_run=True)["invoices"]) == 3
+    assert stored("payments.csv").empty
+    assert len(billing.close(T)["invoices"]) == 3
+
+
+def test_confirmed_rent_builds_equity_and_cannot_be_confirmed_twice(tanks):
+    invoice = billing.close(T - pd.Timedelta(days=5))["invoices"].set_index("ref_id").loc["T1", "payment_id"]
+    billing.confirm_invoice(invoice, "finance")
+    with pytest.raises(ValueError):
+        billing.confirm_invoice(invoice, "finance")
+    stakes = billing.close(T)["equity"].set_index("tank_id")
+    assert stakes.loc["T1", "paid_days"] == 5
+    assert stakes.loc["T1", "remaining_xof"] == 2500.0
+
+
+def _close_slowly(directory, results):
+    backend = CsvBackend(base_dir=directory)
+    storage._backend = backend
+    commit = backend.commit
+
+    def slow(*args, **kwargs):
+        # both closes have read the tables before either commits
+        time.sleep(0.5)
+        return commit(*args, **kwargs)
+
+    backend.commit = slow
+    results.put(len(billing.close(T)["invoices"]))
+
+
+def test_concurrent_closes_do_not_double_bill(tanks, data_dir, stored):
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_close_slowly, args=(data_dir, results)) for _ in range(2)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(60)
+    assert sorted(results.get(timeout=5) for _ in workers) == [0, 3]
+    payments = stored("payments.csv")
+    assert len(payments) == 3
+    assert not payments.duplicated(["ref_id", "payer_id", "period_start"]).any()
@@ -0,0 +1,93 @@
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+import capacity
+import storage
+from capacity import CapacityError, allocate, best_fit, create_lot, occupancy
+from storage import CsvBackend
+
+
+def tank(tank_id, liters, custodian="C1", model="pay_per_liter", status="available", owner=""):
+    return {"tank_id": tank_id, "custodian_id": custodian, "capacity_liters": liters, "ownership_model": model,
+            "status": status, "owner_entity_id": owner}
+
+
+def lot(lot_id, tank_id, liters, owner="E1", status="active"):
+    return {"lot_id": lot_id, "owner_entity_id": owner, "custodian_id": "C1", "tank_id": tank_id,
+            "quantity_liters": liters, "status": status, "expiry_ts": "2026-10-25T00:00:00Z"}
+
+
+@pytest.fixture
+def tanks(seed, monkeypatch):
+    monkeypatch.setattr(capacity, "_book", None)
+    seed("tanks.csv", [tank("T-SMALL", 100.0), tank("T-BIG", 500.0),
+                       tank("T-OWN", 280.0, model="rent_to_own", status="occupied", owner="E2"),
+                       tank("T-OTHER", 1000.0, custodian="C2")])
+    seed("dairy_lots.csv", [lot("L1", "T-BIG", 200.0), lot("L2", "T-BIG", 100.0, status="expired"),
+                            lot("L3", "T-SMALL", 40.0), lot("L4", "T-SMALL", 50.0, owner="E3")])
+    seed("dwr_receipts.csv", [{"receipt_id": "R4", "lot_id": "L4", "status": "released"}])
+
+
+def test_committed_liters_count_only_milk_in_custody(tanks):
+    occ = occupancy().set_index("tank_id")
+    assert occ.loc[["T-SMALL", "T-BIG", "T-OWN"], "committed_liters"].tolist() == [40.0, 200.0, 0.0]
+    assert occ.loc[["T-SMALL", "T-BIG", "T-OWN"], "free_liters"].tolist() == [60.0, 300.0, 280.0]
+    assert occ.loc["T-BIG", "utilisation"] == 0.4
+    assert occ["open_to_all"].tolist() == [True, True, False, True]
+
+
+def test_best_fit_picks_the_tightest_open_tank(tanks):
+    assert best_fit("C1", 50, "E1") == "T-SMALL"
+    assert best_fit("C1", 61, "E1") == "T-BIG"
+    assert best_fit("C1", 301, "E1") is None
+    # the occupied tank only takes its owner's lots, and is the tightest fit for them
+    assert best_fit("C1", 250, "E2") == "T-OWN"
+    assert best_fit("C1", 290, "E2") == "T-BIG"
+    assert best_fit("C1", 301, "E2") is None
+    assert best_fit("C2", 900) == "T-OTHER"
+
+
+def test_allocate_books_each_row_before_the_next(tanks):
+    requests = pd.DataFrame({"custodian_id": "C1", "owner_entity_id": "E1", "quantity_liters": [50.0, 50.0, 250.0, 100.0]})
+    assert allocate(requests).tolist() == ["T-SMALL", "T-BIG", "T-BIG", None]
+    assert occupancy().set_index("tank_id").loc["T-BIG", "committed_liters"] == 200.0   # nothing was stored
+
+
+def test_create_lot_checks_the_tank_in_the_same_transaction(tanks, stored, events):
+    create_lot(lot("L5", "T-SMALL", 60.0), "custodian")
+    assert stored("dairy_lots.csv")["lot_id"].tolist()[-1] == "L5"
+    assert events()["event_type"].tolist() == ["lot_created"]
+    assert capacity.free("T-SMALL") == 0.0
+    with pytest.raises(CapacityError, match="only 0 L free"):
+        create_lot(lot("L6", "T-SMALL", 1.0), "custodian")
+    with pytest.raises(CapacityError, match="does not take lots of E1"):
+        create_lot(lot("L7", "T-OWN", 10.0), "custodian")
+    with pytest.raises(CapacityError, match="does not exist"):
+        create_lot(lot("L8", "T-NONE", 10.0), "custodian")
+    assert len(stored("dairy_lots.csv")) == 5
+
+
+def _intake(directory, i, results):
+    storage._backend = CsvBackend(base_dir=directory)
+    capacity._book = None
+    try:
+        create_lot(lot(f"RACE-{i}", "T-BIG", 200.0), "custodian")
+        results.put("ok")
+    except CapacityError:
+        results.put("full")
+
+
+def test_concurrent_intakes_cannot_overfill_a_tank(tanks, data_dir, stored):
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_intake, args=(data_dir, i, results)) for i in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(60)
+    assert sorted(results.get(timeout=5) for _ in workers) == ["full", "full", "full", "ok"]
+    lots = stored("dairy_lots.csv")
+    assert lots["lot_id"].str.startswith("RACE-").sum() == 1
+    assert capacity.free("T-BIG") == 100.0
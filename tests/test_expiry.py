@@ -0,0 +1,132 @@
+import pandas as pd
+import pytest
+
+import expiry
+from conftest import FUTURE
+from expiry import ExpiryScheduler
+from state_machine import transition
+from transactions import transaction
+
+LOTS = "dairy_lots.csv"
+RECEIPTS = "dwr_receipts.csv"
+ADVANCES = "advances.csv"
+NOW = pd.Timestamp("2026-10-18T12:00:00Z")
+DUE = "2026-10-18T11:00:00Z"
+LATER = "2026-10-18T13:00:00Z"
+
+
+@pytest.fixture
+def milk(seed):
+    seed(LOTS, [{"lot_id": "L1", "status": "active", "expiry_ts": DUE},
+                {"lot_id": "L2", "status": "active", "expiry_ts": DUE},
+                {"lot_id": "L3", "status": "active", "expiry_ts": FUTURE}])
+    seed(RECEIPTS, [{"receipt_id": "R1", "lot_id": "L1", "status": "advance_active", "expiry_ts": DUE},
+                    {"receipt_id": "R2", "lot_id": "L2", "status": "disputed", "expiry_ts": DUE},
+                    {"receipt_id": "R3", "lot_id": "L3", "status": "active", "expiry_ts": FUTURE}])
+    seed(ADVANCES, [{"advance_id": "A1", "receipt_id": "R1", "advance_xof": 10000.0, "fee_xof": 500.0,
+                     "status": "active"}])
+
+
+def test_sweep_expires_due_lots_and_receipts(milk, stored, events):
+    result = ExpiryScheduler().sweep(NOW)
+    assert result["lot_ids"] == ["L1", "L2"]
+    assert result["receipt_ids"] == ["R1"]
+    assert result["advance_ids"] == ["A1"]
+    assert stored(LOTS)["status"].tolist() == ["expired", "expired", "active"]
+    assert stored(RECEIPTS)["status"].tolist() == ["expired", "disputed", "active"]
+    assert sorted(events()["event_type"]) == ["advance_under_collateralised", "lot_expired", "lot_expired",
+                                              "receipt_status_changed"]
+
+
+def test_sweep_is_a_no_op_when_nothing_is_due(milk, stored):
+    s = ExpiryScheduler()
+    s.sweep(NOW)
+    assert s.sweep(NOW)["receipts_expired"] == 0
+    assert s.next_due() == pd.Timestamp(FUTURE)
+
+
+def test_disputed_receipt_is_parked_until_the_dispute_is_resolved(milk, stored):
+    s = ExpiryScheduler()
+    s.sweep(NOW)
+    assert list(s._held[RECEIPTS]) == ["R2"]
+    assert s.sweep(NOW)["receipt_ids"] == []
+
+    with transaction() as tx:
+        transition(tx, "R2", "dispute_resolved", "mediator", {"dispute_id": "D1"}, to="pending_sale")
+    result = s.sweep(NOW)
+    assert result["receipt_ids"] == ["R2"]
+    assert s._held[RECEIPTS] == {}
+    assert stored(RECEIPTS).set_index("receipt_id").loc["R2", "status"] == "expired"
+
+
+def test_moved_expiry_is_requeued(milk, stored):
+    s = ExpiryScheduler()
+    s.next_due()
+    with transaction() as tx:
+        tx.update(RECEIPTS, "R1", {"expiry_ts": LATER})
+    assert s.sweep(NOW)["receipt_ids"] == []
+    assert s.sweep(pd.Timestamp(LATER))["receipt_ids"] == ["R1"]
+
+
+def test_lot_whose_receipt_was_released_does_not_expire(seed, stored):
+    seed(LOTS, [{"lot_id": "L1", "status": "active", "expiry_ts": DUE}])
+    seed(RECEIPTS, [{"receipt_id": "R1", "lot_id": "L1", "status": "released", "expiry_ts": DUE}])
+    assert ExpiryScheduler().sweep(NOW)["lots_expired"] == 0
+    assert stored(LOTS)["status"].tolist() == ["active"]
+
+
+def test_a_dispute_that_ends_in_another_held_state_stays_parked(milk):
+    s = ExpiryScheduler()
+    s.sweep(NOW)
+    with transaction() as tx:
+        transition(tx, "R2", "dispute_resolved", "mediator", {"dispute_id": "D1"}, to="active")
+        transition(tx, "R2", "dispute_filed", "owner", {"dispute_id": "D2"})
+    assert s.sweep(NOW)["receipt_ids"] == []
+    assert list(s._held[RECEIPTS]) == ["R2"]
+
+
+@pytest.fixture
+def no_table_reads(monkeypatch):
+    """After start, reading a whole table from _refresh fails the test."""
+    def read(file_name):
+        raise AssertionError(f"{file_name} was reloaded")
+    return lambda: monkeypatch.setattr(expiry, "load_table", read)
+
+
+def test_new_rows_are_queued_from_the_journal(milk, stored, no_table_reads):
+    s = ExpiryScheduler()
+    s.sweep(NOW)
+    no_table_reads()
+    lot = {"lot_id": "L4", "status": "active", "expiry_ts": LATER}
+    receipt = {"receipt_id": "R4", "lot_id": "L4", "status": "active", "expiry_ts": LATER}
+    with transaction() as tx:
+        tx.insert(LOTS, lot)
+        tx.log("custodian", "lot_created", "dairy_lot", "L4", {"status": "active", "expiry_ts": LATER})
+        tx.insert(RECEIPTS, receipt)
+        tx.log("custodian", "receipt_issued", "dwr", "R4", receipt)
+    assert s.next_due() == pd.Timestamp(LATER)
+    assert len(s) == 4                      # L3, R3 and the two new rows
+    assert s.sweep(NOW)["receipt_ids"] == []
+
+
+def test_status_changes_do_not_requeue_rows_already_queued(milk, no_table_reads):
+    s = ExpiryScheduler()
+    s.next_due()
+    queued = len(s)
+    no_table_reads()
+    with transaction() as tx:
+        transition(tx, "R3", "sale_contract_created", "owner", {"contract_id": "SC-1"})
+    s.next_due()
+    assert len(s) == queued
+
+
+def test_a_reset_journal_restarts_from_the_tables(milk):
+    s = ExpiryScheduler()
+    s.sweep(NOW)
+    assert s.next_due() == pd.Timestamp(FUTURE)        # reads the sweep's own events
+    for path in expiry.event_journal()._all_paths():
+        with open(path, "r+b") as fh:
+            fh.truncate(len(fh.readline()))
+    # rebuilt from the tables: the disputed receipt is queued again and parked when popped
+    assert s.next_due() == pd.Timestamp(DUE)
+    assert s._held == {}
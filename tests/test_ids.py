@@ -0,0 +1,73 @@
+import threading
+
+import pandas as pd
+
+import ids
+from ids import ALPHABET, form_done, form_token, gen_id, gen_ids, id_bounds, id_time, idempotency_key, reserve_id
+
+
+def test_ids_are_unique_and_ascending():
+    out = []
+    for _ in range(200):
+        out.append(gen_id("LOT"))
+        out.extend(gen_ids("LOT-", 50))
+    assert len(set(out)) == len(out)
+    assert out == sorted(out)
+    prefix, day, tail = out[0].split("-")
+    assert prefix == "LOT" and len(day) == 8 and len(tail) == 16 and set(tail) <= set(ALPHABET)
+    assert gen_ids("LOT", 0) == []
+
+
+def test_ids_from_many_threads_do_not_collide():
+    out, lock = [], threading.Lock()
+
+    def work():
+        mine = [gen_id("PAY") for _ in range(500)] + gen_ids("PAY", 500)
+        with lock:
+            out.extend(mine)
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(out)) == 8000
+
+
+def test_a_clock_going_back_keeps_counting_up(monkeypatch):
+    first = gen_id("DWR")
+    monkeypatch.setattr(ids.time, "time_ns", lambda: 1_000_000_000)       # 1970
+    assert gen_id("DWR") > first
+
+
+def test_id_time_and_bounds_follow_creation_time():
+    before = pd.Timestamp.now(tz="UTC").floor("ms")
+    new = gen_id("SC")
+    after = pd.Timestamp.now(tz="UTC")
+    assert before <= id_time(new) <= after
+    assert pd.isna(id_time("SC-20240101-ABC123")) and pd.isna(id_time("garbage"))
+    lo, hi = id_bounds("SC", before, after + pd.Timedelta(milliseconds=1))
+    assert lo <= new < hi
+    lo, hi = id_bounds("SC", after + pd.Timedelta(seconds=1), after + pd.Timedelta(seconds=2))
+    assert not lo <= new < hi
+
+
+def test_reserve_id_hands_out_the_same_id_per_key(monkeypatch):
+    monkeypatch.setattr(ids, "_reserved", {})
+    key = idempotency_key("token", "alice", "lot_created", 120.0)
+    assert key == idempotency_key("token", "alice", "lot_created", 120.0)
+    assert key != idempotency_key("token", "alice", "lot_created", 121.0)
+    first = reserve_id("LOT", key)
+    assert reserve_id("LOT", key) == first
+    assert reserve_id("LOT", idempotency_key("other")) != first
+    assert reserve_id("LOT", key, ttl=0) == first          # the reservation stands until it expires
+    monkeypatch.setattr(ids.time, "monotonic", lambda: 10 ** 9)
+    assert reserve_id("LOT", key) != first
+
+
+def test_form_token_lasts_until_the_form_is_done():
+    state = {}
+    token = form_token(state, "lot")
+    assert form_token(state, "lot") == token
+    assert form_token(state, "sale") != token
+    form_done(state, "lot")
+    assert form_token(state, "lot") != token
@@ -0,0 +1,116 @@
+import pytest
+
+import liens
+import prices
+import utils
+from conftest import FUTURE, PAST
+from liens import (accept_lien, active_lien, decline_lien, lender_liens, pledged, release_lien, request_lien,
+                   summary)
+from state_machine import InvalidTransition, transition
+from transactions import transaction
+
+RECEIPTS = "dwr_receipts.csv"
+
+
+def receipt(receipt_id, lot_id, owner="E1", status="active", expiry_ts=FUTURE):
+    return {"receipt_id": receipt_id, "lot_id": lot_id, "owner_entity_id": owner, "custodian_id": "C1",
+            "status": status, "expiry_ts": expiry_ts, "lien_active": "no", "lien_holder_id": ""}
+
+
+@pytest.fixture
+def vault(seed, monkeypatch):
+    monkeypatch.setattr(liens, "_book", None)
+    monkeypatch.setattr(prices, "_book", None)
+    seed(RECEIPTS, [receipt("R1", "L1"), receipt("R2", "L2"), receipt("R3", "L3", owner="E2"),
+                    receipt("R4", "L4", status="advance_active"), receipt("R5", "L5", expiry_ts=PAST)])
+    seed("dairy_lots.csv", [{"lot_id": f"L{i}", "product_type": "raw_milk", "quantity_liters": 100.0,
+                             "status": "active"} for i in range(1, 6)])
+    seed("entities.csv", [{"entity_id": "E1", "region": "Sikasso"}, {"entity_id": "E2", "region": "Kayes"}])
+    seed("reference_prices.csv", [{"product_type": "raw_milk", "region": "", "xof_per_liter": 500.0,
+                                   "effective_from": ""}])
+    seed("liens.csv", [], columns=utils.columns("liens.csv"))
+
+
+def flags(stored, receipt_id):
+    return stored(RECEIPTS).set_index("receipt_id").loc[receipt_id, ["lien_active", "lien_holder_id"]].tolist()
+
+
+def test_a_request_encumbers_nothing_until_the_lender_accepts(vault, stored, events):
+    request_lien("R1", "E1", "BANK-1", 30_000, 1_500, username="owner", lien_id="LIEN-1")
+    assert active_lien("R1") is None
+    assert flags(stored, "R1") == ["no", ""]
+    assert lender_liens("BANK-1", liens.REQUESTED)["lien_id"].tolist() == ["LIEN-1"]
+
+    with pytest.raises(InvalidTransition, match="held by another lender"):
+        accept_lien("LIEN-1", "bank2", lender_id="BANK-2")
+    accept_lien("LIEN-1", "bank", lender_id="BANK-1")
+    assert active_lien("R1")["lender_id"] == "BANK-1"
+    assert flags(stored, "R1") == ["yes", "BANK-1"]
+    assert events()["event_type"].tolist() == ["lien_requested", "lien_created"]
+
+
+def test_active_lien_blocks_the_receipt_until_released(vault, stored):
+    request_lien("R1", "E1", "BANK-1", 30_000, lien_id="LIEN-1")
+    accept_lien("LIEN-1", lender_id="BANK-1")
+    with pytest.raises(InvalidTransition, match="active lien"):
+        with transaction() as tx:
+            transition(tx, "R1", "sale_contract_created", "owner")
+    with pytest.raises(InvalidTransition, match="active lien"):
+        request_lien("R1", "E1", "BANK-2", 10_000)
+    with pytest.raises(InvalidTransition, match="lien is active"):
+        accept_lien("LIEN-1")
+
+    with pytest.raises(InvalidTransition, match="held by another lender"):
+        release_lien("LIEN-1", lender_id="BANK-2")
+    release_lien("LIEN-1", "bank", lender_id="BANK-1")
+    assert active_lien("R1") is None and flags(stored, "R1") == ["no", ""]
+    with pytest.raises(InvalidTransition, match="lien is released"):
+        release_lien("LIEN-1")
+    with transaction() as tx:
+        transition(tx, "R1", "sale_contract_created", "owner")
+
+
+def test_only_the_owner_can_offer_a_pledgeable_receipt(vault, stored):
+    with pytest.raises(InvalidTransition, match="not owned by E1"):
+        request_lien("R3", "E1", "BANK-1", 10_000)
+    with pytest.raises(InvalidTransition, match="status 'advance_active'"):
+        request_lien("R4", "E1", "BANK-1", 10_000)
+    with pytest.raises(InvalidTransition, match="expired"):
+        request_lien("R5", "E1", "BANK-1", 10_000)
+    with pytest.raises(InvalidTransition, match="receipt not found"):
+        request_lien("R9", "E1", "BANK-1", 10_000)
+    with pytest.raises(InvalidTransition, match="lien not found"):
+        accept_lien("LIEN-9")
+    assert stored("liens.csv").empty
+
+
+def test_decline_and_withdraw(vault, stored):
+    request_lien("R1", "E1", "BANK-1", 10_000, lien_id="LIEN-1")
+    request_lien("R2", "E1", "BANK-1", 10_000, lien_id="LIEN-2")
+    with pytest.raises(InvalidTransition, match="another owner"):
+        decline_lien("LIEN-1", owner_entity_id="E2")
+    decline_lien("LIEN-1", "owner", owner_entity_id="E1")          # withdrawn by the owner
+    decline_lien("LIEN-2", "bank", lender_id="BANK-1")             # declined by the lender
+    assert stored("liens.csv")["status"].tolist() == ["declined", "declined"]
+    with pytest.raises(InvalidTransition, match="lien is declined"):
+        accept_lien("LIEN-1")
+    # the receipt can be offered again
+    request_lien("R1", "E1", "BANK-2", 10_000, lien_id="LIEN-3")
+    accept_lien("LIEN-3", lender_id="BANK-2")
+    assert flags(stored, "R1") == ["yes", "BANK-2"]
+
+
+def test_pledged_values_each_lenders_receipts(vault):
+    request_lien("R1", "E1", "BANK-1", 30_000, 1_500, lien_id="LIEN-1")
+    request_lien("R2", "E1", "BANK-1", 45_000, lien_id="LIEN-2")
+    request_lien("R3", "E2", "BANK-2", 5_000, lien_id="LIEN-3")
+    for lien_id in ("LIEN-1", "LIEN-2", "LIEN-3"):
+        accept_lien(lien_id)
+    book = pledged("BANK-1").set_index("lien_id")
+    assert book.index.tolist() == ["LIEN-1", "LIEN-2"]
+    assert book["collateral_xof"].tolist() == [50_000.0, 50_000.0]
+    assert book["ltv"].tolist() == [0.63, 0.9]
+    assert book["margin_call"].tolist() == [False, True]
+    total = summary(book)
+    assert (total["liens"], total["exposure_xof"], total["margin_calls"]) == (2, 76_500.0, 1)
+    assert pledged("BANK-3").empty
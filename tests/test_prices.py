@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import prices
+from prices import DEFAULT_XOF_PER_LITER, PriceBook
+
+VERSIONS = [
+    {"product_type": "raw_milk", "region": "", "xof_per_liter": 400.0, "effective_from": ""},
+    {"product_type": "raw_milk", "region": "", "xof_per_liter": 450.0, "effective_from": "2026-10-01T00:00:00Z"},
+    {"product_type": "raw_milk", "region": "Sikasso", "xof_per_liter": 500.0, "effective_from": "2026-09-01T00:00:00Z"},
+    {"product_type": "raw_milk", "region": "Sikasso", "xof_per_liter": 550.0, "effective_from": "2026-10-15T00:00:00Z"},
+    {"product_type": "yogurt", "region": "Kayes", "xof_per_liter": 900.0, "effective_from": ""},
+]
+
+
+@pytest.fixture
+def book(seed, monkeypatch):
+    monkeypatch.setattr(prices, "_book", None)
+    seed(prices.PRICES_FILE, VERSIONS)
+    return prices.price_book()
+
+
+def reference(product, region, at):
+    """Reference: the latest version in force at `at` for the region, else the national one, by a plain scan."""
+    at = pd.Timestamp(at)
+    for wanted in (region, ""):
+        best = None
+        for v in VERSIONS:
+            eff = pd.Timestamp(v["effective_from"]) if v["effective_from"] else None
+            if v["product_type"] == product and v["region"] == wanted and (eff is None or eff <= at):
+                if best is None or (eff is not None and (best[0] is None or eff >= best[0])):
+                    best = (eff, v["xof_per_liter"])
+        if best is not None:
+            return best[1]
+    return DEFAULT_XOF_PER_LITER
+
+
+def test_as_of_lookups_with_national_fallback(book):
+    assert book.price("raw_milk", "Sikasso", "2026-08-01T00:00:00Z") == 400.0     # before the regional price
+    assert book.price("raw_milk", "Sikasso", "2026-10-14T23:59:59Z") == 500.0
+    assert book.price("raw_milk", "Sikasso", "2026-10-15T00:00:00Z") == 550.0     # effective_from is inclusive
+    assert book.price("raw_milk", "Kayes", "2026-10-02T00:00:00Z") == 450.0
+    assert book.price("raw_milk", None, "2026-10-02T00:00:00Z") == 450.0
+    assert book.price("yogurt", "Sikasso") == DEFAULT_XOF_PER_LITER               # no national yogurt price
+    assert book.price("butter", "Kayes") == DEFAULT_XOF_PER_LITER
+
+
+def test_batch_lookup_matches_a_plain_scan(book):
+    rng = np.random.default_rng(3)
+    n = 400
+    products = rng.choice(["raw_milk", "yogurt", "butter", None], n)
+    regions = rng.choice(["Sikasso", "Kayes", "Mopti", "", None], n)
+    at = pd.Timestamp("2026-08-15", tz="UTC") + pd.to_timedelta(rng.integers(0, 90 * 24, n), unit="h")
+    got = book.lookup(pd.Series(products).astype("category"), regions, pd.Series(at))
+    expected = [reference(p, r or "", t) for p, r, t in zip(products, regions, at)]
+    assert got.tolist() == expected
+
+
+def test_matrix_is_cached_per_epoch(book):
+    m = book.matrix("2026-10-05T00:00:00Z")
+    assert m.loc["raw_milk", ["Sikasso", "Kayes", "national"]].tolist() == [500.0, 450.0, 450.0]
+    assert book.matrix("2026-10-10T00:00:00Z") is m
+    assert book.matrix("2026-10-20T00:00:00Z").loc["raw_milk", "Sikasso"] == 550.0
+
+
+def test_set_price_adds_a_version_and_rebuilds_the_book(book, events):
+    prices.set_price("yogurt", "", 800.0, "2026-11-01T00:00:00Z", username="ops")
+    fresh = prices.price_book()
+    assert fresh is not book
+    assert fresh.price("yogurt", "Mopti", "2026-11-02T00:00:00Z") == 800.0
+    assert fresh.price("yogurt", "Mopti", "2026-10-31T00:00:00Z") == DEFAULT_XOF_PER_LITER
+    assert prices.price_book() is fresh
+    assert events()["object_id"].tolist() == ["yogurt/national"]
+
+
+def test_empty_book_uses_the_default():
+    book = PriceBook(pd.DataFrame(columns=["product_type", "region", "xof_per_liter", "effective_from"]))
+    assert book.lookup(["raw_milk"], ["Sikasso"]).tolist() == [DEFAULT_XOF_PER_LITER]
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import utils
+from conftest import FUTURE
+from issuance import issue_lots
+from liens import accept_lien, request_lien
+from projections import CONTRACTS_FILE, KEYS, RECEIPTS_FILE, Projector, compare
+from settlement import settle_statement
+from state_machine import transition
+from table_cache import load_table
+from transactions import transaction
+
+
+@pytest.fixture
+def history(seed):
+    """Receipts issued, pledged, disputed and sold through the same calls the pages make."""
+    seed("dairy_lots.csv", {"lot_id": ["L1", "L2", "L3"], "owner_entity_id": "E1", "custodian_id": "C1",
+                            "status": "active", "expiry_ts": FUTURE, "quantity_liters": 10.0})
+    seed("entities.csv", {"entity_id": ["E1", "BUYER"], "phone": ["", ""]})
+    for file_name in ("advances.csv", "sales_contracts.csv", "payments.csv", "liens.csv"):
+        seed(file_name, [], columns=utils.columns(file_name))
+
+    r1, r2, r3 = (r["receipt_id"] for r in issue_lots(load_table("dairy_lots.csv"), "custodian"))
+    request_lien(r1, "E1", "BANK-1", 5000, username="owner", lien_id="LIEN-1")
+    accept_lien("LIEN-1", username="bank", lender_id="BANK-1")
+    with transaction() as tx:
+        transition(tx, r2, "dispute_filed", "owner", {"dispute_id": "D1"})
+    contract = {"contract_id": "SC-1", "receipt_id": r3, "buyer_entity_id": "BUYER", "price_xof": 9000.0,
+                "payment_terms": "mobile_money_instant", "status": "pending_payment",
+                "created_at": "2026-10-18T00:00:00Z", "settled_at": "", "notes": ""}
+    with transaction() as tx:
+        tx.insert(CONTRACTS_FILE, contract)
+        tx.log("owner", "sale_contract_created", "sale_contract", "SC-1", {**contract, "price": 9000.0})
+        transition(tx, r3, "sale_contract_created", "owner", {"contract_id": "SC-1"})
+    statement = b"id,client_reference,amount,sender_mobile,when_completed,status\nW1,SC-1,9000,,2026-10-18T10:00:00Z,succeeded\n"
+    report = settle_statement(statement, provider="wave", username="finance")
+    assert report["summary"]["settled"] == 1
+    return r1, r2, r3
+
+
+def projected():
+    p = Projector()
+    p.catch_up(utils.event_journal())
+    return p
+
+
+def test_projection_matches_the_tables(history):
+    r1, r2, r3 = history
+    p = projected()
+    receipts = p.frame(RECEIPTS_FILE).set_index("receipt_id")
+    assert receipts.loc[[r1, r2, r3], "status"].tolist() == ["active", "disputed", "sold"]
+    assert receipts.loc[r1, "lien_holder_id"] == "BANK-1"
+    assert p.frame(CONTRACTS_FILE)["status"].tolist() == ["settled"]
+    for file_name in KEYS:
+        issues = compare(load_table(file_name), p.frame(file_name), file_name)
+        assert issues.empty, issues.to_string()
+
+
+def test_settlement_events_are_journalled_with_the_commit(history, events):
+    ev = events()
+    sold = ev[(ev["event_type"] == "receipt_status_changed") & (ev["object_id"] == history[2])]
+    assert [json.loads(d)["to"] for d in sold["details_json"]] == ["pending_sale", "sold"]
+    assert ev["event_type"].tolist()[-2:] == ["receipt_status_changed", "sale_settled"]
+
+
+def test_catch_up_resumes_from_the_saved_position(history, data_dir):
+    p = projected()
+    p.save(f"{data_dir}/projections")
+    with transaction() as tx:
+        transition(tx, history[1], "dispute_resolved", "admin", to="active")
+    resumed = Projector.load(f"{data_dir}/projections")
+    assert resumed.catch_up(utils.event_journal()) == 1
+    assert resumed.frame(RECEIPTS_FILE).set_index("receipt_id").loc[history[1], "status"] == "active"
+
+
+def test_table_written_around_the_journal_is_reported(history):
+    utils.update_row(RECEIPTS_FILE, history[0], {"status": "released"})
+    issues = compare(load_table(RECEIPTS_FILE), projected().frame(RECEIPTS_FILE), RECEIPTS_FILE)
+    assert issues[["key", "column", "stored", "projected", "issue"]].values.tolist() == [
+        [history[0], "status", "released", "active", "mismatch"]]
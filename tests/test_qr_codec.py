@@ -0,0 +1,122 @@
+import os
+import stat
+
+import pytest
+
+import qr_codec
+import signing
+from qr_codec import B45_CHARSET, PREFIX, b45decode, b45encode, decode_many, decode_payload, encode_payload
+
+KEY = b"test key"
+
+
+def payload(**fields):
+    args = {"receipt_id": "DWR-20261018-ABC123", "lot_id": "LOT-1", "owner_entity_id": "E-WG-001",
+            "custodian_id": "C-MCC-001", "issued_at": "2026-10-18T08:00:00Z", "expiry_ts": "2026-10-25T08:00:00Z",
+            "status": "active", "key": KEY}
+    return encode_payload(**{**args, **fields})
+
+
+def test_base45_matches_rfc_9285_examples():
+    assert b45encode(b"AB") == "BB8"
+    assert b45encode(b"Hello!!") == "%69 VD92EX0"
+    assert b45decode("QED8WEX0") == b"ietf!"
+    data = bytes(range(256))
+    assert b45decode(b45encode(data)) == data
+    for bad in ("A", "GGW", "a1"):
+        with pytest.raises(ValueError):
+            b45decode(bad)
+
+
+def test_signed_payload_round_trips():
+    text = payload()
+    assert text.startswith(PREFIX) and set(text[len(PREFIX):]) <= set(B45_CHARSET)
+    assert len(text) < 120
+    assert decode_payload(text, KEY) == {
+        "receipt_id": "DWR-20261018-ABC123", "lot_id": "LOT-1", "owner_entity_id": "E-WG-001",
+        "custodian_id": "C-MCC-001", "issued_at": "2026-10-18T08:00:00Z", "expiry_ts": "2026-10-25T08:00:00Z",
+        "status": "active", "format": "signed", "signature_valid": True}
+
+
+def test_tampered_or_foreign_payloads_fail_the_signature():
+    text = payload()
+    assert decode_payload(text, b"other key")["signature_valid"] is False
+    raw = bytearray(b45decode(text[len(PREFIX):]))
+    owner = raw.index(b"E-WG-001")
+    raw[owner + 2:owner + 4] = b"XX"           # same length, different owner
+    forged = decode_payload(PREFIX + b45encode(bytes(raw)), KEY)
+    assert forged["owner_entity_id"] == "E-XX-001" and forged["signature_valid"] is False
+    with pytest.raises(ValueError):
+        decode_payload(text[:-9], KEY)
+
+
+def test_legacy_formats_still_decode():
+    legacy = decode_payload('{"receipt_id": "DWR-OLD", "lot_id": "L1", "status": "active"}')
+    assert legacy["format"] == "json" and legacy["lot_id"] == "L1" and legacy["signature_valid"] is None
+    assert decode_payload(" DWR-123 ")["format"] == "id"
+    assert decode_payload("receipt_id=DWR-9&src=scan")["receipt_id"] == "DWR-9"
+    for bad in ("", "{}", "hello", '{"lot_id": "L1"}'):
+        with pytest.raises(ValueError):
+            decode_payload(bad)
+
+
+def test_decode_many_matches_decode_payload_row_by_row():
+    payloads = [payload(), payload(receipt_id="DWR-X", status="sold"), payload(key=b"other"),
+                PREFIX + "!!!", "DWR-7", "junk", None, payload(owner_entity_id="E-LONGER-OWNER-ID")]
+    df = decode_many(payloads, KEY)
+    assert len(df) == len(payloads)
+    for row, p in zip(df.to_dict("records"), payloads):
+        try:
+            expected = decode_payload(p, KEY)
+        except ValueError:
+            assert row["error"]
+            continue
+        assert row["error"] is None
+        assert {k: row[k] for k in expected} == expected
+    assert df["signature_valid"].tolist()[:3] == [True, True, False]
+    assert df.loc[1, "status"] == "sold"
+
+
+def test_unknown_status_and_long_fields():
+    assert decode_payload(payload(status="weird"), KEY)["status"] is None
+    with pytest.raises(ValueError):
+        payload(lot_id="L" * 256)
+
+
+def test_sign_and_check_are_domain_separated():
+    tag = signing.sign(b"data", b"purpose-a", 16, KEY)
+    assert len(tag) == 16
+    assert signing.check(b"data", tag, b"purpose-a", KEY)
+    assert not signing.check(b"data", tag, b"purpose-b", KEY)
+    assert not signing.check(b"datA", tag, b"purpose-a", KEY)
+
+
+@pytest.fixture
+def secret_file(tmp_path, monkeypatch):
+    path = str(tmp_path / ".dwr_secret")
+    monkeypatch.delenv("DWR_SECRET_KEY", raising=False)
+    monkeypatch.setattr(signing, "SECRET_PATH", path)
+    monkeypatch.setattr(signing, "_key", None)
+    return path
+
+
+def test_generated_secret_is_private_and_stable(secret_file, monkeypatch):
+    key = signing.secret_key()
+    assert len(key) == 64
+    assert stat.S_IMODE(os.stat(secret_file).st_mode) == 0o600
+    monkeypatch.setattr(signing, "_key", None)
+    assert signing.secret_key() == key
+    assert os.listdir(os.path.dirname(secret_file)) == [".dwr_secret"]
+
+
+def test_empty_secret_file_is_refused(secret_file):
+    open(secret_file, "w").close()
+    with pytest.raises(RuntimeError):
+        signing.secret_key()
+
+
+def test_environment_key_wins(secret_file, monkeypatch):
+    monkeypatch.setenv("DWR_SECRET_KEY", "from-env")
+    assert signing.secret_key() == b"from-env"
+    assert not os.path.exists(secret_file)
+    assert qr_codec.decode_payload(encode_payload("DWR-1", "L1", "E1", "C1"))["signature_valid"] is True
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import storage
+from storage import CsvBackend, REDO_FILE
+from transactions import transaction
+
+LOTS = "dairy_lots.csv"
+RECEIPTS = "dwr_receipts.csv"
+
+
+class Crash(BaseException):
+    """The process dying mid-commit (not an error the commit could clean up after)."""
+
+
+@pytest.fixture
+def tables(seed):
+    seed(LOTS, [{"lot_id": "L1", "status": "active"}])
+    seed(RECEIPTS, [{"receipt_id": "R1", "lot_id": "L1", "status": "active"}])
+
+
+def expire_both():
+    with transaction() as tx:
+        tx.update(LOTS, "L1", {"status": "expired"})
+        tx.update(RECEIPTS, "R1", {"status": "expired"})
+        tx.log("sweeper", "lot_expired", "dairy_lot", "L1")
+
+
+def crash_after(monkeypatch, swaps=0, events=False):
+    """Make the next commit die after `swaps` table renames (and, with `events`, after the journal write)."""
+    backend = storage._backend
+    apply = backend._apply
+
+    def partial(redo, replay=False):
+        apply({**redo, "files": redo["files"][:swaps], "events": redo["events"] if events else []}, replay)
+        raise Crash()
+
+    monkeypatch.setattr(backend, "_apply", partial)
+
+
+def statuses(stored):
+    return stored(LOTS)["status"].tolist() + stored(RECEIPTS)["status"].tolist()
+
+
+def test_interrupted_commit_is_finished_by_the_next_writer(tables, data_dir, monkeypatch, stored, events):
+    crash_after(monkeypatch, swaps=1)
+    with pytest.raises(Crash):
+        expire_both()
+    # half-applied on disk: one table swapped, no events, redo log left behind
+    assert sorted(statuses(stored)) == ["active", "expired"]
+    assert events().empty
+    assert os.path.exists(os.path.join(data_dir, REDO_FILE))
+
+    with CsvBackend(base_dir=data_dir).lock():
+        pass
+    assert statuses(stored) == ["expired", "expired"]
+    assert events()["event_type"].tolist() == ["lot_expired"]
+    assert not os.path.exists(os.path.join(data_dir, REDO_FILE))
+
+
+def test_replay_does_not_duplicate_events(tables, data_dir, monkeypatch, stored, events):
+    crash_after(monkeypatch, swaps=2, events=True)
+    with pytest.raises(Crash):
+        expire_both()
+    assert len(events()) == 1
+
+    with CsvBackend(base_dir=data_dir).lock():
+        pass
+    with CsvBackend(base_dir=data_dir).lock():
+        pass
+    assert statuses(stored) == ["expired", "expired"]
+    assert len(events()) == 1
+
+
+def test_failed_staging_leaves_no_temporary_files(tables, data_dir, monkeypatch, stored):
+    def fail(df, path):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage, "_stage_csv", fail)
+    with pytest.raises(OSError):
+        expire_both()
+    assert statuses(stored) == ["active", "active"]
+    assert sorted(os.listdir(data_dir)) == [".dwr.lock", LOTS, RECEIPTS]
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+import prices
+import risk
+from collateral import MARGIN_CALL_LTV
+
+NOW = "2026-10-18T12:00:00Z"
+
+
+@pytest.fixture
+def book(seed, monkeypatch):
+    monkeypatch.setattr(prices, "_book", None)
+    seed("reference_prices.csv", [
+        {"product_type": "raw_milk", "region": "", "xof_per_liter": 400.0, "effective_from": ""},
+        {"product_type": "raw_milk", "region": "Sikasso", "xof_per_liter": 500.0, "effective_from": "2026-10-01T00:00:00Z"},
+    ])
+    seed("entities.csv", [{"entity_id": "E1", "region": "Sikasso"}, {"entity_id": "E2", "region": "Kayes"}])
+
+
+def advance(advance_id, receipt_id, advance_xof, due_at="2026-10-25T00:00:00Z", status="active"):
+    return {"advance_id": advance_id, "receipt_id": receipt_id, "provider_id": "platform", "advance_xof": advance_xof,
+            "fee_xof": 0.0, "created_at": "2026-10-10T00:00:00Z", "due_at": due_at, "status": status}
+
+
+def receipt(receipt_id, lot_id, owner, custodian="C1", expiry_ts="2026-10-30T00:00:00Z", status="active"):
+    return {"receipt_id": receipt_id, "lot_id": lot_id, "owner_entity_id": owner, "custodian_id": custodian,
+            "expiry_ts": expiry_ts, "status": status}
+
+
+def lot(lot_id, liters, status="active", temp=4.0, breaches=0):
+    return {"lot_id": lot_id, "product_type": "raw_milk", "quantity_liters": liters, "temp_avg_c": temp,
+            "temp_breach_count": breaches, "status": status}
+
+
+@pytest.fixture
+def loans(book, seed):
+    seed("advances.csv", [
+        advance("A1", "R1", 30_000.0),                                   # 100 L x 500 = 50k: LTV 0.6
+        advance("A2", "R2", 45_000.0),                                   # 50k: LTV 0.9, margin call
+        advance("A3", "R3", 10_000.0, due_at="2026-10-17T00:00:00Z"),    # Kayes: national 400 x 100 = 40k, overdue
+        advance("A4", "R4", 5_000.0),                                    # expired lot: worth nothing
+        advance("A5", "R5", 5_000.0),                                    # unknown receipt
+        advance("A6", "R1", 1_000.0, status="repaid"),
+    ])
+    seed("dwr_receipts.csv", [
+        receipt("R1", "L1", "E1"), receipt("R2", "L2", "E1", custodian="C2"),
+        receipt("R3", "L3", "E2", expiry_ts="2026-10-18T20:00:00Z"), receipt("R4", "L4", "E1")])
+    seed("dairy_lots.csv", [lot("L1", 100.0), lot("L2", 100.0, breaches=3), lot("L3", 100.0),
+                            lot("L4", 100.0, status="expired")])
+    return risk.portfolio(NOW).set_index("advance_id")
+
+
+def test_collateral_is_valued_at_the_regional_or_national_price(loans):
+    assert loans.index.tolist() == ["A1", "A2", "A3", "A4", "A5"]
+    assert loans.loc[["A1", "A2", "A3"], "collateral_xof"].tolist() == [50_000.0, 50_000.0, 40_000.0]
+    assert loans.loc[["A1", "A2", "A3"], "ltv"].tolist() == pytest.approx([0.6, 0.9, 0.25])
+    assert loans.loc["A4", "collateral_xof"] == 0.0 and pd.isna(loans.loc["A4", "ltv"])
+
+
+def test_margin_calls_cover_high_ltv_and_collateral_that_cannot_be_valued(loans):
+    assert loans["margin_call"].to_dict() == {"A1": False, "A2": True, "A3": False, "A4": True, "A5": True}
+    assert not (loans.loc[~loans["margin_call"], "ltv"] >= MARGIN_CALL_LTV).any()
+
+
+def test_spoilage_and_due_flags(loans):
+    assert loans["spoilage_risk"].to_dict() == {"A1": False, "A2": True, "A3": True, "A4": False, "A5": False}
+    assert loans.loc["A3", "hours_to_expiry"] == 8.0 and loans.loc["A3", "expires_before_due"] == False  # noqa: E712
+    assert loans["overdue"].tolist() == [False, False, True, False, False]
+
+
+def test_prices_in_force_at_the_time_are_used(loans):
+    before = risk.portfolio("2026-09-30T00:00:00Z").set_index("advance_id")
+    assert before.loc["A1", "collateral_xof"] == 40_000.0       # the Sikasso price starts on 1 October
+    assert before.loc["A2", "margin_call"]
+
+
+def test_exposure_rolls_up_by_owner_and_custodian(loans):
+    df = loans.reset_index()
+    owners = risk.exposure(df, "owner").set_index("owner_entity_id")
+    assert owners.loc["E1", ["advances", "exposure_xof", "collateral_xof", "margin_calls"]].tolist() == [
+        3, 80_000.0, 100_000.0, 2]
+    assert owners.loc["E1", "ltv"] == 0.8
+    assert risk.exposure(df, "custodian").set_index("custodian_id").loc["C2", "advances"] == 1
+    total = risk.summary(df)
+    assert (total["advances"], total["exposure_xof"], total["margin_calls"], total["overdue"]) == (5, 95_000.0, 3, 1)
+    assert total["ltv"] == round(95_000.0 / 140_000.0, 3)
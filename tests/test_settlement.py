@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+import utils
+from conftest import FUTURE
+from settlement import read_statement, reconcile, settle_statement
+
+HEADER = "id,client_reference,amount,sender_mobile,when_completed,status\n"
+STATEMENT = (HEADER
+             + "W1,,50000,0022370111111,2026-10-18T10:00:00Z,succeeded\n"      # buyer A by phone
+             + "W2,,50000,+223 76 22 22 22,2026-10-18T10:01:00Z,succeeded\n"   # buyer B: same amount, other phone
+             + "W3,sc-3,30000,,2026-10-18T10:02:00Z,succeeded\n"               # by reference
+             + "W4,SC-4,15000,76222222,2026-10-18T10:03:00Z,succeeded\n"       # short payment
+             + "W5,,50000,79999999,2026-10-18T10:04:00Z,succeeded\n"           # unknown payer
+             + "W1,,50000,0022370111111,2026-10-18T10:00:00Z,succeeded\n"      # the same line twice
+             + "W6,SC-4,20000,76222222,2026-10-18T10:05:00Z,failed\n")
+
+
+def contract(contract_id, receipt_id, buyer, price):
+    return {"contract_id": contract_id, "receipt_id": receipt_id, "buyer_entity_id": buyer, "price_xof": price,
+            "payment_terms": "mobile_money_instant", "status": "pending_payment",
+            "created_at": "2026-10-17T00:00:00Z", "settled_at": "", "notes": ""}
+
+
+@pytest.fixture
+def sales(seed):
+    # mobile money ids are account labels; both end in 001, so only the phone tells the buyers apart
+    seed("entities.csv", [
+        {"entity_id": "BUY-A", "phone": "+22370111111", "mobile_money_id": "OM-AWA-001"},
+        {"entity_id": "BUY-B", "phone": "76 22 22 22", "mobile_money_id": "OM-FAT-001"}])
+    seed("dwr_receipts.csv", [{"receipt_id": f"R{i}", "lot_id": f"L{i}", "owner_entity_id": "E1",
+                               "status": "pending_sale", "lien_active": "no", "expiry_ts": FUTURE} for i in range(1, 5)])
+    seed("sales_contracts.csv", [contract("SC-1", "R1", "BUY-A", 50000.0), contract("SC-2", "R2", "BUY-B", 50000.0),
+                                 contract("SC-3", "R3", "BUY-A", 30000.0), contract("SC-4", "R4", "BUY-B", 20000.0)])
+    seed("advances.csv", [{"advance_id": "ADV-1", "receipt_id": "R1", "advance_xof": 20000.0, "fee_xof": 500.0,
+                           "status": "active", "repaid_at": ""}])
+    seed("payments.csv", [], columns=utils.columns("payments.csv"))
+
+
+def test_read_statement_normalises_provider_columns():
+    df = read_statement(STATEMENT.encode())
+    assert df["method"].unique().tolist() == ["wave"]
+    assert df["payer_msisdn"].tolist()[:5] == ["70111111", "76222222", "", "76222222", "79999999"]
+    assert df["reference"].tolist()[2] == "SC-3"
+    assert df["line"].tolist() == list(range(1, 8))
+
+
+def test_payers_are_matched_by_phone_and_amount(sales):
+    tables = {f: utils.load_csv(f) for f in ("sales_contracts.csv", "dwr_receipts.csv", "advances.csv",
+                                             "payments.csv", "entities.csv")}
+    matched, unmatched = reconcile(read_statement(STATEMENT.encode()), *tables.values())
+    assert matched[["provider_ref", "contract_id", "match"]].values.tolist() == [
+        ["W1", "SC-1", "payer_amount"], ["W2", "SC-2", "payer_amount"], ["W3", "SC-3", "reference"]]
+    assert matched.set_index("contract_id")["net_to_owner_xof"].to_dict() == {
+        "SC-1": 29500.0, "SC-2": 50000.0, "SC-3": 30000.0}
+    assert unmatched.set_index("line")["reason"].to_dict() == {
+        4: "amount 15,000 does not match contract price 20,000",
+        5: "no reference and no unique payer/amount match",
+        6: "duplicate line",
+        7: "payment not successful"}
+
+
+def test_same_payer_and_amount_twice_is_left_for_review(sales, seed):
+    seed("sales_contracts.csv", [contract("SC-1", "R1", "BUY-A", 50000.0), contract("SC-2", "R2", "BUY-A", 50000.0)])
+    report = settle_statement((HEADER + "W1,,50000,70111111,,succeeded\n").encode(), dry_run=True)
+    assert report["summary"]["settled"] == 0
+    assert report["unmatched"]["reason"].tolist() == ["no reference and no unique payer/amount match"]
+
+
+def test_statement_is_applied_in_one_transaction(sales, stored, events):
+    dry = settle_statement(STATEMENT.encode(), dry_run=True)
+    assert dry["summary"]["settled"] == 3 and stored("payments.csv").empty and events().empty
+
+    report = settle_statement(STATEMENT.encode(), username="finance")
+    s = report["summary"]
+    assert (s["settled"], s["settled_xof"], s["advances_repaid"], s["repaid_xof"], s["unpaid_contracts"]) == (
+        3, 130000.0, 1, 20500.0, 1)
+    assert stored("sales_contracts.csv")["status"].tolist() == ["settled", "settled", "settled", "pending_payment"]
+    assert stored("dwr_receipts.csv")["status"].tolist() == ["sold", "sold", "sold", "pending_sale"]
+    assert stored("advances.csv")["status"].tolist() == ["repaid"]
+    payments = stored("payments.csv")
+    assert payments[["ref_id", "payer_id", "provider_ref"]].values.tolist() == [
+        ["SC-1", "BUY-A", "W1"], ["SC-2", "BUY-B", "W2"], ["SC-3", "BUY-A", "W3"]]
+    log = events()
+    assert log["event_type"].value_counts().to_dict() == {"receipt_status_changed": 3, "sale_settled": 3,
+                                                          "advance_repaid": 1}
+    assert set(log.loc[log["event_type"] == "sale_settled", "username"]) == {"finance"}
+
+    # the same file again settles nothing twice
+    again = settle_statement(STATEMENT.encode(), username="finance")
+    assert again["summary"]["settled"] == 0
+    assert again["unmatched"].set_index("line").loc[[1, 2, 3], "reason"].tolist() == ["already settled"] * 3
+    assert len(stored("payments.csv")) == 3
@@ -0,0 +1,82 @@
+import json
+
+import pandas as pd
+import pytest
+
+from conftest import FUTURE, PAST
+from state_machine import InvalidTransition, apply_transitions, target_status, transition, validate
+from transactions import transaction
+
+RECEIPTS = "dwr_receipts.csv"
+
+
+def receipts(*rows):
+    return pd.DataFrame([{"receipt_id": r, "status": s, "lien_active": lien, "expiry_ts": exp}
+                         for r, s, lien, exp in rows])
+
+
+def test_validate_reports_source_status_and_guards():
+    df = receipts(("R1", "active", "no", FUTURE), ("R2", "sold", "no", FUTURE),
+                  ("R3", "active", "yes", FUTURE), ("R4", "active", "no", PAST))
+    assert validate(df, "advance_created").tolist() == [
+        "", "cannot advance_created from status 'sold'", "receipt has an active lien", "receipt has expired"]
+    assert validate(df, "no_such_event").str.startswith("unknown event").all()
+
+
+def test_apply_transitions_chains_events_per_receipt_in_order():
+    df = receipts(("R1", "active", "no", FUTURE), ("R2", "active", "no", FUTURE))
+    events = pd.DataFrame({"receipt_id": ["R1", "R1", "R2", "R1"],
+                           "event": ["sale_contract_created", "sale_settled", "sale_settled", "released"]})
+    out, results = apply_transitions(df, events, log=False)
+    assert out.set_index("receipt_id")["status"].to_dict() == {"R1": "released", "R2": "active"}
+    assert results["ok"].tolist() == [True, True, False, True]
+    assert results.loc[2, "reason"] == "cannot sale_settled from status 'active'"
+    assert results["to_status"].tolist()[:2] == ["pending_sale", "sold"]
+
+
+def test_apply_transitions_unknown_receipt():
+    _, results = apply_transitions(receipts(("R1", "active", "no", FUTURE)),
+                                   pd.DataFrame({"receipt_id": ["R9"], "event": ["expired"]}), log=False)
+    assert not results.loc[0, "ok"] and results.loc[0, "reason"] == "receipt not found"
+
+
+def test_dispute_resolution_restores_the_prior_status():
+    assert target_status("dispute_resolved", "pending_sale") == "pending_sale"
+    assert target_status("dispute_resolved") == "active"
+    with pytest.raises(InvalidTransition):
+        target_status("dispute_resolved", "sold")
+
+
+def test_transition_stages_status_and_event(seed, stored, events):
+    seed(RECEIPTS, [{"receipt_id": "R1", "status": "active", "lien_active": "no", "expiry_ts": FUTURE}])
+    with transaction() as tx:
+        assert transition(tx, "R1", "advance_created", "alice", {"advance_id": "A1"}) == "advance_active"
+    assert stored(RECEIPTS)["status"].tolist() == ["advance_active"]
+    ev = events()
+    assert ev["event_type"].tolist() == ["receipt_status_changed"]
+    assert json.loads(ev["details_json"].iloc[0]) == {"event": "advance_created", "from": "active",
+                                                     "to": "advance_active", "advance_id": "A1"}
+
+
+def test_refused_transition_writes_nothing(seed, stored, events):
+    seed(RECEIPTS, [{"receipt_id": "R1", "status": "active", "lien_active": "yes", "expiry_ts": FUTURE}])
+    with pytest.raises(InvalidTransition, match="active lien"):
+        with transaction() as tx:
+            transition(tx, "R1", "sale_contract_created", "alice")
+    with pytest.raises(InvalidTransition, match="not found"):
+        with transaction() as tx:
+            transition(tx, "R9", "expired", "alice")
+    assert stored(RECEIPTS)["status"].tolist() == ["active"]
+    assert events().empty
+
+
+def test_apply_transitions_logs_only_applied_events(data_dir, events):
+    df = receipts(("R1", "disputed", "no", FUTURE), ("R2", "pending_sale", "no", FUTURE))
+    batch = pd.DataFrame({"receipt_id": ["R1", "R2", "R2"], "event": ["dispute_resolved", "dispute_resolved", "expired"],
+                          "to": ["pending_sale", None, None]})
+    out, results = apply_transitions(df, batch, username="admin")
+    assert out["status"].tolist() == ["pending_sale", "expired"]
+    assert results["ok"].tolist() == [True, False, True]
+    ev = events()
+    assert ev["object_id"].tolist() == ["R1", "R2"]
+    assert [json.loads(d)["to"] for d in ev["details_json"]] == ["pending_sale", "expired"]
@@ -0,0 +1,118 @@
+import os
+
+import pandas as pd
+import pytest
+
+import storage
+import utils
+from storage import OUTBOX_TABLE, ConcurrentUpdateError, CsvBackend, SqlBackend
+
+LOTS = "dairy_lots.csv"
+RECEIPTS = "dwr_receipts.csv"
+ISSUED = pd.Timestamp("2026-10-18T08:30:00", tz="UTC")
+
+
+@pytest.fixture
+def csv_seed(seed):
+    seed(LOTS, [{"lot_id": "L1", "status": "active", "quantity_liters": 100.0},
+                {"lot_id": "L2", "status": "active", "quantity_liters": 50.0}])
+    seed(RECEIPTS, [{"receipt_id": "R1", "lot_id": "L1", "status": "active", "issued_at": "2026-10-01T00:00:00Z"}])
+
+
+@pytest.fixture
+def sql(csv_seed, data_dir, monkeypatch):
+    """SQLite backend seeded from the CSV files in the test directory."""
+    url = f"sqlite:///{os.path.join(data_dir, 'dwr.sqlite')}"
+    backend = SqlBackend(url, seed_dir=data_dir)
+    monkeypatch.setattr(storage, "_backend", backend)
+    yield backend
+    backend.engine.dispose()
+
+
+def test_csv_update_rewrites_only_the_matching_row(csv_seed, stored):
+    backend = storage.get_backend()
+    assert backend.update(LOTS, "L1", {"status": "quarantined"}) == 1
+    assert backend.update(LOTS, "L9", {"status": "expired"}) == 0
+    lots = stored(LOTS)
+    assert lots["status"].tolist() == ["quarantined", "active"]
+    assert lots["quantity_liters"].tolist() == ["100.0", "50.0"]
+
+
+def test_sql_tables_are_seeded_from_csv(sql):
+    assert sql.exists(LOTS)
+    assert sorted(sql.load(LOTS)["lot_id"]) == ["L1", "L2"]
+    assert sql.get_row(RECEIPTS, "R1")["lot_id"] == "L1"
+    assert sql.get_row(RECEIPTS, "R9") is None
+
+
+def test_sql_commit_applies_every_table_and_its_events(sql, events):
+    sql.commit({RECEIPTS: [{"receipt_id": "R2", "lot_id": "L2", "status": "active"}]},
+               {LOTS: {"L2": (0, {"status": "quarantined"})}},
+               [utils.event_row("alice", "receipt_issued", "dwr", "R2")], utils.event_journal())
+    assert sql.get_row(LOTS, "L2")["status"] == "quarantined"
+    assert sql.get_row(LOTS, "L2")["row_version"] == 1
+    assert sql.get_row(RECEIPTS, "R2")["status"] == "active"
+    assert events()["object_id"].tolist() == ["R2"]
+    assert sql.load(OUTBOX_TABLE).empty
+
+
+def test_sql_stale_commit_writes_nothing(sql, events):
+    sql.update(LOTS, "L1", {"status": "quarantined"})
+    with pytest.raises(ConcurrentUpdateError):
+        sql.commit({RECEIPTS: [{"receipt_id": "R2", "lot_id": "L1", "status": "active"}]},
+                   {LOTS: {"L1": (0, {"status": "expired"})}},
+                   [utils.event_row("bob", "lot_expired", "dairy_lot", "L1")], utils.event_journal())
+    assert sql.get_row(LOTS, "L1")["status"] == "quarantined"
+    assert sql.get_row(RECEIPTS, "R2") is None
+    assert events().empty
+
+
+def test_sql_rejects_duplicate_keys(sql):
+    with pytest.raises(Exception):
+        sql.insert(RECEIPTS, [{"receipt_id": "R1", "lot_id": "L2", "status": "active"}])
+    assert len(sql.load(RECEIPTS)) == 1
+
+
+def test_commit_and_insert_store_the_same_row_the_same_way(sql):
+    sql.insert(RECEIPTS, [{"receipt_id": "R2", "lot_id": "L2", "status": "active", "issued_at": ISSUED}])
+    sql.commit({RECEIPTS: [{"receipt_id": "R3", "lot_id": "L2", "status": "active", "issued_at": ISSUED}]}, {})
+    rows = sql.load(RECEIPTS).set_index("receipt_id")
+    assert rows.loc["R2", "issued_at"] == rows.loc["R3", "issued_at"] == "2026-10-18T08:30:00Z"
+
+
+def test_sql_version_token_sees_writes_from_another_connection(sql, data_dir):
+    before = sql.version_token(LOTS)
+    other = SqlBackend(sql.url, seed_dir=data_dir)
+    other.update(LOTS, "L2", {"status": "expired"})
+    other.engine.dispose()
+    assert sql.version_token(LOTS) != before
+
+
+def test_events_left_in_the_outbox_reach_the_journal_once(sql, data_dir, monkeypatch, events):
+    journal = utils.event_journal()
+
+    def stop(rows, sync=False):
+        raise SystemError("process stopped after the database commit")
+
+    with monkeypatch.context() as m:
+        m.setattr(journal, "append_many", stop)
+        with pytest.raises(SystemError):
+            sql.commit({}, {LOTS: {"L1": (0, {"status": "expired"})}},
+                       [utils.event_row("sweeper", "lot_expired", "dairy_lot", "L1")], journal)
+    assert sql.get_row(LOTS, "L1")["status"] == "expired"
+    assert events().empty
+    assert len(sql.load(OUTBOX_TABLE)) == 1
+
+    restarted = SqlBackend(sql.url, seed_dir=data_dir)
+    restarted._recover()
+    restarted._recovered = False
+    restarted._recover()
+    assert events()["event_type"].tolist() == ["lot_expired"]
+    assert sql.load(OUTBOX_TABLE).empty
+    restarted.engine.dispose()
+
+
+def test_unknown_backend_is_refused():
+    with pytest.raises(ValueError):
+        storage.create_backend("mongo")
+    assert isinstance(storage.create_backend("csv"), CsvBackend)
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from telemetry import TankSeries, TelemetryStore, parse_lines, read_readings, summarize
+
+T0 = pd.Timestamp("2026-10-18T06:00:00Z").timestamp()
+
+
+def entering(temps, lo, hi):
+    """Reference: 1 where a reading starts an excursion out of the band, by a plain loop."""
+    flags, out_before = [], False
+    for t in temps:
+        out = t < lo or t > hi
+        flags.append(int(out and not out_before))
+        out_before = out
+    return np.array(flags)
+
+
+def test_consecutive_out_of_band_readings_count_once():
+    s = TankSeries(2.0, 6.0, size=16)
+    s.extend(np.arange(6.0), np.array([4, 7, 8, 4, 1, 4], dtype=np.float32))
+    assert s.stats()["temp_breach_count"] == 2
+    # an excursion still running at the end of one batch continues into the next
+    s.extend(np.array([6.0, 7.0]), np.array([9, 9], dtype=np.float32))
+    s.extend(np.array([8.0]), np.array([9], dtype=np.float32))
+    assert s.stats()["temp_breach_count"] == 3
+
+
+def test_suffix_stats_match_a_plain_scan_after_the_ring_wraps():
+    rng = np.random.default_rng(7)
+    temps = rng.normal(4, 2, 500).astype(np.float32)
+    ts = T0 + np.arange(500.0)
+    s = TankSeries(2.0, 6.0, size=128)
+    for chunk in np.array_split(np.arange(500), 9):
+        s.extend(ts[chunk], temps[chunk])
+    starts = entering(temps, 2.0, 6.0)
+    for since in (T0 + 372, T0 + 400, T0 + 499):
+        tail = ts >= since
+        got = s.stats(since)
+        assert got["readings"] == tail.sum()
+        assert got["temp_avg_c"] == pytest.approx(round(float(temps[tail].astype(np.float64).mean()), 2), abs=0.01)
+        assert got["temp_breach_count"] == starts[tail].sum()
+    assert s.stats()["readings"] == 128
+    assert s.stats(T0 + 10_000)["readings"] == 0
+
+
+def test_parse_lines_accepts_epoch_and_iso_and_counts_bad_lines():
+    ts, tanks, temps, bad = parse_lines([f"{T0},T1,4.5", "2026-10-18T06:00:01Z,T2,3.0", "garbage",
+                                         f"{T0},T1,warm", f"{T0},,4.0"])
+    assert ts.tolist() == [T0, T0 + 1]
+    assert tanks.tolist() == ["T1", "T2"]
+    assert temps.tolist() == [4.5, 3.0]
+    assert bad == 3
+
+
+@pytest.fixture
+def store(seed, data_dir):
+    seed("tanks.csv", [{"tank_id": "T1", "temp_min_c": 2.0, "temp_max_c": 6.0},
+                       {"tank_id": "T2", "temp_min_c": 2.0, "temp_max_c": 6.0}])
+    seed("dairy_lots.csv", [
+        {"lot_id": "L1", "tank_id": "T1", "status": "active", "created_at": "2026-10-18T06:00:30Z"},
+        {"lot_id": "L2", "tank_id": "T2", "status": "active", "created_at": "2026-10-18T06:00:00Z"},
+        {"lot_id": "L3", "tank_id": "T1", "status": "active", "created_at": "2026-10-18T05:00:00Z"}])
+    seed("dwr_receipts.csv", [{"receipt_id": "R3", "lot_id": "L3", "status": "released"}])
+    return TelemetryStore(directory=f"{data_dir}/telemetry", ring_size=1024, flush_rows=10_000, flush_interval=3600)
+
+
+def test_lots_get_the_readings_since_they_were_received(store, stored):
+    lines = [f"{T0 + i},T1,{8.0 if i < 30 else 4.0}" for i in range(60)] + [f"{T0 + i},T2,5.0" for i in range(60)]
+    store.ingest_lines(lines)
+    assert store.attach_to_lots() == 2
+    lots = stored("dairy_lots.csv").set_index("lot_id")
+    assert lots.loc["L1", ["temp_avg_c", "temp_breach_count"]].tolist() == ["4.0", "0"]
+    assert lots.loc["L2", ["temp_avg_c", "temp_breach_count"]].tolist() == ["5.0", "0"]
+    assert lots.loc["L3", "temp_avg_c"] == ""        # released: the milk has left the tank
+    assert store.attach_to_lots() == 0               # nothing changed
+    assert store.stats("T1")["temp_breach_count"] == 1
+
+
+def test_flushed_readings_warm_a_new_store(store, data_dir):
+    store.ingest_lines([f"{T0 + i},T1,{3.0 + i % 3}" for i in range(90)])
+    store.flush()
+    df = read_readings("T1", start=T0 + 30, directory=f"{data_dir}/telemetry")
+    assert len(df) == 60 and df["ts"].is_monotonic_increasing
+    summary = summarize(df, 2.0, 6.0)
+    assert (summary["readings"], summary["temp_avg_c"], summary["temp_breach_count"]) == (60, 4.0, 0)
+
+    restarted = TelemetryStore(directory=f"{data_dir}/telemetry", ring_size=1024)
+    assert restarted.warm(T0) == 90
+    assert restarted.stats("T1") == store.stats("T1")
+    assert restarted.stats("T9")["readings"] == 0
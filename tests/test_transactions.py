@@ -0,0 +1,93 @@
+import pytest
+
+from storage import ConcurrentUpdateError
+from transactions import UnitOfWork, run_in_transaction, transaction
+
+LOTS = "dairy_lots.csv"
+RECEIPTS = "dwr_receipts.csv"
+
+
+@pytest.fixture
+def tables(seed):
+    seed(LOTS, [{"lot_id": "L1", "status": "active", "quantity_liters": 100.0}])
+    seed(RECEIPTS, [{"receipt_id": "R1", "lot_id": "L1", "status": "active"}])
+
+
+def test_commit_writes_every_table_and_bumps_versions(tables, stored, events):
+    with transaction() as tx:
+        tx.update(LOTS, "L1", {"status": "quarantined"})
+        tx.update(RECEIPTS, "R1", {"status": "disputed"})
+        tx.insert(RECEIPTS, {"receipt_id": "R2", "lot_id": "L1", "status": "active"})
+        tx.log_many("alice", "receipt_checked", "dwr", ["R1", "R2"], [{"n": 1}, {"n": 2}])
+    assert stored(LOTS)[["status", "row_version"]].values.tolist() == [["quarantined", "1"]]
+    assert stored(RECEIPTS)["status"].tolist() == ["disputed", "active"]
+    assert events()["object_id"].tolist() == ["R1", "R2"]
+
+
+def test_stale_update_is_rejected_and_nothing_is_written(tables, stored, events):
+    first, second = UnitOfWork(), UnitOfWork()
+    assert first.get(LOTS, "L1")["status"] == second.get(LOTS, "L1")["status"] == "active"
+
+    first.update(LOTS, "L1", {"status": "quarantined"})
+    first.commit()
+
+    second.update(RECEIPTS, "R1", {"status": "expired"})
+    second.update(LOTS, "L1", {"status": "expired"})
+    second.log("bob", "lot_expired", "dairy_lot", "L1")
+    with pytest.raises(ConcurrentUpdateError):
+        second.commit()
+    assert stored(LOTS)["status"].tolist() == ["quarantined"]
+    assert stored(RECEIPTS)["status"].tolist() == ["active"]
+    assert events().empty
+
+
+def test_empty_update_still_claims_the_row(tables):
+    reader = UnitOfWork()
+    reader.get(LOTS, "L1")
+    with transaction() as tx:
+        tx.update(LOTS, "L1", {})
+    reader.update(LOTS, "L1", {"status": "expired"})
+    with pytest.raises(ConcurrentUpdateError):
+        reader.commit()
+
+
+def test_run_in_transaction_retries_on_fresh_rows(tables, stored):
+    attempts = []
+
+    def stage(tx):
+        row = tx.get(LOTS, "L1")
+        attempts.append(row["status"])
+        if len(attempts) == 1:
+            # someone else commits between our read and our commit
+            with transaction() as other:
+                other.update(LOTS, "L1", {"status": "quarantined"})
+        tx.update(LOTS, "L1", {"notes": f"seen {row['status']}"})
+
+    run_in_transaction(stage)
+    assert attempts == ["active", "quarantined"]
+    assert stored(LOTS)["notes"].tolist() == ["seen quarantined"]
+
+
+def test_run_in_transaction_gives_up_after_retries(tables):
+    def stage(tx):
+        tx.get(LOTS, "L1")
+        with transaction() as other:
+            other.update(LOTS, "L1", {})
+        tx.update(LOTS, "L1", {"status": "expired"})
+
+    with pytest.raises(ConcurrentUpdateError):
+        run_in_transaction(stage, retries=2)
+
+
+def test_exception_rolls_back(tables, stored):
+    with pytest.raises(RuntimeError):
+        with transaction() as tx:
+            tx.update(LOTS, "L1", {"status": "expired"})
+            raise RuntimeError("page stopped")
+    assert stored(LOTS)["status"].tolist() == ["active"]
+
+
+def test_update_of_missing_row_raises(tables):
+    with pytest.raises(KeyError):
+        with transaction() as tx:
+            tx.update(LOTS, "L9", {"status": "expired"})
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+import users
+
+FAST = 2 ** 4
+
+
+@pytest.fixture
+def people(seed, monkeypatch):
+    seed("users.csv", [
+        {"username": "bank", "password": users.hash_password("Secret1!", n=FAST), "role": "bank",
+         "entity_id": "BANK-1", "name": "Bank"},
+        {"username": "old", "password": "plain-pass", "role": "custodian", "entity_id": "C1", "name": "Old"},
+        {"username": "bank", "password": "shadowed", "role": "admin", "entity_id": "X", "name": "Dup"}])
+    monkeypatch.setattr(users, "_directory", None)
+    monkeypatch.setattr(users, "_dummy_hash", users.hash_password("nobody", n=FAST))
+
+
+def test_hashes_are_salted_and_checked_in_constant_form():
+    a, b = users.hash_password("pw", n=FAST), users.hash_password("pw", n=FAST)
+    assert a != b and a.startswith(users.HASH_PREFIX) and b.count("$") == 5
+    assert users.verify_password(" pw ", a)
+    assert not users.verify_password("pw2", a)
+    assert not users.verify_password("pw", "scrypt$broken")
+    assert users.verify_password("plain", "plain") and not users.verify_password("plain", "other")
+
+
+def test_authenticate(people):
+    user = users.authenticate("bank", "Secret1!")
+    assert user == {"username": "bank", "role": "bank", "entity_id": "BANK-1", "name": "Bank"}
+    assert users.authenticate(" bank ", "wrong") is None
+    assert users.authenticate("nobody", "Secret1!") is None
+    assert users.authenticate("bank", "shadowed") is None           # the first row for a username wins
+    assert users.get_user("old")["role"] == "custodian" and users.get_user("ghost") is None
+
+
+def test_plaintext_password_is_rehashed_on_first_login(people, stored):
+    assert users.authenticate("old", "plain-pass")["entity_id"] == "C1"
+    stored_pw = stored("users.csv").set_index("username").loc["old", "password"]
+    assert users.is_hashed(stored_pw) and users.verify_password("plain-pass", stored_pw)
+    assert users.authenticate("old", "plain-pass") is not None
+    assert users.hash_plaintext() == 0
+
+
+def test_hash_plaintext_converts_the_file(people, stored):
+    assert users.hash_plaintext() == 1
+    assert users.is_hashed(stored("users.csv").set_index("username").loc["old", "password"])
+
+
+def test_directory_is_rebuilt_only_when_the_file_changes(people):
+    first = users.directory()
+    assert users.directory() is first
+    users.set_password("old", "new-pass")
+    assert users.directory() is not first
+    with pytest.raises(KeyError):
+        users.set_password("ghost", "x")
+
+
+def test_tokens_carry_the_user_and_can_be_verified(people):
+    token = users.issue_token(users.get_user("bank"))
+    claims = users.verify_token(token)
+    assert (claims["sub"], claims["role"], claims["entity_id"]) == ("bank", "bank", "BANK-1")
+    assert users.bearer_token(f"Bearer {token}") == token
+    assert users.bearer_token(f"Basic {token}") == "" and users.bearer_token(None) == ""
+    prefix, body, tag = token.split(".")
+    other = users.issue_token(users.get_user("old")).split(".")[1]
+    for bad in (f"{prefix}.{other}.{tag}", f"u2.{body}.{tag}", token[:-2], f"{prefix}.{body}.", "", "a.b", None):
+        assert users.verify_token(bad) is None
+
+
+def test_tokens_expire(people, monkeypatch):
+    token = users.issue_token(users.get_user("bank"), ttl=60)
+    assert users.verify_token(token) is not None
+    now = time.time()
+    monkeypatch.setattr(users.time, "time", lambda: now + 61)
+    assert users.verify_token(token) is None
+
+
+def test_password_change_invalidates_tokens(people):
+    bank, old = users.issue_token(users.get_user("bank")), users.issue_token(users.get_user("old"))
+    users.set_password("bank", "Changed2!")
+    assert users.verify_token(bank) is None
+    assert users.verify_token(old) is not None
+    assert users.verify_token(users.issue_token(users.get_user("bank"))) is not None
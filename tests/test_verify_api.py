@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import pytest
+
+import users
+import verify_api
+from conftest import FUTURE, PAST
+from qr_codec import encode_payload
+
+
+def call(method, path, body=None, token=None):
+    """One request through the ASGI app; returns (status, JSON body)."""
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    messages = [{"type": "http.request", "body": b"" if body is None else json.dumps(body).encode(), "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(verify_api.app({"type": "http", "method": method, "path": path, "headers": headers}, receive, send))
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.fixture
+def registry(seed, monkeypatch):
+    seed("dwr_receipts.csv", [
+        {"receipt_id": "DWR-1", "lot_id": "L1", "owner_entity_id": "E1", "custodian_id": "C1", "status": "active",
+         "expiry_ts": FUTURE, "lien_active": "no", "lien_holder_id": ""},
+        {"receipt_id": "DWR-2", "lot_id": "L2", "owner_entity_id": "E1", "custodian_id": "C1", "status": "active",
+         "expiry_ts": PAST, "lien_active": "no", "lien_holder_id": ""}])
+    seed("dairy_lots.csv", [{"lot_id": "L1", "product_type": "raw_milk", "quantity_liters": 100.0, "status": "active"},
+                            {"lot_id": "L2", "product_type": "raw_milk", "quantity_liters": 50.0, "status": "active"}])
+    seed("entities.csv", [{"entity_id": "E1", "name": "Awa", "region": "Sikasso"}])
+    seed("custodians.csv", [{"custodian_id": "C1", "name": "MCC Sikasso", "region": "Sikasso", "license_status": "ok"}])
+    seed("advances.csv", [], columns=["advance_id", "receipt_id", "status"])
+    seed("disputes.csv", [], columns=["dispute_id", "receipt_id", "status"])
+    seed("liens.csv", [], columns=["lien_id", "receipt_id", "lender_id", "status"])
+    seed("users.csv", [{"username": "bank", "password": users.hash_password("secret", n=2 ** 4),
+                        "role": "bank", "entity_id": "BANK-1"}])
+    monkeypatch.setattr(users, "_directory", None)
+
+
+def payload(receipt_id="DWR-1", lot_id="L1", owner="E1", key=None):
+    return encode_payload(receipt_id, lot_id, owner, "C1", expiry_ts=FUTURE, key=key)
+
+
+def test_health():
+    assert call("GET", "/health") == (200, {"ok": True})
+
+
+def test_anonymous_scan_gets_validity_without_details(registry):
+    status, body = call("GET", "/verify/DWR-1")
+    assert status == 200
+    assert body["verified"] is True and body["status"] == "active"
+    assert "owner" not in body and "receipt" not in body
+
+
+def test_token_holder_gets_details(registry):
+    token = users.issue_token(users.get_user("bank"))
+    status, body = call("GET", "/verify/DWR-1", token=token)
+    assert status == 200
+    assert body["owner"] == {"entity_id": "E1", "name": "Awa", "region": "Sikasso"}
+    assert body["lot"]["quantity_liters"] == 100.0
+
+
+def test_invalid_token_is_rejected(registry):
+    assert call("GET", "/verify/DWR-1", token="u1.forged.tag")[0] == 401
+    assert call("GET", "/health", token="u1.forged.tag")[0] == 200
+
+
+def test_unknown_and_expired_receipts(registry):
+    assert call("GET", "/verify/DWR-9") == (404, {"receipt_id": "DWR-9", "found": False, "verified": False})
+    status, body = call("GET", "/verify/DWR-2")
+    assert status == 200 and body["expired"] is True and body["verified"] is False
+
+
+def test_signed_payload_must_match_the_registry(registry):
+    status, body = call("POST", "/verify", {"payload": payload()})
+    assert status == 200 and body["signature_valid"] is True and body["payload_matches"] is True
+    assert body["verified"] is True
+
+    _, forged_owner = call("POST", "/verify", {"payload": payload(owner="E-THIEF")})
+    assert forged_owner["signature_valid"] is True and forged_owner["payload_matches"] is False
+    assert forged_owner["verified"] is False
+
+    _, other_key = call("POST", "/verify", {"payload": payload(key=b"someone else")})
+    assert other_key["signature_valid"] is False and other_key["verified"] is False
+
+    assert call("POST", "/verify", {"payload": "not a receipt"})[0] == 400
+
+
+def test_batch_mixes_ids_and_payloads(registry):
+    status, body = call("POST", "/verify/batch", {"receipt_ids": ["DWR-1", "DWR-9"],
+                                                  "payloads": [payload(), "garbage", "DWR-2"]})
+    assert status == 200
+    assert body["count"] == 5 and body["verified"] == 2
+    assert [r["receipt_id"] for r in body["results"]] == ["DWR-1", "DWR-9", "DWR-1", None, "DWR-2"]
+
+
+def test_batch_input_is_validated(registry):
+    assert call("POST", "/verify/batch", {"receipt_ids": "DWR-1"})[0] == 400
+    assert call("POST", "/verify/batch", {"payloads": [1, 2]})[0] == 400
+    assert call("POST", "/verify/batch", {"receipt_ids": ["DWR-1"] * (verify_api.MAX_BATCH + 1)})[0] == 413
+    assert call("POST", "/verify", {"receipt_id": ["DWR-1"]})[0] == 400
+    assert call("GET", "/nowhere")[0] == 404
+
+
+def test_required_token(registry, monkeypatch):
+    monkeypatch.setattr(verify_api, "REQUIRE_TOKEN", True)
+    assert call("GET", "/verify/DWR-1")[0] == 401
+    assert call("GET", "/verify/DWR-1", token=users.issue_token(users.get_user("bank")))[0] == 200
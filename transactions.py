@@ -0,0 +1,127 @@
+import time
+import random
+from contextlib import contextmanager, nullcontext
+
+from storage import get_backend, primary_key, ConcurrentUpdateError, VERSION_COL, parse_version
+from utils import event_row, event_journal
+from table_cache import invalidate
+
+EVENTS_FILE = "events.csv"
+
+
+class UnitOfWork:
+    """
+    Collects inserts, updates and events for several tables and commits them together.
+
+    Rows read with `get` remember their `row_version`; `commit` fails with
+    ConcurrentUpdateError if any updated row was changed by someone else in the
+    meantime, and nothing is written. Events are written to the journal by the same commit.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self._rows = {}
+        self._inserts = {}
+        self._updates = {}
+        self._events = []
+        self.committed = False
+
+    def get(self, file_name, key):
+        cached = self._rows.get((file_name, str(key)))
+        if cached is not None:
+            return dict(cached)
+        row = self.backend.get_row(file_name, key)
+        if row is None:
+            return None
+        self._rows[(file_name, str(key))] = row
+        return dict(row)
+
+    def track(self, file_name, rows) -> None:
+        """
+        Treat rows from an earlier table load as read by `get`, so batch updates skip the
+        per-row read. Their `row_version` is still checked at commit.
+        """
+        key_col = primary_key(file_name)
+        for row in rows:
+            self._rows.setdefault((file_name, str(row[key_col])), dict(row))
+
+    def insert(self, file_name, row: dict) -> None:
+        self._inserts.setdefault(file_name, []).append(dict(row))
+
+    def update(self, file_name, key, values: dict) -> None:
+        row = self._rows.get((file_name, str(key)))
+        if row is None:
+            row = self.get(file_name, key)
+            if row is None:
+                raise KeyError(f"{file_name}: {primary_key(file_name)}={key} not found")
+            row = self._rows[(file_name, str(key))]
+        row.update(values)
+
+        table_updates = self._updates.setdefault(file_name, {})
+        expected, pending = table_updates.get(str(key), (None, {}))
+        if expected is None:
+            expected = parse_version(row.get(VERSION_COL))
+        pending.update(values)
+        table_updates[str(key)] = (expected, pending)
+
+    def log(self, username, event_type, object_type, object_id, details=None) -> None:
+        self._events.append((username, event_type, object_type, object_id, details))
+
+    def log_many(self, username, event_type, object_type, object_ids, details=None) -> None:
+        """One event per object id (details aligned with the ids), written by the same commit."""
+        object_ids = list(object_ids)
+        details = list(details) if details is not None else [None] * len(object_ids)
+        self._events.extend((username, event_type, object_type, o, d) for o, d in zip(object_ids, details))
+
+    def commit(self) -> None:
+        if self.committed:
+            return
+        events = [event_row(*event) for event in self._events]
+        self.backend.commit(self._inserts, self._updates, events, event_journal(EVENTS_FILE))
+        self.committed = True
+        for file_name in set(self._inserts) | set(self._updates):
+            invalidate(file_name)
+        if events:
+            invalidate(EVENTS_FILE)
+
+    def rollback(self) -> None:
+        self._inserts.clear()
+        self._updates.clear()
+        self._events.clear()
+        self._rows.clear()
+
+
+@contextmanager
+def transaction(backend=None):
+    uow = UnitOfWork(backend)
+    try:
+        yield uow
+    except Exception:
+        uow.rollback()
+        raise
+    uow.commit()
+
+
+def run_in_transaction(fn, retries=5, backend=None, exclusive=False):
+    """
+    Run fn(uow) and commit, retrying from scratch on concurrent updates.
+
+    With `exclusive`, fn's reads and the commit run under the backend's writer lock (CSV
+    tables are swapped in one by one; a SQL commit is atomic to readers), so a check that
+    spans several tables never sees half of another commit.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with _writer_lock(backend) if exclusive else nullcontext():
+                with transaction(backend) as uow:
+                    result = fn(uow)
+            return result
+        except ConcurrentUpdateError:
+            if attempt == retries:
+                raise
+            time.sleep(random.uniform(0, 0.01 * (2 ** attempt)))
+
+
+def _writer_lock(backend=None):
+    lock = getattr(backend or get_backend(), "lock", None)
+    return lock() if lock is not None else nullcontext()
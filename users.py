@@ -0,0 +1,226 @@
+"""
+User directory: hashed credentials, constant-time login and signed session tokens.
+
+Passwords are stored as `scrypt$<n>$<r>$<p>$<salt>$<hash>` (base64). Plaintext rows from
+older users.csv files still log in and are re-hashed on their first successful login;
+`python users.py hash` converts the whole file at once.
+
+The directory is a dict keyed by username, rebuilt only when users.csv changes, so a
+login is one dict lookup plus one scrypt. The verification API and batch jobs use
+signed tokens instead of a password:
+
+    token = issue_token(authenticate("bank_demo", "Admin123!"))
+    verify_token(token)   # -> {"sub": "bank_demo", "role": "bank", ...} or None
+
+A token stops working when it expires or when the user's password changes.
+
+    python users.py hash                       # hash plaintext passwords in users.csv
+    python users.py passwd <username> <password>
+    python users.py token <username> [hours]   # for scripts calling the verification API
+"""
+import sys
+import json
+import time
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+
+from storage import get_backend
+from table_cache import load_table
+from utils import update_row, insert_rows
+from signing import sign, check
+
+USERS_FILE = "users.csv"
+REQUIRED_COLUMNS = {"username", "password", "role", "entity_id"}
+
+# scrypt cost: 16 MiB and ~50 ms per hash on a pilot server
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+SALT_BYTES = 16
+HASH_PREFIX = "scrypt$"
+
+TOKEN_PREFIX = "u1"
+TOKEN_PURPOSE = b"dwr-session-v1"
+TOKEN_TTL_S = 12 * 3600
+TOKEN_TAG_BYTES = 16
+
+DEFAULT_USERS = [{"username": "admin", "password": "Admin123!", "role": "admin",
+                  "entity_id": "E-PLAT-001", "name": "Platform Admin"}]
+
+_directory = None
+_dummy_hash = None
+_lock = threading.Lock()
+
+
+# ----------------------------
+# Passwords
+# ----------------------------
+def hash_password(password: str, salt: bytes = None, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P) -> str:
+    salt = salt or secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.scrypt(str(password).encode("utf-8"), salt=salt, n=n, r=r, p=p, dklen=32)
+    return f"{HASH_PREFIX}{n}${r}${p}${_b64(salt)}${_b64(digest)}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """Constant-time check against a stored hash (or a legacy plaintext value)."""
+    password = str(password).strip()
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode("utf-8"), str(stored).encode("utf-8"))
+    try:
+        n, r, p, salt, digest = stored[len(HASH_PREFIX):].split("$")
+        expected = _unb64(digest)
+        got = hashlib.scrypt(password.encode("utf-8"), salt=_unb64(salt), n=int(n), r=int(r), p=int(p),
+                             dklen=len(expected))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(got, expected)
+
+
+def is_hashed(stored) -> bool:
+    return str(stored).startswith(HASH_PREFIX)
+
+
+# ----------------------------
+# Directory
+# ----------------------------
+def ensure_users_file() -> None:
+    backend = get_backend()
+    if not backend.exists(USERS_FILE):
+        insert_rows(USERS_FILE, [{**u, "password": hash_password(u["password"])} for u in DEFAULT_USERS])
+
+
+def directory() -> dict:
+    """{username: user row} for the current users.csv, rebuilt only when the file changes."""
+    global _directory
+    token = get_backend().version_token(USERS_FILE)
+    current = _directory
+    if current is not None and current[0] == token:
+        return current[1]
+    with _lock:
+        if _directory is None or _directory[0] != token:
+            _directory = (token, _build(load_table(USERS_FILE)))
+        return _directory[1]
+
+
+def get_user(username):
+    """The public fields of a user (no password hash), or None."""
+    row = directory().get(str(username or "").strip())
+    return None if row is None else _public(row)
+
+
+def authenticate(username, password):
+    """The user if the password matches, else None. Plaintext rows are re-hashed on success."""
+    row = directory().get(str(username or "").strip())
+    if row is None:
+        verify_password(password, _unknown_user_hash())   # as slow as a wrong password
+        return None
+    if not verify_password(password, row["password"]):
+        return None
+    if not is_hashed(row["password"]):
+        set_password(row["username"], password)
+    return _public(row)
+
+
+def set_password(username, password) -> None:
+    if update_row(USERS_FILE, username, {"password": hash_password(str(password).strip())}) == 0:
+        raise KeyError(f"unknown user '{username}'")
+
+
+def hash_plaintext() -> int:
+    """Hash every plaintext password in users.csv; returns how many rows changed."""
+    changed = 0
+    for username, row in directory().items():
+        if not is_hashed(row["password"]):
+            set_password(username, row["password"])
+            changed += 1
+    return changed
+
+
+# ----------------------------
+# Session tokens
+# ----------------------------
+def issue_token(user: dict, ttl=TOKEN_TTL_S) -> str:
+    """Signed `u1.<claims>.<tag>` token for `user` (as returned by authenticate/get_user)."""
+    row = directory()[user["username"]]
+    claims = {"sub": row["username"], "role": row["role"], "entity_id": row["entity_id"],
+              "exp": int(time.time() + ttl), "pv": _password_version(row)}
+    body = _b64(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    tag = sign(f"{TOKEN_PREFIX}.{body}".encode("ascii"), TOKEN_PURPOSE, TOKEN_TAG_BYTES)
+    return f"{TOKEN_PREFIX}.{body}.{_b64(tag)}"
+
+
+def verify_token(token):
+    """The token's claims if it is authentic, unexpired and the password has not changed; else None."""
+    try:
+        prefix, body, tag = str(token or "").strip().split(".")
+        tag = _unb64(tag)
+        # check() compares as many bytes as it is given: a cut-down (or empty) tag must not pass
+        if (prefix != TOKEN_PREFIX or len(tag) != TOKEN_TAG_BYTES
+                or not check(f"{prefix}.{body}".encode("ascii"), tag, TOKEN_PURPOSE)):
+            return None
+        claims = json.loads(_unb64(body))
+    except (ValueError, TypeError):
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    row = directory().get(claims.get("sub"))
+    if row is None or not hmac.compare_digest(claims.get("pv", ""), _password_version(row)):
+        return None
+    return claims
+
+
+def bearer_token(authorization) -> str:
+    """The token from an `Authorization: Bearer <token>` header value ("" if none)."""
+    scheme, _, token = str(authorization or "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else ""
+
+
+def _build(df) -> dict:
+    missing = REQUIRED_COLUMNS - set(df.columns)
+    if missing:
+        raise ValueError(f"Users file is missing required columns: {sorted(missing)}")
+    out = {}
+    for row in df.astype(object).where(df.notna(), "").to_dict("records"):
+        row = {k: str(v).strip() for k, v in row.items()}
+        out.setdefault(row["username"], row)    # first row wins, like the old mask
+    return out
+
+
+def _unknown_user_hash() -> str:
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_hex(8))
+    return _dummy_hash
+
+
+def _public(row: dict) -> dict:
+    return {k: v for k, v in row.items() if k not in ("password", "row_version")}
+
+
+def _password_version(row: dict) -> str:
+    return hashlib.sha256(row["password"].encode("utf-8")).hexdigest()[:12]
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "hash":
+        print(f"hashed {hash_plaintext()} password(s)")
+    elif cmd == "passwd" and len(sys.argv) == 4:
+        set_password(sys.argv[2], sys.argv[3])
+        print("password updated")
+    elif cmd == "token" and len(sys.argv) >= 3:
+        user = get_user(sys.argv[2])
+        if user is None:
+            sys.exit(f"unknown user '{sys.argv[2]}'")
+        print(issue_token(user, float(sys.argv[3]) * 3600 if len(sys.argv) > 3 else TOKEN_TTL_S))
+    else:
+        sys.exit("usage: python users.py hash | passwd <username> <password> | token <username> [hours]")
@@ -1,12 +1,18 @@
 import os
 import json
-import uuid
-from io import BytesIO
+import warnings
 from datetime import datetime
 
 import pandas as pd
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+
+import receipt_pdf
+from journal import journal_for
+from qr_codec import encode_payload
+from sla import score_coldchain
+from storage import get_backend
+from table_cache import load_table, cached, invalidate
+from schemas import apply, columns, empty
+from ids import gen_id, gen_ids  # noqa: F401  (pages import them from here)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -14,180 +20,89 @@ def csv_path(file_name: str) -> str:
     return os.path.join(BASE_DIR, file_name)
 
 def load_csv(file_name: str) -> pd.DataFrame:
-    path = csv_path(file_name)
-    if not os.path.exists(path):
-        return pd.DataFrame()
-    try:
-        return pd.read_csv(path)
-    except Exception:
-        return pd.DataFrame()
+    return load_table(file_name).copy()
 
 def save_csv(df: pd.DataFrame, file_name: str) -> None:
-    path = csv_path(file_name)
-    df.to_csv(path, index=False)
-
-def load_csv_schema(file_name, schema, seed_df=None):
-    path = csv_path(file_name)
-
-    if not os.path.exists(path):
-        df = seed_df.copy() if seed_df is not None else pd.DataFrame(columns=schema)
-        df.to_csv(path, index=False)
-        return df
-
-    df = pd.read_csv(path)
-
-    for col in schema:
-        if col not in df.columns:
-            df[col] = None
-
-    return df[schema]
+    get_backend().save(df, file_name)
+    invalidate(file_name)
+
+def insert_rows(file_name: str, rows) -> None:
+    get_backend().insert(file_name, rows)
+    invalidate(file_name)
+
+def update_row(file_name: str, key, values: dict) -> int:
+    count = get_backend().update(file_name, key, values)
+    invalidate(file_name)
+    return count
+
+def load_csv_schema(file_name, schema=None, seed_df=None):
+    """
+    Declared columns of a table (see schemas.TABLES), creating the file from `seed_df` if it does not exist.
+    `schema` (a column list) is deprecated: the declared columns are used, and the frame is
+    only reindexed to the list for callers that still pass one.
+    """
+    backend = get_backend()
+
+    if not backend.exists(file_name):
+        df = seed_df.copy() if seed_df is not None else empty(file_name)
+        backend.save(df, file_name)
+        invalidate(file_name)
+        df = apply(df, file_name)[columns(file_name)]
+    else:
+        df = load_table(file_name)[columns(file_name)]
 
-def gen_id(prefix: str) -> str:
-    stamp = datetime.utcnow().strftime("%Y%m%d")
-    short = uuid.uuid4().hex[:6].upper()
-    return f"{prefix}-{stamp}-{short}"
+    if schema is not None:
+        warnings.warn("load_csv_schema(schema=...) is deprecated; columns come from schemas.TABLES",
+                      DeprecationWarning, stacklevel=2)
+        df = df.reindex(columns=list(schema))
+    return df
 
-def log_event(username, event_type, object_type, object_id, details=None, file_name="events.csv"):
-    path = csv_path(file_name)
-
-    row = pd.DataFrame([{
-        "event_ts": datetime.utcnow().isoformat(),
+def event_row(username, event_type, object_type, object_id, details=None, ts=None) -> dict:
+    return {
+        "event_ts": ts or datetime.utcnow().isoformat(),
         "username": username,
         "event_type": event_type,
         "object_type": object_type,
         "object_id": object_id,
         "details_json": json.dumps(details or {}, ensure_ascii=False),
-    }])
-
-    if os.path.exists(path):
-        try:
-            existing = pd.read_csv(path)
-            out = pd.concat([existing, row], ignore_index=True)
-        except Exception:
-            out = row
-    else:
-        out = row
-
-    out.to_csv(path, index=False)
+    }
 
-def compute_coldchain_score(temp_avg_c, temp_breach_count):
-    try:
-        temp_avg_c = float(temp_avg_c)
-    except Exception:
-        temp_avg_c = None
+def event_rows(username, event_type, object_type, object_ids, details=None) -> list:
+    """One event row per object id, sharing a timestamp."""
+    ts = datetime.utcnow().isoformat()
+    object_ids = list(object_ids)
+    details = list(details) if details is not None else [None] * len(object_ids)
+    return [event_row(username, event_type, object_type, o, d, ts) for o, d in zip(object_ids, details)]
 
-    try:
-        temp_breach_count = int(temp_breach_count)
-    except Exception:
-        temp_breach_count = 0
+def event_journal(file_name="events.csv"):
+    return journal_for(csv_path(file_name))
 
-    score = 100
+def log_event(username, event_type, object_type, object_id, details=None, file_name="events.csv"):
+    event_journal(file_name).append(event_row(username, event_type, object_type, object_id, details))
+    invalidate(file_name)
 
-    if temp_avg_c is not None:
-        if temp_avg_c < 2 or temp_avg_c > 6:
-            score -= 25
-        elif temp_avg_c < 3 or temp_avg_c > 5:
-            score -= 10
+def log_events(username, event_type, object_type, object_ids, details=None, file_name="events.csv"):
+    """Append one event per object id in a single journal write."""
+    event_journal(file_name).append_many(event_rows(username, event_type, object_type, object_ids, details))
+    invalidate(file_name)
 
-    score -= min(temp_breach_count * 10, 40)
-    score = max(0, min(100, score))
+def load_events(file_name="events.csv", columns=None) -> pd.DataFrame:
+    journal = journal_for(csv_path(file_name))
+    df = cached(file_name, journal.version_token(), lambda: apply(journal.read_all(), "events.csv"))
+    return (df[columns] if columns else df).copy()
 
-    if score >= 85:
-        status = "Green"
-    elif score >= 60:
-        status = "Amber"
-    else:
-        status = "Red"
+def iter_event_chunks(file_name="events.csv", chunksize=100_000, columns=None):
+    return journal_for(csv_path(file_name)).iter_chunks(chunksize=chunksize, columns=columns)
 
-    return {"score": score, "status": status}
+def compute_coldchain_score(temp_avg_c, temp_breach_count, dispute_count=0, spoiled_count=0):
+    """Scalar wrapper around sla.score_coldchain; returns {"score", "status"}."""
+    row = score_coldchain(temp_avg_c, temp_breach_count, dispute_count, spoiled_count).iloc[0]
+    return {"score": int(row["score"]), "status": row["status"]}
 
 def make_qr_payload(receipt_id, lot_id, owner_entity_id, custodian_id, issued_at=None, expiry_ts=None, status="active"):
-    payload = {
-        "receipt_id": receipt_id,
-        "lot_id": lot_id,
-        "owner_entity_id": owner_entity_id,
-        "custodian_id": custodian_id,
-        "issued_at": issued_at or datetime.utcnow().isoformat(),
-        "expiry_ts": expiry_ts,
-        "status": status,
-    }
-    return json.dumps(payload, ensure_ascii=False)
-
-def _wrap_text(text: str, width: int = 90):
-    text = str(text or "")
-    return [text[i:i + width] for i in range(0, len(text), width)] or [""]
-
-def generate_receipt_pdf(receipt_row: dict, lot_row=None) -> bytes:
-    buffer = BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    y = height - 50
-
-    pdf.setFont("Helvetica-Bold", 16)
-    pdf.drawString(50, y, "Mali Dairy Digital Warehouse Receipt (DWR / BDN)")
-    y -= 30
-
-    pdf.setFont("Helvetica", 10)
-    pdf.drawString(50, y, f"Issued at: {receipt_row.get('issued_at', '')}")
-    y -= 20
-    pdf.drawString(50, y, f"Receipt ID: {receipt_row.get('receipt_id', '')}")
-    y -= 20
-    pdf.drawString(50, y, f"Lot ID: {receipt_row.get('lot_id', '')}")
-    y -= 20
-    pdf.drawString(50, y, f"Owner Entity: {receipt_row.get('owner_entity_id', '')}")
-    y -= 20
-    pdf.drawString(50, y, f"Custodian: {receipt_row.get('custodian_id', '')}")
-    y -= 20
-    pdf.drawString(50, y, f"Status: {receipt_row.get('status', '')}")
-    y -= 20
-    pdf.drawString(50, y, f"Expiry: {receipt_row.get('expiry_ts', '')}")
-    y -= 30
-
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, y, "QR Payload")
-    y -= 18
-
-    pdf.setFont("Helvetica", 9)
-    for line in _wrap_text(receipt_row.get("qr_payload", ""), 90):
-        pdf.drawString(50, y, line)
-        y -= 14
-        if y < 80:
-            pdf.showPage()
-            pdf.setFont("Helvetica", 9)
-            y = height - 50
-
-    if lot_row:
-        y -= 20
-        pdf.setFont("Helvetica-Bold", 12)
-        pdf.drawString(50, y, "Lot Details")
-        y -= 18
-
-        pdf.setFont("Helvetica", 10)
-        fields = [
-            ("Product Type", lot_row.get("product_type", "")),
-            ("Quantity Liters", lot_row.get("quantity_liters", "")),
-            ("Fat %", lot_row.get("fat_pct", "")),
-            ("SNF %", lot_row.get("snf_pct", "")),
-            ("Acidity", lot_row.get("acidity", "")),
-            ("Antibiotic Test", lot_row.get("antibiotic_test", "")),
-            ("Bacterial Score", lot_row.get("bacterial_score", "")),
-            ("Avg Temp C", lot_row.get("temp_avg_c", "")),
-            ("Quality Grade", lot_row.get("quality_grade", "")),
-            ("Lot Status", lot_row.get("status", "")),
-        ]
-
-        for label, value in fields:
-            pdf.drawString(50, y, f"{label}: {value}")
-            y -= 18
-            if y < 80:
-                pdf.showPage()
-                pdf.setFont("Helvetica", 10)
-                y = height - 50
-
-    pdf.showPage()
-    pdf.save()
-
-    buffer.seek(0)
-    return buffer.read()
+    """Signed compact payload (see qr_codec); verification.receipt_id_from_payload still reads the old JSON."""
+    return encode_payload(receipt_id, lot_id, owner_entity_id, custodian_id,
+                          issued_at=issued_at, expiry_ts=expiry_ts, status=status)
 
+def generate_receipt_pdf(receipt_row: dict, lot_row=None, owner_row=None, custodian_row=None) -> bytes:
+    return receipt_pdf.generate_receipt_pdf(receipt_row, lot_row, owner_row, custodian_row)
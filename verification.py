@@ -0,0 +1,130 @@
+import math
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from indexes import lookup, exists
+from qr_codec import decode_payload, decode_many
+from schemas import iso
+from liens import active_lien
+
+PUBLIC_RECEIPT_FIELDS = ["receipt_id", "issued_at", "lot_id", "owner_entity_id", "custodian_id",
+                         "status", "expiry_ts", "lien_active", "lien_holder_id"]
+PUBLIC_LOT_FIELDS = ["lot_id", "product_type", "quantity_liters", "quality_grade", "antibiotic_test",
+                     "temp_avg_c", "temp_breach_count", "expiry_ts", "status"]
+
+
+def receipt_id_from_payload(q: str):
+    """Extract a receipt id from a typed id or scanned QR payload (signed, JSON or query); None if unrecognised."""
+    try:
+        return decode_payload(q)["receipt_id"] or None
+    except ValueError:
+        return None
+
+
+def verify_payload(payload, details=True) -> dict:
+    """
+    Verify a scanned QR payload: the offline signature check plus the registry checks.
+    A signed payload whose fields no longer match the registry (e.g. a forged owner) is not verified.
+    """
+    try:
+        decoded = decode_payload(payload)
+    except ValueError:
+        decoded = None
+    return _verify_decoded(decoded, details)
+
+
+def verify_receipt(receipt_id, details=True) -> dict:
+    """
+    Run the registry checks for one receipt: exists, expired, active advance, active lien,
+    open dispute. `verified` is True only if the receipt exists, is not expired and has no
+    open dispute; a lien does not make a receipt invalid, but it cannot be sold or released.
+    """
+    r0 = lookup("dwr_receipts.csv", receipt_id) if receipt_id else None
+    if r0 is None:
+        return {"receipt_id": receipt_id, "found": False, "verified": False}
+
+    exp = parse_ts(r0.get("expiry_ts"))
+    expired = False if exp is None else exp < datetime.now(timezone.utc)
+    active_adv = exists("advances.csv", ("receipt_id", "status"), (receipt_id, "active"))
+    open_disp = exists("disputes.csv", ("receipt_id", "status"), (receipt_id, "open"))
+    lien = active_lien(receipt_id)
+
+    result = {
+        "receipt_id": receipt_id,
+        "found": True,
+        "status": r0.get("status"),
+        "expired": expired,
+        "advance_active": active_adv,
+        "open_dispute": open_disp,
+        "lien_active": lien is not None,
+        "lien_holder_id": lien["lender_id"] if lien is not None else None,
+        "verified": (not expired) and (not open_disp),
+    }
+    if details:
+        lot = lookup("dairy_lots.csv", r0.get("lot_id")) or {}
+        owner = lookup("entities.csv", r0.get("owner_entity_id")) or {}
+        cust = lookup("custodians.csv", r0.get("custodian_id")) or {}
+        result["receipt"] = clean({k: r0.get(k) for k in PUBLIC_RECEIPT_FIELDS})
+        result["lot"] = clean({k: lot.get(k) for k in PUBLIC_LOT_FIELDS})
+        result["owner"] = clean({"entity_id": owner.get("entity_id"), "name": owner.get("name"), "region": owner.get("region")})
+        result["custodian"] = clean({"custodian_id": cust.get("custodian_id"), "name": cust.get("name"),
+                                     "region": cust.get("region"), "license_status": cust.get("license_status")})
+    return result
+
+
+def verify_receipts(receipt_ids, details=False) -> list:
+    return [verify_receipt(rid, details=details) for rid in receipt_ids]
+
+
+def verify_payloads(payloads, details=False) -> list:
+    """Batch form of verify_payload; signed payloads are decoded together with qr_codec.decode_many."""
+    decoded = decode_many(payloads).to_dict("records")
+    return [_verify_decoded(None if d["error"] else d, details) for d in decoded]
+
+
+def _verify_decoded(decoded, details) -> dict:
+    if decoded is None or not decoded.get("receipt_id"):
+        return {"receipt_id": None, "found": False, "verified": False, "signature_valid": None, "payload_matches": None}
+
+    result = verify_receipt(decoded["receipt_id"], details=details)
+    signature_valid = decoded.get("signature_valid")
+    result["signature_valid"] = signature_valid if signature_valid in (True, False) else None
+    result["payload_matches"] = None
+    if result["signature_valid"] is not None and result["found"]:
+        r0 = lookup("dwr_receipts.csv", decoded["receipt_id"]) or {}
+        result["payload_matches"] = all(
+            str(r0.get(k) or "") == str(decoded[k] or "") for k in ("lot_id", "owner_entity_id", "custodian_id")
+        )
+        result["verified"] = result["verified"] and result["signature_valid"] and result["payload_matches"]
+    return result
+
+
+def parse_ts(value):
+    """Parse an ISO timestamp as stored by the pages (naive, "Z" or "+00:00Z") to aware UTC; None if blank."""
+    s = str(value if value is not None else "").strip()
+    if not s or s.lower() in ("nan", "nat", "none"):
+        return None
+    if s.endswith("Z"):
+        s = s[:-1]
+        if "+" not in s[10:] and "-" not in s[10:]:
+            s += "+00:00"
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        ts = pd.to_datetime(value, errors="coerce", utc=True)
+        return None if pd.isna(ts) else ts.to_pydatetime()
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def clean(d: dict) -> dict:
+    """Make a row dict JSON-safe (NaN/NA -> None, timestamps -> ISO text, numpy scalars -> Python)."""
+    out = {}
+    for k, v in d.items():
+        v = None if v is pd.NA or v is pd.NaT else iso(v)
+        if hasattr(v, "item"):
+            v = v.item()
+        if isinstance(v, float) and math.isnan(v):
+            v = None
+        out[k] = v
+    return out
@@ -0,0 +1,141 @@
+"""
+Headless DWR verification service (ASGI).
+
+    uvicorn verify_api:app --host 0.0.0.0 --port 8000 --workers 4
+
+GET  /health
+GET  /verify/{receipt_id}
+POST /verify          {"payload": "<QR payload or receipt id>"}  (signed payloads also report signature_valid)
+POST /verify/batch    {"receipt_ids": [...]} and/or {"payloads": [...]}  (max MAX_BATCH)
+
+Callers may send `Authorization: Bearer <token>` (see users.issue_token / `python users.py
+token <username>`); an invalid or expired token is rejected with 401. Owner and custodian
+details are only returned to callers with a valid token; anonymous scans get the receipt's
+status and validity. With DWR_VERIFY_REQUIRE_TOKEN=1 every request except /health needs a
+valid token.
+
+Lookups load tables and indexes from disk, so they run in a worker thread and the event
+loop keeps serving other requests meanwhile.
+"""
+import os
+import json
+import asyncio
+from urllib.parse import unquote
+
+from verification import verify_payload, verify_payloads, verify_receipt, verify_receipts
+from users import verify_token, bearer_token
+
+MAX_BATCH = 1000
+MAX_BODY_BYTES = 1024 * 1024
+REQUIRE_TOKEN = os.environ.get("DWR_VERIFY_REQUIRE_TOKEN", "").strip() == "1"
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    method, path = scope["method"], scope["path"].rstrip("/")
+    try:
+        caller = await _caller(scope)
+        if method == "GET" and path == "/health":
+            status, body = 200, {"ok": True}
+        elif caller is False or (caller is None and REQUIRE_TOKEN):
+            status, body = 401, {"error": "missing or invalid bearer token"}
+        elif method == "GET" and path.startswith("/verify/"):
+            receipt_id = unquote(path[len("/verify/"):])
+            status, body = _single(await asyncio.to_thread(verify_receipt, receipt_id, details=bool(caller)))
+        elif method == "POST" and path == "/verify":
+            data = await _read_json(receive)
+            if data.get("receipt_id"):
+                receipt_id = _string(data, "receipt_id")
+                status, body = _single(await asyncio.to_thread(verify_receipt, receipt_id, details=bool(caller)))
+            else:
+                result = await asyncio.to_thread(verify_payload, _string(data, "payload"), details=bool(caller))
+                if not result["receipt_id"]:
+                    status, body = 400, {"error": "unrecognised payload"}
+                else:
+                    status, body = _single(result)
+        elif method == "POST" and path == "/verify/batch":
+            data = await _read_json(receive)
+            ids = _strings(data, "receipt_ids")
+            payloads = _strings(data, "payloads")
+            if len(ids) + len(payloads) > MAX_BATCH:
+                status, body = 413, {"error": f"batch larger than {MAX_BATCH}"}
+            else:
+                details = bool(data.get("details")) and bool(caller)
+                results = await asyncio.to_thread(
+                    lambda: verify_receipts(ids, details=details) + verify_payloads(payloads, details=details))
+                status, body = 200, {"count": len(results), "verified": sum(r["verified"] for r in results), "results": results}
+        else:
+            status, body = 404, {"error": "not found"}
+    except ValueError as e:
+        status, body = 400, {"error": str(e)}
+
+    await _respond(send, status, body)
+
+
+async def _caller(scope):
+    """The token's claims, None without an Authorization header, False for an invalid or expired token."""
+    authorization = next((v for k, v in scope.get("headers", []) if k == b"authorization"), b"")
+    if not authorization:
+        return None
+    claims = await asyncio.to_thread(verify_token, bearer_token(authorization.decode("latin-1")))
+    return claims or False
+
+
+def _string(data, field):
+    value = data.get(field)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    return value
+
+
+def _strings(data, field) -> list:
+    value = data.get(field)
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"{field} must be a list of strings")
+    return value
+
+
+def _single(result):
+    return (200 if result["found"] else 404), result
+
+
+async def _read_json(receive) -> dict:
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError("request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    try:
+        data = json.loads(b"".join(chunks) or b"{}")
+    except json.JSONDecodeError:
+        raise ValueError("invalid JSON body")
+    if not isinstance(data, dict):
+        raise ValueError("JSON body must be an object")
+    return data
+
+
+async def _respond(send, status, body):
+    payload = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())],
+    })
+    await send({"type": "http.response.body", "body": payload})